@@ -0,0 +1,32 @@
+"""Trạng thái hủy suất chiếu: showtimes_status 'cancelled', transaction_status 'refunded'
+
+Revision ID: 01e024736bec
+Revises: d15644bce3dd
+Create Date: 2026-10-19 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '01e024736bec'
+down_revision: Union[str, Sequence[str], None] = 'd15644bce3dd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ADD VALUE chạy ngoài transaction (Postgres < 12 không cho, >= 12 không dùng được giá trị mới trong cùng transaction)
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE showtimes_status ADD VALUE IF NOT EXISTS 'cancelled'")
+        op.execute("ALTER TYPE transaction_status ADD VALUE IF NOT EXISTS 'refunded'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Postgres không xóa được giá trị enum; giữ nguyên 'cancelled' / 'refunded'
+    pass
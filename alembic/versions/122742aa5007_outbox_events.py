@@ -0,0 +1,48 @@
+"""outbox_events: transactional outbox cho email / QR sau thanh toán
+
+Revision ID: 122742aa5007
+Revises:
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '122742aa5007'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+outbox_status = sa.Enum('pending', 'processing', 'done', 'dead', name='outbox_status')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'outbox_events',
+        sa.Column('event_id', sa.Integer(), primary_key=True),
+        sa.Column('event_type', sa.String(length=100), nullable=False),
+        sa.Column('aggregate_id', sa.String(length=100), nullable=True),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('status', outbox_status, nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='8'),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_outbox_events_event_id', 'outbox_events', ['event_id'])
+    op.create_index('ix_outbox_events_aggregate_id', 'outbox_events', ['aggregate_id'])
+    op.create_index('ix_outbox_events_due', 'outbox_events', ['event_type', 'status', 'next_attempt_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('outbox_events')
+    outbox_status.drop(op.get_bind(), checkfirst=True)
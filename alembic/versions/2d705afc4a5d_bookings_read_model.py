@@ -0,0 +1,65 @@
+"""bookings: read model một dòng / đơn đặt vé
+
+Sau khi nâng cấp, dựng dữ liệu cho các vé đã có:
+    python -m app.services.bookings_service
+
+Revision ID: 2d705afc4a5d
+Revises: 65f1868d6474
+Create Date: 2026-10-19 09:50:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2d705afc4a5d'
+down_revision: Union[str, Sequence[str], None] = '65f1868d6474'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+booking_status = sa.Enum('confirmed', 'partially_cancelled', 'cancelled', name='booking_status')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'bookings',
+        sa.Column('booking_id', sa.Integer(), primary_key=True),
+        sa.Column('booking_code', sa.String(length=32), nullable=False, unique=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.user_id'), nullable=True),
+        sa.Column('transaction_id', sa.Integer(), sa.ForeignKey('transactions.transaction_id'), nullable=True),
+        sa.Column('showtime_id', sa.Integer(), sa.ForeignKey('showtimes.showtime_id'), nullable=False),
+        sa.Column('theater_id', sa.Integer(), nullable=True),
+        sa.Column('movie_title', sa.String(length=255), nullable=True),
+        sa.Column('poster_url', sa.String(length=255), nullable=True),
+        sa.Column('show_datetime', sa.DateTime(), nullable=True),
+        sa.Column('room_name', sa.String(length=100), nullable=True),
+        sa.Column('theater_name', sa.String(length=255), nullable=True),
+        sa.Column('theater_city', sa.String(length=100), nullable=True),
+        sa.Column('customer_name', sa.String(length=255), nullable=True),
+        sa.Column('customer_email', sa.String(length=255), nullable=True),
+        sa.Column('customer_phone', sa.String(length=20), nullable=True),
+        sa.Column('tickets', sa.JSON(), nullable=False),
+        sa.Column('seats', sa.String(length=1000), nullable=False, server_default=''),
+        sa.Column('ticket_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('cancelled_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_amount', sa.Numeric(15, 2), nullable=False, server_default='0'),
+        sa.Column('status', booking_status, nullable=False, server_default='confirmed'),
+        sa.Column('booked_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('validated_at', sa.DateTime(), nullable=True),
+        sa.Column('cancelled_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index('ix_bookings_booking_id', 'bookings', ['booking_id'])
+    op.create_index('ix_bookings_booked_at_code', 'bookings', ['booked_at', 'booking_code'])
+    op.create_index('ix_bookings_user_show_datetime', 'bookings', ['user_id', 'show_datetime'])
+    op.create_index('ix_bookings_showtime', 'bookings', ['showtime_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('bookings')
+    booking_status.drop(op.get_bind(), checkfirst=True)
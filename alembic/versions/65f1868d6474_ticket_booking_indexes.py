@@ -0,0 +1,33 @@
+"""Index tickets cho danh sách booking (keyset) và lọc theo suất chiếu
+
+Revision ID: 65f1868d6474
+Revises: 01e024736bec
+Create Date: 2026-10-19 09:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '65f1868d6474'
+down_revision: Union[str, Sequence[str], None] = '01e024736bec'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('ix_tickets_booking_time_code', 'tickets', ['booking_time', 'booking_code'],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_tickets_showtime_status', 'tickets', ['showtime_id', 'status'],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tickets_showtime_status', table_name='tickets')
+    op.drop_index('ix_tickets_booking_time_code', table_name='tickets')
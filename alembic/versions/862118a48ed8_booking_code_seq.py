@@ -0,0 +1,35 @@
+"""booking_code_seq: sequence cấp khối số cho booking_code (app/core/booking_codes.py)
+
+Revision ID: 862118a48ed8
+Revises: b4fee3ef0816
+Create Date: 2026-10-19 10:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '862118a48ed8'
+down_revision: Union[str, Sequence[str], None] = 'b4fee3ef0816'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Khớp app/models/tickets.py: BOOKING_CODE_BLOCK_SIZE, BOOKING_CODE_MAX_VALUE
+BLOCK_SIZE = 1000
+MAX_VALUE = 2 ** 35 - 1
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(sa.schema.CreateSequence(
+        sa.Sequence('booking_code_seq', start=1, minvalue=1, increment=BLOCK_SIZE, maxvalue=MAX_VALUE),
+        if_not_exists=True,
+    ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(sa.schema.DropSequence(sa.Sequence('booking_code_seq'), if_exists=True))
@@ -0,0 +1,37 @@
+"""transaction_combos: combo bán kèm trong giao dịch tại quầy
+
+Revision ID: 9275ea497dba
+Revises: 862118a48ed8
+Create Date: 2026-10-19 10:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9275ea497dba'
+down_revision: Union[str, Sequence[str], None] = '862118a48ed8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'transaction_combos',
+        sa.Column('transaction_combo_id', sa.Integer(), primary_key=True),
+        sa.Column('transaction_id', sa.Integer(), sa.ForeignKey('transactions.transaction_id'), nullable=False),
+        sa.Column('combo_id', sa.Integer(), sa.ForeignKey('combos.combo_id'), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('unit_price', sa.Numeric(10, 2), nullable=False),
+    )
+    op.create_index('ix_transaction_combos_transaction_combo_id', 'transaction_combos', ['transaction_combo_id'])
+    op.create_index('ix_transaction_combos_transaction_id', 'transaction_combos', ['transaction_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('transaction_combos')
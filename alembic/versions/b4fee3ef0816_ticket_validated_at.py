@@ -0,0 +1,28 @@
+"""tickets.validated_at: thời điểm soát vé (gate_validator ghi theo lô)
+
+Revision ID: b4fee3ef0816
+Revises: 2d705afc4a5d
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4fee3ef0816'
+down_revision: Union[str, Sequence[str], None] = '2d705afc4a5d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tickets', sa.Column('validated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('tickets', 'validated_at')
@@ -0,0 +1,41 @@
+"""Index keyset pagination / lọc lịch sử thanh toán VNPay
+
+Revision ID: d15644bce3dd
+Revises: fdcb2bc44917
+Create Date: 2026-10-19 09:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd15644bce3dd'
+down_revision: Union[str, Sequence[str], None] = 'fdcb2bc44917'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY: không khóa ghi bảng payments khi tạo index trên DB đang chạy
+    with op.get_context().autocommit_block():
+        op.create_index('ix_payments_created_at_payment_id', 'payments', ['created_at', 'payment_id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_payments_user_created_at_payment_id', 'payments', ['user_id', 'created_at', 'payment_id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_payments_order_id_prefix', 'payments', ['order_id'],
+                        postgresql_ops={'order_id': 'varchar_pattern_ops'},
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_vnpay_payments_pay_date', 'vnpay_payments', ['vnp_pay_date'],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_vnpay_payments_pay_date', table_name='vnpay_payments')
+    op.drop_index('ix_payments_order_id_prefix', table_name='payments')
+    op.drop_index('ix_payments_user_created_at_payment_id', table_name='payments')
+    op.drop_index('ix_payments_created_at_payment_id', table_name='payments')
@@ -0,0 +1,37 @@
+"""Index GIN trigram cho tra cứu booking tại quầy (cần extension pg_trgm)
+
+Revision ID: efe7c2467609
+Revises: 9275ea497dba
+Create Date: 2026-10-19 10:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'efe7c2467609'
+down_revision: Union[str, Sequence[str], None] = '9275ea497dba'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_COLUMNS = ('booking_code', 'customer_phone', 'customer_email', 'customer_name')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        for column in SEARCH_COLUMNS:
+            op.create_index(f'ix_bookings_{column}_trgm', 'bookings', [column],
+                            postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'},
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Giữ extension pg_trgm: có thể đã được dùng ở nơi khác
+    for column in reversed(SEARCH_COLUMNS):
+        op.drop_index(f'ix_bookings_{column}_trgm', table_name='bookings')
@@ -0,0 +1,35 @@
+"""payments.callback_state / callback_result: xử lý callback VNPay idempotent
+
+Revision ID: fdcb2bc44917
+Revises: 122742aa5007
+Create Date: 2026-10-19 09:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fdcb2bc44917'
+down_revision: Union[str, Sequence[str], None] = '122742aa5007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+payment_callback_state = sa.Enum('pending', 'completed', 'rejected', name='payment_callback_state')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    payment_callback_state.create(op.get_bind(), checkfirst=True)
+    # Payment cũ: pending + không có kết quả lưu → callback trùng đi theo nhánh "Already processed" như trước
+    op.add_column('payments', sa.Column('callback_state', payment_callback_state, nullable=False, server_default='pending'))
+    op.add_column('payments', sa.Column('callback_result', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('payments', 'callback_result')
+    op.drop_column('payments', 'callback_state')
+    payment_callback_state.drop(op.get_bind(), checkfirst=True)
@@ -1,17 +1,62 @@
-from fastapi import APIRouter, Depends
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.services.tickets_service import get_all_bookings, get_booking_by_code
+from app.core.security import get_current_staff_user
+from app.services.ticket_qr_service import BOOKING_QR_TYPE, booking_qr_subject, booking_qr_token, decode_qr_token, qr_image_response
+from app.services.tickets_service import (
+    BOOKING_SEARCH_DEFAULT_LIMIT,
+    BOOKING_SEARCH_MAX_LIMIT,
+    BOOKING_SEARCH_MIN_LENGTH,
+    BOOKINGS_DEFAULT_LIMIT,
+    get_all_bookings,
+    get_booking_by_code,
+    search_bookings,
+)
 from app.utils.response import success_response
 
 router = APIRouter()
 
 
 @router.get('/bookings')
-def list_bookings(db: Session = Depends(get_db)):
-    return success_response(get_all_bookings(db))
+def list_bookings(
+    show_date: Optional[date] = Query(None, description="Lọc theo ngày chiếu (YYYY-MM-DD)"),
+    showtime_id: Optional[int] = None,
+    theater_id: Optional[int] = None,
+    status: Optional[str] = Query(None, description="Trạng thái booking: confirmed / partially_cancelled / cancelled"),
+    limit: int = BOOKINGS_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Danh sách booking mới nhất trước; trang sau: truyền `next_cursor` của trang trước vào `cursor`"""
+    return success_response(get_all_bookings(
+        db, show_date=show_date, showtime_id=showtime_id, theater_id=theater_id,
+        booking_status=status, limit=limit, cursor=cursor,
+    ))
 
 
+# Tra cứu tại quầy theo SĐT / email / tên khách / một phần mã đặt vé
+@router.get('/bookings/search')
+def search_booking(
+    q: str = Query(..., min_length=BOOKING_SEARCH_MIN_LENGTH, max_length=100, description="SĐT, email, tên khách hoặc một phần mã đặt vé"),
+    limit: int = Query(BOOKING_SEARCH_DEFAULT_LIMIT, ge=1, le=BOOKING_SEARCH_MAX_LIMIT),
+    db: Session = Depends(get_db),
+    _ = Depends(get_current_staff_user),
+):
+    return success_response(search_bookings(db, q, limit))
+
+
+# Chi tiết đơn để in vé tại quầy (kèm QR soát vé của từng vé)
 @router.get('/bookings/{booking_code}')
-def get_booking(booking_code: str, db: Session = Depends(get_db)):
+def get_booking(booking_code: str, db: Session = Depends(get_db), _ = Depends(get_current_staff_user)):
     return success_response(get_booking_by_code(db, booking_code))
+
+
+
+# Ảnh QR của cả đơn (tra cứu tại quầy), cache bất biến private
+@router.get('/bookings/{booking_code}/qr.png')
+async def get_booking_qr_image(booking_code: str, token: str, if_none_match: Optional[str] = Header(None)):
+    if decode_qr_token(token, BOOKING_QR_TYPE).get("booking_code") != booking_code:
+        raise HTTPException(status_code=404, detail='Booking not found')
+    return await qr_image_response(booking_qr_token(booking_code), booking_qr_subject(booking_code), if_none_match)
@@ -0,0 +1,53 @@
+import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+
+from app.core.security import get_current_admin_user
+from app.services.exports_service import (
+    EXPORT_FORMATS,
+    export_filename,
+    stream_export,
+    tickets_export_query,
+    transactions_export_query,
+)
+
+router = APIRouter()
+
+FORMAT_PATTERN = "^(" + "|".join(EXPORT_FORMATS) + ")$"
+
+
+def _export_response(kind: str, query, export_format: str, date_from, date_to) -> StreamingResponse:
+    filename = export_filename(kind, export_format, date_from, date_to)
+    return StreamingResponse(
+        stream_export(query, export_format),
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# Xuất vé cho kế toán (stream, không giới hạn số dòng)
+@router.get("/exports/tickets")
+async def export_tickets(
+    date_from: Optional[datetime.date] = Query(None, description="Từ ngày đặt vé (YYYY-MM-DD)"),
+    date_to: Optional[datetime.date] = Query(None, description="Đến hết ngày đặt vé (YYYY-MM-DD)"),
+    theater_id: Optional[int] = None,
+    format: str = Query("ndjson", pattern=FORMAT_PATTERN),
+    _ = Depends(get_current_admin_user),
+):
+    query = tickets_export_query(date_from, date_to, theater_id)
+    return _export_response("tickets", query, format, date_from, date_to)
+
+
+# Xuất giao dịch cho kế toán (stream, không giới hạn số dòng)
+@router.get("/exports/transactions")
+async def export_transactions(
+    date_from: Optional[datetime.date] = Query(None, description="Từ ngày giao dịch (YYYY-MM-DD)"),
+    date_to: Optional[datetime.date] = Query(None, description="Đến hết ngày giao dịch (YYYY-MM-DD)"),
+    theater_id: Optional[int] = None,
+    format: str = Query("ndjson", pattern=FORMAT_PATTERN),
+    _ = Depends(get_current_admin_user),
+):
+    query = transactions_export_query(date_from, date_to, theater_id)
+    return _export_response("transactions", query, format, date_from, date_to)
@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.schemas.reservations import SeatReservationsCreate, CancelReservationRequest
 from app.services.reservations_service import (
     create_reserved_seats, 
@@ -16,19 +16,19 @@ router = APIRouter()
 
 #Danh sach các ghế đã đặt
 @router.get("/reservations/{showtime_id}")
-def list_reserved_seats(showtime_id: int, db: Session = Depends(get_db)):
-    reserved_seats = get_reserved_seats(showtime_id, db)
+async def list_reserved_seats(showtime_id: int, db: AsyncSession = Depends(get_async_db)):
+    reserved_seats = await get_reserved_seats(showtime_id, db)
     return success_response(reserved_seats)
 
 #Tạo đặt chỗ đơn lẻ
 @router.post("/reservations")
-def add_reservations(reservations_in : SeatReservationsCreate, db : Session = Depends(get_db)):
-    reservations = create_reserved_seats(reservations_in, db)
+async def add_reservations(reservations_in : SeatReservationsCreate, db : AsyncSession = Depends(get_async_db)):
+    reservations = await create_reserved_seats(reservations_in, db)
     return success_response(reservations)
 
 #Tạo nhiều đặt chỗ cùng lúc (realtime)
 @router.post("/reservations/multiple")
-async def add_multiple_reservations(reservations_in: List[SeatReservationsCreate], db: Session = Depends(get_db)):
+async def add_multiple_reservations(reservations_in: List[SeatReservationsCreate], db: AsyncSession = Depends(get_async_db)):
     reservations = await create_multiple_reserved_seats(reservations_in, db)
     return success_response(reservations)
 
@@ -41,7 +41,7 @@ async def test_endpoint():
 @router.post("/reservations/cancel")
 async def cancel_reservations(
     cancel_request: CancelReservationRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
         print(f"🔄 Received cancel request: {cancel_request}")
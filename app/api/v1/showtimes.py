@@ -1,6 +1,10 @@
+import json
 from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.core.database import get_db
+from app.core.security import get_current_admin_user
+from app.models.users import Users
 from app.services.seat_layouts_service import *
 from app.utils.response import success_response
 from app.services.showtimes_service import (
@@ -9,9 +13,11 @@ from app.services.showtimes_service import (
     get_showtimes_by_movie,
     get_showtimes_by_movie_and_theater,
     create_showtime,
-    bulk_create_showtimes
+    bulk_create_showtimes,
+    update_showtime
 )
-from app.schemas.showtimes import ShowtimesCreate
+from app.services.showtime_cancellation_service import start_showtime_cancellation, stream_showtime_cancellation
+from app.schemas.showtimes import ShowtimesCreate, ShowtimesUpdate
 from typing import Optional
 from datetime import date
 router = APIRouter()
@@ -59,3 +65,31 @@ def add_showtimes_bulk(showtimes_in: list[ShowtimesCreate], db: Session = Depend
     """Tạo nhiều lịch chiếu cùng lúc"""
     showtimes = bulk_create_showtimes(db, showtimes_in)
     return success_response(showtimes)
+
+
+@router.put("/showtimes/{showtime_id}")
+def edit_showtime(showtime_id: int, showtime_in: ShowtimesUpdate, db: Session = Depends(get_db)):
+    """Cập nhật lịch chiếu (bảng giá của suất chiếu sẽ được làm mới)"""
+    showtime = update_showtime(db, showtime_id, showtime_in)
+    return success_response(showtime)
+
+
+@router.post("/showtimes/{showtime_id}/cancel")
+async def cancel_showtime(
+    showtime_id: int,
+    reason: str = Query("Sự cố kỹ thuật tại phòng chiếu", max_length=255, description="Lý do hủy (gửi kèm email / hoàn tiền)"),
+    chunk_size: Optional[int] = Query(None, ge=1, le=1000, description="Số booking mỗi lô"),
+    current_user: Users = Depends(get_current_admin_user),
+):
+    """
+    Hủy suất chiếu: hủy vé theo lô, hoàn tiền + email qua outbox, giải phóng ghế và broadcast WebSocket.
+    Response là NDJSON, mỗi dòng một bước tiến độ (started → progress... → done).
+    Gọi lại trên suất chiếu đã hủy sẽ tiếp tục với các vé còn sót.
+    """
+    showtime = await start_showtime_cancellation(showtime_id)
+
+    async def progress_lines():
+        async for event in stream_showtime_cancellation(showtime, reason, current_user.email, chunk_size):
+            yield json.dumps(event, ensure_ascii=False, default=str) + "\n"
+
+    return StreamingResponse(progress_lines(), media_type="application/x-ndjson")
@@ -1,13 +1,29 @@
 import datetime
-from fastapi import APIRouter, Depends
-from app.core.security import get_current_active_user
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, Query, Response
+from app.core.security import get_current_active_user, get_current_staff_user, is_staff_user
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.schemas.tickets import TicketsCreate, TicketVerifyRequest
-from app.services.tickets_service import create_ticket_directly, generate_ticket_qr, verify_ticket_qr ,get_all_bookings
+from app.schemas.tickets import CounterCheckoutRequest, TicketsCreate, TicketVerifyBatchRequest, TicketVerifyRequest
+from app.core.gate_validator import gate_validator
+from app.services.bookings_service import refresh_bookings
+from app.services.counter_checkout_service import counter_checkout, sell_single_ticket
+from app.services.user_bookings_cache import invalidate_user_bookings
+from app.services.tickets_service import BOOKINGS_DEFAULT_LIMIT, generate_ticket_qr, verify_ticket_qr, verify_ticket_qr_batch,get_all_bookings, get_my_bookings, MY_BOOKINGS_DEFAULT_LIMIT
+from app.services.qr_service import DEFAULT_BOX_SIZE, MAX_BOX_SIZE, QR_FORMATS, render_qr
+from app.services.ticket_qr_service import (
+    TICKET_QR_TYPE,
+    decode_qr_token,
+    qr_image_response,
+    ticket_qr_expiry,
+    ticket_qr_subject,
+    ticket_qr_token,
+    ticket_qr_url,
+)
 from app.utils.response import success_response
 from app.models.users import Users
-from app.models.tickets import Tickets  
+from app.models.tickets import Tickets, TicketStatusEnum
+from app.models.transactions import Transaction, TransactionStatus
 from fastapi import HTTPException
 from fastapi.responses import StreamingResponse
 from io import BytesIO
@@ -19,30 +35,65 @@ from datetime import timedelta
 router =APIRouter()
 @router.get("/tickets")
 def read_tickets(
+    show_date: Optional[datetime.date] = Query(None, description="Lọc theo ngày chiếu (YYYY-MM-DD)"),
+    showtime_id: Optional[int] = None,
+    theater_id: Optional[int] = None,
+    status: Optional[str] = Query(None, description="Trạng thái booking: confirmed / partially_cancelled / cancelled"),
+    limit: int = BOOKINGS_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     # _ = Depends(get_current_active_user),
 ):
-    # Placeholder for reading tickets logic
-    return success_response(get_all_bookings(db))
+    # Cùng dữ liệu với /bookings (gom theo booking_code, phân trang keyset)
+    return success_response(get_all_bookings(
+        db, show_date=show_date, showtime_id=showtime_id, theater_id=theater_id,
+        booking_status=status, limit=limit, cursor=cursor,
+    ))
 
-# Nhân viên Tạo vé trực tiếp tại quầy
+# Nhân viên Tạo vé trực tiếp tại quầy (một ghế)
 @router.post("/tickets/direct",status_code=201)
-def add_ticket_directly(
+async def add_ticket_directly(
     ticket_in : TicketsCreate,
-    db : Session = Depends(get_db),
     # _ = Depends(get_current_active_user),
 ):
-    return create_ticket_directly(ticket_in=ticket_in ,db=db)
+    return await sell_single_ticket(ticket_in)
 
 
-# Tạo QR token cho vé
+# Nhân viên bán cả giỏ (nhiều ghế + combo) tại quầy: một giao dịch, một commit, một broadcast
+@router.post("/tickets/counter-checkout", status_code=201)
+async def checkout_at_counter(
+    cart: CounterCheckoutRequest,
+    current_user: Users = Depends(get_current_staff_user),
+):
+    return success_response(await counter_checkout(cart, current_user.user_id))
+
+
+# Tạo QR token cho vé (chủ vé / nhân viên; format=png|svg để nhận luôn ảnh QR của token)
 @router.post("/tickets/{ticket_id}/qr")
 def create_ticket_qr(
     ticket_id: int,
+    format: Optional[str] = Query(None, pattern="^(png|svg)$"),
+    box_size: int = Query(DEFAULT_BOX_SIZE, ge=1, le=MAX_BOX_SIZE),
     db: Session = Depends(get_db),
-    # _ = Depends(get_current_active_user),
+    current_user: Users = Depends(get_current_active_user),
 ):
-    return success_response(generate_ticket_qr(db, ticket_id))
+    qr = generate_ticket_qr(db, ticket_id, current_user)
+    if format:
+        content = render_qr(qr.qr_token, format, box_size, subject=ticket_qr_subject(ticket_id, qr.expires_at))
+        return Response(content=content, media_type=QR_FORMATS[format])
+    return success_response(qr)
+
+
+# Ảnh QR soát vé (URL lấy từ response của chủ vé / nhân viên), cache bất biến private tới khi token hết hạn
+@router.get("/tickets/{ticket_id}/qr.png")
+async def get_ticket_qr_image(ticket_id: int, token: str, if_none_match: Optional[str] = Header(None)):
+    claims = decode_qr_token(token, TICKET_QR_TYPE)
+    if claims.get("ticket_id") != ticket_id:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    # Luôn render token chuẩn của (vé, exp): cache theo vé không bị token khác (claim thừa) ghi đè
+    expires_at = claims["exp"]
+    canonical = ticket_qr_token(ticket_id, claims.get("showtime_id"), expires_at)
+    return await qr_image_response(canonical, ticket_qr_subject(ticket_id, expires_at), if_none_match, expires_at)
 
 
 # Quét/kiểm tra QR và xác thực vé
@@ -55,67 +106,41 @@ def verify_ticket_by_qr(
     return success_response(verify_ticket_qr(db, verify_in))
 
 
+# Phát lại bộ đệm quét của cổng soát vé trong một request (kết quả theo từng token)
+@router.post("/tickets/verify-qr/batch")
+def verify_ticket_by_qr_batch(
+    verify_in: TicketVerifyBatchRequest,
+    # _ = Depends(get_current_active_user),
+):
+    return success_response(verify_ticket_qr_batch(verify_in))
+
+
 
 @router.get("/tickets/my")
 def get_my_tickets(
+    section: Optional[str] = Query(None, pattern="^(upcoming|past)$", description="upcoming / past; bỏ trống = trang đầu của cả hai"),
+    limit: int = MY_BOOKINGS_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: Users = Depends(get_current_active_user)
 ):
-    tickets = (
-        db.query(Tickets)
-        .filter(Tickets.user_id == current_user.user_id)
-        .all()
-    )
-
-    bookings = {}
+    # Cache theo khách, vô hiệu hóa khi xuất / hủy vé; trang sau: truyền `next_cursor` của mục đó vào `cursor`
+    return success_response(get_my_bookings(db, current_user.user_id, section=section, limit=limit, cursor=cursor))
 
-    for t in tickets:
-        code = t.booking_code
-
-        if code not in bookings:
-            showtime = t.showtime
-            movie = showtime.movie
-            room = showtime.room
-            theater = showtime.theater
-
-            bookings[code] = {
-                "booking_code": code,
-                "movie_title": movie.title,
-                "poster_url": movie.poster_url,
-                "date": showtime.show_datetime.strftime("%Y-%m-%d"),
-                "time": showtime.show_datetime.strftime("%H:%M"),
-                "room": room.room_name,
-                "theater_name": theater.name,
-                "theater_city": theater.city,
-                "seats": [],
-                "qr_code": t.qr_code,
-                # Dùng trực tiếp show_datetime để sort, không trả ra FE
-                "_sort": showtime.show_datetime
-            }
-
-        bookings[code]["seats"].append(t.seat.seat_code)
-
-    result = list(bookings.values())
-
-    # Sort mới nhất → cũ nhất
-    result.sort(key=lambda x: x["_sort"], reverse=True)
-
-    # Xóa key sort trước khi trả về
-    for item in result:
-        del item["_sort"]
-
-    return success_response(result)
-
-# Lấy chi tiết vé
+# Lấy chi tiết vé (chủ vé hoặc nhân viên: response chứa QR vào cửa)
 @router.get("/tickets/{ticket_id}")
-def get_ticket_detail(ticket_id: int, db: Session = Depends(get_db)):
+def get_ticket_detail(
+    ticket_id: int,
+    db: Session = Depends(get_db),
+    current_user: Users = Depends(get_current_active_user),
+):
     ticket = (
         db.query(Tickets)
         .filter(Tickets.ticket_id == ticket_id)
         .first()
     )
 
-    if not ticket:
+    if not ticket or (ticket.user_id != current_user.user_id and not is_staff_user(current_user)):
         raise HTTPException(status_code=404, detail="Ticket not found")
 
     showtime = ticket.showtime
@@ -134,6 +159,7 @@ def get_ticket_detail(ticket_id: int, db: Session = Depends(get_db)):
         
         "seat_code": seat.seat_code,
         "price": float(ticket.price),
+        "qr_url": ticket_qr_url(ticket.ticket_id, ticket.showtime_id, ticket_qr_expiry(showtime.show_datetime)),
 
         # Theater info – FIXED
         "theater_name": theater.name,
@@ -159,15 +185,20 @@ def cancel_ticket(
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
 
-    if ticket.status == "cancelled":
+    if ticket.status == TicketStatusEnum.cancelled:
         raise HTTPException(status_code=400, detail="Ticket already cancelled")
 
-    ticket.status = "cancelled"
-    ticket.cancelled_at = datetime.now()
+    ticket.status = TicketStatusEnum.cancelled
+    ticket.cancelled_at = datetime.datetime.now()
 
-    if ticket.transaction:
-        ticket.transaction.status = "refunded"
+    transaction = db.get(Transaction, ticket.transaction_id) if ticket.transaction_id else None
+    if transaction and transaction.status == TransactionStatus.success:
+        transaction.status = TransactionStatus.refunded
 
+    refresh_bookings(db, [ticket.booking_code])
+    showtime_id = ticket.showtime_id
     db.commit()
+    invalidate_user_bookings([current_user.user_id])
+    gate_validator.invalidate([showtime_id])
 
     return success_response({"message": "Ticket cancelled successfully"})
\ No newline at end of file
@@ -5,18 +5,22 @@ from fastapi import Response
 
 import redis.asyncio as redis
 redis_client = redis.from_url("redis://localhost:6379", decode_responses=True)
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 import json
 import logging
 import asyncio
 
-from app.core.database import get_db
+from app.core.database import AsyncSessionLocal, get_db
+from app.core.payment_notifier import payment_notifier
 from app.core.websocket_manager import websocket_manager
-from app.services.reservations_service import get_reserved_seats
+from app.models.payments import PaymentStatusEnum
+from app.services.payments_service import PaymentService
+from app.services.reservations_service import RESERVATION_HOLD_MINUTES, get_reserved_seats
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
+payment_service = PaymentService()
 @router.get("/redis/ping")
 async def redis_ping():
     """Kiểm tra kết nối Redis (async)"""
@@ -182,4 +186,71 @@ async def get_websocket_status(showtime_id: int):
         "active_connections": connection_count,
         "status": "active" if connection_count > 0 else "inactive",
         "connections": connections_info
-    }
\ No newline at end of file
+    }
+
+# Thời gian tối đa giữ kết nối chờ kết quả thanh toán (bằng thời gian giữ ghế)
+PAYMENT_WS_TIMEOUT = RESERVATION_HOLD_MINUTES * 60
+
+
+async def _read_payment_status(order_id: str):
+    async with AsyncSessionLocal() as db:
+        return await db.run_sync(payment_service.get_payment_status, order_id)
+
+
+async def _send_payment_status(websocket: WebSocket, order_id: str, payment_status):
+    await websocket.send_text(json.dumps({
+        "type": "payment_status",
+        "order_id": order_id,
+        "data": payment_status
+    }, default=str))
+
+
+@router.websocket("/ws/payments/{order_id}")
+async def payment_status_websocket(websocket: WebSocket, order_id: str):
+    """
+    Đẩy trạng thái thanh toán của một đơn thay cho polling /payment-status:
+    gửi trạng thái hiện tại ngay khi kết nối, rồi gửi kết quả cuối khi callback VNPay được xử lý và đóng kết nối.
+    """
+    await websocket.accept()
+    # Subscribe trước khi đọc DB để không lỡ kết quả được publish giữa hai bước
+    queue = payment_notifier.subscribe(order_id)
+    notify = receive = None
+    try:
+        try:
+            payment_status = await _read_payment_status(order_id)
+        except HTTPException as e:
+            await websocket.send_text(json.dumps({"type": "error", "order_id": order_id, "data": {"message": e.detail}}))
+            return
+        await _send_payment_status(websocket, order_id, payment_status)
+        if payment_status["status"] != PaymentStatusEnum.PENDING.value:
+            return
+
+        notify = asyncio.create_task(payment_notifier.wait(queue, PAYMENT_WS_TIMEOUT))
+        while True:
+            receive = asyncio.create_task(websocket.receive_text())
+            done, _ = await asyncio.wait({notify, receive}, return_when=asyncio.FIRST_COMPLETED)
+            if notify in done:
+                break
+            # Client vẫn có thể ping để giữ kết nối
+            try:
+                message = json.loads(receive.result())
+            except json.JSONDecodeError:
+                continue
+            if message.get("type") == "ping":
+                await websocket.send_text(json.dumps({"type": "pong"}))
+
+        if notify.result() is not None:
+            await _send_payment_status(websocket, order_id, await _read_payment_status(order_id))
+    except WebSocketDisconnect:
+        logger.info(f"🔌 Payment status client disconnected: order={order_id}")
+    except Exception as e:
+        logger.error(f"❌ Error in payment status WebSocket {order_id}: {e}", exc_info=True)
+    finally:
+        for task in (notify, receive):
+            if task is not None and not task.done():
+                task.cancel()
+        payment_notifier.unsubscribe(order_id, queue)
+        try:
+            await websocket.close()
+        except Exception:
+            pass
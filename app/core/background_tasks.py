@@ -5,9 +5,7 @@ File này quản lý các tác vụ chạy nền, chủ yếu để dọn dẹp
 
 import asyncio
 import logging
-from sqlalchemy.orm import Session
-
-from app.core.database import SessionLocal
+from app.core.database import AsyncSessionLocal
 from app.services.reservations_service import delete_expired_reservations
 
 logger = logging.getLogger(__name__)
@@ -24,17 +22,15 @@ class BackgroundTasks:
         """Tác vụ nền: Dọn dẹp các ghế đặt chỗ hết hạn và gửi thông báo WebSocket realtime"""
         while self.running:
             try:
-                # Tạo session database mới cho mỗi lần dọn dẹp
-                db: Session = SessionLocal()
+                # Tạo session database (async) mới cho mỗi lần dọn dẹp
                 try:
-                    # Gọi service để xóa ghế hết hạn (service sẽ tự động gửi WebSocket)
-                    deleted_count = await delete_expired_reservations(db)
+                    async with AsyncSessionLocal() as db:
+                        # Gọi service để xóa ghế hết hạn (service sẽ tự động gửi WebSocket)
+                        deleted_count = await delete_expired_reservations(db)
                     if deleted_count > 0:
                         logger.info(f"🧹 Đã dọn dẹp {deleted_count} ghế hết hạn (realtime notification sent)")
                 except Exception as e:
                     logger.error(f"❌ Lỗi khi dọn dẹp ghế hết hạn: {e}")
-                finally:
-                    db.close()  # Đảm bảo đóng connection
                 
                 # Chờ 30 giây trước lần dọn dẹp tiếp theo
                 await asyncio.sleep(30)
@@ -0,0 +1,122 @@
+"""
+Booking Codes - Sinh booking_code không trùng theo cấu trúc, không truy vấn DB cho từng mã
+- Mỗi process nhận một khối BOOKING_CODE_BLOCK_SIZE số từ sequence booking_code_seq (một nextval / khối)
+  → hai process / hai lần cấp không bao giờ có số trùng nhau
+- Số được xáo trộn bằng một song ánh trên 35 bit (không phải mã hóa: chỉ để mã liền kề không đoán được bằng +1),
+  mã hóa Crockford base32 (7 ký tự, không có I/L/O/U) và thêm một ký tự kiểm tra Luhn mod 32
+  → gõ sai một ký tự tại quầy luôn bị phát hiện trước khi truy vấn; đảo hai ký tự liền kề bị phát hiện
+  trừ cặp 0 ↔ Z (giá trị 0 và 31, giới hạn của Luhn mod N), dưới 1% các lỗi đảo ký tự
+Định dạng: BK + 7 ký tự + 1 ký tự kiểm tra, ví dụ BK3FZ8Q1MD
+"""
+
+import os
+import threading
+from typing import Optional
+
+from sqlalchemy import select
+
+from app.core.database import engine
+from app.models.tickets import BOOKING_CODE_BLOCK_SIZE, BOOKING_CODE_MAX_VALUE, booking_code_seq
+
+BOOKING_CODE_PREFIX = "BK"
+BOOKING_CODE_LENGTH = 7
+CROCKFORD_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+# Ký tự dễ nhầm khi đọc / gõ (chuẩn Crockford)
+_CROCKFORD_ALIASES = {"I": "1", "L": "1", "O": "0"}
+_CROCKFORD_VALUES = {char: value for value, char in enumerate(CROCKFORD_ALPHABET)}
+
+_MASK = BOOKING_CODE_MAX_VALUE
+_MIX_MULTIPLIER_1 = 0x5BD1E995 | 1
+_MIX_MULTIPLIER_2 = 0x2F0B3A49 | 1
+_MIX_SHIFT = 17
+
+
+def _scramble(number: int) -> int:
+    """Song ánh trên [0, 2^35): nhân với số lẻ (mod 2^35) và xor-shift đều khả nghịch"""
+    number = (number * _MIX_MULTIPLIER_1) & _MASK
+    number ^= number >> _MIX_SHIFT
+    return (number * _MIX_MULTIPLIER_2) & _MASK
+
+
+def _check_char(payload: str) -> str:
+    """Ký tự kiểm tra Luhn mod 32 trên chuỗi base32 (không phát hiện được đảo "0Z" ↔ "Z0")"""
+    total, factor = 0, 2
+    for char in reversed(payload):
+        addend = factor * _CROCKFORD_VALUES[char]
+        total += addend // 32 + addend % 32
+        factor = 1 if factor == 2 else 2
+    return CROCKFORD_ALPHABET[(32 - total % 32) % 32]
+
+
+def encode_booking_code(number: int) -> str:
+    """Số thứ tự (từ sequence) → booking_code"""
+    if not 0 <= number <= BOOKING_CODE_MAX_VALUE:
+        raise ValueError(f"booking code number out of range: {number}")
+    value, chars = _scramble(number), []
+    for _ in range(BOOKING_CODE_LENGTH):
+        value, digit = divmod(value, 32)
+        chars.append(CROCKFORD_ALPHABET[digit])
+    payload = "".join(reversed(chars))
+    return f"{BOOKING_CODE_PREFIX}{payload}{_check_char(payload)}"
+
+
+def has_booking_code_format(code: str) -> bool:
+    """Mã theo định dạng hiện tại (mã cũ BK{yyyymmdd}XXXX dài 14 ký tự nên không trùng định dạng)"""
+    return len(code) == len(BOOKING_CODE_PREFIX) + BOOKING_CODE_LENGTH + 1 and code.startswith(BOOKING_CODE_PREFIX)
+
+
+def normalize_booking_code(code: str) -> str:
+    """Chuẩn hóa mã khách đọc / gõ: chữ hoa, bỏ khoảng trắng / gạch, I/L → 1, O → 0 (giữ nguyên mã định dạng cũ)"""
+    code = code.strip().upper().replace("-", "").replace(" ", "")
+    if not has_booking_code_format(code):
+        return code
+    body = code[len(BOOKING_CODE_PREFIX):]
+    return BOOKING_CODE_PREFIX + "".join(_CROCKFORD_ALIASES.get(char, char) for char in body)
+
+
+def is_valid_booking_code(code: str) -> bool:
+    """Mã đúng định dạng hiện tại và đúng ký tự kiểm tra"""
+    if not has_booking_code_format(code):
+        return False
+    payload, check = code[len(BOOKING_CODE_PREFIX):-1], code[-1]
+    if any(char not in _CROCKFORD_VALUES for char in payload):
+        return False
+    return _check_char(payload) == check
+
+
+class BookingCodeAllocator:
+    """Cấp số theo khối từ sequence; mỗi process (kể cả sau fork) giữ khối riêng"""
+
+    def __init__(self, block_size: int = BOOKING_CODE_BLOCK_SIZE):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._pid: Optional[int] = None
+        self.blocks_reserved = 0
+
+    def _reserve_block(self) -> None:
+        with engine.connect() as connection:
+            start = connection.execute(select(booking_code_seq.next_value())).scalar_one()
+        self._next, self._end = start, min(start + self.block_size, BOOKING_CODE_MAX_VALUE + 1)
+        self._pid = os.getpid()
+        self.blocks_reserved += 1
+
+    def next_number(self) -> int:
+        with self._lock:
+            # Khối đã cấp trước khi fork thuộc về process cha
+            if self._pid != os.getpid() or self._next >= self._end:
+                self._reserve_block()
+            number = self._next
+            self._next += 1
+            return number
+
+    def next_code(self) -> str:
+        return encode_booking_code(self.next_number())
+
+
+booking_code_allocator = BookingCodeAllocator()
+
+
+def next_booking_code() -> str:
+    return booking_code_allocator.next_code()
@@ -13,6 +13,10 @@ class Settings(BaseSettings):
     EMAIL_HOST: str = "smtp.gmail.com"
     EMAIL_PORT: int = 587
     EMAIL_SENDER_NAME: str = "CinePlus"
+    SMTP_POOL_SIZE: int = 4  # Số kết nối SMTP đã đăng nhập giữ sẵn (≥ số worker email + hủy suất chiếu)
+    SMTP_POOL_IDLE_SECONDS: float = 30.0  # Kết nối nghỉ lâu hơn được kiểm tra bằng NOOP trước khi dùng lại
+    SMTP_POOL_MAX_MESSAGES: int = 100  # Số email tối đa trên một kết nối trước khi mở kết nối mới
+    SMTP_TIMEOUT_SECONDS: float = 30.0  # Timeout socket SMTP
     CORS_ALLOW_ORIGINS: str = ""  # Comma-separated list of origins
     
     # VNPay Configuration
@@ -29,6 +33,36 @@ class Settings(BaseSettings):
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
     REDIS_PASSWORD: str = ""
+
+    # Outbox worker configuration
+    OUTBOX_EMAIL_WORKERS: int = 2  # Số worker gửi email
+    OUTBOX_QR_WORKERS: int = 2  # Số worker sinh QR
+    OUTBOX_BATCH_SIZE: int = 10  # Số event mỗi worker nhận một lần
+    OUTBOX_POLL_INTERVAL: float = 1.0  # Giây nghỉ khi hàng đợi rỗng
+    OUTBOX_LEASE_SECONDS: int = 300  # Thời gian giữ event trước khi worker khác được nhận lại (gia hạn trước từng event của lô, cần > thời gian một handler)
+    OUTBOX_CANCELLATION_WORKERS: int = 2  # Số worker hoàn tiền / email khi hủy suất chiếu
+    OUTBOX_CANCELLATION_RATE: float = 5.0  # Số event/giây tối đa của lane hủy suất chiếu (0 = không giới hạn)
+
+    # Hủy suất chiếu hàng loạt
+    SHOWTIME_CANCEL_CHUNK_SIZE: int = 50  # Số booking mỗi transaction
+
+    # QR rendering
+    QR_PROCESS_WORKERS: int = 2  # Số process render QR (0 = render trong thread hiện tại)
+    QR_CACHE_MAX_ITEMS: int = 2000  # Số ảnh QR tối đa giữ trong cache
+
+    # Đối soát thanh toán PENDING với API querydr của VNPay (cần VNPAY_API_URL)
+    RECONCILE_INTERVAL_SECONDS: int = 60  # Chu kỳ chạy đối soát
+    RECONCILE_STALE_SECONDS: int = 120  # Payment PENDING lâu hơn mức này mới được đối soát
+    RECONCILE_ABANDON_SECONDS: int = 900  # VNPay không có giao dịch sau mức này → FAILED
+    RECONCILE_BATCH_SIZE: int = 50  # Số payment mỗi lô
+    RECONCILE_CONCURRENCY: int = 5  # Số request querydr đồng thời
+    # Soát vé tại cửa (gate_validator)
+    GATE_PRELOAD_INTERVAL_SECONDS: int = 60  # Chu kỳ nạp tập vé các suất sắp chiếu
+    GATE_PRELOAD_AHEAD_MINUTES: int = 120  # Nạp trước các suất bắt đầu trong khoảng này
+    GATE_LATE_ENTRY_MINUTES: int = 90  # Vẫn soát vé sau giờ chiếu trong khoảng này
+    GATE_RELOAD_SECONDS: int = 30  # Tuổi tối đa của tập vé (vé hủy / mua ở process khác)
+    GATE_FLUSH_INTERVAL_SECONDS: float = 1.0  # Chu kỳ ghi validated_at về DB
+    GATE_FLUSH_BATCH_SIZE: int = 1000  # Số lượt soát mỗi câu UPDATE
     
     class Config:
         env_file = ".env"
@@ -1,4 +1,9 @@
+import ssl
+from typing import Any, Dict, Optional, Tuple
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
@@ -21,4 +26,73 @@ def get_db():
     finally:
         db.close()
 
+
+# Tham số chỉ libpq (psycopg2) hiểu; asyncpg nhận query string làm keyword của connect() nên phải bỏ / đổi
+_LIBPQ_ONLY_PARAMS = {
+    "channel_binding", "gssencmode", "sslcompression", "sslcrl", "sslsni", "requiressl",
+    "keepalives", "keepalives_idle", "keepalives_interval", "keepalives_count",
+}
+_SSL_PARAMS = ("sslmode", "sslrootcert", "sslcert", "sslkey")
+
+
+def _ssl_connect_arg(sslmode: Optional[str], rootcert: Optional[str], cert: Optional[str], key: Optional[str]):
+    """sslmode + file chứng chỉ của libpq → tham số ssl của asyncpg (chuỗi sslmode hoặc SSLContext)"""
+    if not (rootcert or cert):
+        return sslmode
+    if sslmode in ("disable", "allow"):
+        return sslmode
+    context = ssl.create_default_context(cafile=rootcert)
+    if sslmode != "verify-full":
+        context.check_hostname = False
+    if sslmode in (None, "prefer", "require") and not rootcert:
+        context.verify_mode = ssl.CERT_NONE
+    if cert:
+        context.load_cert_chain(cert, key)
+    return context
+
+
+def async_engine_args(database_url: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Đổi DATABASE_URL (psycopg2) sang driver asyncpg cho engine async.
+    Trả về (url, connect_args): sslmode / sslrootcert / sslcert / sslkey chuyển thành connect_args["ssl"],
+    connect_timeout thành timeout, các tham số chỉ libpq hiểu (channel_binding...) bị bỏ.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() != "postgresql":
+        return url.render_as_string(hide_password=False), {}
+    query = dict(url.query)
+    connect_args: Dict[str, Any] = {}
+    ssl_values = [query.pop(name, None) for name in _SSL_PARAMS]
+    ssl_arg = _ssl_connect_arg(*ssl_values)
+    if ssl_arg is not None:
+        connect_args["ssl"] = ssl_arg
+    if "connect_timeout" in query:
+        connect_args["timeout"] = float(query.pop("connect_timeout"))
+    if "application_name" in query:
+        connect_args["server_settings"] = {"application_name": query.pop("application_name")}
+    for name in _LIBPQ_ONLY_PARAMS:
+        query.pop(name, None)
+    url = url.set(drivername="postgresql+asyncpg", query=query)
+    return url.render_as_string(hide_password=False), connect_args
+
+
+# Engine async (asyncpg) cho các endpoint async: truy vấn không chặn event loop / WebSocket
+_async_url, _async_connect_args = async_engine_args(settings.DATABASE_URL)
+async_engine = create_async_engine(
+    _async_url,
+    connect_args=_async_connect_args,
+    pool_pre_ping=True,
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Test in test_db_connection.py
\ No newline at end of file
@@ -0,0 +1,337 @@
+"""
+Gate Validator - Soát vé tại cửa phòng chiếu với tập vé hợp lệ trong bộ nhớ
+- Nạp trước ticket_id hợp lệ / đã hủy / đã soát của các suất sắp chiếu (một truy vấn cho mọi suất)
+  → mỗi lần quét là tra set O(1), không truy vấn DB
+- Đánh dấu đã soát nguyên tử: HSETNX trên Redis (nhiều cửa / nhiều process dùng chung),
+  không có Redis thì dict trong process dưới lock → quét trùng bị phát hiện ngay, trả về giờ quét đầu
+- validated_at được ghi về Postgres theo lô (một UPDATE ... FROM unnest) bởi tác vụ nền;
+  khi tác vụ nền không chạy (script, test) thì ghi ngay sau mỗi lần quét
+- Tập vé được nạp lại sau GATE_RELOAD_SECONDS (vé hủy / mua thêm ở process khác)
+  hoặc ngay khi process này hủy vé (invalidate)
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select, text
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.redis_client import redis_client
+from app.models.showtimes import Showtimes, StatusShowtimeEnum
+from app.models.tickets import Tickets, TicketStatusEnum
+from app.services.bookings_service import mark_bookings_validated
+
+logger = logging.getLogger(__name__)
+
+# Vé không có trong tập: nạp lại suất chiếu nếu tập đã cũ hơn mức này (vé vừa mua tại quầy)
+GATE_MISS_RELOAD_SECONDS = 2.0
+GATE_SCAN_TTL_SECONDS = 24 * 3600
+
+SCAN_VALID = "valid"
+SCAN_DUPLICATE = "duplicate"
+SCAN_INVALID = "invalid"
+SCAN_NOT_FOUND = "not_found"
+
+
+@dataclass
+class GateScan:
+    ticket_id: int
+    status: str
+    validated_at: Optional[datetime] = None
+
+
+class ShowtimeGate:
+    """Vé của một suất chiếu: hợp lệ, đã hủy, đã soát (ticket_id → giờ soát)"""
+
+    __slots__ = ("showtime_id", "valid", "invalid", "scanned", "loaded_at")
+
+    def __init__(self, showtime_id: int, valid: Set[int], invalid: Set[int], scanned: Dict[int, datetime]):
+        self.showtime_id = showtime_id
+        self.valid = valid
+        self.invalid = invalid
+        self.scanned = scanned
+        self.loaded_at = time.monotonic()
+
+
+def _redis_key(showtime_id: int) -> str:
+    return f"gate:scanned:{showtime_id}"
+
+
+def _load_gates(showtime_ids: Iterable[int]) -> Dict[int, ShowtimeGate]:
+    """Một truy vấn cho toàn bộ vé của các suất chiếu (index ix_tickets_showtime_status)"""
+    showtime_ids = list(showtime_ids)
+    gates = {
+        showtime_id: ShowtimeGate(showtime_id, set(), set(), {})
+        for showtime_id in showtime_ids
+    }
+    if not showtime_ids:
+        return gates
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(Tickets.showtime_id, Tickets.ticket_id, Tickets.status, Tickets.validated_at)
+            .where(Tickets.showtime_id.in_(showtime_ids))
+        ).all()
+    finally:
+        db.close()
+    for showtime_id, ticket_id, status, validated_at in rows:
+        gate = gates[showtime_id]
+        if status == TicketStatusEnum.confirmed:
+            gate.valid.add(ticket_id)
+            if validated_at:
+                gate.scanned[ticket_id] = validated_at
+        else:
+            gate.invalid.add(ticket_id)
+    return gates
+
+
+class GateValidator:
+    """Tập vé theo suất chiếu + hàng đợi ghi validated_at theo lô"""
+
+    def __init__(self):
+        self.running = False
+        self.tasks: List[asyncio.Task] = []
+        self._gates: Dict[int, ShowtimeGate] = {}
+        self._pending: List[Tuple[int, datetime]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    # ---------- Tập vé ----------
+
+    def _install(self, gates: Dict[int, ShowtimeGate]) -> None:
+        with self._lock:
+            for showtime_id, gate in gates.items():
+                current = self._gates.get(showtime_id)
+                # Giữ các lần soát chưa ghi xuống DB
+                if current:
+                    for ticket_id, validated_at in current.scanned.items():
+                        gate.scanned.setdefault(ticket_id, validated_at)
+                self._gates[showtime_id] = gate
+
+    def _gate(self, showtime_id: int, max_age: float) -> ShowtimeGate:
+        with self._lock:
+            gate = self._gates.get(showtime_id)
+        if gate is None or time.monotonic() - gate.loaded_at > max_age:
+            self._install(_load_gates([showtime_id]))
+            with self._lock:
+                gate = self._gates[showtime_id]
+        return gate
+
+    def preload(self) -> int:
+        """Nạp tập vé của các suất đang / sắp chiếu, bỏ các suất đã qua khỏi bộ nhớ"""
+        now = datetime.now()
+        db = SessionLocal()
+        try:
+            showtime_ids = db.scalars(
+                select(Showtimes.showtime_id).where(
+                    Showtimes.show_datetime >= now - timedelta(minutes=settings.GATE_LATE_ENTRY_MINUTES),
+                    Showtimes.show_datetime <= now + timedelta(minutes=settings.GATE_PRELOAD_AHEAD_MINUTES),
+                    Showtimes.status != StatusShowtimeEnum.cancelled,
+                )
+            ).all()
+        finally:
+            db.close()
+        self._install(_load_gates(showtime_ids))
+        keep = set(showtime_ids)
+        with self._lock:
+            for showtime_id in list(self._gates):
+                if showtime_id not in keep:
+                    del self._gates[showtime_id]
+        return len(showtime_ids)
+
+    def invalidate(self, showtime_ids: Iterable[int]) -> None:
+        """Vé của suất chiếu thay đổi (hủy vé): lần quét sau nạp lại tập vé"""
+        with self._lock:
+            for showtime_id in showtime_ids:
+                gate = self._gates.get(showtime_id)
+                if gate:
+                    gate.loaded_at = float("-inf")
+
+    # ---------- Soát vé ----------
+
+    def _claim_many(self, claims: List[Tuple[int, int, datetime]]) -> List[Optional[datetime]]:
+        """
+        Đánh dấu đã soát nguyên tử (showtime_id, ticket_id, giờ quét), một pipeline Redis cho cả lô;
+        trả về giờ soát trước đó với vé đã được soát ở cửa / process khác.
+        """
+        if not claims or not redis_client:
+            return [None] * len(claims)
+        try:
+            pipe = redis_client.pipeline()
+            for showtime_id, ticket_id, scanned_at in claims:
+                key = _redis_key(showtime_id)
+                pipe.hsetnx(key, ticket_id, scanned_at.isoformat())
+                pipe.expire(key, GATE_SCAN_TTL_SECONDS)
+                pipe.hget(key, ticket_id)
+            replies = pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Redis soát vé lỗi, dùng tập trong process: {e}")
+            return [None] * len(claims)
+        return [
+            None if replies[i] else datetime.fromisoformat(replies[i + 2])
+            for i in range(0, len(replies), 3)
+        ]
+
+    def scan(self, ticket_id: int, showtime_id: Optional[int] = None) -> GateScan:
+        return self.scan_many([(ticket_id, showtime_id)])[0]
+
+    def scan_many(
+        self,
+        items: List[Tuple[int, Optional[int]]],
+        scanned_at: Optional[List[Optional[datetime]]] = None,
+    ) -> List[GateScan]:
+        """
+        Soát một lô (ticket_id, showtime_id) theo thứ tự: suất chiếu chưa có trong bộ nhớ được nạp
+        bằng một truy vấn chung, đánh dấu Redis bằng một pipeline; vé trùng trong cùng lô được báo duplicate.
+        scanned_at: giờ quét thực tế từng lượt (bộ đệm offline của cổng), mặc định là hiện tại.
+        """
+        missing_showtime = [ticket_id for ticket_id, showtime_id in items if showtime_id is None]
+        if missing_showtime:
+            db = SessionLocal()
+            try:
+                showtime_by_ticket = dict(db.execute(
+                    select(Tickets.ticket_id, Tickets.showtime_id).where(Tickets.ticket_id.in_(missing_showtime))
+                ).all())
+            finally:
+                db.close()
+            items = [(ticket_id, showtime_id or showtime_by_ticket.get(ticket_id)) for ticket_id, showtime_id in items]
+
+        with self._lock:
+            unloaded = {showtime_id for _, showtime_id in items if showtime_id and showtime_id not in self._gates}
+        if unloaded:
+            self._install(_load_gates(unloaded))
+
+        now = datetime.now()
+        results: List[GateScan] = []
+        # Lượt quét đầu trong process, chờ xác nhận trên Redis: (vị trí kết quả, gate, showtime_id, ticket_id, giờ quét)
+        claims = []
+        for position, (ticket_id, showtime_id) in enumerate(items):
+            if showtime_id is None:
+                results.append(GateScan(ticket_id, SCAN_NOT_FOUND))
+                continue
+            gate = self._gate(showtime_id, settings.GATE_RELOAD_SECONDS)
+            if ticket_id not in gate.valid and ticket_id not in gate.invalid:
+                gate = self._gate(showtime_id, GATE_MISS_RELOAD_SECONDS)
+            if ticket_id in gate.invalid:
+                results.append(GateScan(ticket_id, SCAN_INVALID))
+                continue
+            if ticket_id not in gate.valid:
+                results.append(GateScan(ticket_id, SCAN_NOT_FOUND))
+                continue
+
+            at = min(scanned_at[position] or now, now) if scanned_at else now
+            with self._lock:
+                first = gate.scanned.get(ticket_id)
+                if first is None:
+                    gate.scanned[ticket_id] = at
+            if first is None:
+                claims.append((position, gate, showtime_id, ticket_id, at))
+                results.append(GateScan(ticket_id, SCAN_VALID, at))
+            else:
+                results.append(GateScan(ticket_id, SCAN_DUPLICATE, first))
+
+        claimed = self._claim_many([(showtime_id, ticket_id, at) for _, _, showtime_id, ticket_id, at in claims])
+        with self._lock:
+            for (position, gate, _, ticket_id, at), first in zip(claims, claimed):
+                if first is None:
+                    self._pending.append((ticket_id, at))
+                else:
+                    # Đã soát ở cửa / process khác
+                    gate.scanned[ticket_id] = first
+                    results[position] = GateScan(ticket_id, SCAN_DUPLICATE, first)
+
+        if not self.running:
+            self.flush()
+        return results
+
+    # ---------- Ghi về Postgres ----------
+
+    def flush(self) -> int:
+        """Ghi các lần soát đang chờ bằng một UPDATE mỗi lô; lỗi thì trả lại hàng đợi để thử lại"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self._pending[:settings.GATE_FLUSH_BATCH_SIZE]
+                    del self._pending[:len(batch)]
+                if not batch:
+                    return written
+                db = SessionLocal()
+                try:
+                    booking_codes = db.scalars(
+                        text("""
+                            UPDATE tickets SET validated_at = v.validated_at
+                            FROM unnest(CAST(:ticket_ids AS integer[]), CAST(:validated_ats AS timestamp[]))
+                                 AS v(ticket_id, validated_at)
+                            WHERE tickets.ticket_id = v.ticket_id AND tickets.validated_at IS NULL
+                            RETURNING tickets.booking_code
+                        """),
+                        {
+                            "ticket_ids": [ticket_id for ticket_id, _ in batch],
+                            "validated_ats": [validated_at for _, validated_at in batch],
+                        },
+                    ).all()
+                    mark_bookings_validated(db, booking_codes, min(validated_at for _, validated_at in batch))
+                    db.commit()
+                    written += len(batch)
+                except Exception as e:
+                    db.rollback()
+                    with self._lock:
+                        self._pending[:0] = batch
+                    logger.error(f"❌ Ghi {len(batch)} lượt soát vé thất bại: {e}")
+                    return written
+                finally:
+                    db.close()
+
+    # ---------- Tác vụ nền ----------
+
+    async def _preload_loop(self):
+        while self.running:
+            try:
+                loaded = await asyncio.to_thread(self.preload)
+                logger.debug(f"🎫 Nạp tập vé cho {loaded} suất chiếu")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Lỗi nạp tập vé soát cửa: {e}")
+            await asyncio.sleep(settings.GATE_PRELOAD_INTERVAL_SECONDS)
+
+    async def _flush_loop(self):
+        while self.running:
+            await asyncio.sleep(settings.GATE_FLUSH_INTERVAL_SECONDS)
+            if self._pending:
+                try:
+                    await asyncio.to_thread(self.flush)
+                except Exception as e:
+                    logger.error(f"❌ Lỗi ghi lượt soát vé: {e}")
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.tasks = [asyncio.create_task(self._preload_loop()), asyncio.create_task(self._flush_loop())]
+        logger.info(f"🚀 Soát vé đã khởi động (ghi DB mỗi {settings.GATE_FLUSH_INTERVAL_SECONDS}s)")
+
+    async def stop(self):
+        if self.running:
+            self.running = False
+            for task in self.tasks:
+                task.cancel()
+            for task in self.tasks:
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+            self.tasks = []
+            await asyncio.to_thread(self.flush)
+            logger.info("🛑 Soát vé đã dừng")
+
+
+# Instance toàn cục
+gate_validator = GateValidator()
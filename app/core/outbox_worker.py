@@ -0,0 +1,153 @@
+"""
+Outbox Worker Pool - Pool worker bất đồng bộ xử lý bảng outbox_events
+Mỗi lane (email, qr, ...) có số worker riêng để scale độc lập;
+lane có cấu hình tốc độ (event/giây) được giới hạn chung cho mọi worker của lane.
+Handler đồng bộ (SMTP, Pillow) được chạy trong thread để không chặn event loop.
+Lô event xử lý tuần tự (throttle, SMTP chậm): trước từng event, lease của phần còn lại của lô được gia hạn
+→ OUTBOX_LEASE_SECONDS chỉ cần lớn hơn thời gian một handler, không phụ thuộc OUTBOX_BATCH_SIZE.
+"""
+
+import asyncio
+import logging
+import traceback
+from typing import Dict, List
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services import outbox_handlers  # noqa: F401 - đăng ký handler
+from app.services.outbox_service import claim_events, get_handler, get_lanes, mark_done, mark_failed, renew_leases
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxWorkerPool:
+    """Quản lý các worker xử lý outbox theo lane"""
+
+    def __init__(self):
+        self.running = False
+        self.tasks: List[asyncio.Task] = []
+        # Thời điểm (loop.time()) event kế tiếp của lane được phép chạy
+        self._next_slot: Dict[str, float] = {}
+
+    def _lane_concurrency(self) -> Dict[str, int]:
+        """Số worker cho từng lane, cấu hình qua settings"""
+        return {
+            "email": settings.OUTBOX_EMAIL_WORKERS,
+            "qr": settings.OUTBOX_QR_WORKERS,
+            "cancellation": settings.OUTBOX_CANCELLATION_WORKERS,
+        }
+
+    def _lane_rate(self) -> Dict[str, float]:
+        """Số event/giây tối đa của từng lane (không có = không giới hạn)"""
+        return {
+            "cancellation": settings.OUTBOX_CANCELLATION_RATE,
+        }
+
+    async def _throttle(self, lane: str) -> None:
+        """Giãn đều event của lane theo tốc độ cấu hình (chia slot giữa các worker cùng lane)"""
+        rate = self._lane_rate().get(lane)
+        if not rate:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next_slot.get(lane, now))
+        self._next_slot[lane] = slot + 1 / rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    @staticmethod
+    def _process_event(event: Dict) -> None:
+        """Chạy handler và ghi nhận kết quả (chạy trong thread)"""
+        db = SessionLocal()
+        try:
+            handler = get_handler(event["event_type"])
+            if handler is None:
+                mark_failed(db, event["event_id"], f"No handler for {event['event_type']}")
+                return
+            try:
+                handler(event["payload"])
+            except Exception as e:
+                logger.warning(f"⚠️ Outbox event {event['event_id']} ({event['event_type']}) lỗi: {e}")
+                mark_failed(db, event["event_id"], f"{e}\n{traceback.format_exc()}")
+                return
+            mark_done(db, event["event_id"])
+        finally:
+            db.close()
+
+    @staticmethod
+    def _claim(event_types: List[str]) -> List[Dict]:
+        db = SessionLocal()
+        try:
+            return claim_events(
+                db,
+                event_types,
+                batch_size=settings.OUTBOX_BATCH_SIZE,
+                lease_seconds=settings.OUTBOX_LEASE_SECONDS,
+            )
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _renew(events: List[Dict]) -> List[Dict]:
+        db = SessionLocal()
+        try:
+            return renew_leases(db, events, settings.OUTBOX_LEASE_SECONDS)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def worker(self, lane: str, event_types: List[str], worker_id: int):
+        """Vòng lặp của một worker: nhận lô event, xử lý từng event, nghỉ khi hàng đợi rỗng"""
+        while self.running:
+            try:
+                events = await asyncio.to_thread(self._claim, event_types)
+                if not events:
+                    await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL)
+                    continue
+                while events:
+                    await self._throttle(lane)
+                    # Gia hạn phần còn lại của lô ngay trước event kế tiếp; event bị nhận lại thì bỏ qua
+                    events = await asyncio.to_thread(self._renew, events)
+                    if events:
+                        await asyncio.to_thread(self._process_event, events.pop(0))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Lỗi worker outbox {lane}#{worker_id}: {e}")
+                await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL * 5)
+
+    def start(self):
+        """Khởi động pool worker cho tất cả lane đã đăng ký"""
+        if self.running:
+            return
+        self.running = True
+        concurrency = self._lane_concurrency()
+        for lane, event_types in get_lanes().items():
+            count = concurrency.get(lane, 1)
+            for worker_id in range(count):
+                self.tasks.append(asyncio.create_task(self.worker(lane, event_types, worker_id)))
+            logger.info(f"🚀 Outbox lane '{lane}' khởi động {count} worker ({', '.join(event_types)})")
+
+    async def stop(self):
+        """Dừng toàn bộ worker"""
+        if not self.running:
+            return
+        self.running = False
+        for task in self.tasks:
+            task.cancel()
+        for task in self.tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.tasks = []
+        logger.info("🛑 Outbox worker pool đã dừng")
+
+
+# Instance toàn cục
+outbox_worker_pool = OutboxWorkerPool()
@@ -0,0 +1,114 @@
+"""
+Payment Notifier - Kênh thông báo trạng thái thanh toán theo order_id
+- update_payment_status publish kết quả cuối sau khi commit (gọi được từ thread bất kỳ)
+- WebSocket /ws/payments/{order_id} và long-poll /payment-status/{order_id}?wait= subscribe theo order_id
+- Có Redis: publish qua kênh payment:status:{order_id} để mọi worker uvicorn đều nhận được
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional, Set
+
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+from app.core.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "payment:status:"
+
+
+class PaymentNotifier:
+    """Quản lý subscriber (asyncio.Queue) theo order_id trên event loop của ứng dụng"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def subscribe(self, order_id: str) -> asyncio.Queue:
+        """Đăng ký nhận kết quả của một đơn (gọi trên event loop)"""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers.setdefault(order_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, order_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(order_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[order_id]
+
+    def _dispatch(self, order_id: str, message: Dict[str, Any]) -> None:
+        for queue in list(self._subscribers.get(order_id, ())):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    def publish(self, order_id: str, result: Dict[str, Any]) -> None:
+        """
+        Publish kết quả cuối của một đơn. Thread-safe: được gọi từ run_sync, thread pool hoặc worker.
+        Không bao giờ raise - thông báo lỗi không được làm hỏng luồng thanh toán.
+        """
+        message = {"type": "payment_status", "order_id": order_id, "result": result}
+        try:
+            if redis_client and self._listener is not None and not self._listener.done():
+                redis_client.publish(f"{CHANNEL_PREFIX}{order_id}", json.dumps(message, default=str))
+                return
+            if self._loop is not None and not self._loop.is_closed() and order_id in self._subscribers:
+                self._loop.call_soon_threadsafe(self._dispatch, order_id, message)
+        except Exception as e:
+            logger.warning(f"⚠️ Không publish được trạng thái thanh toán {order_id}: {e}")
+
+    async def wait(self, queue: asyncio.Queue, timeout: float) -> Optional[Dict[str, Any]]:
+        """Chờ thông báo trên queue đã subscribe; None nếu hết thời gian"""
+        try:
+            return await asyncio.wait_for(queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def _listen_redis(self):
+        """Nhận publish từ mọi worker qua Redis và phân phối cho subscriber trong process này"""
+        client = aioredis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            password=settings.REDIS_PASSWORD or None,
+            decode_responses=True,
+        )
+        pubsub = client.pubsub()
+        try:
+            await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+            async for item in pubsub.listen():
+                if item.get("type") != "pmessage":
+                    continue
+                order_id = item["channel"][len(CHANNEL_PREFIX):]
+                if order_id in self._subscribers:
+                    self._dispatch(order_id, json.loads(item["data"]))
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+    def start(self):
+        """Gắn notifier với event loop của ứng dụng (và Redis listener nếu có Redis)"""
+        self._loop = asyncio.get_running_loop()
+        if redis_client and self._listener is None:
+            self._listener = asyncio.create_task(self._listen_redis())
+            logger.info("🚀 Payment notifier: Redis pub/sub")
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener = None
+
+
+# Instance toàn cục
+payment_notifier = PaymentNotifier()
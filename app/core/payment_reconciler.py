@@ -0,0 +1,54 @@
+"""
+Payment Reconciler - Tác vụ nền đối soát định kỳ các payment VNPay PENDING (mất IPN)
+"""
+
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.services.payment_reconciliation_service import reconcile_pending_payments
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentReconciler:
+    """Chạy reconcile_pending_payments theo chu kỳ RECONCILE_INTERVAL_SECONDS"""
+
+    def __init__(self):
+        self.running = False
+        self.task = None
+
+    async def run(self):
+        while self.running:
+            try:
+                stats = await reconcile_pending_payments()
+                if stats.get("checked"):
+                    logger.info(f"🔁 Đối soát thanh toán: {dict(stats)}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Lỗi đối soát thanh toán: {e}")
+            await asyncio.sleep(settings.RECONCILE_INTERVAL_SECONDS)
+
+    def start(self):
+        """Khởi động vòng lặp đối soát (chỉ khi đã cấu hình VNPAY_API_URL)"""
+        if self.running or not settings.VNPAY_API_URL:
+            return
+        self.running = True
+        self.task = asyncio.create_task(self.run())
+        logger.info(f"🚀 Đối soát thanh toán đã khởi động ({settings.RECONCILE_INTERVAL_SECONDS}s interval)")
+
+    async def stop(self):
+        if self.running:
+            self.running = False
+            if self.task:
+                self.task.cancel()
+                try:
+                    await self.task
+                except asyncio.CancelledError:
+                    pass
+            logger.info("🛑 Đối soát thanh toán đã dừng")
+
+
+# Instance toàn cục
+payment_reconciler = PaymentReconciler()
@@ -14,6 +14,28 @@ def get_current_active_user(current_user = Depends(get_current_user)):
             status_code=status.HTTP_403_FORBIDDEN, detail="Tài khoản chưa được xác minh"
         )
     return current_user
+
+
+def get_current_admin_user(current_user = Depends(get_current_active_user)):
+    """Chỉ cho phép tài khoản có role admin (thao tác quản trị: hủy suất chiếu...)"""
+    if not any((role.role_name or '').lower() == 'admin' for role in getattr(current_user, 'roles', [])):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
+
+
+# Role được thao tác tại quầy (tra cứu booking, bán vé) – xem app/core/init_data.py
+STAFF_ROLES = {'admin', 'super_admin', 'theater_admin', 'theater_manager', 'booking_staff'}
+
+
+def is_staff_user(user) -> bool:
+    return any((role.role_name or '').lower() in STAFF_ROLES for role in getattr(user, 'roles', []))
+
+
+def get_current_staff_user(current_user = Depends(get_current_active_user)):
+    """Chỉ cho phép nhân viên quầy / quản lý rạp / admin (dữ liệu khách hàng: SĐT, email, QR vé)"""
+    if not is_staff_user(current_user):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Staff privileges required")
+    return current_user
 # Cấu hình hashing mật khẩu
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
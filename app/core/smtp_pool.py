@@ -0,0 +1,171 @@
+"""
+SMTP Pool - Giữ sẵn một nhóm nhỏ kết nối SMTP đã STARTTLS + đăng nhập để gửi nhiều email
+- Mỗi email chỉ còn MAIL FROM / RCPT TO / DATA trên kết nối có sẵn, thay vì TCP + EHLO + STARTTLS + AUTH + QUIT
+- Kết nối nghỉ lâu được kiểm tra bằng NOOP trước khi dùng; server đóng kết nối giữa chừng → mở lại và gửi lại một lần
+- Kết nối được thay mới sau SMTP_POOL_MAX_MESSAGES email (Gmail giới hạn số thư / kết nối)
+Gọi từ thread (worker outbox chạy handler qua asyncio.to_thread), an toàn khi nhiều thread dùng chung.
+"""
+
+import logging
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from email.message import Message
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class _PooledConnection:
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+
+class SMTPConnectionPool:
+    """Pool kết nối SMTP đã xác thực tới một server / tài khoản"""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        size: Optional[int] = None,
+        idle_seconds: Optional[float] = None,
+        max_messages: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = size or settings.SMTP_POOL_SIZE
+        self.idle_seconds = idle_seconds if idle_seconds is not None else settings.SMTP_POOL_IDLE_SECONDS
+        self.max_messages = max_messages or settings.SMTP_POOL_MAX_MESSAGES
+        self.timeout = timeout or settings.SMTP_TIMEOUT_SECONDS
+        # Kết nối rảnh; slot giới hạn tổng số kết nối đang mở (rảnh + đang gửi)
+        self._idle: "queue.LifoQueue[_PooledConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self.connections_opened = 0
+
+    def _connect(self) -> _PooledConnection:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if smtp.has_extn("starttls"):
+                smtp.starttls(context=ssl.create_default_context())
+                smtp.ehlo()
+            if self.username and smtp.has_extn("auth"):
+                smtp.login(self.username, self.password or "")
+        except Exception:
+            self._discard(_PooledConnection(smtp))
+            raise
+        self.connections_opened += 1
+        logger.info(f"📮 Mở kết nối SMTP {self.host}:{self.port} (tổng {self.connections_opened})")
+        return _PooledConnection(smtp)
+
+    @staticmethod
+    def _discard(connection: _PooledConnection) -> None:
+        try:
+            connection.smtp.quit()
+        except Exception:
+            try:
+                connection.smtp.close()
+            except Exception:
+                pass
+
+    def _is_alive(self, connection: _PooledConnection) -> bool:
+        if time.monotonic() - connection.last_used < self.idle_seconds:
+            return True
+        try:
+            return connection.smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _acquire(self) -> _PooledConnection:
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if connection.sent < self.max_messages and self._is_alive(connection):
+                    return connection
+                self._discard(connection)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, connection: Optional[_PooledConnection]) -> None:
+        if connection is not None:
+            connection.last_used = time.monotonic()
+            self._idle.put(connection)
+        self._slots.release()
+
+    def send(self, message: Message, from_addr: str, to_addrs: List[str]) -> None:
+        """Gửi một email; kết nối hỏng được mở lại và gửi lại đúng một lần. Lỗi SMTP khác được raise cho người gọi"""
+        payload = message.as_bytes() if hasattr(message, "as_bytes") else message.as_string()
+        for attempt in (1, 2):
+            connection = self._acquire()
+            try:
+                connection.smtp.sendmail(from_addr, to_addrs, payload)
+            except smtplib.SMTPException as e:
+                # SMTPException là lớp con của OSError: phải xét trước nhánh lỗi socket bên dưới
+                if not isinstance(e, smtplib.SMTPServerDisconnected):
+                    # Lỗi theo từng thư (người nhận bị từ chối...): kết nối vẫn dùng được sau RSET
+                    try:
+                        connection.smtp.rset()
+                    except Exception:
+                        self._discard(connection)
+                        connection = None
+                    self._release(connection)
+                    raise
+                error = e
+            except OSError as e:
+                # ConnectionError, socket.timeout, lỗi SSL...: kết nối đã hỏng
+                error = e
+            else:
+                connection.sent += 1
+                self._release(connection)
+                return
+            self._discard(connection)
+            self._release(None)
+            if attempt == 2:
+                raise error
+            logger.warning(f"⚠️ Kết nối SMTP {self.host} bị đóng ({error}), mở lại và gửi lại")
+
+    def close(self) -> None:
+        """Đóng mọi kết nối đang rảnh (khi tắt ứng dụng)"""
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+_pools: Dict[Tuple[str, int, Optional[str]], SMTPConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_smtp_pool(host: str, port: int, username: Optional[str] = None, password: Optional[str] = None) -> SMTPConnectionPool:
+    """Pool dùng chung cho mỗi (server, cổng, tài khoản)"""
+    key = (host, int(port), username)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = SMTPConnectionPool(host, int(port), username, password)
+        return pool
+
+
+def close_smtp_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -171,6 +171,21 @@ class WebSocketManager:
         logger.info(f"🔄 Broadcasting seat_released: showtime={showtime_id}, seats={seat_ids}")
         await self.broadcast_to_showtime(message, showtime_id, exclude_websocket)
 
+    async def send_showtime_cancelled(self, showtime_id: int, reason: str):
+        """Thông báo suất chiếu đã bị hủy (client đóng sơ đồ ghế / hủy thanh toán đang dở)"""
+        from datetime import datetime
+
+        message = {
+            "type": "showtime_cancelled",
+            "showtime_id": showtime_id,
+            "data": {
+                "reason": reason,
+                "timestamp": datetime.now().isoformat()
+            }
+        }
+        logger.info(f"🛑 Broadcasting showtime_cancelled: showtime={showtime_id}")
+        await self.broadcast_to_showtime(message, showtime_id)
+
     def get_connection_count(self, showtime_id: int) -> int:
         """Lấy số lượng kết nối đang hoạt động cho một suất chiếu"""
         return len(self.active_connections.get(showtime_id, set()))
@@ -3,10 +3,18 @@ from fastapi.responses import JSONResponse, RedirectResponse
 import uvicorn
 from app.core.middleware import setup_middleware
 from app.utils.response import error_response
-from app.api.v1 import auth, movies, reservations, roles, rooms, seat_layouts, showtimes, theaters, tickets, users, promotions, combos, ranks, payments, websocket, bookings, dashboard
+from app.api.v1 import auth, movies, reservations, roles, rooms, seat_layouts, showtimes, theaters, tickets, users, promotions, combos, ranks, payments, websocket, bookings, dashboard, exports
 # from app.core.database import Base, engine
 from app.core.background_tasks import background_tasks
-from app.core.database import SessionLocal
+from app.core.outbox_worker import outbox_worker_pool
+from app.core.payment_reconciler import payment_reconciler
+from app.core.payment_notifier import payment_notifier
+from app.core.gate_validator import gate_validator
+from app.core.smtp_pool import close_smtp_pools
+from app.services.email_templates import precompile_email_templates
+from app.services.pricing_service import price_table_invalidator
+from app.services.qr_service import shutdown_qr_pool
+from app.core.database import SessionLocal, async_engine
 from app.core.init_data import initialize_default_data
 from fastapi.middleware.cors import CORSMiddleware
 import logging
@@ -27,14 +35,30 @@ async def startup_event():
         logger.error(f"Lỗi khởi tạo dữ liệu: {e}")
     finally:
         db.close()
-    
+
+    # Inline CSS template email một lần, trước khi worker outbox gửi email đầu tiên
+    precompile_email_templates()
+
     # Start background tasks
     background_tasks.start()
+    outbox_worker_pool.start()
+    payment_reconciler.start()
+    payment_notifier.start()
+    price_table_invalidator.start()
+    gate_validator.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Stop background tasks when the application shuts down"""
     await background_tasks.stop()
+    await outbox_worker_pool.stop()
+    await payment_reconciler.stop()
+    await payment_notifier.stop()
+    await price_table_invalidator.stop()
+    await gate_validator.stop()
+    shutdown_qr_pool()
+    close_smtp_pools()
+    await async_engine.dispose()
 # Tạo bảng cơ sở dữ liệu
 # Base.metadata.create_all(bind=engine)
 
@@ -49,6 +73,7 @@ app.include_router(showtimes.router,  prefix="/api/v1",tags=["Showtimes"])
 app.include_router(reservations.router,  prefix="/api/v1",tags=["Reservations"])
 app.include_router(tickets.router,  prefix="/api/v1",tags=["Tickets"])
 app.include_router(bookings.router, prefix="/api/v1", tags=["Bookings"])
+app.include_router(exports.router, prefix="/api/v1", tags=["Exports"])
 app.include_router(combos.router, prefix="/api/v1", tags=["Combos"])
 app.include_router(ranks.router, prefix="/api/v1", tags=["Ranks"])
 app.include_router(roles.router, prefix="/api/v1", tags=["Roles"])
@@ -0,0 +1,64 @@
+import enum
+from sqlalchemy import DDL, JSON, Column, DateTime, Enum, ForeignKey, Index, Integer, Numeric, String, event, func
+from app.core.database import Base
+
+
+class BookingStatusEnum(enum.Enum):
+    confirmed = "confirmed"                      # mọi vé còn hiệu lực
+    partially_cancelled = "partially_cancelled"  # khách hủy một số vé của đơn
+    cancelled = "cancelled"                      # toàn bộ vé đã hủy (khách hủy / hủy suất chiếu)
+
+
+class Bookings(Base):
+    """
+    Read model một dòng / đơn đặt vé (booking_code), phi chuẩn hóa từ tickets + suất chiếu + khách.
+    Được ghi trong cùng transaction với thao tác trên tickets (xuất vé, hủy vé, soát vé)
+    → các màn hình đơn hàng đọc một dòng / một lần quét index thay vì gom tickets mỗi request.
+    """
+    __tablename__ = "bookings"
+
+    booking_id = Column(Integer, primary_key=True, index=True)
+    booking_code = Column(String(32), nullable=False, unique=True)  # Tra cứu tại quầy
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=True)
+    transaction_id = Column(Integer, ForeignKey("transactions.transaction_id"), nullable=True)
+    showtime_id = Column(Integer, ForeignKey("showtimes.showtime_id"), nullable=False)
+    theater_id = Column(Integer, nullable=True)
+    # Thông tin hiển thị (không đổi sau khi xuất vé)
+    movie_title = Column(String(255), nullable=True)
+    poster_url = Column(String(255), nullable=True)
+    show_datetime = Column(DateTime, nullable=True)
+    room_name = Column(String(100), nullable=True)
+    theater_name = Column(String(255), nullable=True)
+    theater_city = Column(String(100), nullable=True)
+    customer_name = Column(String(255), nullable=True)
+    customer_email = Column(String(255), nullable=True)
+    customer_phone = Column(String(20), nullable=True)
+    # [{ticket_id, seat, type, price, status}] sắp theo mã ghế
+    tickets = Column(JSON, nullable=False)
+    seats = Column(String(1000), nullable=False, server_default="")  # "A1, A2"
+    ticket_count = Column(Integer, nullable=False, default=0, server_default="0")
+    cancelled_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_amount = Column(Numeric(15, 2, asdecimal=False), nullable=False, default=0, server_default="0")
+    status = Column(Enum(BookingStatusEnum, name="booking_status"), nullable=False, default=BookingStatusEnum.confirmed, server_default="confirmed")
+    booked_at = Column(DateTime, nullable=False, server_default=func.now())
+    validated_at = Column(DateTime, nullable=True)  # Lần soát vé đầu tiên của đơn
+    cancelled_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        # Danh sách booking mới nhất trước, keyset (booked_at, booking_code)
+        Index("ix_bookings_booked_at_code", "booked_at", "booking_code"),
+        # Lịch sử đặt vé của khách, sắp theo giờ chiếu
+        Index("ix_bookings_user_show_datetime", "user_id", "show_datetime"),
+        # Booking của một suất chiếu
+        Index("ix_bookings_showtime", "showtime_id"),
+        # Tra cứu tại quầy theo một phần mã / SĐT / email / tên (ILIKE '%...%' dùng GIN trigram)
+        *[
+            Index(f"ix_bookings_{column}_trgm", column, postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"})
+            for column in ("booking_code", "customer_phone", "customer_email", "customer_name")
+        ],
+    )
+
+
+# gin_trgm_ops cần extension pg_trgm
+event.listen(Bookings.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
@@ -0,0 +1,33 @@
+import enum
+from sqlalchemy import JSON, Column, DateTime, Enum, Index, Integer, String, Text, func
+from app.core.database import Base
+
+
+class OutboxStatusEnum(enum.Enum):
+    pending = "pending"        # chờ worker xử lý
+    processing = "processing"  # đã được một worker nhận (có lease)
+    done = "done"              # xử lý thành công
+    dead = "dead"              # vượt quá số lần thử -> dead-letter
+
+
+class OutboxEvents(Base):
+    """Bảng outbox: tác vụ phụ (email, QR...) được ghi cùng transaction với nghiệp vụ chính"""
+    __tablename__ = "outbox_events"
+
+    event_id = Column(Integer, primary_key=True, index=True)
+    event_type = Column(String(100), nullable=False)  # VD: booking.email, ticket.qr
+    aggregate_id = Column(String(100), nullable=True, index=True)  # order_id / booking_code để tra cứu
+    payload = Column(JSON, nullable=False)
+    status = Column(Enum(OutboxStatusEnum, name="outbox_status"), nullable=False, default=OutboxStatusEnum.pending, server_default="pending")
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    max_attempts = Column(Integer, nullable=False, default=8, server_default="8")
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # Lease: worker chết thì event được nhận lại
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Worker luôn quét theo (event_type, status, next_attempt_at)
+        Index("ix_outbox_events_due", "event_type", "status", "next_attempt_at"),
+    )
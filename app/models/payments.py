@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Float, ForeignKey, Integer, String, DateTime, Enum, Text
+from sqlalchemy import JSON, Column, Float, ForeignKey, Index, Integer, String, DateTime, Enum, Text
 from sqlalchemy.sql import func
 from app.core.database import Base
 import enum
@@ -11,6 +11,11 @@ class PaymentStatusEnum(enum.Enum):
     FAILED = "FAILED"
     CANCELLED = "CANCELLED"
 
+class CallbackStateEnum(enum.Enum):
+    pending = "pending"      # Chưa xử lý callback hợp lệ nào
+    completed = "completed"  # Đã xử lý xong (thành công hoặc ghi nhận thất bại từ cổng)
+    rejected = "rejected"    # Bị từ chối (reservation hết hạn / không tồn tại)
+
 class PaymentMethodEnum(enum.Enum):
     VNPAY = "VNPAY"
     CASH = "CASH"
@@ -25,6 +30,13 @@ class Payment(Base):
         'polymorphic_identity': 'payment',
         'polymorphic_on': 'payment_method'  # Sử dụng để phân biệt loại phương thức
     }
+    __table_args__ = (
+        # Keyset pagination lịch sử thanh toán: ORDER BY created_at DESC, payment_id DESC
+        Index("ix_payments_created_at_payment_id", "created_at", "payment_id"),
+        Index("ix_payments_user_created_at_payment_id", "user_id", "created_at", "payment_id"),
+        # Tìm theo tiền tố order_id (LIKE 'abc%') dùng được index với mọi collation
+        Index("ix_payments_order_id_prefix", "order_id", postgresql_ops={"order_id": "varchar_pattern_ops"}),
+    )
     payment_id = Column(Integer, primary_key=True, index=True)
     order_id = Column(String(100), unique=True, index=True, nullable=False)
     amount = Column(Float, nullable=False)
@@ -37,6 +49,10 @@ class Payment(Base):
     # Order information
     order_desc = Column(Text, nullable=True)
     client_ip = Column(String(45), nullable=True)
+
+    # Trạng thái xử lý callback (return/IPN) và kết quả đã trả, dùng để trả lại ngay cho callback trùng
+    callback_state = Column(Enum(CallbackStateEnum, name="payment_callback_state"), nullable=False, default=CallbackStateEnum.pending, server_default="pending")
+    callback_result = Column(JSON, nullable=True)
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -52,6 +68,10 @@ class Payment(Base):
 class VNPayPayment(Payment):
     __tablename__ = "vnpay_payments"
     __mapper_args__ = {'polymorphic_identity': PaymentMethodEnum.VNPAY}
+    __table_args__ = (
+        # Lọc theo ngày thanh toán (chuỗi yyyyMMddHHmmss so sánh theo thứ tự từ điển)
+        Index("ix_vnpay_payments_pay_date", "vnp_pay_date"),
+    )
 
     payment_id = Column(Integer, ForeignKey('payments.payment_id'), primary_key=True)
     
@@ -23,6 +23,7 @@ class StatusShowtimeEnum(enum.Enum):
     active = "active"  # là trạng thái hoạt động bình thường
     inactive = "inactive"  # là trạng thái không hoạt động
     sold_out = "sold_out"  # là trạng thái đã bán hết vé
+    cancelled = "cancelled"  # là suất chiếu đã bị hủy (vé được hoàn tiền)
 
 
 class Showtimes(Base):
@@ -1,7 +1,23 @@
 import enum
-from sqlalchemy import Column, DateTime, Enum, ForeignKey, Integer, Numeric, String, func
+from sqlalchemy import Column, DateTime, Enum, ForeignKey, Index, Integer, Numeric, Sequence, String, func
 from app.core.database import Base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
+
+# Số booking_code mỗi lần cấp khối từ sequence (xem app/core/booking_codes.py)
+BOOKING_CODE_BLOCK_SIZE = 1000
+# Không gian mã 35 bit = 7 ký tự base32
+BOOKING_CODE_MAX_VALUE = 2 ** 35 - 1
+
+# Mỗi nextval cấp một khối BOOKING_CODE_BLOCK_SIZE số liên tiếp cho một process
+booking_code_seq = Sequence(
+    "booking_code_seq",
+    start=1,
+    minvalue=1,
+    increment=BOOKING_CODE_BLOCK_SIZE,
+    maxvalue=BOOKING_CODE_MAX_VALUE,
+    metadata=Base.metadata,
+)
+
 
 class TicketStatusEnum(enum.Enum):
     pending = "pending"
@@ -13,7 +29,8 @@ class Tickets(Base):
     __tablename__ = "tickets"
 
     ticket_id = Column(Integer, primary_key=True, index=True)
-    booking_code = Column(String(32), index=True, nullable=False)  # Mã đặt vé chung cho các vé cùng đơn
+    # Mã đặt vé chung cho các vé cùng đơn (booking_codes.next_booking_code), duy nhất theo từng đơn ở bookings.booking_code
+    booking_code = Column(String(32), index=True, nullable=False)
     transaction_id = Column(Integer, ForeignKey("transactions.transaction_id"), nullable=True)
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=True)
     showtime_id = Column(Integer, ForeignKey("showtimes.showtime_id"), nullable=False)
@@ -23,12 +40,20 @@ class Tickets(Base):
     booking_time = Column(DateTime, server_default=func.now())
     status = Column(Enum(TicketStatusEnum, name="ticket_status"), default=TicketStatusEnum.pending, server_default="pending")
     cancelled_at = Column(DateTime, nullable=True)
-    qr_code = Column(String, nullable=True)  # Lưu ảnh QR code base64
-    # Thời điểm xác thực vé thành công (quét QR)
-    # validated_at = Column(DateTime, nullable=True)
+    # Ảnh QR base64 cũ: không còn ghi (QR sinh theo yêu cầu, xem ticket_qr_service), deferred để SELECT vé không kéo theo
+    qr_code = deferred(Column(String, nullable=True))
+    # Thời điểm xác thực vé thành công (quét QR), ghi theo lô bởi gate_validator
+    validated_at = Column(DateTime, nullable=True)
 
     # Quan hệ
     user = relationship("Users", back_populates="tickets")
     showtime = relationship("Showtimes", back_populates="tickets")
     seat = relationship("Seats", back_populates="tickets")
     promotions = relationship("Promotions", back_populates="tickets")
+
+    __table_args__ = (
+        # Danh sách booking mới nhất trước, keyset (booking_time, booking_code)
+        Index("ix_tickets_booking_time_code", "booking_time", "booking_code"),
+        # Vé của một suất chiếu (lọc booking theo suất chiếu, hủy suất chiếu)
+        Index("ix_tickets_showtime_status", "showtime_id", "status"),
+    )
@@ -8,6 +8,7 @@ class TransactionStatus(enum.Enum):
     pending = "pending"
     success = "success"
     failed = "failed"
+    refunded = "refunded"  # đã hủy, tiền được hoàn (hoàn tiền cổng thanh toán chạy qua outbox)
 
 
 class Transaction(Base):
@@ -28,3 +29,13 @@ class Transaction(Base):
     user = relationship("Users", back_populates="transactions", foreign_keys=[user_id])
     staff = relationship("Users", foreign_keys=[staff_user_id])
 
+
+class TransactionCombo(Base):
+    """Combo bắp nước bán kèm trong một giao dịch (bán tại quầy), giá chốt tại thời điểm bán"""
+    __tablename__ = "transaction_combos"
+
+    transaction_combo_id = Column(Integer, primary_key=True, index=True)
+    transaction_id = Column(Integer, ForeignKey("transactions.transaction_id"), nullable=False, index=True)
+    combo_id = Column(Integer, ForeignKey("combos.combo_id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    unit_price = Column(Numeric(10, 2, asdecimal=False), nullable=False)
@@ -1,3 +1,25 @@
-from .vnpay import VNPay
+from .vnpay import (
+    build_payment_url,
+    canonical_query,
+    sign,
+    sign_querydr_request,
+    sign_querydr_response,
+    sign_refund_request,
+    sign_refund_response,
+    verify_callback,
+    verify_querydr_response,
+    verify_refund_response,
+)
 
-__all__ = ["VNPay"]
\ No newline at end of file
+__all__ = [
+    "build_payment_url",
+    "canonical_query",
+    "sign",
+    "sign_querydr_request",
+    "sign_querydr_response",
+    "sign_refund_request",
+    "sign_refund_response",
+    "verify_callback",
+    "verify_querydr_response",
+    "verify_refund_response",
+]
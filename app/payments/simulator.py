@@ -0,0 +1,301 @@
+"""
+VNPay Simulator - Cổng VNPay giả lập (ASGI) để chạy end-to-end / load test thanh toán
+- Nhận đúng URL mà create_vnpay_url tạo ra, kiểm tra chữ ký và tham số bắt buộc
+- Sinh kết quả giao dịch (thành công / mã lỗi cấu hình được) và ký callback như VNPay
+- Gửi IPN server-to-server (có thể gửi trùng, làm mất, retry khi RspCode=99) và trả về return URL
+  (redirect như trình duyệt, hoặc tự gọi return URL khi deliver_return=True)
+- API querydr / refund (POST /merchant_webapi/api/transaction) trả kết quả và hoàn tiền các giao dịch đã xử lý
+
+Chạy độc lập:
+# VNPAY_SIM_IPN_URL=http://localhost:8000/api/v1/payments/vnpay/ipn python -m app.payments.simulator
+Rồi chạy backend với VNPAY_PAYMENT_URL=http://localhost:9000/paymentv2/vpcpay.html
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import random
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, RedirectResponse
+
+from app.core.config import settings
+from app.payments.vnpay import (
+    canonical_query,
+    sign,
+    sign_querydr_request,
+    sign_querydr_response,
+    sign_refund_request,
+    sign_refund_response,
+    verify_callback,
+)
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_PATH = "/paymentv2/vpcpay.html"
+QUERYDR_PATH = "/merchant_webapi/api/transaction"
+REQUIRED_PARAMS = (
+    "vnp_Version", "vnp_Command", "vnp_TmnCode", "vnp_Amount", "vnp_CurrCode",
+    "vnp_TxnRef", "vnp_OrderInfo", "vnp_CreateDate", "vnp_IpAddr", "vnp_ReturnUrl",
+)
+
+
+@dataclass
+class SimulatorConfig:
+    """Cấu hình hành vi của cổng giả lập"""
+    secret_key: str = field(default_factory=lambda: settings.VNPAY_HASH_SECRET_KEY)
+    tmn_code: str = field(default_factory=lambda: settings.VNPAY_TMN_CODE)
+    ipn_url: str = field(default_factory=lambda: settings.VNPAY_IPN_URL)
+    latency_ms: float = 0.0           # Thời gian "khách thanh toán" trước khi có kết quả
+    latency_jitter_ms: float = 0.0
+    failure_rate: float = 0.0         # Tỷ lệ giao dịch thất bại
+    failure_code: str = "24"          # 24 = khách hủy giao dịch
+    duplicate_ipn_rate: float = 0.0   # Tỷ lệ IPN bị gửi hai lần
+    ipn_loss_rate: float = 0.0        # Tỷ lệ IPN bị mất (không bao giờ tới backend)
+    send_ipn: bool = True
+    deliver_return: bool = False      # Tự gọi return URL (thay trình duyệt) và trả body về cho client
+    ipn_retries: int = 3              # Số lần gửi lại IPN khi backend trả RspCode 99
+    ipn_retry_delay_ms: float = 200.0
+
+    @classmethod
+    def from_env(cls) -> "SimulatorConfig":
+        env = os.getenv
+        return cls(
+            ipn_url=env("VNPAY_SIM_IPN_URL", settings.VNPAY_IPN_URL),
+            latency_ms=float(env("VNPAY_SIM_LATENCY_MS", "0")),
+            latency_jitter_ms=float(env("VNPAY_SIM_LATENCY_JITTER_MS", "0")),
+            failure_rate=float(env("VNPAY_SIM_FAILURE_RATE", "0")),
+            failure_code=env("VNPAY_SIM_FAILURE_CODE", "24"),
+            duplicate_ipn_rate=float(env("VNPAY_SIM_DUPLICATE_IPN_RATE", "0")),
+            ipn_loss_rate=float(env("VNPAY_SIM_IPN_LOSS_RATE", "0")),
+            send_ipn=env("VNPAY_SIM_SEND_IPN", "true").lower() == "true",
+            deliver_return=env("VNPAY_SIM_DELIVER_RETURN", "false").lower() == "true",
+        )
+
+
+class VNPaySimulator:
+    """State của cổng giả lập: số giao dịch, thống kê callback"""
+
+    def __init__(self, config: SimulatorConfig):
+        self.config = config
+        self.client: Optional[httpx.AsyncClient] = None
+        self.stats: Counter = Counter()
+        self._transaction_no = itertools.count(14000000)
+        self._ipn_tasks = set()
+        # Kết quả giao dịch theo vnp_TxnRef, phục vụ querydr
+        self.transactions: Dict[str, Dict[str, str]] = {}
+        # Số tiền (x100) đã hoàn theo vnp_TxnRef
+        self.refunds: Dict[str, int] = {}
+
+    def signed_callback(self, request_params: Dict[str, Any]) -> Dict[str, str]:
+        """Tham số callback (return/IPN) đã ký, giống VNPay gửi về merchant"""
+        failed = random.random() < self.config.failure_rate
+        response_code = self.config.failure_code if failed else "00"
+        transaction_no = str(next(self._transaction_no))
+        params = {
+            "vnp_Amount": str(request_params["vnp_Amount"]),
+            "vnp_BankCode": request_params.get("vnp_BankCode") or "NCB",
+            "vnp_BankTranNo": f"VNP{transaction_no}",
+            "vnp_CardType": "ATM",
+            "vnp_OrderInfo": request_params["vnp_OrderInfo"],
+            "vnp_PayDate": datetime.now().strftime('%Y%m%d%H%M%S'),
+            "vnp_ResponseCode": response_code,
+            "vnp_TmnCode": request_params["vnp_TmnCode"],
+            "vnp_TransactionNo": "0" if failed else transaction_no,
+            "vnp_TransactionStatus": "02" if failed else "00",
+            "vnp_TxnRef": request_params["vnp_TxnRef"],
+        }
+        params["vnp_SecureHash"] = sign(self.config.secret_key, canonical_query(params))
+        self.transactions[params["vnp_TxnRef"]] = params
+        return params
+
+    def querydr_response(self, request_body: Dict[str, Any]) -> Dict[str, Any]:
+        """Response querydr đã ký cho một vnp_TxnRef"""
+        transaction = self.transactions.get(request_body.get("vnp_TxnRef"))
+        response = {
+            "vnp_ResponseId": uuid.uuid4().hex[:32],
+            "vnp_Command": "querydr",
+            "vnp_TmnCode": request_body.get("vnp_TmnCode"),
+            "vnp_TxnRef": request_body.get("vnp_TxnRef"),
+        }
+        if transaction is None:
+            response.update({"vnp_ResponseCode": "91", "vnp_Message": "Transaction not found"})
+        else:
+            response.update({
+                "vnp_ResponseCode": "00",
+                "vnp_Message": "QueryDR Success",
+                "vnp_Amount": transaction["vnp_Amount"],
+                "vnp_BankCode": transaction["vnp_BankCode"],
+                "vnp_PayDate": transaction["vnp_PayDate"],
+                "vnp_TransactionNo": transaction["vnp_TransactionNo"],
+                "vnp_TransactionType": "01",
+                "vnp_TransactionStatus": transaction["vnp_TransactionStatus"],
+                "vnp_OrderInfo": transaction["vnp_OrderInfo"],
+                "vnp_PromotionCode": "",
+                "vnp_PromotionAmount": "",
+            })
+        return sign_querydr_response(response, self.config.secret_key)
+
+    def refund_response(self, request_body: Dict[str, Any]) -> Dict[str, Any]:
+        """Response refund đã ký: 00 = hoàn tiền thành công, 94 = đã hoàn trước đó, 95 = giao dịch gốc không thành công"""
+        txn_ref = request_body.get("vnp_TxnRef")
+        transaction = self.transactions.get(txn_ref)
+        response = {
+            "vnp_ResponseId": uuid.uuid4().hex[:32],
+            "vnp_Command": "refund",
+            "vnp_TmnCode": request_body.get("vnp_TmnCode"),
+            "vnp_TxnRef": txn_ref,
+            "vnp_Amount": request_body.get("vnp_Amount"),
+            "vnp_TransactionType": request_body.get("vnp_TransactionType"),
+            "vnp_OrderInfo": request_body.get("vnp_OrderInfo"),
+        }
+        amount = int(request_body.get("vnp_Amount") or 0)
+        if transaction is None:
+            response.update({"vnp_ResponseCode": "91", "vnp_Message": "Transaction not found"})
+        elif transaction["vnp_TransactionStatus"] != "00":
+            response.update({"vnp_ResponseCode": "95", "vnp_Message": "Transaction is not successful"})
+        elif self.refunds.get(txn_ref, 0) + amount > int(transaction["vnp_Amount"]):
+            self.stats["refund_duplicate"] += 1
+            response.update({"vnp_ResponseCode": "94", "vnp_Message": "Duplicate refund request"})
+        else:
+            self.refunds[txn_ref] = self.refunds.get(txn_ref, 0) + amount
+            self.stats["refunded"] += 1
+            response.update({
+                "vnp_ResponseCode": "00",
+                "vnp_Message": "Refund Success",
+                "vnp_BankCode": transaction["vnp_BankCode"],
+                "vnp_PayDate": datetime.now().strftime('%Y%m%d%H%M%S'),
+                "vnp_TransactionNo": transaction["vnp_TransactionNo"],
+                "vnp_TransactionStatus": "05",
+            })
+        return sign_refund_response(response, self.config.secret_key)
+
+    async def deliver_ipn(self, params: Dict[str, str]) -> None:
+        """Gửi IPN; backend trả RspCode 99 (đang xử lý / lỗi) thì gửi lại như VNPay"""
+        for attempt in range(self.config.ipn_retries + 1):
+            try:
+                response = await self.client.get(self.config.ipn_url, params=params)
+                rsp_code = response.json().get("RspCode", "??")
+            except Exception as e:
+                logger.warning(f"⚠️ IPN {params['vnp_TxnRef']} lỗi: {e}")
+                rsp_code = "error"
+            self.stats[f"ipn_rsp_{rsp_code}"] += 1
+            if rsp_code not in ("99", "error"):
+                return
+            await asyncio.sleep(self.config.ipn_retry_delay_ms / 1000 * (attempt + 1))
+        self.stats["ipn_gave_up"] += 1
+
+    def schedule_ipn(self, params: Dict[str, str]) -> None:
+        if random.random() < self.config.ipn_loss_rate:
+            self.stats["ipn_lost"] += 1
+            return
+        copies = 2 if random.random() < self.config.duplicate_ipn_rate else 1
+        self.stats["ipn_duplicates"] += copies - 1
+        for _ in range(copies):
+            task = asyncio.create_task(self.deliver_ipn(params))
+            self._ipn_tasks.add(task)
+            task.add_done_callback(self._ipn_tasks.discard)
+
+    async def drain(self) -> None:
+        """Chờ các IPN đang gửi hoàn tất"""
+        while self._ipn_tasks:
+            await asyncio.gather(*list(self._ipn_tasks), return_exceptions=True)
+
+
+def create_simulator_app(config: Optional[SimulatorConfig] = None) -> FastAPI:
+    """Tạo ASGI app của cổng giả lập"""
+    simulator = VNPaySimulator(config or SimulatorConfig())
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        simulator.client = httpx.AsyncClient(timeout=30)
+        try:
+            yield
+        finally:
+            await simulator.drain()
+            await simulator.client.aclose()
+
+    app = FastAPI(title="VNPay Simulator", lifespan=lifespan)
+    app.state.simulator = simulator
+
+    @app.get(PAYMENT_PATH)
+    async def pay(request: Request):
+        params = dict(request.query_params)
+        simulator.stats["payments"] += 1
+
+        if not verify_callback(params, simulator.config.secret_key):
+            simulator.stats["invalid_signature"] += 1
+            return JSONResponse({"RspCode": "97", "Message": "Invalid signature"}, status_code=400)
+        missing = [name for name in REQUIRED_PARAMS if not params.get(name)]
+        if missing:
+            simulator.stats["invalid_request"] += 1
+            return JSONResponse({"RspCode": "03", "Message": f"Missing {', '.join(missing)}"}, status_code=400)
+        if params["vnp_TmnCode"] != simulator.config.tmn_code:
+            simulator.stats["invalid_request"] += 1
+            return JSONResponse({"RspCode": "02", "Message": "Invalid TmnCode"}, status_code=400)
+
+        # Thời gian khách thao tác trên trang thanh toán
+        delay_ms = simulator.config.latency_ms + random.uniform(0, simulator.config.latency_jitter_ms)
+        if delay_ms > 0:
+            await asyncio.sleep(delay_ms / 1000)
+
+        callback = simulator.signed_callback(params)
+        simulator.stats["succeeded" if callback["vnp_ResponseCode"] == "00" else "failed"] += 1
+        if simulator.config.send_ipn and simulator.config.ipn_url:
+            simulator.schedule_ipn(callback)
+
+        if simulator.config.deliver_return:
+            response = await simulator.client.get(params["vnp_ReturnUrl"], params=callback)
+            simulator.stats[f"return_http_{response.status_code}"] += 1
+            try:
+                body = response.json()
+            except ValueError:
+                body = response.text
+            return JSONResponse({"return_status": response.status_code, "return_body": body, "callback": callback})
+        return RedirectResponse(f"{params['vnp_ReturnUrl']}?{urlencode(callback)}", status_code=302)
+
+    @app.post(QUERYDR_PATH)
+    async def merchant_api(request: Request):
+        body = await request.json()
+        command = body.get("vnp_Command")
+        simulator.stats[command or "unknown_command"] += 1
+        sign_request, sign_response = (
+            (sign_refund_request, sign_refund_response) if command == "refund"
+            else (sign_querydr_request, sign_querydr_response)
+        )
+        unsigned = {key: val for key, val in body.items() if key != "vnp_SecureHash"}
+        expected_hash = sign_request(unsigned, simulator.config.secret_key)["vnp_SecureHash"]
+        if str(body.get("vnp_SecureHash", "")).lower() != expected_hash:
+            return JSONResponse(sign_response(
+                {"vnp_ResponseCode": "97", "vnp_Message": "Invalid Checksum", "vnp_Command": command},
+                simulator.config.secret_key,
+            ))
+        if command not in ("querydr", "refund") or body.get("vnp_TmnCode") != simulator.config.tmn_code:
+            return JSONResponse(sign_response(
+                {"vnp_ResponseCode": "02", "vnp_Message": "Invalid request", "vnp_Command": command},
+                simulator.config.secret_key,
+            ))
+        if command == "refund":
+            return JSONResponse(simulator.refund_response(body))
+        return JSONResponse(simulator.querydr_response(body))
+
+    @app.get("/simulator/stats")
+    async def stats():
+        return dict(simulator.stats)
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(create_simulator_app(SimulatorConfig.from_env()), port=int(os.getenv("VNPAY_SIM_PORT", "9000")))
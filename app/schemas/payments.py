@@ -57,4 +57,9 @@ class PaymentResult(BaseModel):
     payment_method: PaymentMethod
     payment_status: PaymentStatus
     payment_url: Optional[str] = None
-    expires_at: Optional[datetime] = None
\ No newline at end of file
+    expires_at: Optional[datetime] = None
+    # Thông tin bổ sung từ VNPay callback
+    response_code: Optional[str] = None
+    bank_code: Optional[str] = None
+    card_type: Optional[str] = None
+    pay_date: Optional[str] = None
\ No newline at end of file
@@ -1,6 +1,12 @@
 from datetime import datetime
-from typing import Optional
-from pydantic import BaseModel
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+
+# Số lượt quét tối đa mỗi request /tickets/verify-qr/batch
+TICKET_VERIFY_BATCH_MAX = 1000
+# Số ghế / số dòng combo tối đa trong một giỏ bán tại quầy
+COUNTER_CART_MAX_SEATS = 50
+COUNTER_CART_MAX_COMBOS = 20
 
 
 class TicketsBase(BaseModel):
@@ -39,6 +45,7 @@ class TicketsResponse(TicketsBase):
 class TicketQRResponse(BaseModel):
     ticket_id: int
     qr_token: str
+    expires_at: int  # exp (epoch) của token: hết cửa sổ vào muộn của suất chiếu
 
 
 class TicketVerifyRequest(BaseModel):
@@ -49,4 +56,73 @@ class TicketVerifyResponse(BaseModel):
     ticket_id: int
     validated: bool
     validated_at: Optional[datetime] = None
-    status: str
\ No newline at end of file
+    status: str
+    duplicate: bool = False  # Vé đã được soát trước đó (validated_at = lần soát đầu)
+
+
+class TicketVerifyBatchItem(BaseModel):
+    qr_token: str
+    scanned_at: Optional[datetime] = None  # Giờ quét tại cổng (phát lại bộ đệm offline), mặc định là lúc nhận
+
+
+class TicketVerifyBatchRequest(BaseModel):
+    items: List[TicketVerifyBatchItem] = Field(..., min_length=1, max_length=TICKET_VERIFY_BATCH_MAX)
+
+
+class TicketVerifyBatchResult(BaseModel):
+    index: int  # Vị trí trong items
+    ticket_id: Optional[int] = None
+    result: str  # valid / duplicate / invalid / not_found / bad_token
+    validated_at: Optional[datetime] = None
+
+
+class TicketVerifyBatchResponse(BaseModel):
+    results: List[TicketVerifyBatchResult]
+    summary: Dict[str, int]
+
+
+
+class CounterComboItem(BaseModel):
+    combo_id: int
+    quantity: int = Field(1, ge=1, le=100)
+
+
+class CounterCheckoutRequest(BaseModel):
+    showtime_id: int
+    seat_ids: List[int] = Field(..., min_length=1, max_length=COUNTER_CART_MAX_SEATS)
+    combos: List[CounterComboItem] = Field(default_factory=list, max_length=COUNTER_CART_MAX_COMBOS)
+    user_id: Optional[int] = None  # Khách thành viên (tích điểm, email vé)
+    promotion_id: Optional[int] = None
+    payment_method: str = "cash"
+
+
+class CounterTicketItem(BaseModel):
+    ticket_id: int
+    seat_id: int
+    seat_code: str
+    seat_type: Optional[str] = None
+    price: float
+    qr_url: str
+
+
+class CounterComboLine(BaseModel):
+    combo_id: int
+    combo_name: str
+    quantity: int
+    unit_price: float
+    amount: float
+
+
+class CounterCheckoutResponse(BaseModel):
+    booking_code: str
+    transaction_id: int
+    showtime_id: int
+    user_id: Optional[int] = None
+    tickets: List[CounterTicketItem]
+    combos: List[CounterComboLine]
+    seats_amount: float
+    combos_amount: float
+    total_amount: float
+    loyalty_points: int
+    booking_time: datetime
+    qr_url: str
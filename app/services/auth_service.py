@@ -16,6 +16,8 @@ from app.models.ranks import Ranks
 from app.schemas.auth import EmailVerificationRequest, UserLogin, UserRegister
 from app.schemas.users import UserResponse
 from app.services.email_service import EmailService
+from app.services.outbox_handlers import VERIFICATION_EMAIL_EVENT
+from app.services.outbox_service import enqueue_event
 from app.services.users_service import pwd_context
 from fastapi.security import HTTPBearer, OAuth2PasswordBearer
 
@@ -35,6 +37,16 @@ email_service = EmailService(
 )
 
 
+def _enqueue_verification_email(db: Session, email: str, verification_code: str) -> None:
+    """Ghi event gửi mã xác nhận vào outbox. KHÔNG commit - người gọi commit cùng mã xác nhận."""
+    enqueue_event(
+        db,
+        VERIFICATION_EMAIL_EVENT,
+        {"to_email": email, "verification_code": verification_code},
+        aggregate_id=email,
+    )
+
+
 # oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/login")
 security_scheme = HTTPBearer()
 
@@ -121,10 +133,8 @@ def register(db: Session, user_in: UserRegister):
             is_verified=False,
         )
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
-
-        print(f"New user rank_id after commit: {new_user.rank_id}")
+        # User, mã xác nhận, role và event email commit cùng lúc: lỗi giữa chừng không để lại user dở dang
+        db.flush()
 
         # Tạo mã xác nhận và gửi email
         verification_code = email_service.generate_verification_code()
@@ -148,15 +158,10 @@ def register(db: Session, user_in: UserRegister):
         new_user_role = UserRole(user_id=new_user.user_id, role_id=default_role.role_id)
         db.add(new_user_role)
 
+        # Email xác nhận đi qua outbox (lane "email"), commit cùng mã xác nhận: request không chờ SMTP
+        _enqueue_verification_email(db, user_in.email, verification_code)
         db.commit()
 
-        # Gửi email xác nhận
-        if not email_service.send_verification_email(user_in.email, verification_code):
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Không thể gửi email xác nhận. Vui lòng thử lại sau.",
-            )
-
         return {
             "message": "Đăng ký thành công! Vui lòng kiểm tra email để xác minh tài khoản.",
             "email": user_in.email,
@@ -368,15 +373,9 @@ def resend_verification_code(db: Session, email: str):
             email=email, verification_code=verification_code, expires_at=expires_at
         )
         db.add(verification)
+        _enqueue_verification_email(db, email, verification_code)
         db.commit()
 
-        # Gửi email xác nhận
-        if not email_service.send_verification_email(email, verification_code):
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Không thể gửi email xác nhận. Vui lòng thử lại.",
-            )
-
         return {"message": "Mã xác nhận đã được gửi lại thành công."}
 
     except Exception as e:
@@ -0,0 +1,163 @@
+"""
+Bookings Service - Read model `bookings` (một dòng / booking_code)
+- refresh_bookings: gom lại tickets của các booking_code trong SQL và UPSERT vào bookings
+  (INSERT ... SELECT ... ON CONFLICT), gọi trong cùng transaction với thao tác trên tickets:
+  xuất vé, khách hủy vé, hủy suất chiếu
+- mark_bookings_validated: ghi thời điểm soát vé đầu tiên
+- backfill_bookings: dựng read model cho dữ liệu có sẵn, theo lô booking_code
+Các hàm KHÔNG commit (trừ backfill) - người gọi commit cùng thay đổi trên tickets.
+
+# python -m app.services.bookings_service   (backfill)
+"""
+
+import logging
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import String, case, cast, func, literal, select, update
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.bookings import Bookings, BookingStatusEnum
+from app.models.movies import Movies
+from app.models.rooms import Rooms
+from app.models.seats import Seats
+from app.models.showtimes import Showtimes
+from app.models.theaters import Theaters
+from app.models.tickets import Tickets, TicketStatusEnum
+from app.models.users import Users
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+
+# Cột được tính lại mỗi lần refresh (validated_at chỉ do soát vé ghi)
+_REFRESHED_COLUMNS = (
+    "user_id", "transaction_id", "showtime_id", "theater_id",
+    "movie_title", "poster_url", "show_datetime", "room_name", "theater_name", "theater_city",
+    "customer_name", "customer_email", "customer_phone",
+    "tickets", "seats", "ticket_count", "cancelled_count", "total_amount", "status",
+    "booked_at", "cancelled_at",
+)
+
+
+def _booking_rows_query(booking_codes: Iterable[str]):
+    """
+    Một dòng / booking, gom từ tickets trong SQL (json_agg vé, string_agg mã ghế).
+    Thông tin khách / suất chiếu giống nhau trong một đơn nên lấy bằng min().
+    """
+    ticket_item = func.json_build_object(
+        'ticket_id', Tickets.ticket_id,
+        'seat', Seats.seat_code,
+        'type', cast(Seats.seat_type, String),
+        'price', Tickets.price,
+        'status', cast(Tickets.status, String),
+    )
+    ticket_count = func.count(Tickets.ticket_id)
+    cancelled_count = func.count(Tickets.ticket_id).filter(Tickets.status == TicketStatusEnum.cancelled)
+    all_cancelled = cancelled_count == ticket_count
+    return (
+        select(
+            Tickets.booking_code,
+            func.min(Tickets.user_id),
+            func.min(Tickets.transaction_id),
+            func.min(Tickets.showtime_id),
+            func.min(Showtimes.theater_id),
+            func.min(Movies.title),
+            func.min(Movies.poster_url),
+            func.min(Showtimes.show_datetime),
+            func.min(Rooms.room_name),
+            func.min(Theaters.name),
+            func.min(Theaters.city),
+            func.min(Users.full_name),
+            func.min(Users.email),
+            func.min(Users.phone),
+            func.json_agg(aggregate_order_by(ticket_item, Seats.seat_code)),
+            func.coalesce(func.string_agg(Seats.seat_code, aggregate_order_by(literal(', '), Seats.seat_code)), ''),
+            ticket_count,
+            cancelled_count,
+            func.coalesce(func.sum(Tickets.price), 0),
+            cast(
+                case(
+                    (all_cancelled, BookingStatusEnum.cancelled.value),
+                    (cancelled_count > 0, BookingStatusEnum.partially_cancelled.value),
+                    else_=BookingStatusEnum.confirmed.value,
+                ),
+                Bookings.status.type,
+            ),
+            func.coalesce(func.min(Tickets.booking_time), func.now()),
+            case((all_cancelled, func.max(Tickets.cancelled_at)), else_=None),
+        )
+        .join(Seats, Seats.seat_id == Tickets.seat_id)
+        .join(Showtimes, Showtimes.showtime_id == Tickets.showtime_id)
+        .join(Movies, Movies.movie_id == Showtimes.movie_id)
+        .outerjoin(Rooms, Rooms.room_id == Showtimes.room_id)
+        .outerjoin(Theaters, Theaters.theater_id == Showtimes.theater_id)
+        .outerjoin(Users, Users.user_id == Tickets.user_id)
+        .where(Tickets.booking_code.in_(list(booking_codes)))
+        .group_by(Tickets.booking_code)
+    )
+
+
+def refresh_bookings(db: Session, booking_codes: Iterable[str]) -> int:
+    """
+    Tính lại dòng bookings cho các booking_code từ tickets hiện tại (một câu lệnh, không phụ thuộc số vé).
+    Trả về số booking được ghi.
+    """
+    booking_codes = {code for code in booking_codes if code}
+    if not booking_codes:
+        return 0
+    db.flush()
+    stmt = pg_insert(Bookings).from_select(
+        ["booking_code", *_REFRESHED_COLUMNS], _booking_rows_query(booking_codes)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Bookings.booking_code],
+        set_={**{column: stmt.excluded[column] for column in _REFRESHED_COLUMNS}, "updated_at": func.now()},
+    )
+    return db.execute(stmt.execution_options(synchronize_session=False)).rowcount
+
+
+def mark_bookings_validated(db: Session, booking_codes: Iterable[str], validated_at: Optional[datetime] = None) -> None:
+    """Ghi thời điểm soát vé đầu tiên (lần quét sau không ghi đè)"""
+    booking_codes = {code for code in booking_codes if code}
+    if not booking_codes:
+        return
+    db.execute(
+        update(Bookings)
+        .where(Bookings.booking_code.in_(booking_codes))
+        .values(validated_at=func.coalesce(Bookings.validated_at, validated_at or datetime.now()))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def backfill_bookings(db: Session, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Dựng (lại) read model cho toàn bộ tickets, mỗi lô batch_size booking_code một transaction"""
+    total = 0
+    last_code = ""
+    while True:
+        booking_codes = db.scalars(
+            select(Tickets.booking_code)
+            .where(Tickets.booking_code > last_code)
+            .group_by(Tickets.booking_code)
+            .order_by(Tickets.booking_code)
+            .limit(batch_size)
+        ).all()
+        if not booking_codes:
+            break
+        total += refresh_bookings(db, booking_codes)
+        db.commit()
+        last_code = booking_codes[-1]
+    logger.info(f"📚 Backfill bookings: {total} booking")
+    return total
+
+
+if __name__ == "__main__":
+    from app.core.database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        print(f"✅ Đã dựng {backfill_bookings(session)} booking")
+    finally:
+        session.close()
@@ -0,0 +1,264 @@
+"""
+Counter Checkout Service - Bán vé tại quầy theo giỏ (nhiều ghế + combo) trong một transaction
+Số câu lệnh SQL không phụ thuộc số ghế:
+  1 truy vấn suất chiếu, bảng giá từ cache (pricing_service), 1 truy vấn vé còn hiệu lực trên các ghế,
+  1 truy vấn combo, 1 INSERT ... ON CONFLICT giữ ghế (seat_reservations là trạng thái ghế mà sơ đồ ghế đọc),
+  1 INSERT giao dịch, pipeline xuất vé (ticket_issuance_service), 1 INSERT combo, 1 commit.
+Sau commit: vô hiệu hóa cache "Vé của tôi" / tập vé soát cửa, một broadcast WebSocket cho cả giỏ.
+"""
+
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.database import AsyncSessionLocal
+from app.core.gate_validator import gate_validator
+from app.models.combos import Combo, ComboStatusEnum
+from app.models.seat_reservations import SeatReservations
+from app.models.seats import Seats
+from app.models.showtimes import Showtimes, StatusShowtimeEnum
+from app.models.tickets import Tickets, TicketStatusEnum
+from app.models.transactions import Transaction, TransactionCombo, TransactionStatus
+from app.models.users import Users
+from app.schemas.tickets import (
+    CounterCheckoutRequest,
+    CounterCheckoutResponse,
+    CounterComboLine,
+    CounterTicketItem,
+    TicketsCreate,
+    TicketsResponse,
+)
+from app.services.pricing_service import price_cart
+from app.services.ticket_issuance_service import issue_tickets
+from app.services.ticket_qr_service import booking_qr_url, ticket_qr_expiry, ticket_qr_url
+from app.services.user_bookings_cache import invalidate_user_bookings
+
+logger = logging.getLogger(__name__)
+
+# Session của reservation do quầy tạo (client sơ đồ ghế phân biệt với khách online)
+COUNTER_SESSION_ID = "counter"
+
+
+def _price_combos(db: Session, items) -> List[CounterComboLine]:
+    """Gộp các dòng cùng combo, kiểm tra combo còn bán và lấy giá trong một truy vấn"""
+    quantities = Counter()
+    for item in items:
+        quantities[item.combo_id] += item.quantity
+    if not quantities:
+        return []
+    combos = {
+        combo.combo_id: combo
+        for combo in db.scalars(
+            select(Combo).where(Combo.combo_id.in_(quantities), Combo.status == ComboStatusEnum.active)
+        )
+    }
+    missing = [combo_id for combo_id in quantities if combo_id not in combos]
+    if missing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Combos {missing} not found or inactive")
+    return [
+        CounterComboLine(
+            combo_id=combo_id,
+            combo_name=combos[combo_id].combo_name,
+            quantity=quantity,
+            unit_price=float(combos[combo_id].price),
+            amount=float(combos[combo_id].price) * quantity,
+        )
+        for combo_id, quantity in quantities.items()
+    ]
+
+
+def _claim_seats(db: Session, cart: CounterCheckoutRequest, seat_ids: List[int]) -> List[SeatReservations]:
+    """
+    Giữ toàn bộ ghế bằng một câu INSERT: ghế trống hoặc chỉ có reservation pending đã hết hạn thì nhận,
+    ghế đang được giữ / đã bán thì bị bỏ qua → báo 409 với danh sách ghế. Unique (seat_id, showtime_id)
+    bảo đảm hai quầy / khách online không thể cùng nhận một ghế.
+    """
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            "seat_id": seat_id,
+            "showtime_id": cart.showtime_id,
+            "user_id": cart.user_id,
+            "session_id": COUNTER_SESSION_ID,
+            "expires_at": now + timedelta(minutes=1),
+            "status": "pending",
+        }
+        for seat_id in seat_ids
+    ]
+    stmt = pg_insert(SeatReservations).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SeatReservations.seat_id, SeatReservations.showtime_id],
+        set_={
+            "user_id": stmt.excluded.user_id,
+            "session_id": stmt.excluded.session_id,
+            "expires_at": stmt.excluded.expires_at,
+            "status": stmt.excluded.status,
+            "reserved_at": func.now(),
+            "payment_id": None,
+            "transaction_id": None,
+        },
+        where=and_(SeatReservations.status == "pending", SeatReservations.expires_at <= now),
+    ).returning(SeatReservations)
+    reservations = db.scalars(stmt, execution_options={"populate_existing": True}).all()
+    if len(reservations) != len(seat_ids):
+        claimed = {reservation.seat_id for reservation in reservations}
+        taken = [seat_id for seat_id in seat_ids if seat_id not in claimed]
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Seats {taken} are already reserved or sold")
+    by_seat = {reservation.seat_id: reservation for reservation in reservations}
+    return [by_seat[seat_id] for seat_id in seat_ids]
+
+
+def checkout_counter_cart(db: Session, cart: CounterCheckoutRequest, staff_user_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Bán cả giỏ trong một transaction, một commit. Trả về response và danh sách seat_id để broadcast.
+    Lỗi kiểm tra (ghế đã bán, combo ngừng bán...) rollback toàn bộ giỏ.
+    staff_user_id: nhân viên bán lấy từ phiên đăng nhập (không nhận từ body request).
+    """
+    seat_ids = list(dict.fromkeys(cart.seat_ids))
+    try:
+        showtime = db.get(Showtimes, cart.showtime_id)
+        if not showtime:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Showtime not found")
+        if showtime.status != StatusShowtimeEnum.active:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Showtime is not open for sale")
+        expires_at = ticket_qr_expiry(showtime.show_datetime)
+
+        # Giá toàn giỏ từ bảng giá cache; ghế không thuộc phòng của suất chiếu → 404
+        seat_prices = price_cart(db, cart.showtime_id, seat_ids)
+        combo_lines = _price_combos(db, cart.combos)
+
+        # Vé bán trực tiếp trước đây không có reservation: kiểm tra thêm trên tickets
+        sold = db.scalars(
+            select(Tickets.seat_id).where(
+                Tickets.showtime_id == cart.showtime_id,
+                Tickets.seat_id.in_(seat_ids),
+                Tickets.status != TicketStatusEnum.cancelled,
+            )
+        ).all()
+        if sold:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Seats {sorted(set(sold))} are already sold")
+
+        reservations = _claim_seats(db, cart, seat_ids)
+        user = db.get(Users, cart.user_id) if cart.user_id else None
+        if cart.user_id and not user:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+        seats_amount = float(sum(seat_prices.values()))
+        combos_amount = float(sum(line.amount for line in combo_lines))
+        transaction = Transaction(
+            user_id=cart.user_id,
+            staff_user_id=staff_user_id,
+            promotion_id=cart.promotion_id,
+            total_amount=seats_amount + combos_amount,
+            payment_method=cart.payment_method,
+            status=TransactionStatus.pending,
+            transaction_time=datetime.now(),
+        )
+        db.add(transaction)
+        db.flush()  # Để lấy transaction_id
+
+        issued = issue_tickets(db, transaction, reservations, user, promotion_id=cart.promotion_id)
+        if combo_lines:
+            db.execute(insert(TransactionCombo), [
+                {
+                    "transaction_id": transaction.transaction_id,
+                    "combo_id": line.combo_id,
+                    "quantity": line.quantity,
+                    "unit_price": line.unit_price,
+                }
+                for line in combo_lines
+            ])
+        seats = {
+            seat_id: (seat_code, seat_type)
+            for seat_id, seat_code, seat_type in db.execute(
+                select(Seats.seat_id, Seats.seat_code, Seats.seat_type).where(Seats.seat_id.in_(seat_ids))
+            )
+        }
+        db.commit()
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+    if cart.user_id:
+        invalidate_user_bookings([cart.user_id])
+    gate_validator.invalidate([cart.showtime_id])
+    logger.info(
+        f"🧾 Bán tại quầy {issued['booking_code']}: {len(seat_ids)} vé + {len(combo_lines)} combo, "
+        f"suất chiếu {cart.showtime_id}"
+    )
+
+    response = CounterCheckoutResponse(
+        booking_code=issued["booking_code"],
+        transaction_id=transaction.transaction_id,
+        showtime_id=cart.showtime_id,
+        user_id=cart.user_id,
+        tickets=[
+            CounterTicketItem(
+                ticket_id=ticket_id,
+                seat_id=seat_id,
+                seat_code=seats[seat_id][0],
+                seat_type=getattr(seats[seat_id][1], "value", seats[seat_id][1]),
+                price=seat_prices[seat_id],
+                qr_url=ticket_qr_url(ticket_id, cart.showtime_id, expires_at),
+            )
+            for seat_id, ticket_id in zip(seat_ids, issued["ticket_ids"])
+        ],
+        combos=combo_lines,
+        seats_amount=seats_amount,
+        combos_amount=combos_amount,
+        total_amount=seats_amount + combos_amount,
+        loyalty_points=issued["loyalty_points"],
+        booking_time=transaction.transaction_time,
+        qr_url=booking_qr_url(issued["booking_code"]),
+    )
+    return {"response": response, "seat_ids": seat_ids}
+
+
+async def counter_checkout(cart: CounterCheckoutRequest, staff_user_id: Optional[int] = None) -> CounterCheckoutResponse:
+    """Chạy checkout trên async stack, broadcast một lần cho cả giỏ sau khi commit"""
+    from app.core.websocket_manager import websocket_manager
+
+    async with AsyncSessionLocal() as db:
+        result = await db.run_sync(checkout_counter_cart, cart, staff_user_id)
+    try:
+        await websocket_manager.send_seat_reserved(
+            showtime_id=cart.showtime_id,
+            seat_ids=result["seat_ids"],
+            user_session=COUNTER_SESSION_ID,
+        )
+    except Exception as ws_error:
+        logger.warning(f"⚠️ Thông báo WebSocket bán tại quầy {cart.showtime_id} thất bại: {ws_error}")
+    return result["response"]
+
+
+async def sell_single_ticket(ticket_in: TicketsCreate) -> TicketsResponse:
+    """
+    POST /tickets/direct: giỏ một ghế, giữ nguyên định dạng response cũ.
+    user_id là khách mua vé, không phải nhân viên → staff_user_id để trống.
+    """
+    checkout = await counter_checkout(CounterCheckoutRequest(
+        showtime_id=ticket_in.showtime_id,
+        seat_ids=[ticket_in.seat_id],
+        user_id=ticket_in.user_id,
+        promotion_id=ticket_in.promotion_id,
+    ))
+    ticket = checkout.tickets[0]
+    return TicketsResponse(
+        ticket_id=ticket.ticket_id,
+        showtime_id=checkout.showtime_id,
+        seat_id=ticket.seat_id,
+        price=ticket.price,
+        booking_time=checkout.booking_time,
+        status=TicketStatusEnum.confirmed.value,
+        seat_code=ticket.seat_code,
+        seat_type=ticket.seat_type,
+    )
@@ -1,20 +1,21 @@
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
-import smtplib
+from email.message import Message
 import random
 import string
-import ssl
-import qrcode
-import json
-from io import BytesIO
-import base64
 from email.utils import formataddr
 from datetime import datetime
 
-# Cài đặt premailer nếu bạn muốn tự động inline CSS từ style tag
-# pip install premailer
-from premailer import transform
+from app.core.smtp_pool import get_smtp_pool
+from app.services.email_templates import (
+    BOOKING_CONFIRMATION_TEMPLATE,
+    SHOWTIME_CANCELLED_TEMPLATE,
+    TICKET_TEMPLATE,
+    VERIFICATION_TEMPLATE,
+    render_template,
+)
+from app.services.qr_service import render_qr
 
 class EmailService:
     def __init__(self, smtp_server: str, smtp_port: int, username: str, password: str, sender_name: str = "CinePlus"):
@@ -24,6 +25,11 @@ class EmailService:
         self.password = password
         self.sender_name = sender_name
 
+    def _deliver(self, msg: Message, to_email: str) -> None:
+        """Gửi qua kết nối SMTP dùng chung (app.core.smtp_pool) thay vì mở kết nối + STARTTLS + login mỗi email"""
+        pool = get_smtp_pool(self.smtp_server, self.smtp_port, self.username, self.password)
+        pool.send(msg, self.username, [to_email])
+
     def generate_verification_code(self, length: int = 6) -> str:
         """Tạo mã xác nhận ngẫu nhiên."""
         return ''.join(random.choices(string.digits, k=length))
@@ -37,50 +43,17 @@ class EmailService:
             msg['To'] = to_email
             msg['Subject'] = "Xác nhận đăng ký tài khoản của bạn"
 
-            # Template HTML với các class Tailwind (cần được xử lý thành inline CSS)
-            html_template = f"""\
-            <html>
-            <head>
-            </head>
-            <body style="font-family: Arial, Helvetica, sans-serif; background-color: #f3f4f6; margin: 0; padding: 0;">
-                <table width="100%" cellpadding="0" cellspacing="0" style="max-width: 600px; margin: 20px auto; background-color: #ffffff; border-radius: 8px;">
-                    <tr>
-                        <td style="background-color: #2563eb; color: #ffffff; text-align: center; padding: 20px; border-top-left-radius: 8px; border-top-right-radius: 8px;">
-                            <h2 style="font-size: 24px; font-weight: bold; margin: 0;">Xác nhận Tài khoản</h2>
-                        </td>
-                    </tr>
-                    <tr>
-                        <td style="padding: 20px;">
-                            <p style="margin: 0 0 16px;">Chào bạn,</p>
-                            <p style="margin: 0 0 16px;">Cảm ơn bạn đã đăng ký tài khoản. Mã xác nhận của bạn là:</p>
-                            <div style="width: fit-content; margin: 20px auto; padding: 16px; background-color: #e5e7eb; border-radius: 6px; font-size: 24px; font-weight: bold; text-align: center; border: 1px solid #9ca3af;">
-                                {verification_code}
-                            </div>
-                            <p style="margin: 0 0 16px; font-size: 14px; color: #4b5563;">Mã này sẽ hết hạn sau <strong>15 phút</strong>.</p>
-                            <p style="margin: 0 0 16px; font-size: 14px; color: #4b5563;">Nếu bạn không yêu cầu mã này, vui lòng bỏ qua email này.</p>
-                            <p style="margin: 32px 0 0;">Trân trọng,<br>{self.sender_name}</p>
-                        </td>
-                    </tr>
-                    <tr>
-                        <td style="text-align: center; font-size: 12px; color: #6b7280; padding: 16px; border-top: 1px solid #e5e7eb;">
-                            <p style="margin: 0 0 8px;">Đây là email tự động, vui lòng không trả lời.</p>
-                            <p style="margin: 0;">&copy; {datetime.now().year} {self.sender_name}. All rights reserved.</p>
-                        </td>
-                    </tr>
-                </table>
-            </body>
-            </html>
-            """
-            html_body_inlined = transform(html_template)
+            # Template đã inline CSS sẵn (app.services.email_templates), chỉ ghép giá trị
+            html_body_inlined = render_template(
+                VERIFICATION_TEMPLATE,
+                verification_code=verification_code,
+                sender_name=self.sender_name,
+                year=datetime.now().year,
+            )
 
             msg.attach(MIMEText(html_body_inlined, 'html', 'utf-8'))
 
-            context = ssl.create_default_context()
-
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls(context=context)
-                server.login(self.username, self.password)
-                server.sendmail(self.username, to_email, msg.as_string())
+            self._deliver(msg, to_email)
 
             return True
 
@@ -96,49 +69,18 @@ class EmailService:
             msg['To'] = to_email
             msg['Subject'] = "Xác nhận đặt vé thành công"
 
-            html_template_with_tailwind_booking = f"""\
-            <html>
-            <head>
-            </head>
-            <body class="font-sans text-gray-800 bg-gray-100 p-0 m-0">
-            <div class="max-w-xl mx-auto bg-white rounded-lg shadow-md overflow-hidden my-8">
-            <div class="bg-red-600 text-white text-center py-6 px-6 rounded-t-lg">
-            <h2 class="text-3xl font-bold tracking-tight">XÁC NHẬN ĐẶT VÉ THÀNH CÔNG</h2>
-            </div>
-            <div class="p-8">
-            <p class="mb-6 text-lg">Xin chào,</p>
-            <p class="mb-6">Cảm ơn bạn đã tin tưởng và đặt vé xem phim tại hệ thống của chúng tôi. Dưới đây là thông tin chi tiết về vé của bạn:</p>
-            <div class="bg-gray-100 rounded-md p-6 mb-6 border border-gray-200">
-            <ul class="list-none p-0">
-            <li class="mb-3"><strong class="text-red-600">Mã đặt vé:</strong> <span class="font-semibold">{booking_details.get('booking_id', 'N/A')}</span></li>
-            <li class="mb-3"><strong class="text-red-600">Họ và tên:</strong> <span class="font-semibold">{booking_details.get('customer_name', 'N/A')}</span></li>
-            <li class="mb-3"><strong class="text-red-600">Ngày chiếu:</strong> <span class="font-semibold">{booking_details.get('departure_date', 'N/A')}</span></li>
-            <li class="mb-3"><strong class="text-red-600">Phim:</strong> <span class="font-semibold">{booking_details.get('origin', 'N/A')}</span></li>
-            <li class="mb-3"><strong class="text-red-600">Rạp:</strong> <span class="font-semibold">{booking_details.get('destination', 'N/A')}</span></li>
-            <li class="mb-3"><strong class="text-red-600">Giờ chiếu:</strong> <span class="font-semibold">{booking_details.get('time', 'N/A')}</span></li>
-            <li class="mb-3"><strong class="text-red-600">Số lượng vé:</strong> <span class="font-semibold">{booking_details.get('ticket_count', 'N/A')}</span></li>
-            </ul>
-            </div>
-            <div class="text-center my-8">
-            <p class="mb-4 text-lg">Vui lòng quét mã QR này để nhận vé tại quầy:</p>
-            <div class="inline-block bg-white p-4 border border-red-300 rounded-md shadow-md">
-            <img src="qr_code_image_url" alt="Mã QR nhận vé" class="w-48 h-48">
-            </div>
-            <p class="mt-4 text-sm text-gray-600">Hoặc cung cấp mã đặt vé trên cho nhân viên.</p>
-            </div>
-            <p class="text-sm text-gray-600 mb-6">Xin vui lòng kiểm tra kỹ thông tin đặt vé. Nếu có bất kỳ sai sót hoặc thắc mắc, đừng ngần ngại liên hệ với chúng tôi.</p>
-            <p class="mt-8">Trân trọng,<br><strong class="text-red-600">{self.sender_name}</strong></p>
-            </div>
-            <div class="bg-gray-100 text-center text-xs text-gray-500 py-4 px-6 border-t border-gray-200 rounded-b-lg">
-            <p class="mb-2">Đây là email tự động, vui lòng không phản hồi trực tiếp.</p>
-            <p>&copy; {datetime.now().year} <strong class="text-red-600">{self.sender_name}</strong>. Mọi quyền được bảo lưu.</p>
-            </div>
-            </div>
-            </body>
-            </html>
-            """
-
-            html_body_inlined = transform(html_template_with_tailwind_booking)
+            html_body_inlined = render_template(
+                BOOKING_CONFIRMATION_TEMPLATE,
+                booking_id=booking_details.get('booking_id', 'N/A'),
+                customer_name=booking_details.get('customer_name', 'N/A'),
+                departure_date=booking_details.get('departure_date', 'N/A'),
+                origin=booking_details.get('origin', 'N/A'),
+                destination=booking_details.get('destination', 'N/A'),
+                time=booking_details.get('time', 'N/A'),
+                ticket_count=booking_details.get('ticket_count', 'N/A'),
+                sender_name=self.sender_name,
+                year=datetime.now().year,
+            )
 
             plain_text_body = f"""\
 Xác nhận Đặt Vé Thành Công
@@ -168,12 +110,7 @@ Trân trọng,
             msg.attach(MIMEText(plain_text_body, 'plain', 'utf-8'))
             msg.attach(MIMEText(html_body_inlined, 'html', 'utf-8'))
 
-            context = ssl.create_default_context()
-
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls(context=context)
-                server.login(self.username, self.password)
-                server.sendmail(self.username, to_email, msg.as_string())
+            self._deliver(msg, to_email)
 
             return True
 
@@ -210,18 +147,7 @@ Suất chiếu: {ticket_info.get('showtime')}
 Ghế: {seats_display}
 """
 
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_data)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
-        buf = BytesIO()
-        img.save(buf, format="PNG")
-        return buf.getvalue()
+        return render_qr(qr_data, "png")
 
     def send_ticket_email(self, to_email: str, ticket_info: dict) -> bool:
         """
@@ -277,22 +203,15 @@ Ghế: {seats_display}
             img_bytes = self.generate_ticket_qr_bytes(qr_ticket_info)
 
             # HTML email
-            html_template = f"""
-            <html>
-            <body style="font-family: Arial, sans-serif;">
-                <h2>Thông tin vé xem phim</h2>
-                <p><strong>Mã đặt vé:</strong> {ticket_info.get('booking_id', '')}</p>
-                <p><strong>Khách hàng:</strong> {ticket_info.get('customer_name', '')}</p>
-                <p><strong>Phim:</strong> {ticket_info.get('movie_name', '')}</p>
-                <p><strong>Suất chiếu:</strong> {ticket_info.get('showtime', '')}</p>
-                <p><strong>Ghế:</strong> {seats_display}</p>
-                <div style="margin:18px 0; text-align:center;">
-                    <img src="cid:ticket_qr" alt="QR toàn bộ vé" style="width:180px; height:180px;"/>
-                </div>
-            </body>
-            </html>
-            """
-            msg_alternative.attach(MIMEText(html_template, 'html', 'utf-8'))
+            html_body = render_template(
+                TICKET_TEMPLATE,
+                booking_id=ticket_info.get('booking_id', ''),
+                customer_name=ticket_info.get('customer_name', ''),
+                movie_name=ticket_info.get('movie_name', ''),
+                showtime=ticket_info.get('showtime', ''),
+                seats=seats_display,
+            )
+            msg_alternative.attach(MIMEText(html_body, 'html', 'utf-8'))
 
             # Đính kèm QR code (inline và attachment)
             mime_img = MIMEImage(img_bytes, _subtype='png')
@@ -304,14 +223,52 @@ Ghế: {seats_display}
             attachment.add_header('Content-Disposition', 'attachment', filename='ticket_qr.png')
             msg_root.attach(attachment)
 
-            context = ssl.create_default_context()
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls(context=context)
-                server.login(self.username, self.password)
-                server.sendmail(self.username, to_email, msg_root.as_string())
+            self._deliver(msg_root, to_email)
 
             return True
 
         except Exception as e:
             print(f"Lỗi khi gửi email vé: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+    def send_showtime_cancelled_email(self, to_email: str, cancel_info: dict) -> bool:
+        """Gửi email thông báo suất chiếu bị hủy và vé đã được hoàn tiền."""
+        if not to_email:
+            print("send_showtime_cancelled_email: missing to_email, skip sending")
+            return False
+
+        seats_display = ', '.join(str(seat) for seat in cancel_info.get('seats') or [])
+        refund_amount = cancel_info.get('refund_amount')
+        refund_display = f"{int(refund_amount):,}đ".replace(',', '.') if refund_amount else ''
+        try:
+            msg = MIMEMultipart('alternative')
+            msg['From'] = formataddr((self.sender_name, self.username))
+            msg['To'] = to_email
+            msg['Subject'] = f"Suất chiếu đã bị hủy - {cancel_info.get('booking_code', '')}"
+
+            plain_lines = [
+                f"Mã đặt vé: {cancel_info.get('booking_code', '')}",
+                f"Phim: {cancel_info.get('movie_title', '')}",
+                f"Suất chiếu: {cancel_info.get('showtime', '')}",
+                f"Ghế: {seats_display}",
+                f"Số tiền hoàn: {refund_display}",
+            ]
+            msg.attach(MIMEText("\n".join(plain_lines), 'plain', 'utf-8'))
+
+            html_body = render_template(
+                SHOWTIME_CANCELLED_TEMPLATE,
+                customer_name=cancel_info.get('customer_name') or 'bạn',
+                booking_code=cancel_info.get('booking_code', ''),
+                movie_title=cancel_info.get('movie_title', ''),
+                showtime=cancel_info.get('showtime', ''),
+                seats=seats_display,
+                refund_amount=refund_display,
+                sender_name=self.sender_name,
+            )
+            msg.attach(MIMEText(html_body, 'html', 'utf-8'))
+
+            self._deliver(msg, to_email)
+
+            return True
+        except Exception as e:
+            print(f"Lỗi khi gửi email hủy suất chiếu: {str(e)}")
+            return False
@@ -0,0 +1,188 @@
+"""
+Email Templates - Template HTML của email được inline CSS (premailer) một lần rồi cache
+- Trước đây mỗi email chạy premailer.transform() trên cả template: parse DOM + CSS mỗi lần gửi
+- Giờ template nguồn (placeholder ${name}) được transform một lần lúc khởi động (precompile_email_templates)
+  hoặc lần dùng đầu tiên, rồi tách sẵn thành các đoạn tĩnh + tên placeholder
+- render() chỉ ghép chuỗi; mọi giá trị được html.escape (tên khách, tên phim... không chèn được HTML)
+"""
+
+import html
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Tuple
+
+from premailer import transform
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_PATTERN = re.compile(r"\$\{(\w+)\}")
+
+VERIFICATION_TEMPLATE = "verification"
+BOOKING_CONFIRMATION_TEMPLATE = "booking_confirmation"
+TICKET_TEMPLATE = "ticket"
+SHOWTIME_CANCELLED_TEMPLATE = "showtime_cancelled"
+
+TEMPLATE_SOURCES: Dict[str, str] = {
+    VERIFICATION_TEMPLATE: """\
+<html>
+<head>
+</head>
+<body style="font-family: Arial, Helvetica, sans-serif; background-color: #f3f4f6; margin: 0; padding: 0;">
+    <table width="100%" cellpadding="0" cellspacing="0" style="max-width: 600px; margin: 20px auto; background-color: #ffffff; border-radius: 8px;">
+        <tr>
+            <td style="background-color: #2563eb; color: #ffffff; text-align: center; padding: 20px; border-top-left-radius: 8px; border-top-right-radius: 8px;">
+                <h2 style="font-size: 24px; font-weight: bold; margin: 0;">Xác nhận Tài khoản</h2>
+            </td>
+        </tr>
+        <tr>
+            <td style="padding: 20px;">
+                <p style="margin: 0 0 16px;">Chào bạn,</p>
+                <p style="margin: 0 0 16px;">Cảm ơn bạn đã đăng ký tài khoản. Mã xác nhận của bạn là:</p>
+                <div style="width: fit-content; margin: 20px auto; padding: 16px; background-color: #e5e7eb; border-radius: 6px; font-size: 24px; font-weight: bold; text-align: center; border: 1px solid #9ca3af;">
+                    ${verification_code}
+                </div>
+                <p style="margin: 0 0 16px; font-size: 14px; color: #4b5563;">Mã này sẽ hết hạn sau <strong>15 phút</strong>.</p>
+                <p style="margin: 0 0 16px; font-size: 14px; color: #4b5563;">Nếu bạn không yêu cầu mã này, vui lòng bỏ qua email này.</p>
+                <p style="margin: 32px 0 0;">Trân trọng,<br>${sender_name}</p>
+            </td>
+        </tr>
+        <tr>
+            <td style="text-align: center; font-size: 12px; color: #6b7280; padding: 16px; border-top: 1px solid #e5e7eb;">
+                <p style="margin: 0 0 8px;">Đây là email tự động, vui lòng không trả lời.</p>
+                <p style="margin: 0;">&copy; ${year} ${sender_name}. All rights reserved.</p>
+            </td>
+        </tr>
+    </table>
+</body>
+</html>
+""",
+    BOOKING_CONFIRMATION_TEMPLATE: """\
+<html>
+<head>
+</head>
+<body class="font-sans text-gray-800 bg-gray-100 p-0 m-0">
+<div class="max-w-xl mx-auto bg-white rounded-lg shadow-md overflow-hidden my-8">
+<div class="bg-red-600 text-white text-center py-6 px-6 rounded-t-lg">
+<h2 class="text-3xl font-bold tracking-tight">XÁC NHẬN ĐẶT VÉ THÀNH CÔNG</h2>
+</div>
+<div class="p-8">
+<p class="mb-6 text-lg">Xin chào,</p>
+<p class="mb-6">Cảm ơn bạn đã tin tưởng và đặt vé xem phim tại hệ thống của chúng tôi. Dưới đây là thông tin chi tiết về vé của bạn:</p>
+<div class="bg-gray-100 rounded-md p-6 mb-6 border border-gray-200">
+<ul class="list-none p-0">
+<li class="mb-3"><strong class="text-red-600">Mã đặt vé:</strong> <span class="font-semibold">${booking_id}</span></li>
+<li class="mb-3"><strong class="text-red-600">Họ và tên:</strong> <span class="font-semibold">${customer_name}</span></li>
+<li class="mb-3"><strong class="text-red-600">Ngày chiếu:</strong> <span class="font-semibold">${departure_date}</span></li>
+<li class="mb-3"><strong class="text-red-600">Phim:</strong> <span class="font-semibold">${origin}</span></li>
+<li class="mb-3"><strong class="text-red-600">Rạp:</strong> <span class="font-semibold">${destination}</span></li>
+<li class="mb-3"><strong class="text-red-600">Giờ chiếu:</strong> <span class="font-semibold">${time}</span></li>
+<li class="mb-3"><strong class="text-red-600">Số lượng vé:</strong> <span class="font-semibold">${ticket_count}</span></li>
+</ul>
+</div>
+<div class="text-center my-8">
+<p class="mb-4 text-lg">Vui lòng quét mã QR này để nhận vé tại quầy:</p>
+<div class="inline-block bg-white p-4 border border-red-300 rounded-md shadow-md">
+<img src="qr_code_image_url" alt="Mã QR nhận vé" class="w-48 h-48">
+</div>
+<p class="mt-4 text-sm text-gray-600">Hoặc cung cấp mã đặt vé trên cho nhân viên.</p>
+</div>
+<p class="text-sm text-gray-600 mb-6">Xin vui lòng kiểm tra kỹ thông tin đặt vé. Nếu có bất kỳ sai sót hoặc thắc mắc, đừng ngần ngại liên hệ với chúng tôi.</p>
+<p class="mt-8">Trân trọng,<br><strong class="text-red-600">${sender_name}</strong></p>
+</div>
+<div class="bg-gray-100 text-center text-xs text-gray-500 py-4 px-6 border-t border-gray-200 rounded-b-lg">
+<p class="mb-2">Đây là email tự động, vui lòng không phản hồi trực tiếp.</p>
+<p>&copy; ${year} <strong class="text-red-600">${sender_name}</strong>. Mọi quyền được bảo lưu.</p>
+</div>
+</div>
+</body>
+</html>
+""",
+    TICKET_TEMPLATE: """\
+<html>
+<body style="font-family: Arial, sans-serif;">
+    <h2>Thông tin vé xem phim</h2>
+    <p><strong>Mã đặt vé:</strong> ${booking_id}</p>
+    <p><strong>Khách hàng:</strong> ${customer_name}</p>
+    <p><strong>Phim:</strong> ${movie_name}</p>
+    <p><strong>Suất chiếu:</strong> ${showtime}</p>
+    <p><strong>Ghế:</strong> ${seats}</p>
+    <div style="margin:18px 0; text-align:center;">
+        <img src="cid:ticket_qr" alt="QR toàn bộ vé" style="width:180px; height:180px;"/>
+    </div>
+</body>
+</html>
+""",
+    SHOWTIME_CANCELLED_TEMPLATE: """\
+<html>
+<body style="font-family: Arial, sans-serif;">
+    <h2>Suất chiếu đã bị hủy</h2>
+    <p>Chào ${customer_name},</p>
+    <p>Rất tiếc, suất chiếu dưới đây đã bị hủy do sự cố kỹ thuật. Vé của bạn đã được hủy và tiền sẽ được hoàn lại.</p>
+    <p><strong>Mã đặt vé:</strong> ${booking_code}</p>
+    <p><strong>Phim:</strong> ${movie_title}</p>
+    <p><strong>Suất chiếu:</strong> ${showtime}</p>
+    <p><strong>Ghế:</strong> ${seats}</p>
+    <p><strong>Số tiền hoàn:</strong> ${refund_amount}</p>
+    <p style="margin: 32px 0 0;">Trân trọng,<br>${sender_name}</p>
+</body>
+</html>
+""",
+}
+
+
+class CompiledTemplate:
+    """Template đã inline CSS, tách thành [đoạn tĩnh, placeholder, đoạn tĩnh, placeholder, ..., đoạn tĩnh]"""
+
+    def __init__(self, name: str, inlined_html: str):
+        self.name = name
+        pieces = PLACEHOLDER_PATTERN.split(inlined_html)
+        self._static: Tuple[str, ...] = tuple(pieces[0::2])
+        self._fields: Tuple[str, ...] = tuple(pieces[1::2])
+        self.fields = frozenset(self._fields)
+
+    def render(self, **values: Any) -> str:
+        """Ghép giá trị (đã escape HTML) vào template; thiếu placeholder → KeyError"""
+        missing = self.fields.difference(values)
+        if missing:
+            raise KeyError(f"Template {self.name} thiếu giá trị: {sorted(missing)}")
+        escaped = {field: html.escape(str(values[field])) for field in self.fields}
+        parts: List[str] = [self._static[0]]
+        for field, static in zip(self._fields, self._static[1:]):
+            parts.append(escaped[field])
+            parts.append(static)
+        return "".join(parts)
+
+
+_compiled: Dict[str, CompiledTemplate] = {}
+_compile_lock = threading.Lock()
+
+
+def compile_template(name: str) -> CompiledTemplate:
+    """Inline CSS template nguồn bằng premailer (chậm, chỉ chạy một lần cho mỗi template)"""
+    inlined = transform(TEMPLATE_SOURCES[name])
+    missing = set(PLACEHOLDER_PATTERN.findall(TEMPLATE_SOURCES[name])) - set(PLACEHOLDER_PATTERN.findall(inlined))
+    if missing:
+        raise ValueError(f"premailer làm mất placeholder {sorted(missing)} của template {name}")
+    return CompiledTemplate(name, inlined)
+
+
+def get_template(name: str) -> CompiledTemplate:
+    template = _compiled.get(name)
+    if template is None:
+        with _compile_lock:
+            template = _compiled.get(name)
+            if template is None:
+                template = _compiled[name] = compile_template(name)
+    return template
+
+
+def render_template(name: str, **values: Any) -> str:
+    return get_template(name).render(**values)
+
+
+def precompile_email_templates() -> None:
+    """Gọi lúc khởi động: email đầu tiên không phải chờ premailer"""
+    for name in TEMPLATE_SOURCES:
+        get_template(name)
+    logger.info(f"📧 Đã inline CSS {len(TEMPLATE_SOURCES)} template email")
@@ -0,0 +1,176 @@
+"""
+Exports Service - Xuất vé / giao dịch cho kế toán dạng NDJSON hoặc CSV, stream theo lô
+- Đọc qua server-side cursor của asyncpg (yield_per): bộ nhớ chỉ giữ một lô EXPORT_BATCH_SIZE dòng
+  dù export hàng triệu dòng, và event loop không bị chặn nên worker vẫn phục vụ request khác
+- Mỗi lô được mã hóa (trong thread) thành một chunk của response, ít lần ghi socket hơn từng dòng
+- Thứ tự theo khóa chính: Postgres trả dòng đầu ngay theo index, không phải sort cả khoảng ngày trước
+"""
+
+import asyncio
+import csv
+import io
+import json
+import logging
+from datetime import date, datetime, time, timedelta
+from enum import Enum
+from typing import Any, AsyncIterator, List, Optional, Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, exists, select
+
+from app.core.database import AsyncSessionLocal
+from app.models.movies import Movies
+from app.models.rooms import Rooms
+from app.models.seats import Seats
+from app.models.showtimes import Showtimes
+from app.models.theaters import Theaters
+from app.models.tickets import Tickets
+from app.models.transactions import Transaction
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+TICKET_EXPORT_COLUMNS = [
+    ("ticket_id", Tickets.ticket_id),
+    ("booking_code", Tickets.booking_code),
+    ("transaction_id", Tickets.transaction_id),
+    ("user_id", Tickets.user_id),
+    ("booking_time", Tickets.booking_time),
+    ("status", Tickets.status),
+    ("price", Tickets.price),
+    ("cancelled_at", Tickets.cancelled_at),
+    ("validated_at", Tickets.validated_at),
+    ("showtime_id", Tickets.showtime_id),
+    ("show_datetime", Showtimes.show_datetime),
+    ("movie_title", Movies.title),
+    ("theater_id", Showtimes.theater_id),
+    ("theater_name", Theaters.name),
+    ("room_name", Rooms.room_name),
+    ("seat_code", Seats.seat_code),
+    ("seat_type", Seats.seat_type),
+]
+
+TRANSACTION_EXPORT_COLUMNS = [
+    ("transaction_id", Transaction.transaction_id),
+    ("transaction_time", Transaction.transaction_time),
+    ("status", Transaction.status),
+    ("payment_method", Transaction.payment_method),
+    ("total_amount", Transaction.total_amount),
+    ("payment_ref_code", Transaction.payment_ref_code),
+    ("payment_id", Transaction.payment_id),
+    ("user_id", Transaction.user_id),
+    ("staff_user_id", Transaction.staff_user_id),
+    ("promotion_id", Transaction.promotion_id),
+]
+
+
+def _date_bounds(date_from: Optional[date], date_to: Optional[date]):
+    """[date_from 00:00, date_to + 1 ngày 00:00): date_to tính trọn ngày"""
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_from must not be after date_to")
+    start = datetime.combine(date_from, time.min) if date_from else None
+    end = datetime.combine(date_to + timedelta(days=1), time.min) if date_to else None
+    return start, end
+
+
+def tickets_export_query(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    theater_id: Optional[int] = None,
+) -> Select:
+    """Vé theo ngày đặt (booking_time), kèm suất chiếu / phim / rạp / ghế trong cùng một câu SELECT"""
+    start, end = _date_bounds(date_from, date_to)
+    query = (
+        select(*[column.label(name) for name, column in TICKET_EXPORT_COLUMNS])
+        .join(Showtimes, Showtimes.showtime_id == Tickets.showtime_id)
+        .join(Movies, Movies.movie_id == Showtimes.movie_id)
+        .join(Theaters, Theaters.theater_id == Showtimes.theater_id)
+        .join(Rooms, Rooms.room_id == Showtimes.room_id)
+        .join(Seats, Seats.seat_id == Tickets.seat_id)
+        .order_by(Tickets.ticket_id)
+    )
+    if start:
+        query = query.where(Tickets.booking_time >= start)
+    if end:
+        query = query.where(Tickets.booking_time < end)
+    if theater_id is not None:
+        query = query.where(Showtimes.theater_id == theater_id)
+    return query
+
+
+def transactions_export_query(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    theater_id: Optional[int] = None,
+) -> Select:
+    """Giao dịch theo transaction_time; lọc rạp qua vé của giao dịch (giao dịch không lưu rạp)"""
+    start, end = _date_bounds(date_from, date_to)
+    query = select(*[column.label(name) for name, column in TRANSACTION_EXPORT_COLUMNS]).order_by(Transaction.transaction_id)
+    if start:
+        query = query.where(Transaction.transaction_time >= start)
+    if end:
+        query = query.where(Transaction.transaction_time < end)
+    if theater_id is not None:
+        query = query.where(exists(
+            select(Tickets.ticket_id)
+            .join(Showtimes, Showtimes.showtime_id == Tickets.showtime_id)
+            .where(Tickets.transaction_id == Transaction.transaction_id, Showtimes.theater_id == theater_id)
+        ))
+    return query
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _json_default(value: Any) -> Any:
+    plain = _plain(value)
+    return str(plain) if plain is value else plain
+
+
+# Encoder dùng chung: default chỉ được gọi cho giá trị JSON không biểu diễn được (enum, datetime, Decimal)
+_json_encoder = json.JSONEncoder(ensure_ascii=False, default=_json_default)
+
+
+def _encode_ndjson(columns: List[str], rows: Sequence) -> str:
+    encode = _json_encoder.encode
+    return "".join([encode(dict(zip(columns, row))) + "\n" for row in rows])
+
+
+def _encode_csv(rows: Sequence) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([_plain(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+
+async def stream_export(query: Select, export_format: str, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[str]:
+    """Stream kết quả query theo lô: mỗi lô từ server-side cursor → một chunk NDJSON / CSV"""
+    columns = [column.name for column in query.selected_columns]
+    if export_format == "csv":
+        yield _encode_csv([columns])
+    exported = 0
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=batch_size))
+        async for rows in result.partitions():
+            exported += len(rows)
+            # Mã hóa một lô tốn vài chục ms CPU: chạy trong thread để event loop vẫn phục vụ request khác
+            if export_format == "csv":
+                yield await asyncio.to_thread(_encode_csv, rows)
+            else:
+                yield await asyncio.to_thread(_encode_ndjson, columns, rows)
+    logger.info(f"📤 Export {export_format}: {exported} dòng")
+
+
+def export_filename(kind: str, export_format: str, date_from: Optional[date], date_to: Optional[date]) -> str:
+    period = "_".join(day.isoformat() for day in (date_from, date_to) if day) or "all"
+    return f"{kind}_{period}.{export_format}"
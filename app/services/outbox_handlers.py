@@ -0,0 +1,86 @@
+"""
+Outbox Handlers - Các handler xử lý event outbox sau thanh toán / hủy suất chiếu
+Mỗi handler nhận payload (dict) và raise exception nếu thất bại để worker retry.
+"""
+
+import logging
+from typing import Any, Dict
+
+from app.core.config import settings
+from app.services.email_service import EmailService
+from app.services.outbox_service import register_handler
+from app.services.refund_service import refund_payment
+
+logger = logging.getLogger(__name__)
+
+BOOKING_EMAIL_EVENT = "booking.email"
+TICKET_QR_EVENT = "ticket.qr"
+SHOWTIME_REFUND_EVENT = "showtime.refund"
+SHOWTIME_CANCELLED_EMAIL_EVENT = "showtime.cancelled_email"
+VERIFICATION_EMAIL_EVENT = "user.verification_email"
+
+
+def _email_service() -> EmailService:
+    return EmailService(
+        smtp_server=settings.EMAIL_HOST,
+        smtp_port=settings.EMAIL_PORT,
+        username=settings.EMAIL_USERNAME,
+        password=settings.EMAIL_PASSWORD,
+        sender_name=settings.EMAIL_SENDER_NAME
+    )
+
+
+@register_handler(BOOKING_EMAIL_EVENT, lane="email")
+def handle_booking_email(payload: Dict[str, Any]) -> None:
+    """Gửi email vé cho khách hàng"""
+    email_service = _email_service()
+    ticket_info = {
+        'booking_id': payload.get('booking_code'),
+        'customer_name': payload.get('customer_name') or 'Customer',
+        'movie_name': payload.get('movie_title'),
+        'showtime': payload.get('showtime'),
+        'seats': payload.get('seats') or [],
+    }
+    if not email_service.send_ticket_email(to_email=payload.get('to_email'), ticket_info=ticket_info):
+        raise RuntimeError(f"Gửi email vé thất bại cho booking {payload.get('booking_code')}")
+
+
+@register_handler(VERIFICATION_EMAIL_EVENT, lane="email")
+def handle_verification_email(payload: Dict[str, Any]) -> None:
+    """Gửi mã xác nhận đăng ký (register / resend chỉ ghi event, không chờ SMTP)"""
+    if not _email_service().send_verification_email(payload.get('to_email'), payload.get('verification_code')):
+        raise RuntimeError(f"Gửi email xác nhận thất bại cho {payload.get('to_email')}")
+
+
+@register_handler(TICKET_QR_EVENT, lane="qr")
+def handle_ticket_qr(payload: Dict[str, Any]) -> None:
+    """
+    Event cũ (trước khi QR sinh theo yêu cầu): không còn lưu ảnh base64 vào tickets,
+    chỉ đánh dấu xong để lane "qr" xả hết event tồn.
+    """
+    logger.info(f"ℹ️ Bỏ qua event QR của booking {payload.get('booking_code')} (QR sinh theo yêu cầu)")
+
+
+# Lane "cancellation": hủy suất chiếu sinh hàng trăm event cùng lúc,
+# worker chạy riêng và có giới hạn tốc độ (OUTBOX_CANCELLATION_RATE) để không dồn SMTP / API VNPay
+@register_handler(SHOWTIME_REFUND_EVENT, lane="cancellation")
+def handle_showtime_refund(payload: Dict[str, Any]) -> None:
+    """
+    Hoàn tiền giao dịch của suất chiếu bị hủy, hoặc payment VNPay đã trừ tiền nhưng bị từ chối xuất vé
+    (ghế đã bị giải phóng khi khách còn ở trang thanh toán)
+    """
+    outcome = refund_payment(
+        payload.get('payment_id'),
+        int(payload.get('amount') or 0),
+        reason=payload.get('reason') or f"Huy suat chieu {payload.get('showtime_id')}",
+        requested_by=payload.get('requested_by') or 'system',
+    )
+    if outcome == "manual":
+        logger.info(f"💵 Booking {payload.get('booking_code')}: thanh toán tại quầy - hoàn tiền tại quầy")
+
+
+@register_handler(SHOWTIME_CANCELLED_EMAIL_EVENT, lane="cancellation")
+def handle_showtime_cancelled_email(payload: Dict[str, Any]) -> None:
+    """Báo khách hàng suất chiếu đã bị hủy và vé được hoàn tiền"""
+    if not _email_service().send_showtime_cancelled_email(to_email=payload.get('to_email'), cancel_info=payload):
+        raise RuntimeError(f"Gửi email hủy suất chiếu thất bại cho booking {payload.get('booking_code')}")
@@ -0,0 +1,204 @@
+"""
+Outbox Service - Ghi và xử lý các tác vụ phụ sau nghiệp vụ chính
+Nghiệp vụ chính (VD: tạo vé) chỉ ghi một dòng outbox trong CÙNG transaction,
+worker pool (app/core/outbox_worker.py) sẽ lấy ra xử lý, retry với backoff và dead-letter.
+"""
+
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, or_, tuple_, update
+from sqlalchemy.orm import Session
+
+from app.models.outbox import OutboxEvents, OutboxStatusEnum
+
+logger = logging.getLogger(__name__)
+
+# event_type -> handler(payload)
+_handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+# lane -> danh sách event_type; mỗi lane có pool worker riêng để scale độc lập
+_lanes: Dict[str, List[str]] = {}
+
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 3600
+
+
+def register_handler(event_type: str, lane: str = "default"):
+    """Decorator đăng ký handler cho một loại event"""
+    def decorator(func: Callable[[Dict[str, Any]], None]):
+        _handlers[event_type] = func
+        _lanes.setdefault(lane, [])
+        if event_type not in _lanes[lane]:
+            _lanes[lane].append(event_type)
+        return func
+    return decorator
+
+
+def get_handler(event_type: str) -> Optional[Callable[[Dict[str, Any]], None]]:
+    return _handlers.get(event_type)
+
+
+def get_lanes() -> Dict[str, List[str]]:
+    return dict(_lanes)
+
+
+def enqueue_event(
+    db: Session,
+    event_type: str,
+    payload: Dict[str, Any],
+    aggregate_id: Optional[str] = None,
+    max_attempts: Optional[int] = None,
+) -> OutboxEvents:
+    """Thêm event vào outbox. KHÔNG commit - người gọi commit cùng nghiệp vụ chính."""
+    event = OutboxEvents(
+        event_type=event_type,
+        aggregate_id=aggregate_id,
+        payload=payload,
+        status=OutboxStatusEnum.pending,
+        attempts=0,
+        next_attempt_at=datetime.now(timezone.utc),
+    )
+    if max_attempts is not None:
+        event.max_attempts = max_attempts
+    db.add(event)
+    return event
+
+
+def claim_events(db: Session, event_types: List[str], batch_size: int, lease_seconds: int) -> List[Dict[str, Any]]:
+    """
+    Nhận một lô event đến hạn bằng SELECT ... FOR UPDATE SKIP LOCKED
+    để nhiều worker (kể cả trên nhiều process) không nhận trùng event.
+    Event 'processing' có lease hết hạn (worker chết / treo giữa chừng) được nhận lại và tính là một lần thử:
+    event làm sập worker mỗi lần chạy vẫn đi vào dead-letter sau max_attempts thay vì retry mãi.
+    Lô được xử lý tuần tự: worker gia hạn phần còn lại của lô trước từng event (renew_leases),
+    lease chỉ cần dài hơn một handler chứ không phải cả lô.
+    """
+    now = datetime.now(timezone.utc)
+    events = (
+        db.query(OutboxEvents)
+        .filter(
+            OutboxEvents.event_type.in_(event_types),
+            or_(
+                and_(
+                    OutboxEvents.status == OutboxStatusEnum.pending,
+                    OutboxEvents.next_attempt_at <= now,
+                ),
+                and_(
+                    OutboxEvents.status == OutboxStatusEnum.processing,
+                    OutboxEvents.locked_until < now,
+                ),
+            ),
+        )
+        .order_by(OutboxEvents.next_attempt_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    claimed = []
+    for event in events:
+        if event.status == OutboxStatusEnum.processing:
+            event.attempts = (event.attempts or 0) + 1
+            event.last_error = f"Lease hết hạn lúc {event.locked_until.isoformat()} (worker dừng giữa chừng)"
+            if event.attempts >= (event.max_attempts or 1):
+                event.status = OutboxStatusEnum.dead
+                event.locked_until = None
+                logger.error(f"☠️ Outbox event {event.event_id} ({event.event_type}) chuyển sang dead-letter: {event.last_error}")
+                continue
+        event.status = OutboxStatusEnum.processing
+        event.locked_until = now + timedelta(seconds=lease_seconds)
+        claimed.append({
+            "event_id": event.event_id,
+            "event_type": event.event_type,
+            "payload": event.payload,
+            "attempts": event.attempts,
+            "locked_until": event.locked_until,
+        })
+    db.commit()
+    return claimed
+
+
+def renew_leases(db: Session, events: List[Dict[str, Any]], lease_seconds: int) -> List[Dict[str, Any]]:
+    """
+    Gia hạn lease các event đã nhận (claim_events) thêm lease_seconds tính từ bây giờ, một câu UPDATE.
+    locked_until đã nhận dùng như fencing token: event đã hết lease và bị worker khác nhận lại
+    (locked_until đổi) không được gia hạn. Trả về các event worker còn giữ, theo thứ tự ban đầu.
+    """
+    if not events:
+        return []
+    locked_until = datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)
+    renewed = set(db.scalars(
+        update(OutboxEvents)
+        .where(
+            OutboxEvents.status == OutboxStatusEnum.processing,
+            tuple_(OutboxEvents.event_id, OutboxEvents.locked_until).in_(
+                [(event["event_id"], event["locked_until"]) for event in events]
+            ),
+        )
+        .values(locked_until=locked_until)
+        .returning(OutboxEvents.event_id)
+    ).all())
+    db.commit()
+    owned = []
+    for event in events:
+        if event["event_id"] in renewed:
+            event["locked_until"] = locked_until
+            owned.append(event)
+        else:
+            logger.warning(f"⚠️ Outbox event {event['event_id']} ({event['event_type']}) hết lease, worker khác đã nhận lại - bỏ qua")
+    return owned
+
+
+def mark_done(db: Session, event_id: int) -> None:
+    db.query(OutboxEvents).filter(OutboxEvents.event_id == event_id).update(
+        {
+            OutboxEvents.status: OutboxStatusEnum.done,
+            OutboxEvents.locked_until: None,
+            OutboxEvents.processed_at: datetime.now(timezone.utc),
+            OutboxEvents.last_error: None,
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def compute_backoff(attempts: int) -> float:
+    """Exponential backoff có jitter: 5s, 10s, 20s... tối đa 1 giờ"""
+    delay = min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def mark_failed(db: Session, event_id: int, error: str) -> OutboxStatusEnum:
+    """Tăng số lần thử; lên lịch retry hoặc chuyển sang dead-letter"""
+    event = db.query(OutboxEvents).filter(OutboxEvents.event_id == event_id).first()
+    if not event:
+        return OutboxStatusEnum.dead
+    event.attempts = (event.attempts or 0) + 1
+    event.last_error = error[:2000] if error else None
+    event.locked_until = None
+    if event.attempts >= (event.max_attempts or 1):
+        event.status = OutboxStatusEnum.dead
+        logger.error(f"☠️ Outbox event {event_id} ({event.event_type}) chuyển sang dead-letter: {error}")
+    else:
+        event.status = OutboxStatusEnum.pending
+        event.next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=compute_backoff(event.attempts))
+    db.commit()
+    return event.status
+
+
+def requeue_dead_events(db: Session, event_type: Optional[str] = None) -> int:
+    """Đưa các event dead-letter về pending (dùng khi đã khắc phục nguyên nhân lỗi)"""
+    query = db.query(OutboxEvents).filter(OutboxEvents.status == OutboxStatusEnum.dead)
+    if event_type:
+        query = query.filter(OutboxEvents.event_type == event_type)
+    count = query.update(
+        {
+            OutboxEvents.status: OutboxStatusEnum.pending,
+            OutboxEvents.attempts: 0,
+            OutboxEvents.next_attempt_at: datetime.now(timezone.utc),
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+    return count
@@ -0,0 +1,64 @@
+"""
+Cache kết quả xử lý callback VNPay theo order_id (vnp_TxnRef)
+Callback trùng (return + IPN, VNPay gửi lại IPN) được trả kết quả ngay mà không truy vấn DB.
+Dùng Redis nếu có để các worker dùng chung, luôn kèm cache trong process.
+"""
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.core.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+CALLBACK_CACHE_MAX_ITEMS = 10000
+CALLBACK_CACHE_TTL_SECONDS = 24 * 3600
+
+_local: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _redis_key(order_id: str) -> str:
+    return f"payment:callback:{order_id}"
+
+
+def get_cached_callback_result(order_id: str) -> Optional[Dict[str, Any]]:
+    if not order_id:
+        return None
+    with _lock:
+        result = _local.get(order_id)
+    if result is not None:
+        return result
+    if redis_client:
+        try:
+            raw = redis_client.get(_redis_key(order_id))
+            if raw:
+                result = json.loads(raw)
+                _put_local(order_id, result)
+                return result
+        except Exception as e:
+            logger.warning(f"Không đọc được cache callback từ Redis: {e}")
+    return None
+
+
+def _put_local(order_id: str, result: Dict[str, Any]) -> None:
+    with _lock:
+        _local[order_id] = result
+        _local.move_to_end(order_id)
+        while len(_local) > CALLBACK_CACHE_MAX_ITEMS:
+            _local.popitem(last=False)
+
+
+def cache_callback_result(order_id: str, result: Dict[str, Any]) -> None:
+    """Lưu kết quả cuối cùng (chỉ gọi SAU KHI đã commit)"""
+    if not order_id:
+        return
+    _put_local(order_id, result)
+    if redis_client:
+        try:
+            redis_client.set(_redis_key(order_id), json.dumps(result, default=str), ex=CALLBACK_CACHE_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Không ghi được cache callback vào Redis: {e}")
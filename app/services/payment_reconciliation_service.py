@@ -0,0 +1,197 @@
+"""
+Payment Reconciliation Service - Đối soát payment VNPay PENDING (mất IPN) với API querydr
+- Chọn payment PENDING quá hạn theo lô (keyset theo payment_id)
+- Truy vấn cổng song song có giới hạn (asyncio.Semaphore + httpx.AsyncClient)
+- Áp kết quả qua PaymentService.update_payment_status: cùng khóa, cùng idempotency với return/IPN
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.payments import CallbackStateEnum, PaymentStatusEnum, VNPayPayment
+from app.payments.vnpay import sign_querydr_request, verify_querydr_response
+from app.schemas.payments import PaymentMethod, PaymentResult, PaymentStatus
+from app.services.payments_service import PaymentService
+
+logger = logging.getLogger(__name__)
+
+VNP_DATE_FORMAT = '%Y%m%d%H%M%S'
+# vnp_ResponseCode của querydr: 00 = truy vấn thành công, 91 = không tìm thấy giao dịch
+QUERY_OK = "00"
+QUERY_NOT_FOUND = "91"
+# vnp_TransactionStatus: 00 = thành công, 01 = chưa hoàn tất, 02 = lỗi
+TRANSACTION_SUCCESS = "00"
+TRANSACTION_PENDING = "01"
+
+payment_service = PaymentService()
+
+
+async def select_stale_payments(stale_before: datetime, after_payment_id: int, batch_size: int) -> List[Dict[str, Any]]:
+    """Một lô payment VNPay PENDING tạo trước stale_before, chưa có callback nào được xử lý"""
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(
+                VNPayPayment.payment_id,
+                VNPayPayment.order_id,
+                VNPayPayment.order_desc,
+                VNPayPayment.client_ip,
+                VNPayPayment.created_at,
+            )
+            .where(
+                VNPayPayment.payment_status == PaymentStatusEnum.PENDING,
+                VNPayPayment.callback_state == CallbackStateEnum.pending,
+                VNPayPayment.created_at < stale_before,
+                VNPayPayment.payment_id > after_payment_id,
+            )
+            .order_by(VNPayPayment.payment_id)
+            .limit(batch_size)
+        )).all()
+    return [dict(row._mapping) for row in rows]
+
+
+def build_querydr_body(payment: Dict[str, Any]) -> Dict[str, Any]:
+    """Body querydr cho một payment (vnp_TransactionDate = thời điểm tạo URL thanh toán)"""
+    created_at = payment["created_at"] or datetime.now(timezone.utc)
+    return sign_querydr_request(
+        {
+            "vnp_RequestId": uuid.uuid4().hex[:32],
+            "vnp_Version": "2.1.0",
+            "vnp_Command": "querydr",
+            "vnp_TmnCode": settings.VNPAY_TMN_CODE,
+            "vnp_TxnRef": payment["order_id"],
+            "vnp_OrderInfo": f"Doi soat {payment['order_id']}",
+            "vnp_TransactionDate": created_at.astimezone().strftime(VNP_DATE_FORMAT),
+            "vnp_CreateDate": datetime.now().strftime(VNP_DATE_FORMAT),
+            "vnp_IpAddr": payment["client_ip"] or "127.0.0.1",
+        },
+        settings.VNPAY_HASH_SECRET_KEY,
+    )
+
+
+async def query_transaction(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, payment: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Gọi querydr (giới hạn số request đồng thời); None nếu lỗi mạng / chữ ký sai"""
+    async with semaphore:
+        try:
+            response = await client.post(settings.VNPAY_API_URL, json=build_querydr_body(payment))
+            response.raise_for_status()
+            data = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"⚠️ querydr {payment['order_id']} lỗi: {e}")
+            return None
+    if not verify_querydr_response(data, settings.VNPAY_HASH_SECRET_KEY):
+        logger.warning(f"⚠️ querydr {payment['order_id']}: chữ ký response không hợp lệ")
+        return None
+    return data
+
+
+def to_payment_result(payment: Dict[str, Any], data: Dict[str, Any], abandon_before: datetime) -> Optional[PaymentResult]:
+    """
+    Đổi response querydr thành PaymentResult như một callback:
+    None = chưa có kết quả cuối (giao dịch đang xử lý, hoặc chưa đủ lâu để coi là bỏ dở)
+    """
+    response_code = data.get("vnp_ResponseCode")
+    if response_code == QUERY_NOT_FOUND:
+        # Khách chưa từng thanh toán trên cổng → chỉ coi là thất bại khi đã quá thời gian giữ đơn
+        if payment["created_at"] and payment["created_at"] < abandon_before:
+            return PaymentResult(
+                success=False,
+                order_id=payment["order_id"],
+                payment_method=PaymentMethod.VNPAY,
+                payment_status=PaymentStatus.FAILED,
+                response_code=QUERY_NOT_FOUND,
+            )
+        return None
+    if response_code != QUERY_OK:
+        return None
+
+    transaction_status = data.get("vnp_TransactionStatus")
+    if transaction_status == TRANSACTION_PENDING:
+        return None
+    success = transaction_status == TRANSACTION_SUCCESS
+    return PaymentResult(
+        success=success,
+        order_id=payment["order_id"],
+        transaction_id=data.get("vnp_TransactionNo"),
+        amount=int(data.get("vnp_Amount") or 0) // 100,
+        payment_method=PaymentMethod.VNPAY,
+        payment_status=PaymentStatus.SUCCESS if success else PaymentStatus.FAILED,
+        response_code=transaction_status,
+        bank_code=data.get("vnp_BankCode"),
+        pay_date=data.get("vnp_PayDate"),
+    )
+
+
+async def apply_result(payment_result: PaymentResult) -> str:
+    """Áp kết quả qua đường xử lý callback idempotent (khóa payment, xuất vé, lưu kết quả)"""
+    async with AsyncSessionLocal() as db:
+        try:
+            result = await payment_service.update_payment_status_async(db, payment_result.order_id, payment_result)
+        except HTTPException as e:
+            if e.status_code == 400:
+                # Khách đã trả tiền nhưng giữ ghế đã hết hạn → cần hoàn tiền thủ công
+                logger.warning(f"⚠️ Đối soát {payment_result.order_id}: {e.detail}")
+                return "rejected"
+            raise
+    if result.get("duplicate"):
+        return "duplicate"
+    return result.get("status", "unknown")
+
+
+async def reconcile_pending_payments(
+    client: Optional[httpx.AsyncClient] = None,
+    stale_seconds: Optional[int] = None,
+    abandon_seconds: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    concurrency: Optional[int] = None,
+) -> Counter:
+    """Một lượt đối soát toàn bộ payment PENDING quá hạn. Trả về thống kê kết quả."""
+    stats: Counter = Counter()
+    if client is None and not settings.VNPAY_API_URL:
+        logger.debug("VNPAY_API_URL chưa cấu hình - bỏ qua đối soát")
+        return stats
+
+    now = datetime.now(timezone.utc)
+    stale_before = now - timedelta(seconds=settings.RECONCILE_STALE_SECONDS if stale_seconds is None else stale_seconds)
+    abandon_before = now - timedelta(seconds=settings.RECONCILE_ABANDON_SECONDS if abandon_seconds is None else abandon_seconds)
+    batch_size = batch_size or settings.RECONCILE_BATCH_SIZE
+    semaphore = asyncio.Semaphore(concurrency or settings.RECONCILE_CONCURRENCY)
+
+    own_client = client is None
+    client = client or httpx.AsyncClient(timeout=30)
+    try:
+        after_payment_id = 0
+        while True:
+            payments = await select_stale_payments(stale_before, after_payment_id, batch_size)
+            if not payments:
+                break
+            after_payment_id = payments[-1]["payment_id"]
+
+            responses = await asyncio.gather(*[query_transaction(client, semaphore, payment) for payment in payments])
+            for payment, data in zip(payments, responses):
+                stats["checked"] += 1
+                if data is None:
+                    stats["query_error"] += 1
+                    continue
+                payment_result = to_payment_result(payment, data, abandon_before)
+                if payment_result is None:
+                    stats["still_pending"] += 1
+                    continue
+                try:
+                    stats[await apply_result(payment_result)] += 1
+                except Exception as e:
+                    stats["apply_error"] += 1
+                    logger.error(f"❌ Đối soát {payment['order_id']} lỗi: {e}")
+    finally:
+        if own_client:
+            await client.aclose()
+    return stats
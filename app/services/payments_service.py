@@ -1,23 +1,29 @@
-from typing import Optional, Dict, Any
+from functools import partial
+from typing import Optional, Dict, Any, Callable, List
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
 from datetime import datetime, timezone
+import asyncio
+import base64
+import json
+import logging
 import uuid
-import random
-import string
-import traceback
 import unicodedata
-import qrcode
-import base64
-from io import BytesIO
-from app.services.email_service import EmailService
+from app.core.booking_codes import next_booking_code
+from app.core.payment_notifier import payment_notifier
+from app.services.outbox_handlers import SHOWTIME_REFUND_EVENT
+from app.services.outbox_service import enqueue_event
+from app.services.payment_callback_cache import cache_callback_result, get_cached_callback_result
+from app.services.pricing_service import get_price_table, price_reservations
+from app.services.ticket_issuance_service import issue_tickets
+from app.services.user_bookings_cache import invalidate_user_bookings
 from app.models.users import Users
-from app.models.showtimes import Showtimes
-from app.models.movies import Movies
-from app.models.seats import Seats
 from app.core.config import settings
-from app.payments.vnpay import VNPay
-from app.models.payments import Payment, PaymentStatusEnum, PaymentMethodEnum, VNPayPayment
+from app.payments.vnpay import build_payment_url, verify_callback
+from app.models.payments import CallbackStateEnum, Payment, PaymentStatusEnum, PaymentMethodEnum, VNPayPayment
 from app.models.seat_reservations import SeatReservations
 from app.models.tickets import Tickets
 from app.models.transactions import Transaction, TransactionStatus
@@ -28,14 +34,50 @@ from app.schemas.payments import (
     PaymentStatus,
     PaymentMethod
 )
-from app.models.seats import Seats
-from app.models.showtimes import Showtimes
-from app.models.seat_templates import SeatTypeEnum
+logger = logging.getLogger(__name__)
+
+HISTORY_DEFAULT_LIMIT = 50
+HISTORY_MAX_LIMIT = 500
+VNP_PAY_DATE_FORMAT = '%Y%m%d%H%M%S'
+
+
+def encode_history_cursor(created_at: datetime, payment_id: int) -> str:
+    """Cursor (opaque) = vị trí bản ghi cuối của trang: (created_at, payment_id)"""
+    raw = json.dumps([created_at.isoformat(), payment_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_history_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, payment_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(payment_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def to_vnp_pay_date(value: Optional[str], end_of_day: bool = False) -> Optional[str]:
+    """
+    Đổi ngày ISO (2025-01-31 hoặc 2025-01-31T10:00:00) sang định dạng vnp_PayDate (yyyyMMddHHmmss),
+    để so sánh đúng với cột vnp_pay_date (chuỗi cố định độ dài, thứ tự từ điển = thứ tự thời gian)
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {value}")
+    if end_of_day and len(value) == 10:
+        parsed = parsed.replace(hour=23, minute=59, second=59)
+    return parsed.strftime(VNP_PAY_DATE_FORMAT)
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
 class PaymentService:
-    """Service xử lý thanh toán"""
-    
-    def __init__(self):
-        self.vnpay = VNPay()
+    """Service xử lý thanh toán (không giữ state theo request - dùng chung an toàn giữa các request)"""
 
     # --- HELPER: BỎ DẤU TIẾNG VIỆT ---
     def remove_accents(self, input_str: str) -> str:
@@ -46,7 +88,7 @@ class PaymentService:
         return "".join(c for c in only_ascii if c.isalnum() or c == " ")
 
     def create_payment(self, db: Session, request: PaymentRequest, client_ip: str, user_id: Optional[int] = None):
-        print("\n================ PAYMENT START ================\n")
+        logger.debug(f"💳 Tạo thanh toán cho user {user_id}, session {request.session_id}")
         try:
             order_id = str(uuid.uuid4())
             reservations = db.query(SeatReservations).filter(
@@ -60,11 +102,8 @@ class PaymentService:
             if user_id is None:
                 raise ValueError("Người dùng chưa được xác định")
             
-            # Tính tổng tiền
-            total_amount = 0
-            for reservation in reservations:
-                ticket_price = self.calculate_ticket_price(db, reservation.seat_id, reservation.showtime_id)
-                total_amount += ticket_price
+            # Tính tổng tiền (cả giỏ ghế trong một lần gọi)
+            total_amount = sum(price_reservations(db, reservations).values())
             
             # Chuẩn hóa payment_method
             try:
@@ -140,7 +179,7 @@ class PaymentService:
             )
         except Exception as e:
             db.rollback()
-            print(traceback.format_exc())
+            logger.exception(f"❌ Tạo thanh toán thất bại (session {request.session_id})")
             raise HTTPException(status_code=500, detail=str(e))
 
     def create_vnpay_url(self, payment_request: PaymentRequest, client_ip: str, amount: int, order_id: str) -> str:
@@ -149,7 +188,7 @@ class PaymentService:
             clean_order_desc = self.remove_accents(payment_request.order_desc)
             clean_order_desc = clean_order_desc[:50] if clean_order_desc else f"Thanh toan {order_id}"
 
-            self.vnpay.set_request_data(
+            params = dict(
                 vnp_Version='2.1.0',
                 vnp_Command='pay',
                 vnp_TmnCode=settings.VNPAY_TMN_CODE,
@@ -164,95 +203,172 @@ class PaymentService:
                 vnp_ReturnUrl=settings.VNPAY_RETURN_URL
             )
             
-            return self.vnpay.get_payment_url(
-                settings.VNPAY_PAYMENT_URL,
-                settings.VNPAY_HASH_SECRET_KEY
-            )
+            return build_payment_url(settings.VNPAY_PAYMENT_URL, params, settings.VNPAY_HASH_SECRET_KEY)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to create payment URL: {str(e)}")
     
     def handle_vnpay_callback(self, db: Session, callback_data: Dict[str, Any]) -> PaymentResult:
         """Xử lý callback: Chỉ xác thực chữ ký, KHÔNG cập nhật status DB tại đây để tránh conflict"""
         try:
-            self.vnpay.set_response_data(callback_data)
-            is_valid = self.vnpay.validate_response(settings.VNPAY_HASH_SECRET_KEY)
-            
-            order_id = callback_data.get('vnp_TxnRef')
-            amount = int(callback_data.get('vnp_Amount', 0)) // 100
-            response_code = callback_data.get('vnp_ResponseCode')
-            transaction_no = callback_data.get('vnp_TransactionNo')
-
-            if not is_valid:
-                return PaymentResult(
-                    success=False,
-                    order_id=order_id,
-                    message="Invalid signature",
-                    payment_method=PaymentMethod.VNPAY,
-                    payment_status=PaymentStatus.FAILED
-                )
-            
-            success = (response_code == '00')
-            
-            return PaymentResult(
-                success=success,
-                order_id=order_id,
-                transaction_id=transaction_no,
-                amount=amount,
-                message="Success" if success else f"Failed: {response_code}",
-                payment_method=PaymentMethod.VNPAY,
-                payment_status=PaymentStatus.SUCCESS if success else PaymentStatus.FAILED
-            )
-            
+            is_valid = verify_callback(callback_data, settings.VNPAY_HASH_SECRET_KEY)
         except Exception as e:
-            print(traceback.format_exc())
+            logger.exception("❌ Lỗi xác thực callback VNPay")
             raise HTTPException(status_code=500, detail=f"Callback error: {str(e)}")
 
+        # Chữ ký sai: KHÔNG được phép thay đổi trạng thái payment
+        if not is_valid:
+            raise HTTPException(status_code=400, detail="Invalid signature")
+
+        order_id = callback_data.get('vnp_TxnRef')
+        amount = int(callback_data.get('vnp_Amount', 0)) // 100
+        response_code = callback_data.get('vnp_ResponseCode')
+        transaction_no = callback_data.get('vnp_TransactionNo')
+        success = (response_code == '00')
+
+        return PaymentResult(
+            success=success,
+            order_id=order_id,
+            transaction_id=transaction_no,
+            amount=amount,
+            payment_method=PaymentMethod.VNPAY,
+            payment_status=PaymentStatus.SUCCESS if success else PaymentStatus.FAILED,
+            response_code=response_code,
+            bank_code=callback_data.get('vnp_BankCode'),
+            card_type=callback_data.get('vnp_CardType'),
+            pay_date=callback_data.get('vnp_PayDate'),
+        )
+
+    def _replay_callback_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Trả lại kết quả đã lưu cho callback trùng (raise lại nếu lần đầu bị từ chối)"""
+        if result.get("status") == "rejected":
+            raise HTTPException(status_code=result.get("code", 400), detail=result.get("message"))
+        return {**result, "duplicate": True}
+
+    def _finish_callback(self, payment: Payment, state: CallbackStateEnum, result: Dict[str, Any]) -> None:
+        """Ghi trạng thái cuối và kết quả callback (commit cùng nghiệp vụ)"""
+        payment.callback_state = state
+        payment.callback_result = jsonable_encoder(result)
+
+    def _publish_result(self, order_id: str, result: Dict[str, Any]) -> None:
+        """Sau commit: cache kết quả cho callback trùng và đẩy cho client đang chờ (WebSocket / long-poll)"""
+        cache_callback_result(order_id, result)
+        payment_notifier.publish(order_id, jsonable_encoder(result))
+
     def update_payment_status(self, db: Session, order_id: str, payment_result: PaymentResult) -> Dict[str, Any]:
         """
-        Hàm quan trọng: Cập nhật trạng thái và TẠO VÉ (Atomic)
+        Hàm quan trọng: Cập nhật trạng thái và TẠO VÉ (Atomic, idempotent)
         
         LOGIC:
-        1. Kiểm tra payment đã xử lý chưa
+        0. Callback trùng (return + IPN, VNPay retry) → trả kết quả đã lưu, O(1)
+        1. Nhận quyền xử lý bằng SELECT ... FOR UPDATE SKIP LOCKED trên payment (khóa theo vnp_TxnRef)
         2. VALIDATE reservations TRƯỚC KHI cho phép payment success
-        3. Chỉ cập nhật payment success SAU KHI tạo vé thành công
+        3. Chỉ cập nhật payment success SAU KHI tạo vé thành công, lưu kết quả callback cùng commit
         """
+        cached = get_cached_callback_result(order_id)
+        if cached is not None:
+            return self._replay_callback_result(cached)
+
+        after_commit: List[Callable[[], None]] = []
         try:
-            # 1. Tìm payment
-            payment = self.get_payment_by_order_id(db, order_id)
+            return self._apply_payment_result(db, order_id, payment_result, after_commit)
+        finally:
+            for effect in after_commit:
+                effect()
+
+    async def update_payment_status_async(self, db: AsyncSession, order_id: str, payment_result: PaymentResult) -> Dict[str, Any]:
+        """
+        update_payment_status cho AsyncSession: phần DB chạy qua run_sync (asyncpg), còn các lời gọi
+        đồng bộ ra Redis / sequence (cache callback, publish, vô hiệu cache vé, cấp khối mã đặt vé)
+        chạy trong thread pool trước / sau run_sync → không chặn event loop
+        """
+        cached = await asyncio.to_thread(get_cached_callback_result, order_id)
+        if cached is not None:
+            return self._replay_callback_result(cached)
+
+        # Mã đặt vé cấp trước (callback trùng / bị từ chối chỉ bỏ phí một số trong khối)
+        booking_code = await asyncio.to_thread(next_booking_code) if payment_result.success else None
+        after_commit: List[Callable[[], None]] = []
+        try:
+            return await db.run_sync(self._apply_payment_result, order_id, payment_result, after_commit, booking_code)
+        finally:
+            for effect in after_commit:
+                await asyncio.to_thread(effect)
+
+    def _apply_payment_result(
+        self,
+        db: Session,
+        order_id: str,
+        payment_result: PaymentResult,
+        after_commit: List[Callable[[], None]],
+        booking_code: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Phần DB của update_payment_status; không gọi Redis - tác vụ sau commit (cache kết quả, publish,
+        vô hiệu cache vé của khách) được thêm vào after_commit để người gọi chạy
+        """
+        try:
+            # 1. Khóa payment; nếu callback khác đang giữ khóa thì không chờ
+            payment = (
+                db.query(Payment)
+                .filter(Payment.order_id == order_id)
+                .with_for_update(skip_locked=True, of=Payment)
+                .first()
+            )
             if not payment:
-                raise HTTPException(status_code=404, detail="Payment not found")
-            
-            # Nếu đã xử lý rồi
+                exists = db.query(Payment.payment_id).filter(Payment.order_id == order_id).first()
+                db.rollback()
+                if not exists:
+                    raise HTTPException(status_code=404, detail="Payment not found")
+                return {
+                    "status": "processing",
+                    "order_id": order_id,
+                    "message": "Payment is being processed by another callback"
+                }
+
+            # Callback đã được xử lý trước đó → trả kết quả đã lưu
+            if payment.callback_state != CallbackStateEnum.pending and payment.callback_result:
+                result = payment.callback_result
+                db.rollback()
+                after_commit.append(partial(cache_callback_result, order_id, result))
+                return self._replay_callback_result(result)
+
+            # Payment cũ đã SUCCESS nhưng chưa có kết quả lưu sẵn
             if payment.payment_status == PaymentStatusEnum.SUCCESS:
                 trans = db.query(Transaction).filter_by(payment_id=payment.payment_id).first()
                 ticket = db.query(Tickets).filter_by(transaction_id=trans.transaction_id).first() if trans else None
+                db.rollback()
                 return {
                     "status": "success",
                     "booking_code": ticket.booking_code if ticket else "PROCESSED",
                     "message": "Already processed"
                 }
 
+            vnpay_payment = payment if isinstance(payment, VNPayPayment) else None
+            if vnpay_payment:
+                vnpay_payment.vnp_response_code = payment_result.response_code
+                vnpay_payment.vnp_bank_code = payment_result.bank_code
+                vnpay_payment.vnp_card_type = payment_result.card_type
+                vnpay_payment.vnp_pay_date = payment_result.pay_date
+
             # 2. Xử lý thanh toán thất bại
             if not payment_result.success:
                 payment.payment_status = PaymentStatusEnum.FAILED
                 
-                # Cập nhật VNPay payment nếu có
-                vnpay_payment = db.query(VNPayPayment).filter_by(payment_id=payment.payment_id).first()
-                if vnpay_payment:
-                    vnpay_payment.payment_status = PaymentStatusEnum.FAILED
-                
                 # Cập nhật transaction
                 trans = db.query(Transaction).filter_by(payment_id=payment.payment_id).first()
                 if trans:
                     trans.status = TransactionStatus.failed
                 
-                db.commit()
-                return {
+                result = {
                     "status": "failed",
                     "payment_status": payment.payment_status.value,
                     "order_id": order_id,
                     "message": "Payment failed from gateway"
                 }
+                self._finish_callback(payment, CallbackStateEnum.completed, result)
+                db.commit()
+                after_commit.append(partial(self._publish_result, order_id, result))
+                return result
             
             # 3. Thanh toán thành công - VALIDATE reservations TRƯỚC KHI commit payment success
             reservations = db.query(SeatReservations).filter(
@@ -260,300 +376,260 @@ class PaymentService:
                 SeatReservations.status == 'pending'
             ).all()
             
+            rejection = None
             if not reservations:
                 # KHÔNG có reservations → KHÔNG CHO PHÉP payment thành công
-                payment.payment_status = PaymentStatusEnum.FAILED
-                db.commit()
-                raise HTTPException(
-                    status_code=400,
-                    detail="Cannot process payment: No valid reservations found. Payment has been marked as FAILED."
-                )
-            
-            # Kiểm tra reservations có còn hạn không
-            current_time = datetime.now(timezone.utc)
-            expired_reservations = []
-            
-            for res in reservations:
-                expires_at = res.expires_at
-                # Đảm bảo expires_at là timezone-aware
-                if not hasattr(expires_at, 'tzinfo') or expires_at.tzinfo is None:
-                    expires_at = expires_at.replace(tzinfo=timezone.utc)
-                elif expires_at.tzinfo != timezone.utc:
-                    expires_at = expires_at.astimezone(timezone.utc)
+                rejection = "Cannot process payment: No valid reservations found. Payment has been marked as FAILED."
+            else:
+                # Kiểm tra reservations có còn hạn không
+                current_time = datetime.now(timezone.utc)
+                expired_reservations = []
                 
-                if expires_at < current_time:
-                    expired_reservations.append(res.reservation_id)
-            
-            if expired_reservations:
-                # Có reservations hết hạn → KHÔNG CHO PHÉP payment thành công
+                for res in reservations:
+                    expires_at = res.expires_at
+                    # Đảm bảo expires_at là timezone-aware
+                    if not hasattr(expires_at, 'tzinfo') or expires_at.tzinfo is None:
+                        expires_at = expires_at.replace(tzinfo=timezone.utc)
+                    elif expires_at.tzinfo != timezone.utc:
+                        expires_at = expires_at.astimezone(timezone.utc)
+                    
+                    if expires_at < current_time:
+                        expired_reservations.append(res.reservation_id)
+                
+                if expired_reservations:
+                    # Có reservations hết hạn → KHÔNG CHO PHÉP payment thành công
+                    rejection = f"{len(expired_reservations)} reservation(s) have expired. Cannot process payment. Payment has been marked as FAILED."
+
+            if rejection:
                 payment.payment_status = PaymentStatusEnum.FAILED
+                result = {"status": "rejected", "order_id": order_id, "code": 400, "message": rejection}
+                if vnpay_payment:
+                    # VNPay đã trừ tiền nhưng không còn ghế để xuất vé (giữ ghế hết hạn, suất chiếu bị hủy
+                    # khi khách đang ở trang VNPay) → hoàn tiền qua lane outbox "cancellation", cùng commit
+                    if payment_result.transaction_id:
+                        vnpay_payment.vnp_transaction_no = payment_result.transaction_id
+                    enqueue_event(
+                        db,
+                        SHOWTIME_REFUND_EVENT,
+                        {
+                            "order_id": order_id,
+                            "payment_id": payment.payment_id,
+                            "payment_method": payment.payment_method.value,
+                            "amount": payment.amount,
+                            "reason": f"Hoan tien don {order_id}: khong con ghe de xuat ve",
+                            "requested_by": "system",
+                        },
+                        aggregate_id=order_id,
+                    )
+                    result["refund"] = "queued"
+                self._finish_callback(payment, CallbackStateEnum.rejected, result)
                 db.commit()
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"{len(expired_reservations)} reservation(s) have expired. Cannot process payment. Payment has been marked as FAILED."
-                )
+                after_commit.append(partial(self._publish_result, order_id, result))
+                raise HTTPException(status_code=400, detail=rejection)
             
-            # 4. Có reservations hợp lệ → Cập nhật VNPay transaction number trước
-            vnpay_payment = db.query(VNPayPayment).filter_by(payment_id=payment.payment_id).first()
+            # 4. Có reservations hợp lệ → Cập nhật VNPay transaction number
             if vnpay_payment and payment_result.transaction_id:
                 vnpay_payment.vnp_transaction_no = payment_result.transaction_id
-                db.commit()
             
-            # 5. Tạo tickets (trong một transaction riêng để đảm bảo atomic)
-            success_result = self.process_successful_payment(db, order_id, payment_result)
+            # 5. Tạo tickets (cùng transaction DB, chưa commit)
+            success_result = self.process_successful_payment(db, payment, reservations, payment_result, booking_code)
             
-            # 6. CHỈ CẬP NHẬT payment success SAU KHI tạo vé thành công
+            # 6. Cập nhật payment success và commit MỘT lần cho toàn bộ đơn
             payment.payment_status = PaymentStatusEnum.SUCCESS
-            if vnpay_payment:
-                vnpay_payment.payment_status = PaymentStatusEnum.SUCCESS
-            if success_result.get("transaction_id"):
-                payment.transaction_id = success_result["transaction_id"]
-            
-            db.commit()
-            
-            return {
+            result = {
                 "status": "success",
                 "payment_status": payment.payment_status.value,
                 "order_id": order_id,
                 "vnp_transaction_no": getattr(payment, 'vnp_transaction_no', None),
                 **success_result
             }
+            self._finish_callback(payment, CallbackStateEnum.completed, result)
+            user_id = payment.user_id
+            db.commit()
+            after_commit.append(partial(self._publish_result, order_id, result))
+            after_commit.append(partial(invalidate_user_bookings, [user_id]))
+            return result
             
         except HTTPException:
             # Re-raise HTTP exceptions as-is
+            db.rollback()
             raise
         except Exception as e:
             db.rollback()
-            print(traceback.format_exc())
+            logger.exception(f"❌ Cập nhật thanh toán {order_id} thất bại")
             raise HTTPException(status_code=500, detail=str(e))
 
-    def process_successful_payment(self, db: Session, order_id: str, payment_result: PaymentResult) -> Dict[str, Any]:
+    def process_successful_payment(
+        self,
+        db: Session,
+        payment: Payment,
+        reservations,
+        payment_result: PaymentResult,
+        booking_code: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """
         Xử lý sau khi thanh toán thành công - tạo ticket và cập nhật reservation
         
-        LƯU Ý: Method này CHỈ được gọi SAU KHI đã validate reservations trong update_payment_status
+        LƯU Ý: Method này CHỈ được gọi SAU KHI đã validate reservations trong update_payment_status.
+        Không commit - update_payment_status commit một lần sau khi cập nhật payment.
+        booking_code: mã đã cấp sẵn ngoài event loop (update_payment_status_async), None → cấp tại đây
         """
-        try:
-            # 0. Lấy payment để biết payment_id
-            payment = self.get_payment_by_order_id(db, order_id)
-            if not payment:
-                raise HTTPException(status_code=404, detail=f"Payment not found for order_id: {order_id}")
-            
-            # Get user information
-            user = db.query(Users).filter(Users.user_id == payment.user_id).first()
-            if not user:
-                raise HTTPException(status_code=404, detail=f"User not found for payment")
-
-            # Get transaction
-            transaction = db.query(Transaction).filter(
-                Transaction.payment_id == payment.payment_id
-            ).first()
-            if not transaction:
-                raise HTTPException(status_code=404, detail=f"Transaction not found for payment_id: {payment.payment_id}")
-
-            # Get reservations (đã được validate ở update_payment_status)
-            reservations = db.query(SeatReservations).filter(
-                SeatReservations.payment_id == payment.payment_id,
-                SeatReservations.status == 'pending'
-            ).all()
-
-            if not reservations:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"CRITICAL: No pending reservations found for payment_id: {payment.payment_id}"
-                )
-
-            created_tickets = []
-            reservation_ids = []
-
-            # Sinh booking_code duy nhất cho đơn đặt vé này
-            def generate_booking_code():
-                now = datetime.now()
-                rand = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
-                return f"BK{now.strftime('%Y%m%d')}{rand}"
-            
-            booking_code = generate_booking_code()
-
-            # Thu thập thông tin để gửi email
-            seats_list = []
-            movie_title = 'Unknown'
-            showtime_str = 'Unknown'
-
-            for reservation in reservations:
-                reservation_ids.append(reservation.reservation_id)
-
-                # Tính giá vé chính xác
-                correct_price = self.calculate_ticket_price(
-                    db,
-                    reservation.seat_id,
-                    reservation.showtime_id
-                )
-
-                # Lấy thông tin ghế trước khi tạo QR code
-                seat = db.query(Seats).filter(Seats.seat_id == reservation.seat_id).first()
-                seat_code = seat.seat_code if seat else f"seat_{reservation.seat_id}"
-                seats_list.append(seat_code)
-
-                # Tạo Ticket với booking_code
-                ticket_user_id = reservation.user_id or transaction.user_id or getattr(payment, 'user_id', None)
-                # Chuỗi QR code payload cho từng vé (có thể tuỳ chỉnh thêm thông tin nếu muốn)
-                qr_code_payload = f"Mã đặt vé: {booking_code}\nKhách hàng: {user.full_name or user.name or 'Customer'}\nPhim: {movie_title}\nSuất chiếu: {showtime_str}\nGhế: {seat_code}"
-
-                qr = qrcode.QRCode(
-                    version=1,
-                    error_correction=qrcode.constants.ERROR_CORRECT_L,
-                    box_size=10,
-                    border=4,
-                )
-                qr.add_data(qr_code_payload)
-                qr.make(fit=True)
-                img = qr.make_image(fill_color="black", back_color="white")
-                buf = BytesIO()
-                img.save(buf, format="PNG")
-                qr_code_base64 = base64.b64encode(buf.getvalue()).decode("utf-8")
-                db_ticket = Tickets(
-                    user_id=ticket_user_id,
-                    showtime_id=reservation.showtime_id,
-                    seat_id=reservation.seat_id,
-                    promotion_id=None,
-                    price=correct_price,
-                    status='confirmed',
-                    transaction_id=transaction.transaction_id,
-                    booking_code=booking_code,
-                    qr_code=qr_code_base64
-                )
-                db.add(db_ticket)
-                db.flush()
-
-                # Cập nhật reservation
-                reservation.status = "confirmed"
-                reservation.transaction_id = transaction.transaction_id
-                created_tickets.append(db_ticket.ticket_id)
-
-                # ...đã chuyển lên trên...
-
-                # Lấy thông tin phim/suất chiếu từ reservation đầu tiên
-                if movie_title == 'Unknown' or showtime_str == 'Unknown':
-                    st = db.query(Showtimes).filter(Showtimes.showtime_id == reservation.showtime_id).first()
-                    if st:
-                        # Lấy tên phim
-                        if hasattr(st, 'movie') and getattr(st, 'movie') is not None:
-                            movie_title = getattr(st.movie, 'title', 'Unknown')
-                        else:
-                            mv = db.query(Movies).filter(Movies.movie_id == getattr(st, 'movie_id', None)).first()
-                            movie_title = mv.title if mv else 'Unknown'
-
-                        # Lấy thời gian chiếu
-                        dt = getattr(st, 'show_datetime', None)
-                        if dt is not None:
-                            try:
-                                showtime_str = dt.strftime('%Y-%m-%d %H:%M')
-                            except Exception:
-                                showtime_str = str(dt)
-                        else:
-                            if hasattr(st, 'start_time'):
-                                showtime_str = str(getattr(st, 'start_time'))
-                            elif hasattr(st, 'show_time'):
-                                showtime_str = str(getattr(st, 'show_time'))
-                            else:
-                                showtime_str = 'Unknown'
-
-
-            # Tích điểm cho user khi đặt vé online
-            if user:
-                total_points = 0
-                for ticket_id in created_tickets:
-                    ticket = db.query(Tickets).filter(Tickets.ticket_id == ticket_id).first()
-                    seat = db.query(Seats).filter(Seats.seat_id == ticket.seat_id).first()
-                    point_ratio = 1.0
-                    if seat.seat_type == SeatTypeEnum.vip:
-                        point_ratio = 1.5
-                    elif seat.seat_type == SeatTypeEnum.couple:
-                        point_ratio = 2.0
-                    points = int((ticket.price / 10000) * point_ratio)
-                    total_points += points
-                user.loyalty_points += total_points
-                db.commit()
-                print(f"[LOYALTY] Cộng {total_points} điểm cho user {user.user_id} khi đặt vé online.")
-
-            # Cập nhật transaction
-            transaction.status = TransactionStatus.success
-            transaction.payment_ref_code = payment_result.transaction_id
-            db.commit()
-
-            # --- GỬI EMAIL (BỌC TRY-EXCEPT ĐỂ KHÔNG CRASH NẾU LỖI) ---
-            try:
-                self.send_booking_email(
-                    user=user,
-                    booking_code=booking_code,
-                    movie_title=movie_title,
-                    showtime_str=showtime_str,
-                    seats_list=seats_list
-                )
-            except Exception as email_error:
-                print(f"WARNING: Failed to send email for {booking_code}. Error: {email_error}")
-                print(traceback.format_exc())
-                # Không raise exception - vé đã tạo thành công
-
-            return {
-                "transaction_id": transaction.transaction_id,
-                "booking_code": booking_code,
-                "message": "Tickets created successfully"
-            }
-            
-        except HTTPException:
-            db.rollback()
-            raise
-        except Exception as e:
-            db.rollback()
-            print(traceback.format_exc())
-            raise HTTPException(status_code=500, detail=str(e))
+        # Get user information
+        user = db.query(Users).filter(Users.user_id == payment.user_id).first()
+        if not user:
+            raise HTTPException(status_code=404, detail=f"User not found for payment")
+
+        # Get transaction
+        transaction = db.query(Transaction).filter(
+            Transaction.payment_id == payment.payment_id
+        ).first()
+        if not transaction:
+            raise HTTPException(status_code=404, detail=f"Transaction not found for payment_id: {payment.payment_id}")
+
+        issued = issue_tickets(
+            db,
+            transaction=transaction,
+            reservations=reservations,
+            user=user,
+            payment_ref_code=payment_result.transaction_id,
+            fallback_user_id=payment.user_id,
+            booking_code=booking_code,
+        )
+        logger.debug(f"🎁 Cộng {issued['loyalty_points']} điểm cho user {user.user_id} khi đặt vé online")
 
-    def send_booking_email(self, user: Users, booking_code: str, movie_title: str, 
-                          showtime_str: str, seats_list: list):
-        """
-        Hàm gửi email tách riêng - không cần db session vì chỉ gửi email
-        
-        Raises:
-            Exception: Nếu gửi email thất bại
-        """
-        ticket_info = {
-            'booking_id': booking_code,
-            'customer_name': user.full_name or user.name or 'Customer',
-            'movie_name': movie_title,
-            'showtime': showtime_str,
-            'seats': seats_list
+        return {
+            "transaction_id": transaction.transaction_id,
+            "booking_code": issued["booking_code"],
+            "message": "Tickets created successfully"
         }
-        
-        email_service = EmailService(
-            smtp_server=settings.EMAIL_HOST,
-            smtp_port=settings.EMAIL_PORT,
-            username=settings.EMAIL_USERNAME,
-            password=settings.EMAIL_PASSWORD,
-            sender_name=settings.EMAIL_SENDER_NAME
-        )
-        
-        email_service.send_ticket_email(to_email=user.email, ticket_info=ticket_info)
 
     def calculate_ticket_price(self, db: Session, seat_id: int, showtime_id: int) -> int:
-
-        
-        seat = db.query(Seats).filter(Seats.seat_id == seat_id).first()
-        showtime = db.query(Showtimes).filter(Showtimes.showtime_id == showtime_id).first()
-        
-        if not seat or not showtime:
-            raise HTTPException(status_code=404, detail="Seat or Showtime not found")
-        
-        price = float(showtime.ticket_price)
-        
-        # Áp dụng hệ số nhân theo loại ghế
-        if seat.seat_type == SeatTypeEnum.vip:
-            price *= 1.5
-        elif seat.seat_type == SeatTypeEnum.couple:
-            price *= 2.0
-            
-        return int(price)
+        """Giá một ghế - dùng bảng giá đã cache của suất chiếu"""
+        return get_price_table(db, showtime_id).price_of(seat_id)
 
     def get_payment_by_order_id(self, db: Session, order_id: str) -> Optional[Payment]:
         """Lấy payment theo order_id"""
-        return db.query(Payment).filter(Payment.order_id == order_id).first()
\ No newline at end of file
+        return db.query(Payment).filter(Payment.order_id == order_id).first()
+
+    def get_payment_status(self, db: Session, order_id: str) -> Dict[str, Any]:
+        """Trạng thái thanh toán của một đơn (đọc xong toàn bộ cột trong session)"""
+        payment = self.get_payment_by_order_id(db, order_id)
+        if not payment:
+            raise HTTPException(status_code=404, detail="Payment not found")
+        return {
+            "order_id": order_id,
+            "status": payment.payment_status.value,
+            "amount": payment.amount,
+            "payment_method": payment.payment_method.value,
+            "transaction_id": getattr(payment, "vnp_transaction_no", None),
+            "created_at": payment.created_at,
+            "updated_at": payment.updated_at,
+            "result": payment.callback_result,
+            "message": "Payment status retrieved successfully"
+        }
+
+    def _estimate_count(self, db: Session, query) -> int:
+        """
+        Tổng ước lượng từ planner (EXPLAIN) - O(1), không quét bảng.
+        Câu lệnh biên dịch với tham số bind (không ghép literal giá trị người dùng nhập vào SQL),
+        chạy qua driver vì text() sẽ hiểu %(...)s / dấu : trong câu đã biên dịch là tham số của nó;
+        giá trị đi qua bind processor của kiểu cột (Enum → tên) như khi SQLAlchemy tự thực thi.
+        """
+        connection = db.connection()
+        dialect = connection.dialect
+        if dialect.name != "postgresql":
+            return query.order_by(None).count()
+        compiled = query.order_by(None).statement.compile(dialect=dialect, compile_kwargs={"render_postcompile": True})
+        params = {}
+        for name, value in compiled.params.items():
+            bind = compiled.binds.get(name)
+            processor = bind.type.bind_processor(dialect) if bind is not None else None
+            params[name] = processor(value) if processor else value
+        plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def get_vnpay_history(
+        self,
+        db: Session,
+        user_id: Optional[int] = None,
+        order_id: Optional[str] = None,
+        status: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        limit: int = HISTORY_DEFAULT_LIMIT,
+        cursor: Optional[str] = None,
+        include_total: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Lịch sử thanh toán VNPay, phân trang keyset trên (created_at, payment_id) giảm dần:
+        mỗi trang là một lần quét index từ vị trí cursor, chi phí như nhau ở trang 1 hay trang 500.
+        - order_id: tìm theo tiền tố (LIKE 'abc%', dùng index varchar_pattern_ops)
+        - start_date / end_date: ngày ISO, so sánh với vnp_pay_date theo định dạng yyyyMMddHHmmss
+        - include_total: tổng ước lượng từ planner thay cho COUNT(*) trên toàn bộ bảng
+        """
+        if limit <= 0:
+            limit = HISTORY_DEFAULT_LIMIT
+        limit = min(limit, HISTORY_MAX_LIMIT)
+
+        query = db.query(VNPayPayment)
+        if user_id:
+            query = query.filter(VNPayPayment.user_id == user_id)
+        if order_id:
+            query = query.filter(VNPayPayment.order_id.like(f"{escape_like(order_id)}%", escape="\\"))
+        if status:
+            try:
+                query = query.filter(VNPayPayment.payment_status == PaymentStatusEnum[status])
+            except KeyError:
+                raise HTTPException(status_code=400, detail="Invalid status")
+        pay_date_from = to_vnp_pay_date(start_date)
+        pay_date_to = to_vnp_pay_date(end_date, end_of_day=True)
+        if pay_date_from:
+            query = query.filter(VNPayPayment.vnp_pay_date >= pay_date_from)
+        if pay_date_to:
+            query = query.filter(VNPayPayment.vnp_pay_date <= pay_date_to)
+
+        total = self._estimate_count(db, query) if include_total else None
+
+        # Cột của bảng payments (VNPayPayment.payment_id trỏ vào vnpay_payments) để khớp index keyset
+        created_at_col, payment_id_col = Payment.__table__.c.created_at, Payment.__table__.c.payment_id
+        if cursor:
+            cursor_created_at, cursor_payment_id = decode_history_cursor(cursor)
+            query = query.filter(tuple_(created_at_col, payment_id_col) < (cursor_created_at, cursor_payment_id))
+
+        # Lấy dư một bản ghi để biết còn trang sau hay không
+        rows = (
+            query.order_by(created_at_col.desc(), payment_id_col.desc())
+            .limit(limit + 1)
+            .all()
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        items = [
+            {
+                'payment_id': row.payment_id,
+                'order_id': row.order_id,
+                'vnp_txn_ref': row.vnp_txn_ref,
+                'vnp_transaction_no': row.vnp_transaction_no,
+                'vnp_bank_code': row.vnp_bank_code,
+                'vnp_card_type': row.vnp_card_type,
+                'vnp_pay_date': row.vnp_pay_date,
+                'vnp_response_code': row.vnp_response_code,
+                'amount': row.amount,
+                'payment_status': row.payment_status.value if row.payment_status else None,
+                'user_id': row.user_id,
+                'created_at': row.created_at,
+                'updated_at': row.updated_at,
+            }
+            for row in rows
+        ]
+        return {
+            'items': items,
+            'limit': limit,
+            'next_cursor': encode_history_cursor(rows[-1].created_at, rows[-1].payment_id) if has_more else None,
+            'has_more': has_more,
+            'total': total,
+            'total_is_estimate': include_total and db.get_bind().dialect.name == "postgresql",
+        }
@@ -0,0 +1,215 @@
+"""
+Pricing Service - Bảng giá vé theo suất chiếu
+Bảng giá (loại ghế -> giá, seat_id -> giá) được dựng MỘT lần cho mỗi suất chiếu
+bằng 2 truy vấn, cache trong process và bị vô hiệu hóa khi suất chiếu thay đổi.
+Có Redis: lệnh vô hiệu hóa được publish qua kênh pricing:invalidate để mọi worker uvicorn cùng xóa bảng giá;
+TTL ngắn giới hạn độ lệch khi không có Redis hoặc lỡ mất thông báo.
+Cả giỏ ghế được tính giá trong một lần gọi, không truy vấn theo từng ghế.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis_client import redis_client
+from app.models.seat_templates import SeatTypeEnum
+from app.models.seats import Seats
+from app.models.showtimes import FormatTypeEnum, Showtimes
+
+# Hệ số nhân theo loại ghế
+SEAT_TYPE_MULTIPLIERS: Dict[SeatTypeEnum, float] = {
+    SeatTypeEnum.regular: 1.0,
+    SeatTypeEnum.vip: 1.5,
+    SeatTypeEnum.couple: 2.0,
+}
+
+# Phụ thu theo định dạng phim (VND) - hiện chưa áp dụng
+FORMAT_SURCHARGES: Dict[FormatTypeEnum, int] = {
+    FormatTypeEnum.TWO_D: 0,
+    FormatTypeEnum.THREE_D: 0,
+    FormatTypeEnum.IMAX: 0,
+    FormatTypeEnum.FOUR_D: 0,
+}
+
+# Phụ thu theo khung giờ: (giờ bắt đầu, giờ kết thúc, VND) - hiện chưa áp dụng
+DAY_PART_SURCHARGES: List[Tuple[int, int, int]] = []
+
+logger = logging.getLogger(__name__)
+
+# Thời gian sống của bảng giá trong cache (giây): độ lệch tối đa giữa các worker khi không có Redis
+PRICE_TABLE_TTL_SECONDS = 60
+PRICE_INVALIDATION_CHANNEL = "pricing:invalidate"
+
+
+def get_point_ratio(seat_type) -> float:
+    """Hệ số tích điểm theo loại ghế (trùng với hệ số giá)"""
+    return SEAT_TYPE_MULTIPLIERS.get(seat_type, 1.0)
+
+
+def _day_part_surcharge(show_datetime: Optional[datetime]) -> int:
+    if not show_datetime:
+        return 0
+    for start_hour, end_hour, amount in DAY_PART_SURCHARGES:
+        if start_hour <= show_datetime.hour < end_hour:
+            return amount
+    return 0
+
+
+class ShowtimePriceTable:
+    """Bảng giá bất biến của một suất chiếu"""
+
+    def __init__(self, showtime_id: int, base_price: float, surcharge: int, seat_types: Dict[int, SeatTypeEnum]):
+        self.showtime_id = showtime_id
+        self.base_price = base_price
+        self.surcharge = surcharge
+        # Giá theo loại ghế, giữ nguyên cách làm tròn cũ: int(giá gốc * hệ số)
+        self.seat_type_prices: Dict[SeatTypeEnum, int] = {
+            seat_type: int(base_price * multiplier) + surcharge
+            for seat_type, multiplier in SEAT_TYPE_MULTIPLIERS.items()
+        }
+        self.seat_types = seat_types
+        self.seat_prices: Dict[int, int] = {
+            seat_id: self.seat_type_prices.get(seat_type, int(base_price) + surcharge)
+            for seat_id, seat_type in seat_types.items()
+        }
+
+    def price_of(self, seat_id: int) -> int:
+        try:
+            return self.seat_prices[seat_id]
+        except KeyError:
+            raise HTTPException(status_code=404, detail=f"Seat {seat_id} not found in showtime {self.showtime_id}")
+
+    def price_cart(self, seat_ids: Iterable[int]) -> Dict[int, int]:
+        """Tính giá cho cả giỏ ghế: seat_id -> giá"""
+        seat_ids = list(seat_ids)
+        missing = [seat_id for seat_id in seat_ids if seat_id not in self.seat_prices]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Seats {missing} not found in showtime {self.showtime_id}")
+        return {seat_id: self.seat_prices[seat_id] for seat_id in seat_ids}
+
+
+_cache: Dict[int, Tuple[ShowtimePriceTable, float]] = {}
+_cache_lock = threading.Lock()
+
+
+def build_price_table(db: Session, showtime_id: int) -> ShowtimePriceTable:
+    """Dựng bảng giá: 1 truy vấn suất chiếu + 1 truy vấn toàn bộ ghế của phòng"""
+    showtime = db.query(Showtimes).filter(Showtimes.showtime_id == showtime_id).first()
+    if not showtime:
+        raise HTTPException(status_code=404, detail="Seat or Showtime not found")
+    rows = db.query(Seats.seat_id, Seats.seat_type).filter(Seats.room_id == showtime.room_id).all()
+    surcharge = FORMAT_SURCHARGES.get(showtime.format, 0) + _day_part_surcharge(showtime.show_datetime)
+    return ShowtimePriceTable(
+        showtime_id=showtime_id,
+        base_price=float(showtime.ticket_price),
+        surcharge=surcharge,
+        seat_types={seat_id: seat_type for seat_id, seat_type in rows},
+    )
+
+
+def get_price_table(db: Session, showtime_id: int) -> ShowtimePriceTable:
+    """Lấy bảng giá từ cache, dựng lại nếu chưa có hoặc đã hết hạn"""
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(showtime_id)
+    if cached and cached[1] > now:
+        return cached[0]
+    table = build_price_table(db, showtime_id)
+    with _cache_lock:
+        _cache[showtime_id] = (table, now + PRICE_TABLE_TTL_SECONDS)
+    return table
+
+
+def price_cart(db: Session, showtime_id: int, seat_ids: Iterable[int]) -> Dict[int, int]:
+    """Tính giá cả giỏ ghế của một suất chiếu trong một lần gọi"""
+    return get_price_table(db, showtime_id).price_cart(seat_ids)
+
+
+def price_reservations(db: Session, reservations) -> Dict[int, int]:
+    """Tính giá cho danh sách reservation (có thể thuộc nhiều suất chiếu): reservation_id -> giá"""
+    by_showtime: Dict[int, list] = {}
+    for reservation in reservations:
+        by_showtime.setdefault(reservation.showtime_id, []).append(reservation)
+    prices: Dict[int, int] = {}
+    for showtime_id, items in by_showtime.items():
+        table = get_price_table(db, showtime_id)
+        for reservation in items:
+            prices[reservation.reservation_id] = table.price_of(reservation.seat_id)
+    return prices
+
+
+def _drop_local(showtime_id: Optional[int]) -> None:
+    with _cache_lock:
+        if showtime_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(showtime_id, None)
+
+
+def invalidate_price_table(showtime_id: Optional[int] = None) -> None:
+    """
+    Xóa bảng giá khỏi cache (None = xóa toàn bộ, VD khi sơ đồ ghế thay đổi) - gọi SAU KHI đã commit.
+    Có Redis: publish để các worker khác cũng xóa; lỗi Redis chỉ ghi log (TTL vẫn giới hạn độ lệch).
+    """
+    _drop_local(showtime_id)
+    if redis_client:
+        try:
+            redis_client.publish(PRICE_INVALIDATION_CHANNEL, json.dumps({"showtime_id": showtime_id}))
+        except Exception as e:
+            logger.warning(f"⚠️ Không publish được lệnh xóa bảng giá {showtime_id}: {e}")
+
+
+class PriceTableInvalidator:
+    """Nhận lệnh xóa bảng giá từ mọi worker qua Redis pub/sub và xóa cache trong process này"""
+
+    def __init__(self):
+        self._listener: Optional[asyncio.Task] = None
+
+    async def _listen_redis(self):
+        client = aioredis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            password=settings.REDIS_PASSWORD or None,
+            decode_responses=True,
+        )
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(PRICE_INVALIDATION_CHANNEL)
+            async for item in pubsub.listen():
+                if item.get("type") != "message":
+                    continue
+                try:
+                    _drop_local(json.loads(item["data"]).get("showtime_id"))
+                except (ValueError, AttributeError):
+                    logger.warning(f"⚠️ Bỏ qua lệnh xóa bảng giá không hợp lệ: {item['data']!r}")
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+    def start(self):
+        if redis_client and self._listener is None:
+            self._listener = asyncio.create_task(self._listen_redis())
+            logger.info("🚀 Bảng giá: nhận lệnh vô hiệu hóa qua Redis pub/sub")
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener = None
+
+
+# Instance toàn cục
+price_table_invalidator = PriceTableInvalidator()
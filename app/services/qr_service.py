@@ -0,0 +1,159 @@
+"""
+QR Service - Dịch vụ render QR dùng chung cho thanh toán, email và API vé
+- Cache theo nội dung: key = sha256(định dạng, kích thước, payload), cùng payload chỉ render một lần;
+  ảnh QR của vé / đơn (payload xác định theo vé) truyền subject → key = (vé, định dạng, kích thước)
+- Render PNG/SVG (CPU-bound) được đẩy sang process pool, không chạy trên thread xử lý request
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Optional
+
+import qrcode
+import qrcode.image.svg
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+QR_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+DEFAULT_BOX_SIZE = 10
+DEFAULT_BORDER = 4
+MAX_BOX_SIZE = 40
+
+_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_cache_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def qr_cache_key(
+    payload: str,
+    fmt: str = "png",
+    box_size: int = DEFAULT_BOX_SIZE,
+    border: int = DEFAULT_BORDER,
+    subject: Optional[str] = None,
+) -> str:
+    """
+    Key của ảnh QR (cũng dùng làm ETag). subject (vd. "ticket:42"): payload chỉ phụ thuộc subject
+    nên key = (subject, định dạng, kích thước), không băm lại token mỗi lần
+    """
+    if subject is not None:
+        return f"{subject}:{fmt}:{box_size}:{border}"
+    digest = hashlib.sha256()
+    digest.update(f"{fmt}:{box_size}:{border}:".encode("utf-8"))
+    digest.update(payload.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _render(payload: str, fmt: str, box_size: int, border: int) -> bytes:
+    """Render QR thực sự - chạy trong process con"""
+    qr = qrcode.QRCode(
+        version=None,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=box_size,
+        border=border,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+    buf = BytesIO()
+    if fmt == "svg":
+        # SvgPathImage: một <path> duy nhất, nhỏ gọn hơn nhiều so với mỗi ô một <rect>
+        img = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+        img.save(buf)
+    else:
+        img = qr.make_image(fill_color="black", back_color="white")
+        img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if settings.QR_PROCESS_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=settings.QR_PROCESS_WORKERS)
+        return _pool
+
+
+def _validate(fmt: str, box_size: int, border: int) -> None:
+    if fmt not in QR_FORMATS:
+        raise ValueError(f"Unsupported QR format: {fmt}")
+    if not 1 <= box_size <= MAX_BOX_SIZE or not 0 <= border <= 10:
+        raise ValueError("Invalid QR size")
+
+
+def _cache_get(key: str) -> Optional[bytes]:
+    with _cache_lock:
+        data = _cache.get(key)
+        if data is not None:
+            _cache.move_to_end(key)
+        return data
+
+
+def _cache_put(key: str, data: bytes) -> None:
+    with _cache_lock:
+        _cache[key] = data
+        _cache.move_to_end(key)
+        while len(_cache) > settings.QR_CACHE_MAX_ITEMS:
+            _cache.popitem(last=False)
+
+
+def render_qr(
+    payload: str,
+    fmt: str = "png",
+    box_size: int = DEFAULT_BOX_SIZE,
+    border: int = DEFAULT_BORDER,
+    subject: Optional[str] = None,
+) -> bytes:
+    """Render QR (đồng bộ) - dùng từ worker/thread. Ảnh đã render được lấy lại từ cache."""
+    _validate(fmt, box_size, border)
+    key = qr_cache_key(payload, fmt, box_size, border, subject)
+    data = _cache_get(key)
+    if data is not None:
+        return data
+    pool = _get_pool()
+    if pool is None:
+        data = _render(payload, fmt, box_size, border)
+    else:
+        data = pool.submit(_render, payload, fmt, box_size, border).result()
+    _cache_put(key, data)
+    return data
+
+
+async def render_qr_async(
+    payload: str,
+    fmt: str = "png",
+    box_size: int = DEFAULT_BOX_SIZE,
+    border: int = DEFAULT_BORDER,
+    subject: Optional[str] = None,
+) -> bytes:
+    """Render QR từ code async (endpoint) mà không chặn event loop"""
+    _validate(fmt, box_size, border)
+    key = qr_cache_key(payload, fmt, box_size, border, subject)
+    data = _cache_get(key)
+    if data is not None:
+        return data
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    if pool is None:
+        data = await asyncio.to_thread(_render, payload, fmt, box_size, border)
+    else:
+        data = await loop.run_in_executor(pool, _render, payload, fmt, box_size, border)
+    _cache_put(key, data)
+    return data
+
+
+def shutdown_qr_pool() -> None:
+    """Đóng process pool khi ứng dụng dừng"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,93 @@
+"""
+Refund Service - Hoàn tiền giao dịch VNPay qua API refund (merchant_webapi)
+Được gọi từ worker outbox (đồng bộ, trong thread) - raise để worker retry / dead-letter.
+"""
+
+import logging
+import unicodedata
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.payments import VNPayPayment
+from app.payments.vnpay import sign_refund_request, verify_refund_response
+
+logger = logging.getLogger(__name__)
+
+VNP_DATE_FORMAT = '%Y%m%d%H%M%S'
+# vnp_TransactionType: 02 = hoàn toàn phần, 03 = hoàn một phần
+REFUND_FULL = "02"
+REFUND_PARTIAL = "03"
+# vnp_ResponseCode: 00 = thành công, 94 = yêu cầu trùng (đã hoàn trước đó)
+REFUND_OK = "00"
+REFUND_DUPLICATE = "94"
+
+
+def _order_info(text: str) -> str:
+    """vnp_OrderInfo: tiếng Việt không dấu, không ký tự đặc biệt (như create_vnpay_url)"""
+    nfkd_form = unicodedata.normalize('NFKD', text or "")
+    only_ascii = "".join(c for c in nfkd_form if not unicodedata.combining(c))
+    return "".join(c for c in only_ascii if c.isalnum() or c == " ")[:255] or "Hoan tien"
+
+
+def build_refund_body(payment: VNPayPayment, amount: int, reason: str, requested_by: str) -> Dict[str, Any]:
+    """Body refund đã ký cho một payment VNPay (vnp_TransactionDate = thời điểm tạo URL thanh toán)"""
+    created_at = payment.created_at or datetime.now(timezone.utc)
+    return sign_refund_request(
+        {
+            "vnp_RequestId": uuid.uuid4().hex[:32],
+            "vnp_Version": "2.1.0",
+            "vnp_Command": "refund",
+            "vnp_TmnCode": settings.VNPAY_TMN_CODE,
+            "vnp_TransactionType": REFUND_FULL if amount >= payment.amount else REFUND_PARTIAL,
+            "vnp_TxnRef": payment.order_id,
+            "vnp_Amount": int(amount) * 100,
+            "vnp_TransactionNo": payment.vnp_transaction_no or "0",
+            "vnp_TransactionDate": created_at.astimezone().strftime(VNP_DATE_FORMAT),
+            "vnp_CreateBy": requested_by,
+            "vnp_CreateDate": datetime.now().strftime(VNP_DATE_FORMAT),
+            "vnp_IpAddr": payment.client_ip or "127.0.0.1",
+            "vnp_OrderInfo": _order_info(reason),
+        },
+        settings.VNPAY_HASH_SECRET_KEY,
+    )
+
+
+def refund_payment(payment_id: Optional[int], amount: int, reason: str, requested_by: str = "system") -> str:
+    """
+    Hoàn tiền cho payment_id. Trả về:
+    - "refunded": VNPay đã hoàn tiền
+    - "already_refunded": VNPay báo yêu cầu trùng (đã hoàn ở lần thử trước)
+    - "manual": không phải giao dịch VNPay (thanh toán tại quầy) → hoàn tiền tại quầy
+    """
+    if payment_id is None:
+        return "manual"
+    db = SessionLocal()
+    try:
+        payment = db.query(VNPayPayment).filter(VNPayPayment.payment_id == payment_id).first()
+        if payment is None:
+            return "manual"
+        order_id = payment.order_id
+        body = build_refund_body(payment, amount, reason, requested_by)
+    finally:
+        db.close()
+
+    if not settings.VNPAY_API_URL:
+        raise RuntimeError("VNPAY_API_URL chưa cấu hình - không thể hoàn tiền VNPay")
+    response = httpx.post(settings.VNPAY_API_URL, json=body, timeout=30)
+    response.raise_for_status()
+    data = response.json()
+    if not verify_refund_response(data, settings.VNPAY_HASH_SECRET_KEY):
+        raise RuntimeError(f"Refund {order_id}: chữ ký response không hợp lệ")
+
+    response_code = data.get("vnp_ResponseCode")
+    if response_code == REFUND_OK:
+        logger.info(f"💸 Đã hoàn {amount} cho {order_id} (VNPay {data.get('vnp_TransactionNo')})")
+        return "refunded"
+    if response_code == REFUND_DUPLICATE:
+        return "already_refunded"
+    raise RuntimeError(f"Refund {order_id} bị từ chối: {response_code} {data.get('vnp_Message')}")
@@ -1,285 +1,260 @@
 from datetime import datetime, timedelta, timezone
-import json
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-import asyncio
 
 from app.models.seat_reservations import SeatReservations
 from app.models.seats import Seats
-from app.models.showtimes import Showtimes
+from app.models.showtimes import Showtimes, StatusShowtimeEnum
 from app.schemas.reservations import SeatReservationsCreate, SeatReservationsResponse
 
+# Thời gian giữ ghế chờ thanh toán
+RESERVATION_HOLD_MINUTES = 10
+
+# Service chạy trên AsyncSession (asyncpg): truy vấn DB không chặn event loop,
+# nên broadcast WebSocket cho các client khác không bị trễ khi nhiều người cùng đặt ghế.
+
+
+def _active_reservation_filter(showtime_id: int, seat_ids: List[int]):
+    """Ghế đang bị giữ: đã xác nhận hoặc pending chưa hết hạn"""
+    return and_(
+        SeatReservations.showtime_id == showtime_id,
+        SeatReservations.seat_id.in_(seat_ids),
+        or_(
+            SeatReservations.status == 'confirmed',
+            and_(
+                SeatReservations.status == 'pending',
+                SeatReservations.expires_at > datetime.now(timezone.utc)
+            )
+        )
+    )
+
+
+async def _get_showtime(db: AsyncSession, showtime_id: int) -> Showtimes:
+    showtime = await db.get(Showtimes, showtime_id)
+    if not showtime:
+        raise HTTPException(status_code=404, detail="Showtime not found")
+    return showtime
+
 
 #Lấy danh sách các ghế đã đặt
-def get_reserved_seats(showtime_id: int, db: Session):
+async def get_reserved_seats(showtime_id: int, db: AsyncSession):
     try:
-        showtime = db.query(Showtimes).filter(Showtimes.showtime_id == showtime_id).first()
-        if not showtime:
-            raise HTTPException(status_code=404, detail="Showtime not found")
+        await _get_showtime(db, showtime_id)
         # Lấy danh sách các ghế đã đặt cho showtime cụ thể
-        reserved_seats = db.query(SeatReservations).filter(
-            SeatReservations.showtime_id == showtime_id,
-            SeatReservations.status.in_(["confirmed", "pending"])
-        ).all()
-        
+        reserved_seats = (await db.scalars(
+            select(SeatReservations).where(
+                SeatReservations.showtime_id == showtime_id,
+                SeatReservations.status.in_(["confirmed", "pending"])
+            )
+        )).all()
+
         return [SeatReservationsResponse.from_orm(reservation) for reservation in reserved_seats]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-    
+
+
 # Tạo một hàm để tạo đặt chỗ
-def create_reserved_seats(reservation_in : SeatReservationsCreate , db : Session):
+async def create_reserved_seats(reservation_in: SeatReservationsCreate, db: AsyncSession):
+    reservations = await create_multiple_reserved_seats([reservation_in], db)
+    return reservations[0]
+
+
+# Tạo nhiều reservations cùng lúc
+async def create_multiple_reserved_seats(reservations_in: List[SeatReservationsCreate], db: AsyncSession):
+    """
+    Giữ nhiều ghế trong một transaction với số truy vấn cố định:
+    kiểm tra suất chiếu, ghế và xung đột bằng IN (...), INSERT nhiều dòng, một broadcast WebSocket.
+    """
+    if not reservations_in:
+        return []
     try:
-        showtime = db.query(Showtimes).filter(Showtimes.showtime_id == reservation_in.showtime_id).first()
-        seat = db.query(Seats).filter(Seats.seat_id == reservation_in.seat_id).first()
-        if not showtime:
-            raise HTTPException(status_code=404 , detail="Showtime not found")
-        if not seat:
-            raise HTTPException(status_code=404 , detail="Seat not found")
-        existing_reservation = db.query(SeatReservations).filter(
-            SeatReservations.showtime_id == reservation_in.showtime_id,
-            SeatReservations.seat_id == reservation_in.seat_id,
-            or_(
-                SeatReservations.status == 'confirmed',
-                and_(
-                    SeatReservations.status == 'pending',
-                    SeatReservations.expires_at > datetime.now(timezone.utc)
-                )
-            )
-        ).first()
+        showtime_ids = {reservation_in.showtime_id for reservation_in in reservations_in}
+        if len(showtime_ids) > 1:
+            raise HTTPException(status_code=400, detail="All seats must belong to the same showtime")
+        showtime_id = reservations_in[0].showtime_id
+        seat_ids = [reservation_in.seat_id for reservation_in in reservations_in]
+        if len(set(seat_ids)) != len(seat_ids):
+            raise HTTPException(status_code=400, detail="Duplicate seats in request")
+
+        showtime = await _get_showtime(db, showtime_id)
+        if showtime.status == StatusShowtimeEnum.cancelled:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Showtime has been cancelled")
+        found_seat_ids = set((await db.scalars(select(Seats.seat_id).where(Seats.seat_id.in_(seat_ids)))).all())
+        if len(found_seat_ids) != len(set(seat_ids)):
+            raise HTTPException(status_code=404, detail="Seat not found")
+
+        # Check existing reservations
+        existing_reservation = (await db.scalars(
+            select(SeatReservations).where(_active_reservation_filter(showtime_id, seat_ids)).limit(1)
+        )).first()
         if existing_reservation:
             if existing_reservation.status == 'confirmed':
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT, 
-                    detail=f"Seat {reservation_in.seat_id} for showtime {reservation_in.showtime_id} is already confirmed."
-                )
-            elif existing_reservation.status == 'pending':
                 raise HTTPException(
                     status_code=status.HTTP_409_CONFLICT,
-                    detail=f"Seat {reservation_in.seat_id} for showtime {reservation_in.showtime_id} is temporarily reserved and not yet expired."
-                )
-            
-        current_utc_time = datetime.now(timezone.utc)
-        calculated_expires_at = current_utc_time + timedelta(minutes=10)
-
-        db_reservation = SeatReservations(
-            seat_id=reservation_in.seat_id,
-            showtime_id=reservation_in.showtime_id,
-            user_id=reservation_in.user_id,
-            session_id=reservation_in.session_id,
-            expires_at=calculated_expires_at,
-            status="pending"
-        )
-
-        db.add(db_reservation)
-        db.commit()
-        db.refresh(db_reservation) 
-
-        # Gửi thông báo WebSocket realtime (không chặn luong chính)
-        try:
-            from app.core.websocket_manager import websocket_manager
-            # Tạo task bất đồng bộ để thông báo ghế đã được đặt
-            asyncio.create_task(
-                websocket_manager.send_seat_reserved(
-                    showtime_id=reservation_in.showtime_id,  # Suất chiếu
-                    seat_ids=[reservation_in.seat_id],       # Danh sách ghế được đặt
-                    user_session=reservation_in.session_id or ""  # Session người đặt
+                    detail=f"Seat {existing_reservation.seat_id} is already confirmed."
                 )
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Seat {existing_reservation.seat_id} is temporarily reserved."
             )
-        except Exception as ws_error:
-            # Không làm thất bại việc đặt ghế nếu WebSocket gặp lỗi
-            print(f"Thông báo WebSocket thất bại: {ws_error}")
-
-        return SeatReservationsResponse.from_orm(db_reservation)
-    except Exception as e :
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,detail= e)
 
+        # Một câu INSERT: bản ghi pending đã hết hạn nhưng chưa được dọn (chặn unique (seat_id, showtime_id))
+        # được ghi đè; ghế vừa bị người khác giữ sau bước kiểm tra trên thì bị bỏ qua → 409
+        now = datetime.now(timezone.utc)
+        calculated_expires_at = now + timedelta(minutes=RESERVATION_HOLD_MINUTES)
+        stmt = pg_insert(SeatReservations).values([
+            {
+                "seat_id": reservation_in.seat_id,
+                "showtime_id": reservation_in.showtime_id,
+                "user_id": reservation_in.user_id,
+                "session_id": reservation_in.session_id,
+                "expires_at": calculated_expires_at,
+                "status": "pending",
+            }
+            for reservation_in in reservations_in
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SeatReservations.seat_id, SeatReservations.showtime_id],
+            set_={
+                "user_id": stmt.excluded.user_id,
+                "session_id": stmt.excluded.session_id,
+                "expires_at": stmt.excluded.expires_at,
+                "status": stmt.excluded.status,
+                "reserved_at": func.now(),
+                "payment_id": None,
+                "transaction_id": None,
+            },
+            where=and_(SeatReservations.status == 'pending', SeatReservations.expires_at <= now),
+        ).returning(SeatReservations)
+        created_reservations = (await db.scalars(stmt, execution_options={"populate_existing": True})).all()
+        if len(created_reservations) != len(seat_ids):
+            claimed = {reservation.seat_id for reservation in created_reservations}
+            taken = [seat_id for seat_id in seat_ids if seat_id not in claimed]
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Seats {taken} are already reserved."
+            )
+        response = [SeatReservationsResponse.from_orm(res) for res in created_reservations]
+        await db.commit()
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-# Tạo nhiều reservations cùng lúc
-async def create_multiple_reserved_seats(reservations_in: List[SeatReservationsCreate], db: Session):
+    # Gửi thông báo WebSocket cho tất cả ghế được đặt cùng lúc
     try:
-        created_reservations = []
-        seat_ids = []
-        showtime_id = None
-        user_session = None
-        
-        for reservation_in in reservations_in:
-            showtime = db.query(Showtimes).filter(Showtimes.showtime_id == reservation_in.showtime_id).first()
-            seat = db.query(Seats).filter(Seats.seat_id == reservation_in.seat_id).first()
-            
-            if not showtime:
-                raise HTTPException(status_code=404, detail="Showtime not found")
-            if not seat:
-                raise HTTPException(status_code=404, detail="Seat not found")
-                
-            # Check existing reservations
-            existing_reservation = db.query(SeatReservations).filter(
-                SeatReservations.showtime_id == reservation_in.showtime_id,
-                SeatReservations.seat_id == reservation_in.seat_id,
-                or_(
-                    SeatReservations.status == 'confirmed',
-                    and_(
-                        SeatReservations.status == 'pending',
-                        SeatReservations.expires_at > datetime.now(timezone.utc)
-                    )
-                )
-            ).first()
-            
-            if existing_reservation:
-                if existing_reservation.status == 'confirmed':
-                    raise HTTPException(
-                        status_code=status.HTTP_409_CONFLICT,
-                        detail=f"Seat {reservation_in.seat_id} is already confirmed."
-                    )
-                elif existing_reservation.status == 'pending':
-                    raise HTTPException(
-                        status_code=status.HTTP_409_CONFLICT,
-                        detail=f"Seat {reservation_in.seat_id} is temporarily reserved."
-                    )
-            
-            current_utc_time = datetime.now(timezone.utc)
-            calculated_expires_at = current_utc_time + timedelta(minutes=10)
+        from app.core.websocket_manager import websocket_manager
+        # Thông báo realtime đến tất cả client đang xem suất chiếu này
+        await websocket_manager.send_seat_reserved(
+            showtime_id=showtime_id,    # Suất chiếu
+            seat_ids=seat_ids,          # Danh sách tất cả ghế vừa được đặt
+            user_session=reservations_in[0].session_id or ""  # Session người đặt
+        )
+    except Exception as ws_error:
+        print(f"Thông báo WebSocket đặt nhiều ghế thất bại: {ws_error}")
 
-            db_reservation = SeatReservations(
-                seat_id=reservation_in.seat_id,
-                showtime_id=reservation_in.showtime_id,
-                user_id=reservation_in.user_id,
-                session_id=reservation_in.session_id,
-                expires_at=calculated_expires_at,
-                status="pending"
-            )
+    return response
 
-            db.add(db_reservation)
-            seat_ids.append(reservation_in.seat_id)
-            showtime_id = reservation_in.showtime_id
-            user_session = reservation_in.session_id or ""
-            
-        db.commit()
-        
-        # Gửi thông báo WebSocket cho tất cả ghế được đặt cùng lúc
-        try:
-            from app.core.websocket_manager import websocket_manager
-            # Thông báo realtime đến tất cả client đang xem suất chiếu này
-            await websocket_manager.send_seat_reserved(
-                showtime_id=showtime_id,    # Suất chiếu
-                seat_ids=seat_ids,          # Danh sách tất cả ghế vừa được đặt
-                user_session=user_session   # Session người đặt
-            )
-        except Exception as ws_error:
-            print(f"Thông báo WebSocket đặt nhiều ghế thất bại: {ws_error}")
-        
-        # Refresh and return all created reservations
-        for reservation in created_reservations:
-            db.refresh(reservation)
-            
-        return [SeatReservationsResponse.from_orm(res) for res in created_reservations]
-        
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 # Giải phóng ghế (hủy reservation)
-async def cancel_seat_reservations(showtime_id: int, seat_ids: List[int], session_id: str, db: Session):
+async def cancel_seat_reservations(showtime_id: int, seat_ids: List[int], session_id: str, db: AsyncSession):
     try:
         # Validate showtime exists
-        showtime = db.query(Showtimes).filter(Showtimes.showtime_id == showtime_id).first()
-        if not showtime:
-            raise HTTPException(status_code=404, detail="Showtime not found")
-        
-        # Find reservations to cancel (chỉ pending và của session này)
-        reservations_to_cancel = db.query(SeatReservations).filter(
-            SeatReservations.showtime_id == showtime_id,
-            SeatReservations.seat_id.in_(seat_ids),
-            SeatReservations.session_id == session_id,
-            SeatReservations.status == 'pending'
-        ).all()
-        
-        if not reservations_to_cancel:
+        showtime = await _get_showtime(db, showtime_id)
+
+        # Xóa reservation pending của session này, lấy lại seat_id đã xóa trong cùng câu lệnh
+        cancelled_seat_ids = (await db.scalars(
+            delete(SeatReservations)
+            .where(
+                SeatReservations.showtime_id == showtime_id,
+                SeatReservations.seat_id.in_(seat_ids),
+                SeatReservations.session_id == session_id,
+                SeatReservations.status == 'pending'
+            )
+            .returning(SeatReservations.seat_id)
+        )).all()
+
+        if not cancelled_seat_ids:
             # Trả về thành công nhưng không có gì để hủy
             return {
                 "success": True,
                 "message": "No pending reservations found to cancel",
                 "cancelled_seats": []
             }
-        
-        cancelled_seat_ids = []
-        seat_codes = []
-        
-        for reservation in reservations_to_cancel:
-            # Lấy seat_code để gửi WebSocket
-            seat = db.query(Seats).filter(Seats.seat_id == reservation.seat_id).first()
-            if seat:
-                seat_codes.append(seat.seat_code)
-            
-            cancelled_seat_ids.append(reservation.seat_id)
-            db.delete(reservation)
-        
-        db.commit()
-        
-        # Gửi thông báo WebSocket về việc giải phóng ghế
-        try:
-            from app.core.websocket_manager import websocket_manager
-            # Thông báo realtime rằng các ghế đã được giải phóng
-            await websocket_manager.send_seat_released(
-                showtime_id=showtime_id,
-                seat_ids=cancelled_seat_ids
-            )
-            print(f"✅ WebSocket thông báo giải phóng {len(cancelled_seat_ids)} ghế cho showtime {showtime_id}")
-        except Exception as ws_error:
-            print(f"❌ Thông báo WebSocket giải phóng ghế thất bại: {ws_error}")
-        
-        # Lấy room_id từ showtime để frontend có thể invalidate seats cache
-        room_id = showtime.room_id if showtime else None
-        
-        return {
-            "success": True,
-            "message": f"Successfully cancelled {len(cancelled_seat_ids)} seat reservations",
-            "cancelled_seats": cancelled_seat_ids,
-            "seat_codes": seat_codes,
-            "showtime_id": showtime_id,
-            "session_id": session_id,
-            "room_id": room_id
-        }
-        
+
+        # Lấy seat_code để gửi WebSocket
+        seat_codes = (await db.scalars(
+            select(Seats.seat_code).where(Seats.seat_id.in_(cancelled_seat_ids))
+        )).all()
+        await db.commit()
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-#Xóa đặt chỗ tự động khi hết hạn  
-async def delete_expired_reservations(db: Session):
+    # Gửi thông báo WebSocket về việc giải phóng ghế
     try:
-        current_time = datetime.now(timezone.utc)
-        expired_reservations = db.query(SeatReservations).filter(
-            SeatReservations.status == 'pending',
-            SeatReservations.expires_at < current_time
-        ).all()
+        from app.core.websocket_manager import websocket_manager
+        # Thông báo realtime rằng các ghế đã được giải phóng
+        await websocket_manager.send_seat_released(
+            showtime_id=showtime_id,
+            seat_ids=list(cancelled_seat_ids)
+        )
+        print(f"✅ WebSocket thông báo giải phóng {len(cancelled_seat_ids)} ghế cho showtime {showtime_id}")
+    except Exception as ws_error:
+        print(f"❌ Thông báo WebSocket giải phóng ghế thất bại: {ws_error}")
 
-        # Nhóm các ghế theo suất chiếu để gửi thông báo WebSocket hiệu quả
-        showtime_seat_map = {}
-        for reservation in expired_reservations:
-            showtime_id = reservation.showtime_id
-            # Tạo map: showtime_id -> danh sách seat_id hết hạn
-            if showtime_id not in showtime_seat_map:
-                showtime_seat_map[showtime_id] = []
-            showtime_seat_map[showtime_id].append(reservation.seat_id)
-            db.delete(reservation)  # Xóa reservation hết hạn
+    return {
+        "success": True,
+        "message": f"Successfully cancelled {len(cancelled_seat_ids)} seat reservations",
+        "cancelled_seats": list(cancelled_seat_ids),
+        "seat_codes": list(seat_codes),
+        "showtime_id": showtime_id,
+        "session_id": session_id,
+        # room_id để frontend có thể invalidate seats cache
+        "room_id": showtime.room_id
+    }
 
-        db.commit()
-        
-        # Gửi thông báo WebSocket cho các ghế được giải phóng do hết hạn
-        try:
-            from app.core.websocket_manager import websocket_manager
-            # Gửi thông báo cho từng suất chiếu
-            for showtime_id, seat_ids in showtime_seat_map.items():
-                await websocket_manager.send_seat_released(
-                    showtime_id=showtime_id,  # Suất chiếu
-                    seat_ids=seat_ids         # Danh sách ghế hết hạn được giải phóng
-                )
-        except Exception as ws_error:
-            print(f"Thông báo WebSocket ghế hết hạn thất bại: {ws_error}")
-            
-        return len(expired_reservations)
-        
+
+#Xóa đặt chỗ tự động khi hết hạn
+async def delete_expired_reservations(db: AsyncSession):
+    try:
+        expired = (await db.execute(
+            delete(SeatReservations)
+            .where(
+                SeatReservations.status == 'pending',
+                SeatReservations.expires_at < datetime.now(timezone.utc)
+            )
+            .returning(SeatReservations.showtime_id, SeatReservations.seat_id)
+        )).all()
+        await db.commit()
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
\ No newline at end of file
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+    # Nhóm các ghế theo suất chiếu để gửi thông báo WebSocket hiệu quả
+    showtime_seat_map = {}
+    for showtime_id, seat_id in expired:
+        showtime_seat_map.setdefault(showtime_id, []).append(seat_id)
+
+    # Gửi thông báo WebSocket cho các ghế được giải phóng do hết hạn
+    try:
+        from app.core.websocket_manager import websocket_manager
+        for showtime_id, seat_ids in showtime_seat_map.items():
+            await websocket_manager.send_seat_released(
+                showtime_id=showtime_id,  # Suất chiếu
+                seat_ids=seat_ids         # Danh sách ghế hết hạn được giải phóng
+            )
+    except Exception as ws_error:
+        print(f"Thông báo WebSocket ghế hết hạn thất bại: {ws_error}")
+
+    return len(expired)
@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from app.models.rooms import Rooms
 from app.models.theaters import Theaters
 from app.schemas.seats import SeatsResponse
+from app.services.pricing_service import invalidate_price_table
 
 
 # Lấy thông tin phòng theo ID
@@ -132,6 +133,8 @@ def update_room(db: Session, room_id: int, room_in: RoomCreate):
             setattr(room, key, value)
         db.commit()
         db.refresh(room)
+        # Sơ đồ ghế của phòng có thể đã đổi -> bỏ toàn bộ bảng giá đã cache
+        invalidate_price_table()
         return room
     except Exception as e:
         db.rollback()
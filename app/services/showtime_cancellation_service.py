@@ -0,0 +1,286 @@
+"""
+Showtime Cancellation Service - Hủy suất chiếu hàng loạt (máy chiếu hỏng, sự cố phòng chiếu)
+- Đánh dấu suất chiếu cancelled và giải phóng ghế đang giữ trong một transaction ngắn
+  → không ai giữ ghế / thanh toán thêm được nữa
+- Hủy vé theo lô booking_code, mỗi lô một transaction: UPDATE ... RETURNING cho vé và giao dịch,
+  xóa reservation, trừ điểm tích lũy, cập nhật read model bookings, ghi outbox hoàn tiền + email cùng commit,
+  sau commit vô hiệu hóa cache "Vé của tôi" của các khách bị ảnh hưởng
+- Lô sau chỉ chọn vé chưa hủy → gọi lại được (resume) nếu bị gián đoạn giữa chừng
+- Hoàn tiền và email do lane outbox "cancellation" (có giới hạn tốc độ) xử lý sau commit
+Hàm đồng bộ chạy trên Session (gọi qua AsyncSession.run_sync); stream_showtime_cancellation
+điều phối các lô, broadcast WebSocket và trả tiến độ.
+"""
+
+import logging
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.gate_validator import gate_validator
+from app.models.movies import Movies
+from app.models.seat_reservations import SeatReservations
+from app.models.seats import Seats
+from app.models.showtimes import Showtimes, StatusShowtimeEnum
+from app.models.tickets import Tickets, TicketStatusEnum
+from app.models.transactions import Transaction, TransactionStatus
+from app.models.users import Users
+from app.services.bookings_service import refresh_bookings
+from app.services.outbox_handlers import SHOWTIME_CANCELLED_EMAIL_EVENT, SHOWTIME_REFUND_EVENT
+from app.services.outbox_service import enqueue_event
+from app.services.ticket_issuance_service import calculate_loyalty_points
+from app.services.user_bookings_cache import invalidate_user_bookings
+
+logger = logging.getLogger(__name__)
+
+CANCEL_REASON = "showtime_cancelled"
+
+
+def begin_showtime_cancellation(db: Session, showtime_id: int) -> Dict[str, Any]:
+    """
+    Bước 1: khóa suất chiếu, chuyển sang cancelled, xóa reservation pending (khách đang chọn ghế / thanh toán dở).
+    Gọi lại trên suất chiếu đã hủy vẫn hợp lệ: tiếp tục hủy các vé còn sót.
+    """
+    row = db.execute(
+        select(Showtimes.status, Showtimes.room_id, Showtimes.show_datetime, Movies.title)
+        .join(Movies, Movies.movie_id == Showtimes.movie_id)
+        .where(Showtimes.showtime_id == showtime_id)
+        .with_for_update(of=Showtimes)
+    ).first()
+    if row is None:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Showtime not found")
+    status, room_id, show_datetime, title = row
+
+    db.execute(
+        update(Showtimes)
+        .where(Showtimes.showtime_id == showtime_id)
+        .values(status=StatusShowtimeEnum.cancelled)
+    )
+    released_seat_ids = db.scalars(
+        delete(SeatReservations)
+        .where(SeatReservations.showtime_id == showtime_id, SeatReservations.status == 'pending')
+        .returning(SeatReservations.seat_id)
+    ).all()
+    total_tickets, total_bookings = db.execute(
+        select(func.count(Tickets.ticket_id), func.count(func.distinct(Tickets.booking_code)))
+        .where(Tickets.showtime_id == showtime_id, Tickets.status != TicketStatusEnum.cancelled)
+    ).one()
+    db.commit()
+
+    return {
+        "showtime_id": showtime_id,
+        "room_id": room_id,
+        "movie_title": title or 'Unknown',
+        "showtime": show_datetime.strftime('%Y-%m-%d %H:%M') if show_datetime else 'Unknown',
+        "already_cancelled": status == StatusShowtimeEnum.cancelled,
+        "total_tickets": total_tickets,
+        "total_bookings": total_bookings,
+        "released_seat_ids": list(released_seat_ids),
+    }
+
+
+def cancel_booking_chunk(
+    db: Session,
+    showtime: Dict[str, Any],
+    chunk_size: int,
+    reason: str,
+    requested_by: str,
+) -> Dict[str, Any]:
+    """
+    Bước 2 (lặp): hủy tối đa chunk_size booking chưa hủy của suất chiếu trong một transaction.
+    Số câu lệnh SQL cố định mỗi lô, không phụ thuộc số vé.
+    """
+    showtime_id = showtime["showtime_id"]
+    booking_codes = db.scalars(
+        select(Tickets.booking_code)
+        .where(Tickets.showtime_id == showtime_id, Tickets.status != TicketStatusEnum.cancelled)
+        .group_by(Tickets.booking_code)
+        .order_by(Tickets.booking_code)
+        .limit(chunk_size)
+    ).all()
+    if not booking_codes:
+        return {"bookings": 0, "tickets": 0, "refunds": 0, "emails": 0, "released_seat_ids": []}
+
+    tickets = db.execute(
+        update(Tickets)
+        .where(
+            Tickets.showtime_id == showtime_id,
+            Tickets.booking_code.in_(booking_codes),
+            Tickets.status != TicketStatusEnum.cancelled,
+        )
+        .values(status=TicketStatusEnum.cancelled, cancelled_at=datetime.now())
+        .returning(Tickets.booking_code, Tickets.transaction_id, Tickets.user_id, Tickets.seat_id, Tickets.price)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+    # Chỉ giao dịch đã thành công mới được hoàn tiền (lần chạy lại không hoàn trùng)
+    transaction_ids = {ticket.transaction_id for ticket in tickets if ticket.transaction_id}
+    refunded = db.execute(
+        update(Transaction)
+        .where(Transaction.transaction_id.in_(transaction_ids), Transaction.status == TransactionStatus.success)
+        .values(status=TransactionStatus.refunded)
+        .returning(Transaction.transaction_id, Transaction.payment_id, Transaction.total_amount, Transaction.payment_method)
+        .execution_options(synchronize_session=False)
+    ).all() if transaction_ids else []
+
+    seat_ids = [ticket.seat_id for ticket in tickets]
+    released_seat_ids = db.scalars(
+        delete(SeatReservations)
+        .where(SeatReservations.showtime_id == showtime_id, SeatReservations.seat_id.in_(seat_ids))
+        .returning(SeatReservations.seat_id)
+    ).all()
+    seats = {
+        seat_id: (seat_code, seat_type)
+        for seat_id, seat_code, seat_type in db.execute(
+            select(Seats.seat_id, Seats.seat_code, Seats.seat_type).where(Seats.seat_id.in_(seat_ids))
+        ).all()
+    }
+
+    # Gom vé theo booking, điểm tích lũy theo khách
+    bookings: Dict[str, Dict[str, Any]] = {}
+    points_by_user: Counter = Counter()
+    for ticket in tickets:
+        booking = bookings.setdefault(ticket.booking_code, {"user_id": ticket.user_id, "seats": [], "amount": 0})
+        seat_code, seat_type = seats.get(ticket.seat_id, (f"seat_{ticket.seat_id}", None))
+        booking["seats"].append(seat_code)
+        booking["amount"] += ticket.price or 0
+        booking["transaction_id"] = ticket.transaction_id
+        if ticket.user_id:
+            points_by_user[ticket.user_id] += calculate_loyalty_points([(ticket.price, seat_type)])
+
+    # Thu hồi điểm đã cộng khi xuất vé (không để âm nếu khách đã dùng điểm)
+    points_by_user = {user_id: points for user_id, points in points_by_user.items() if points}
+    if points_by_user:
+        db.execute(
+            update(Users)
+            .where(Users.user_id.in_(points_by_user))
+            .values(loyalty_points=func.greatest(
+                func.coalesce(Users.loyalty_points, 0) - case(points_by_user, value=Users.user_id, else_=0), 0
+            ))
+            .execution_options(synchronize_session=False)
+        )
+
+    refresh_bookings(db, bookings)
+
+    users = {
+        user_id: (email, full_name)
+        for user_id, email, full_name in db.execute(
+            select(Users.user_id, Users.email, Users.full_name)
+            .where(Users.user_id.in_({booking["user_id"] for booking in bookings.values() if booking["user_id"]}))
+        ).all()
+    }
+
+    booking_by_transaction = {booking["transaction_id"]: code for code, booking in bookings.items()}
+    refund_amounts = {}
+    for transaction in refunded:
+        booking_code = booking_by_transaction.get(transaction.transaction_id)
+        refund_amounts[booking_code] = transaction.total_amount
+        enqueue_event(
+            db,
+            SHOWTIME_REFUND_EVENT,
+            {
+                "showtime_id": showtime_id,
+                "booking_code": booking_code,
+                "transaction_id": transaction.transaction_id,
+                "payment_id": transaction.payment_id,
+                "payment_method": transaction.payment_method,
+                "amount": transaction.total_amount,
+                "reason": reason,
+                "requested_by": requested_by,
+            },
+            aggregate_id=booking_code,
+        )
+
+    emails = 0
+    for booking_code, booking in bookings.items():
+        email, full_name = users.get(booking["user_id"], (None, None))
+        if not email:
+            continue
+        enqueue_event(
+            db,
+            SHOWTIME_CANCELLED_EMAIL_EVENT,
+            {
+                "to_email": email,
+                "customer_name": full_name or 'Customer',
+                "booking_code": booking_code,
+                "movie_title": showtime["movie_title"],
+                "showtime": showtime["showtime"],
+                "seats": booking["seats"],
+                "refund_amount": refund_amounts.get(booking_code, booking["amount"]),
+                "reason": reason,
+            },
+            aggregate_id=booking_code,
+        )
+        emails += 1
+
+    db.commit()
+    invalidate_user_bookings(booking["user_id"] for booking in bookings.values())
+    gate_validator.invalidate([showtime_id])
+    return {
+        "bookings": len(bookings),
+        "tickets": len(tickets),
+        "refunds": len(refunded),
+        "emails": emails,
+        "released_seat_ids": list(released_seat_ids),
+    }
+
+
+async def start_showtime_cancellation(showtime_id: int) -> Dict[str, Any]:
+    """Bước 1 trên async stack; raise 404 trước khi response stream bắt đầu"""
+    async with AsyncSessionLocal() as db:
+        return await db.run_sync(begin_showtime_cancellation, showtime_id)
+
+
+async def stream_showtime_cancellation(
+    showtime: Dict[str, Any],
+    reason: str,
+    requested_by: str = "system",
+    chunk_size: Optional[int] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Hủy toàn bộ vé của suất chiếu theo lô, yield tiến độ sau mỗi lô
+    (started → progress... → done). Mỗi lô dùng session riêng: khóa dòng chỉ giữ trong một lô.
+    """
+    from app.core.websocket_manager import websocket_manager
+
+    chunk_size = chunk_size or settings.SHOWTIME_CANCEL_CHUNK_SIZE
+    showtime_id = showtime["showtime_id"]
+    started = time.perf_counter()
+    yield {
+        "type": "started",
+        **{key: val for key, val in showtime.items() if key != "released_seat_ids"},
+        "released_pending_seats": len(showtime["released_seat_ids"]),
+    }
+
+    try:
+        await websocket_manager.send_showtime_cancelled(showtime_id, reason)
+        if showtime["released_seat_ids"]:
+            await websocket_manager.send_seat_released(showtime_id, showtime["released_seat_ids"], reason=CANCEL_REASON)
+    except Exception as ws_error:
+        logger.warning(f"⚠️ Thông báo WebSocket hủy suất chiếu {showtime_id} thất bại: {ws_error}")
+
+    totals: Counter = Counter(bookings=0, tickets=0, refunds=0, emails=0, released_seats=0)
+    while True:
+        async with AsyncSessionLocal() as db:
+            chunk = await db.run_sync(cancel_booking_chunk, showtime, chunk_size, reason, requested_by)
+        if not chunk["bookings"]:
+            break
+        released_seat_ids = chunk.pop("released_seat_ids")
+        totals.update(chunk)
+        totals["released_seats"] += len(released_seat_ids)
+        try:
+            await websocket_manager.send_seat_released(showtime_id, released_seat_ids, reason=CANCEL_REASON)
+        except Exception as ws_error:
+            logger.warning(f"⚠️ Thông báo WebSocket giải phóng ghế {showtime_id} thất bại: {ws_error}")
+        yield {"type": "progress", "showtime_id": showtime_id, **totals}
+
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"🛑 Đã hủy suất chiếu {showtime_id}: {dict(totals)} trong {elapsed_ms}ms")
+    yield {"type": "done", "showtime_id": showtime_id, **totals, "elapsed_ms": elapsed_ms}
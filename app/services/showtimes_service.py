@@ -5,7 +5,8 @@ from app.models.showtimes import Showtimes
 from app.models.movies import Movies
 from fastapi import HTTPException
 from app.models.rooms import Rooms
-from app.schemas.showtimes import ShowtimesCreate, ShowtimesResponse
+from app.schemas.showtimes import ShowtimesCreate, ShowtimesResponse, ShowtimesUpdate
+from app.services.pricing_service import invalidate_price_table
 from typing import Optional
 from datetime import datetime, date
 
@@ -213,6 +214,28 @@ def bulk_create_showtimes(db: Session, showtimes_in: list[ShowtimesCreate]):
     return result
 
 
+# Cập nhật xuất chiếu theo id
+def update_showtime(db: Session, showtime_id: int, showtime_in: ShowtimesUpdate):
+    try:
+        showtime = (
+            db.query(Showtimes).filter(Showtimes.showtime_id == showtime_id).first()
+        )
+        if not showtime:
+            raise HTTPException(status_code=404, detail="Showtime not found")
+        for key, value in showtime_in.dict(exclude_unset=True).items():
+            setattr(showtime, key, value)
+        db.commit()
+        db.refresh(showtime)
+        # Giá vé / phòng / định dạng có thể đã đổi -> dựng lại bảng giá
+        invalidate_price_table(showtime_id)
+        return ShowtimesResponse.from_orm(showtime)
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # Xóa xuất chiếu theo id
 def delete_showtime(db: Session, showtime_id: int):
     try:
@@ -223,6 +246,7 @@ def delete_showtime(db: Session, showtime_id: int):
             raise HTTPException(status_code=404, detail="Showtime not found")
         db.delete(showtime)
         db.commit()
+        invalidate_price_table(showtime_id)
         return True
     except Exception as e:
         db.rollback()
@@ -0,0 +1,148 @@
+"""
+Ticket Issuance Service - Pipeline xuất vé hàng loạt cho đơn đã thanh toán
+Số câu lệnh SQL không phụ thuộc số ghế:
+  1 truy vấn ghế, 1 truy vấn suất chiếu/phim, 1 INSERT nhiều dòng cho vé,
+  1 UPDATE ... WHERE reservation_id IN (...), 1 UPDATE điểm tích lũy,
+  1 INSERT ... SELECT cho read model bookings.
+Pipeline KHÔNG commit - người gọi commit một lần cho toàn bộ đơn.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.core.booking_codes import next_booking_code
+from app.models.movies import Movies
+from app.models.seat_reservations import SeatReservations
+from app.models.seats import Seats
+from app.models.showtimes import Showtimes
+from app.models.tickets import Tickets, TicketStatusEnum
+from app.models.transactions import Transaction, TransactionStatus
+from app.models.users import Users
+from app.services.bookings_service import refresh_bookings
+from app.services.outbox_handlers import BOOKING_EMAIL_EVENT
+from app.services.outbox_service import enqueue_event
+from app.services.pricing_service import get_point_ratio, price_reservations
+
+
+def calculate_loyalty_points(prices_and_types) -> int:
+    """Điểm tích lũy: 1 điểm / 10.000đ nhân hệ số loại ghế, làm tròn xuống theo từng vé"""
+    return sum(int((price / 10000) * get_point_ratio(seat_type)) for price, seat_type in prices_and_types)
+
+
+def _showtime_labels(db: Session, showtime_ids: List[int]) -> Dict[int, Dict[str, str]]:
+    """Tên phim và giờ chiếu cho các suất chiếu của đơn (1 truy vấn)"""
+    rows = (
+        db.query(Showtimes.showtime_id, Showtimes.show_datetime, Movies.title)
+        .join(Movies, Movies.movie_id == Showtimes.movie_id)
+        .filter(Showtimes.showtime_id.in_(showtime_ids))
+        .all()
+    )
+    labels = {}
+    for showtime_id, show_datetime, title in rows:
+        labels[showtime_id] = {
+            "movie_title": title or 'Unknown',
+            "showtime": show_datetime.strftime('%Y-%m-%d %H:%M') if show_datetime else 'Unknown',
+        }
+    return labels
+
+
+def issue_tickets(
+    db: Session,
+    transaction: Transaction,
+    reservations: List[SeatReservations],
+    user: Optional[Users],
+    payment_ref_code: Optional[str] = None,
+    fallback_user_id: Optional[int] = None,
+    promotion_id: Optional[int] = None,
+    booking_code: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Xuất vé cho toàn bộ reservation của một đơn trong transaction hiện tại.
+    promotion_id: khuyến mãi áp dụng cho đơn (bán tại quầy), ghi vào từng vé.
+    booking_code: mã đã cấp sẵn (người gọi chạy trên event loop), None → cấp từ next_booking_code.
+    Trả về booking_code, danh sách ticket_id và số điểm đã cộng.
+    """
+    booking_code = booking_code or next_booking_code()
+    ticket_prices = price_reservations(db, reservations)
+
+    seat_ids = [reservation.seat_id for reservation in reservations]
+    seats = {
+        seat_id: (seat_code, seat_type)
+        for seat_id, seat_code, seat_type in db.query(Seats.seat_id, Seats.seat_code, Seats.seat_type)
+        .filter(Seats.seat_id.in_(seat_ids))
+        .all()
+    }
+    labels = _showtime_labels(db, list({reservation.showtime_id for reservation in reservations}))
+
+    rows = []
+    for reservation in reservations:
+        rows.append({
+            "user_id": reservation.user_id or transaction.user_id or fallback_user_id,
+            "showtime_id": reservation.showtime_id,
+            "seat_id": reservation.seat_id,
+            "promotion_id": promotion_id,
+            "price": ticket_prices[reservation.reservation_id],
+            "status": TicketStatusEnum.confirmed,
+            "transaction_id": transaction.transaction_id,
+            "booking_code": booking_code,
+        })
+
+    # Một câu INSERT nhiều dòng cho toàn bộ vé
+    inserted = db.execute(
+        insert(Tickets).values(rows).returning(Tickets.ticket_id, Tickets.seat_id)
+    ).all()
+    ticket_ids_by_seat = {seat_id: ticket_id for ticket_id, seat_id in inserted}
+    refresh_bookings(db, [booking_code])
+
+    # Một câu UPDATE cho toàn bộ reservation
+    db.execute(
+        update(SeatReservations)
+        .where(SeatReservations.reservation_id.in_([reservation.reservation_id for reservation in reservations]))
+        .values(status="confirmed", transaction_id=transaction.transaction_id)
+        .execution_options(synchronize_session=False)
+    )
+
+    # Tích điểm tính trong bộ nhớ, cộng dồn nguyên tử trên DB
+    points = 0
+    if user:
+        points = calculate_loyalty_points(
+            (row["price"], seats.get(row["seat_id"], (None, None))[1]) for row in rows
+        )
+        if points:
+            db.execute(
+                update(Users)
+                .where(Users.user_id == user.user_id)
+                .values(loyalty_points=Users.loyalty_points + points)
+                .execution_options(synchronize_session=False)
+            )
+
+    transaction.status = TransactionStatus.success
+    if payment_ref_code:
+        transaction.payment_ref_code = payment_ref_code
+
+    # Outbox: email được xử lý bởi worker pool sau khi commit (ảnh QR sinh theo yêu cầu từ token đã ký)
+    first_label = labels.get(reservations[0].showtime_id, {"movie_title": 'Unknown', "showtime": 'Unknown'})
+    customer_name = (user.full_name if user else None) or 'Customer'
+    seats_list = [seats.get(seat_id, (f"seat_{seat_id}", None))[0] for seat_id in seat_ids]
+    if user and user.email:
+        enqueue_event(
+            db,
+            BOOKING_EMAIL_EVENT,
+            {
+                "to_email": user.email,
+                "booking_code": booking_code,
+                "customer_name": customer_name,
+                "movie_title": first_label['movie_title'],
+                "showtime": first_label['showtime'],
+                "seats": seats_list,
+            },
+            aggregate_id=booking_code,
+        )
+
+    return {
+        "booking_code": booking_code,
+        "ticket_ids": [ticket_ids_by_seat[seat_id] for seat_id in seat_ids],
+        "loyalty_points": points,
+    }
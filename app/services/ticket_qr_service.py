@@ -0,0 +1,105 @@
+"""
+Ticket QR Service - Ảnh QR vé / booking sinh theo yêu cầu từ token đã ký
+- Token xác định (deterministic): cùng vé → cùng token → cùng ảnh, nên URL ảnh là bất biến
+  và được trình duyệt cache (tới khi token hết hạn) thay vì lưu PNG base64 trên từng dòng tickets
+- Token vé có exp = giờ chiếu + GATE_LATE_ENTRY_MINUTES (hết cửa sổ soát vé của gate_validator):
+  token / ảnh bị lộ không dùng được sau suất chiếu
+- Thu hồi trước hạn: hủy vé (cancel_ticket) → gate_validator.invalidate nạp lại tập vé của suất chiếu,
+  token của vé đã hủy bị từ chối khi soát dù chữ ký còn hợp lệ
+- URL chứa chính token (ai có URL là vào cửa được) → chỉ trả qr_url trong response đã xác thực của chủ vé /
+  nhân viên, ảnh chỉ cache private (không để proxy / CDN dùng chung lưu lại)
+"""
+
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from urllib.parse import quote
+
+from fastapi import HTTPException, Response, status
+from jose import JWTError, jwt
+
+from app.core.config import settings
+from app.services.qr_service import QR_FORMATS, qr_cache_key, render_qr_async
+
+QR_URL_PREFIX = "/api/v1"
+QR_IMAGE_MAX_AGE = 31536000
+TICKET_QR_TYPE = "qr"
+BOOKING_QR_TYPE = "booking_qr"
+
+
+def _sign(claims: Dict[str, Any]) -> str:
+    return jwt.encode(claims, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+def ticket_qr_expiry(show_datetime: datetime) -> int:
+    """exp (epoch) của token vé: hết cửa sổ vào muộn; show_datetime naive giờ local như gate_validator"""
+    return int((show_datetime + timedelta(minutes=settings.GATE_LATE_ENTRY_MINUTES)).timestamp())
+
+
+def ticket_qr_token(ticket_id: int, showtime_id: int, expires_at: int) -> str:
+    """Token soát vé của một vé (cùng định dạng verify_ticket_qr đọc), expires_at từ ticket_qr_expiry"""
+    return _sign({
+        "ticket_id": int(ticket_id),
+        "showtime_id": int(showtime_id),
+        "type": TICKET_QR_TYPE,
+        "exp": int(expires_at),
+    })
+
+
+def booking_qr_token(booking_code: str) -> str:
+    """Token của cả đơn (tra cứu tại quầy)"""
+    return _sign({"booking_code": booking_code, "type": BOOKING_QR_TYPE})
+
+
+def ticket_qr_subject(ticket_id: int, expires_at: int) -> str:
+    """Key cache ảnh QR của vé: token xác định theo (vé, exp) nên ảnh chỉ phụ thuộc vé, exp, định dạng, kích thước"""
+    return f"ticket:{int(ticket_id)}:{int(expires_at)}"
+
+
+def booking_qr_subject(booking_code: str) -> str:
+    return f"booking:{booking_code}"
+
+
+def ticket_qr_url(ticket_id: int, showtime_id: int, expires_at: int) -> str:
+    return f"{QR_URL_PREFIX}/tickets/{ticket_id}/qr.png?token={ticket_qr_token(ticket_id, showtime_id, expires_at)}"
+
+
+def booking_qr_url(booking_code: str) -> str:
+    return f"{QR_URL_PREFIX}/bookings/{quote(booking_code)}/qr.png?token={booking_qr_token(booking_code)}"
+
+
+def decode_qr_token(token: str, token_type: str) -> Dict[str, Any]:
+    """Token hết hạn / token vé không có exp → 400"""
+    try:
+        claims = jwt.decode(
+            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM],
+            options={"require_exp": token_type == TICKET_QR_TYPE},
+        )
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid QR token")
+    if claims.get("type") != token_type:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid QR payload")
+    return claims
+
+
+def qr_image_cache_control(expires_at: Optional[int] = None) -> str:
+    """Cache bất biến (private), không quá thời điểm token hết hạn"""
+    max_age = QR_IMAGE_MAX_AGE if expires_at is None else max(0, min(QR_IMAGE_MAX_AGE, int(expires_at - time.time())))
+    return f"private, max-age={max_age}, immutable"
+
+
+async def qr_image_response(
+    token: str,
+    subject: str,
+    if_none_match: Optional[str] = None,
+    expires_at: Optional[int] = None,
+) -> Response:
+    """
+    Ảnh PNG của token chuẩn (ticket_qr_token / booking_qr_token) của subject, cache bất biến (private)
+    tới expires_at; ETag = key cache → If-None-Match trả 304 không render
+    """
+    etag = f'"{qr_cache_key(token, subject=subject)}"'
+    headers = {"Cache-Control": qr_image_cache_control(expires_at), "ETag": etag}
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=await render_qr_async(token, subject=subject), media_type=QR_FORMATS["png"], headers=headers)
@@ -1,308 +1,396 @@
-from datetime import datetime
+import base64
+import json
+import re
+from collections import Counter
+from datetime import date, datetime, time
+from typing import List, Optional
 from fastapi import HTTPException,status
-from sqlalchemy import  func
-from app.models.seat_reservations import SeatReservations
-from app.models.seat_templates import SeatTypeEnum
-from app.models.seats import Seats
+from sqlalchemy import case, func, or_, select, tuple_
+from app.core.booking_codes import has_booking_code_format, is_valid_booking_code, normalize_booking_code
+from app.models.bookings import Bookings, BookingStatusEnum
 from app.models.showtimes import Showtimes
-from app.models.transactions import TransactionStatus, Transaction
+from app.core.security import is_staff_user
+from app.core.gate_validator import SCAN_DUPLICATE, SCAN_INVALID, SCAN_NOT_FOUND, gate_validator
+from app.services.ticket_qr_service import (
+    TICKET_QR_TYPE,
+    booking_qr_url,
+    decode_qr_token,
+    ticket_qr_expiry,
+    ticket_qr_token,
+    ticket_qr_url,
+)
+from app.services.user_bookings_cache import (
+    USER_BOOKINGS_CACHE_TTL_SECONDS,
+    cache_generation,
+    cache_page,
+    get_cached_page,
+)
 from app.schemas.tickets import (
-    TicketsCreate,
-    TicketsResponse,
     TicketQRResponse,
     TicketVerifyRequest,
     TicketVerifyResponse,
+    TicketVerifyBatchRequest,
+    TicketVerifyBatchResponse,
+    TicketVerifyBatchResult,
 )
 from sqlalchemy.orm import Session
-from app.models.tickets import Tickets
-from app.core.token_utils import create_token
+from app.models.tickets import Tickets, TicketStatusEnum
 from datetime import timedelta
-from jose import jwt, JWTError
-from app.core.config import settings
+
+BOOKINGS_DEFAULT_LIMIT = 50
+BOOKINGS_MAX_LIMIT = 500
+MY_BOOKINGS_DEFAULT_LIMIT = 10
+MY_BOOKINGS_MAX_LIMIT = 50
+MY_BOOKINGS_SECTIONS = ('upcoming', 'past')
+# Tra cứu tại quầy: trigram cần tối thiểu 3 ký tự
+BOOKING_SEARCH_MIN_LENGTH = 3
+BOOKING_SEARCH_DEFAULT_LIMIT = 10
+BOOKING_SEARCH_MAX_LIMIT = 50
+
+
+def encode_booking_cursor(booking_time: datetime, booking_code: str) -> str:
+    """Cursor (opaque) = vị trí booking cuối của trang: (booked_at, booking_code)"""
+    raw = json.dumps([booking_time.isoformat() if booking_time else None, booking_code]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
 
 
-def get_all_bookings(db: Session):
-    """Return bookings grouped by booking_code with summary fields suitable for admin/print views."""
+def decode_booking_cursor(cursor: str):
     try:
-        tickets = db.query(Tickets).all()
-        grouped = {}
-        for t in tickets:
-            code = getattr(t, 'booking_code', None) or 'NO_CODE'
-            if code not in grouped:
-                grouped[code] = {
-                    'code': code,
-                    'tickets': [],
-                    'customer': None,
-                    'phone': None,
-                    'email': None,
-                    'movie': None,
-                    'showtime': None,
-                    'date': None,
-                    'status': None,
-                    'printed': False,
-                    'received': False,
-                    'refunded': False,
-                    'qr_code': None,  # sẽ gán sau
-                    'ts': None,  # internal timestamp for sorting (epoch seconds)
-                }
-            # seat code/type
-            seat_code = getattr(t.seat, 'seat_code', None)
-            seat_type = getattr(t.seat, 'seat_type', None)
-            grouped[code]['tickets'].append({
-                'ticket_id': t.ticket_id,
-                'seat': seat_code,
-                'type': str(seat_type) if seat_type else None,
-                'price': float(t.price) if t.price is not None else None,
-            })
-            # populate customer/email/phone if available from user
-            if t.user:
-                grouped[code]['customer'] = t.user.full_name
-                grouped[code]['email'] = t.user.email
-                grouped[code]['phone'] = t.user.phone
-            # showtime/movie
-            dt = None
-            if t.showtime and t.showtime.movie:
-                grouped[code]['movie'] = t.showtime.movie.title
-                # format showtime
-                try:
-                    dt = t.showtime.show_datetime
-                    room = getattr(t.showtime.room, 'room_name', None)
-                    grouped[code]['showtime'] = f"{dt.strftime('%H:%M')} - {room}" if dt else None
-                    grouped[code]['date'] = dt.strftime('%Y-%m-%d') if dt else None
-                except Exception:
-                    dt = None
-
-            # Compute internal timestamp for sorting: prefer ticket.booking_time, fallback to showtime.show_datetime
-            candidate_ts = None
-            bt = getattr(t, 'booking_time', None)
-            if bt:
-                try:
-                    candidate_ts = int(bt.timestamp())
-                except Exception:
-                    candidate_ts = None
-            if candidate_ts is None and dt:
-                try:
-                    candidate_ts = int(dt.timestamp())
-                except Exception:
-                    candidate_ts = None
-            if candidate_ts is not None:
-                # keep the newest timestamp among tickets in the same booking
-                if grouped[code].get('ts') is None or candidate_ts > grouped[code].get('ts'):
-                    grouped[code]['ts'] = candidate_ts
-            # Gán qr cho booking nếu chưa có (ưu tiên qr_token, fallback về code)
-            if grouped[code]['qr_code'] is None:
-                    grouped[code]['qr_code'] = getattr(t, 'qr_code', None) or code
-            # status inference: if any ticket is refunded/cancelled
-            if str(t.status) == 'cancelled':
-                grouped[code]['refunded'] = True
-
-        # Convert to list
-        result = []
-        for code, item in grouped.items():
-            # compute seats string
-            seats = [ti['seat'] for ti in item['tickets'] if ti.get('seat')]
-            item['seats'] = ', '.join(seats)
-            # status aggregation
-            item['status'] = 'Đã thanh toán' if any(True for ti in item['tickets']) else 'unknown'
-            result.append(item)
-        # Sort by timestamp (newest first). If no timestamp, treat as 0.
-        result.sort(key=lambda it: it.get('ts') or 0, reverse=True)
-        # remove internal timestamp before returning
-        for it in result:
-            if 'ts' in it:
-                it.pop('ts', None)
-
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        booking_time, booking_code = json.loads(raw)
+        return datetime.fromisoformat(booking_time), str(booking_code)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def _booking_summary(booking: Bookings, include_qr: bool = False) -> dict:
+    """include_qr: chỉ response của nhân viên mới có qr_url (URL chứa token vào cửa)"""
+    show_datetime = booking.show_datetime
+    summary = {
+        'code': booking.booking_code,
+        'tickets': booking.tickets,
+        'customer': booking.customer_name,
+        'phone': booking.customer_phone,
+        'email': booking.customer_email,
+        'movie': booking.movie_title,
+        'showtime': f"{show_datetime.strftime('%H:%M')} - {booking.room_name}" if show_datetime else None,
+        'date': show_datetime.strftime('%Y-%m-%d') if show_datetime else None,
+        'status': 'Đã thanh toán',
+        'booking_status': booking.status.value,
+        'printed': False,
+        'received': booking.validated_at is not None,
+        'refunded': booking.cancelled_count > 0,
+        'seats': booking.seats,
+    }
+    if include_qr:
+        summary['qr_url'] = booking_qr_url(booking.booking_code)
+    return summary
+
+
+def get_all_bookings(
+    db: Session,
+    show_date: Optional[date] = None,
+    showtime_id: Optional[int] = None,
+    theater_id: Optional[int] = None,
+    booking_status: Optional[str] = None,
+    limit: int = BOOKINGS_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+):
+    """
+    Danh sách booking (admin / in vé) từ read model bookings, mới nhất trước,
+    phân trang keyset trên (booked_at, booking_code): mỗi trang là một lần quét index từ vị trí cursor.
+    - show_date: ngày chiếu; showtime_id / theater_id: lọc theo suất chiếu / rạp
+    - booking_status: confirmed / partially_cancelled / cancelled
+    """
+    if limit <= 0:
+        limit = BOOKINGS_DEFAULT_LIMIT
+    limit = min(limit, BOOKINGS_MAX_LIMIT)
+
+    query = select(Bookings)
+    if showtime_id:
+        query = query.where(Bookings.showtime_id == showtime_id)
+    if theater_id:
+        query = query.where(Bookings.theater_id == theater_id)
+    if show_date:
+        day_start = datetime.combine(show_date, time.min)
+        query = query.where(Bookings.show_datetime >= day_start, Bookings.show_datetime < day_start + timedelta(days=1))
+    if booking_status:
+        try:
+            query = query.where(Bookings.status == BookingStatusEnum(booking_status))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status")
+    if cursor:
+        cursor_time, cursor_code = decode_booking_cursor(cursor)
+        query = query.where(tuple_(Bookings.booked_at, Bookings.booking_code) < (cursor_time, cursor_code))
+
+    # Lấy dư một booking để biết còn trang sau hay không
+    bookings = db.scalars(
+        query.order_by(Bookings.booked_at.desc(), Bookings.booking_code.desc()).limit(limit + 1)
+    ).all()
+    has_more = len(bookings) > limit
+    bookings = bookings[:limit]
+    return {
+        'items': [_booking_summary(booking) for booking in bookings],
+        'limit': limit,
+        'next_cursor': encode_booking_cursor(bookings[-1].booked_at, bookings[-1].booking_code) if has_more else None,
+        'has_more': has_more,
+    }
 
 
 def get_booking_by_code(db: Session, booking_code: str):
-    try:
-        tickets = db.query(Tickets).filter(Tickets.booking_code == booking_code).all()
-        if not tickets:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Booking not found')
-        # reuse grouping logic but only for one code
-        grouped = {
-            'code': booking_code,
-            'tickets': [],
-            'customer': None,
-            'phone': None,
-            'email': None,
-            'movie': None,
-            'showtime': None,
-            'date': None,
-            'status': None,
-            'printed': False,
-            'received': False,
-            'refunded': False,
-            'qr': None,  # sẽ gán sau
-        }
-        for t in tickets:
-            seat_code = getattr(t.seat, 'seat_code', None)
-            seat_type = getattr(t.seat, 'seat_type', None)
-            grouped['tickets'].append({
-                'ticket_id': t.ticket_id,
-                'seat': seat_code,
-                'type': str(seat_type) if seat_type else None,
-                'price': float(t.price) if t.price is not None else None,
-            })
-            if t.user:
-                grouped['customer'] = t.user.full_name
-                grouped['email'] = t.user.email
-                grouped['phone'] = t.user.phone
-            if t.showtime and t.showtime.movie:
-                try:
-                    dt = t.showtime.show_datetime
-                    room = getattr(t.showtime.room, 'room_name', None)
-                    grouped['showtime'] = f"{dt.strftime('%H:%M')} - {room}" if dt else None
-                    grouped['date'] = dt.strftime('%Y-%m-%d') if dt else None
-                    grouped['movie'] = t.showtime.movie.title
-                except Exception:
-                    pass
-            # Gán qr cho booking nếu chưa có (ưu tiên qr_token, fallback về booking_code)
-            if grouped['qr'] is None:
-                    grouped['qr'] = getattr(t, 'qr_code', None) or booking_code
-            if str(t.status) == 'cancelled':
-                grouped['refunded'] = True
-        grouped['seats'] = ', '.join([ti['seat'] for ti in grouped['tickets'] if ti.get('seat')])
-        grouped['status'] = 'Đã thanh toán'
-        return grouped
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    booking_code = normalize_booking_code(booking_code)
+    # Gõ sai mã tại quầy: ký tự kiểm tra không khớp → báo ngay, không truy vấn
+    if has_booking_code_format(booking_code) and not is_valid_booking_code(booking_code):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid booking code')
+    booking = db.scalars(select(Bookings).where(Bookings.booking_code == booking_code)).first()
+    if not booking:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Booking not found')
+    summary = _booking_summary(booking, include_qr=True)
+    # Chi tiết (in vé tại quầy): thêm ảnh QR soát vé của từng vé
+    show_datetime = booking.show_datetime or db.get(Showtimes, booking.showtime_id).show_datetime
+    expires_at = ticket_qr_expiry(show_datetime)
+    summary['tickets'] = [
+        {**ticket, 'qr_url': ticket_qr_url(ticket['ticket_id'], booking.showtime_id, expires_at)}
+        for ticket in booking.tickets
+    ]
+    return summary
 
 
-# Nhân viên tạo vé trực tiếp tại quầy
-def create_ticket_directly(db : Session, ticket_in : TicketsCreate):
-    try:
-        # Kiểm tra xem ghế đã được đặt hay chưa
-        existing_ticket = db.query(Tickets).filter(
-            Tickets.showtime_id == ticket_in.showtime_id,
-            Tickets.seat_id == ticket_in.seat_id,
-            Tickets.status != 'cancelled'
-        ).first()
-        if existing_ticket:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Seat already booked for this showtime.")
-        
-        # Kiểm tra xem ghế đã đặt chỗ hay chưa
-        reversed_seat = db.query(SeatReservations).filter(
-            SeatReservations.showtime_id == ticket_in.showtime_id,
-            SeatReservations.seat_id == ticket_in.seat_id,
-            SeatReservations.status == 'pending',
-            SeatReservations.expires_at > func.now()
-        ).first()
-        if reversed_seat:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Seat is reserved and cannot be booked directly.")
-        
-        showtime = db.query(Showtimes).filter(
-            Showtimes.showtime_id == ticket_in.showtime_id,
-            Showtimes.status == 'active'
-        ).first()
-        seat = db.query(Seats).filter(
-            Seats.seat_id == ticket_in.seat_id
-        ).first()
-        # Tính giá vé dựa trên loại ghế
-        base_price = float(showtime.ticket_price)
-        if seat.seat_type == SeatTypeEnum.vip:
-            base_price *= 1.5
-        elif seat.seat_type == SeatTypeEnum.couple:
-            base_price *= 2
-
-        db_transaction = Transaction(
-            user_id=ticket_in.user_id,
-            staff_user_id=ticket_in.user_id,
-            # staff_user_id=staff_user_id, # Nhân viên thực hiện giao dịch
-            promotion_id=ticket_in.promotion_id,
-            total_amount=base_price,
-            payment_method='cash',  # Mặc định tiền mặt khi tạo tại quầy
-            status=TransactionStatus.success,  # Mặc định thành công khi tạo trực tiếp
-            transaction_time=datetime.now()
+def _like_contains(term: str) -> str:
+    """Mẫu ILIKE '%term%' với ký tự đặc biệt của LIKE được escape"""
+    return "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _phone_term(query: str) -> Optional[str]:
+    """Chuỗi giống SĐT (chỉ chữ số, dấu cách / chấm / gạch / +84) → dạng lưu trong DB (0xxxxxxxxx), ngược lại None"""
+    compact = re.sub(r"[\s.\-()]", "", query)
+    if not re.fullmatch(r"\+?\d+", compact):
+        return None
+    if compact.startswith("+84"):
+        return "0" + compact[3:]
+    if compact.startswith("84") and len(compact) >= 11:
+        return "0" + compact[2:]
+    return compact.lstrip("+")
+
+
+def search_bookings(db: Session, query: str, limit: int = BOOKING_SEARCH_DEFAULT_LIMIT):
+    """
+    Tra cứu đơn tại quầy theo một phần SĐT / email / tên khách / mã đặt vé trên read model bookings
+    (một dòng / đơn, ghế đã gom sẵn). Điều kiện ILIKE '%...%' dùng index GIN trigram của từng cột;
+    khớp chính xác / đầu chuỗi xếp trước, sau đó suất chiếu gần nhất trước.
+    """
+    query = query.strip()
+    if len(query) < BOOKING_SEARCH_MIN_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'Search query must have at least {BOOKING_SEARCH_MIN_LENGTH} characters',
+        )
+    limit = max(1, min(limit, BOOKING_SEARCH_MAX_LIMIT))
+    code = normalize_booking_code(query)
+    phone = _phone_term(query)
+
+    # Chuỗi số chỉ có thể là SĐT hoặc mã đặt vé: bỏ điều kiện tên / email để không quét thêm index
+    if phone:
+        conditions = [
+            Bookings.customer_phone.ilike(_like_contains(phone), escape="\\"),
+            Bookings.booking_code.ilike(_like_contains(code), escape="\\"),
+        ]
+        rank = case(
+            (or_(Bookings.customer_phone == phone, Bookings.booking_code == code), 0),
+            (Bookings.customer_phone.like(phone + "%"), 1),
+            else_=2,
         )
-        db.add(db_transaction)
-        db.flush()  # Để lấy transaction_id
-        db_ticket = Tickets(
-            user_id=ticket_in.user_id,
-            showtime_id=ticket_in.showtime_id,
-            seat_id=ticket_in.seat_id,
-            promotion_id=ticket_in.promotion_id,
-            price= base_price,
-            status='confirmed',
-            transaction_id=db_transaction.transaction_id
+    else:
+        pattern = _like_contains(query)
+        conditions = [
+            Bookings.booking_code.ilike(_like_contains(code), escape="\\"),
+            Bookings.customer_email.ilike(pattern, escape="\\"),
+            Bookings.customer_name.ilike(pattern, escape="\\"),
+        ]
+        rank = case(
+            (or_(Bookings.booking_code == code, func.lower(Bookings.customer_email) == query.lower()), 0),
+            (or_(
+                func.lower(Bookings.customer_email).startswith(query.lower(), autoescape=True),
+                func.lower(Bookings.customer_name).startswith(query.lower(), autoescape=True),
+            ), 1),
+            else_=2,
         )
-        db.add(db_ticket)
-        db.flush() 
-        db.commit()
-        db.refresh(db_transaction)
-        db.refresh(db_ticket)
-
-        # Tích điểm cho user
-        user = db.query(Users).filter(Users.user_id == ticket_in.user_id).first()
-        if user:
-            # Quy tắc: mỗi loại ghế sẽ có số điểm khác nhau, ví dụ:
-            # regular: 1 điểm/10k, vip: 1.5 điểm/10k, couple: 2 điểm/10k
-            point_ratio = 1.0
-            if seat.seat_type == SeatTypeEnum.vip:
-                point_ratio = 1.5
-            elif seat.seat_type == SeatTypeEnum.couple:
-                point_ratio = 2.0
-            # Tính điểm dựa trên giá vé
-            points = int((base_price / 10000) * point_ratio)
-            user.loyalty_points += points
-            db.commit()
-            print(f"[LOYALTY] Cộng {points} điểm cho user {user.user_id} (loại ghế: {seat.seat_type})")
-
-        # Chuẩn bị dữ liệu response
-        response_data = {
-            "ticket_id": db_ticket.ticket_id,
-            "user_id": db_ticket.user_id,
-            "showtime_id": db_ticket.showtime_id,
-            "seat_id": db_ticket.seat_id,
-            "promotion_id": db_ticket.promotion_id,
-            "price": db_ticket.price,
-            "booking_time": db_ticket.booking_time,
-            "status": db_ticket.status,
-            "cancelled_at": db_ticket.cancelled_at,
-            "seat_code": seat.seat_code,
-            "seat_type": seat.seat_type
+
+    bookings = db.scalars(
+        select(Bookings)
+        .where(or_(*conditions))
+        .order_by(rank, Bookings.show_datetime.desc().nulls_last(), Bookings.booking_code)
+        .limit(limit)
+    ).all()
+    return {'query': query, 'items': [_booking_summary(booking, include_qr=True) for booking in bookings]}
+
+
+def _my_booking_item(booking: Bookings) -> dict:
+    return {
+        "booking_code": booking.booking_code,
+        "movie_title": booking.movie_title,
+        "poster_url": booking.poster_url,
+        "date": booking.show_datetime.strftime("%Y-%m-%d") if booking.show_datetime else None,
+        "time": booking.show_datetime.strftime("%H:%M") if booking.show_datetime else None,
+        "room": booking.room_name,
+        "theater_name": booking.theater_name,
+        "theater_city": booking.theater_city,
+        "seats": [ticket["seat"] for ticket in booking.tickets],
+        "status": booking.status.value,
+        "qr_url": booking_qr_url(booking.booking_code),
+    }
+
+
+def get_user_bookings_page(
+    db: Session,
+    user_id: int,
+    section: str,
+    limit: int = MY_BOOKINGS_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    now: Optional[datetime] = None,
+) -> dict:
+    """
+    Một trang "Vé của tôi" từ read model bookings (một lần quét index ix_bookings_user_show_datetime):
+    - upcoming: suất chưa chiếu, gần nhất trước
+    - past: suất đã chiếu, mới nhất trước
+    Keyset trên (show_datetime, booking_code) → thời gian phản hồi không phụ thuộc số vé của khách.
+    """
+    if section not in MY_BOOKINGS_SECTIONS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid section")
+    if limit <= 0:
+        limit = MY_BOOKINGS_DEFAULT_LIMIT
+    limit = min(limit, MY_BOOKINGS_MAX_LIMIT)
+    now = now or datetime.now()
+
+    query = select(Bookings).where(Bookings.user_id == user_id)
+    position = tuple_(Bookings.show_datetime, Bookings.booking_code)
+    if section == 'upcoming':
+        query = query.where(Bookings.show_datetime >= now).order_by(Bookings.show_datetime, Bookings.booking_code)
+    else:
+        query = query.where(Bookings.show_datetime < now).order_by(Bookings.show_datetime.desc(), Bookings.booking_code.desc())
+    if cursor:
+        cursor_time, cursor_code = decode_booking_cursor(cursor)
+        query = query.where(position > (cursor_time, cursor_code) if section == 'upcoming' else position < (cursor_time, cursor_code))
+
+    bookings = db.scalars(query.limit(limit + 1)).all()
+    has_more = len(bookings) > limit
+    bookings = bookings[:limit]
+    return {
+        'section': section,
+        'items': [_my_booking_item(booking) for booking in bookings],
+        'limit': limit,
+        'next_cursor': encode_booking_cursor(bookings[-1].show_datetime, bookings[-1].booking_code) if has_more else None,
+        'has_more': has_more,
+    }
+
+
+def _next_show_datetime(db: Session, user_id: int, now: datetime) -> Optional[datetime]:
+    """Suất sắp chiếu gần nhất của khách: lúc đó một booking chuyển từ upcoming sang past"""
+    return db.scalar(
+        select(func.min(Bookings.show_datetime)).where(Bookings.user_id == user_id, Bookings.show_datetime >= now)
+    )
+
+
+def get_my_bookings(
+    db: Session,
+    user_id: int,
+    section: Optional[str] = None,
+    limit: int = MY_BOOKINGS_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+) -> dict:
+    """
+    "Vé của tôi" qua cache theo khách (user_bookings_cache). section=None → trang đầu của cả hai mục.
+    Trang được cache tới khi xuất / hủy vé của khách (invalidate_user_bookings) hoặc tới giờ chiếu
+    của suất sắp tới gần nhất (ranh giới upcoming / past dịch chuyển).
+    """
+    if section is None:
+        return {
+            name: get_my_bookings(db, user_id, name, limit=limit)
+            for name in MY_BOOKINGS_SECTIONS
         }
 
-        return TicketsResponse(**response_data)
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    generation = cache_generation(user_id)
+    field = f"{section}:{limit}:{cursor or ''}"
+    page = get_cached_page(user_id, generation, field)
+    if page is not None:
+        return page
+
+    now = datetime.now()
+    page = get_user_bookings_page(db, user_id, section, limit=limit, cursor=cursor, now=now)
+    ttl = USER_BOOKINGS_CACHE_TTL_SECONDS
+    next_show = _next_show_datetime(db, user_id, now)
+    if next_show:
+        ttl = min(ttl, (next_show - now).total_seconds())
+    cache_page(user_id, generation, field, page, ttl)
+    return page
 
 
-def generate_ticket_qr(db: Session, ticket_id: int) -> TicketQRResponse:
+# Nhân viên tạo vé trực tiếp tại quầy
+def generate_ticket_qr(db: Session, ticket_id: int, current_user) -> TicketQRResponse:
+    """Token vào cửa của vé - chỉ chủ vé hoặc nhân viên (người khác: 404 như vé không tồn tại)"""
     ticket = db.query(Tickets).filter(Tickets.ticket_id == ticket_id).first()
-    if not ticket:
+    if not ticket or (ticket.user_id != current_user.user_id and not is_staff_user(current_user)):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
-    if str(ticket.status) != 'confirmed':
+    if ticket.status != TicketStatusEnum.confirmed:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ticket is not confirmed")
-    payload = {"ticket_id": ticket.ticket_id, "showtime_id": ticket.showtime_id, "type": "ticket_qr"}
-    token = create_token(payload, expires_delta=timedelta(hours=12), token_type="qr")
-    return TicketQRResponse(ticket_id=ticket.ticket_id, qr_token=token)
+    # Token soát vé xác định theo vé (như qr_url): ảnh QR cache theo (vé, exp, định dạng, kích thước)
+    expires_at = ticket_qr_expiry(ticket.showtime.show_datetime)
+    return TicketQRResponse(
+        ticket_id=ticket.ticket_id,
+        qr_token=ticket_qr_token(ticket.ticket_id, ticket.showtime_id, expires_at),
+        expires_at=expires_at,
+    )
 
 
 def verify_ticket_qr(db: Session, verify_in: TicketVerifyRequest) -> TicketVerifyResponse:
-    try:
-        decoded = jwt.decode(verify_in.qr_token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid QR token")
-    if decoded.get("type") != "qr" or decoded.get("ticket_id") is None:
+    """
+    Soát vé tại cửa qua gate_validator: tra tập vé trong bộ nhớ, đánh dấu nguyên tử,
+    validated_at được ghi về DB theo lô. Quét lại vé đã soát → duplicate=True kèm giờ soát đầu.
+    """
+    claims = decode_qr_token(verify_in.qr_token, TICKET_QR_TYPE)
+    if claims.get("ticket_id") is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid QR payload")
-    ticket_id = int(decoded["ticket_id"])
-    ticket = db.query(Tickets).filter(Tickets.ticket_id == ticket_id).first()
-    if not ticket:
+    scan = gate_validator.scan(int(claims["ticket_id"]), claims.get("showtime_id"))
+    if scan.status == SCAN_NOT_FOUND:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
-    if str(ticket.status) != 'confirmed':
+    if scan.status == SCAN_INVALID:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ticket is not valid for entry")
-    # Idempotent: if already validated, return current state
-    if ticket.validated_at:
-        return TicketVerifyResponse(ticket_id=ticket.ticket_id, validated=True, validated_at=ticket.validated_at, status=str(ticket.status))
-    ticket.validated_at = datetime.now()
-    db.add(ticket)
-    db.commit()
-    db.refresh(ticket)
-    return TicketVerifyResponse(ticket_id=ticket.ticket_id, validated=True, validated_at=ticket.validated_at, status=str(ticket.status))
\ No newline at end of file
+    return TicketVerifyResponse(
+        ticket_id=scan.ticket_id,
+        validated=True,
+        validated_at=scan.validated_at,
+        status=TicketStatusEnum.confirmed.value,
+        duplicate=scan.status == SCAN_DUPLICATE,
+    )
+
+
+def verify_ticket_qr_batch(verify_in: TicketVerifyBatchRequest) -> TicketVerifyBatchResponse:
+    """
+    Soát một lô token (bộ đệm offline của cổng) trong một request: kiểm chữ ký từng token,
+    rồi gate_validator.scan_many xử lý cả lô (một truy vấn nạp vé cho suất chiếu chưa có trong bộ nhớ,
+    một câu UPDATE ghi validated_at). Token lỗi không làm hỏng các token khác.
+    """
+    results: List[Optional[TicketVerifyBatchResult]] = [None] * len(verify_in.items)
+    positions, scans, scanned_at = [], [], []
+    for index, item in enumerate(verify_in.items):
+        try:
+            claims = decode_qr_token(item.qr_token, TICKET_QR_TYPE)
+            ticket_id = int(claims["ticket_id"])
+        except (HTTPException, KeyError, TypeError, ValueError):
+            results[index] = TicketVerifyBatchResult(index=index, result="bad_token")
+            continue
+        positions.append(index)
+        scans.append((ticket_id, claims.get("showtime_id")))
+        at = item.scanned_at
+        if at is not None and at.tzinfo is not None:
+            at = at.astimezone().replace(tzinfo=None)
+        scanned_at.append(at)
+
+    for index, scan in zip(positions, gate_validator.scan_many(scans, scanned_at)):
+        results[index] = TicketVerifyBatchResult(
+            index=index, ticket_id=scan.ticket_id, result=scan.status, validated_at=scan.validated_at,
+        )
+    return TicketVerifyBatchResponse(
+        results=results,
+        summary=dict(Counter(result.result for result in results)),
+    )
@@ -0,0 +1,124 @@
+"""
+Cache "Vé của tôi" (/tickets/my) theo user_id
+Mỗi khách có một số thế hệ (generation); các trang được lưu dưới thế hệ hiện tại.
+invalidate_user_bookings tăng thế hệ → mọi trang cũ bị bỏ qua, kể cả trang do một request
+đọc DB trước commit ghi vào sau khi đã vô hiệu hóa (ghi vào thế hệ cũ, không ai đọc nữa).
+Dùng Redis nếu có để các worker dùng chung, nếu không thì cache trong process.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from app.core.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+USER_BOOKINGS_CACHE_TTL_SECONDS = 300
+USER_BOOKINGS_CACHE_MAX_USERS = 10000
+# Khóa thế hệ sống lâu hơn mọi trang được cache
+GENERATION_TTL_SECONDS = 24 * 3600
+
+# user_id -> (generation, {field: (expires_at, page)})
+_local: "OrderedDict[int, Tuple[int, Dict[str, Tuple[float, Dict[str, Any]]]]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _generation_key(user_id: int) -> str:
+    return f"tickets:my:{user_id}:gen"
+
+
+def _pages_key(user_id: int, generation: int) -> str:
+    return f"tickets:my:{user_id}:{generation}"
+
+
+def cache_generation(user_id: int) -> int:
+    """Thế hệ hiện tại của khách - đọc TRƯỚC khi truy vấn DB, truyền lại cho cache_page"""
+    if redis_client:
+        try:
+            return int(redis_client.get(_generation_key(user_id)) or 0)
+        except Exception as e:
+            logger.warning(f"Không đọc được thế hệ cache vé từ Redis: {e}")
+            return -1
+    with _lock:
+        entry = _local.get(user_id)
+        return entry[0] if entry else 0
+
+
+def get_cached_page(user_id: int, generation: int, field: str) -> Optional[Dict[str, Any]]:
+    if generation < 0:
+        return None
+    if redis_client:
+        try:
+            raw = redis_client.hget(_pages_key(user_id, generation), field)
+            if raw:
+                expires_at, page = json.loads(raw)
+                if expires_at > time.time():
+                    return page
+        except Exception as e:
+            logger.warning(f"Không đọc được cache vé từ Redis: {e}")
+        return None
+    with _lock:
+        entry = _local.get(user_id)
+        if not entry or entry[0] != generation:
+            return None
+        _local.move_to_end(user_id)
+        cached = entry[1].get(field)
+    if cached and cached[0] > time.time():
+        return cached[1]
+    return None
+
+
+def cache_page(user_id: int, generation: int, field: str, page: Dict[str, Any], ttl: float) -> None:
+    """Lưu một trang dưới thế hệ đã đọc trước truy vấn (bỏ qua nếu đã bị vô hiệu hóa)"""
+    if generation < 0 or ttl <= 0:
+        return
+    expires_at = time.time() + ttl
+    if redis_client:
+        try:
+            key = _pages_key(user_id, generation)
+            pipe = redis_client.pipeline()
+            pipe.hset(key, field, json.dumps([expires_at, page], default=str))
+            pipe.expire(key, USER_BOOKINGS_CACHE_TTL_SECONDS)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Không ghi được cache vé vào Redis: {e}")
+        return
+    with _lock:
+        entry = _local.get(user_id)
+        current = entry[0] if entry else 0
+        if current != generation:
+            return
+        pages = entry[1] if entry else {}
+        pages[field] = (expires_at, page)
+        _local[user_id] = (current, pages)
+        _local.move_to_end(user_id)
+        while len(_local) > USER_BOOKINGS_CACHE_MAX_USERS:
+            _local.popitem(last=False)
+
+
+def invalidate_user_bookings(user_ids: Iterable[Optional[int]]) -> None:
+    """Vô hiệu hóa cache của các khách (chỉ gọi SAU KHI đã commit thay đổi vé)"""
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids:
+        return
+    if redis_client:
+        try:
+            pipe = redis_client.pipeline()
+            for user_id in user_ids:
+                pipe.incr(_generation_key(user_id))
+                pipe.expire(_generation_key(user_id), GENERATION_TTL_SECONDS)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Không vô hiệu hóa được cache vé trên Redis: {e}")
+        return
+    with _lock:
+        for user_id in user_ids:
+            entry = _local.get(user_id)
+            _local[user_id] = ((entry[0] if entry else 0) + 1, {})
+            _local.move_to_end(user_id)
+        while len(_local) > USER_BOOKINGS_CACHE_MAX_USERS:
+            _local.popitem(last=False)
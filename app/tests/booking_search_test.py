@@ -0,0 +1,166 @@
+"""
+Kiểm thử tra cứu đơn tại quầy (GET /bookings/search) trên read model bookings:
+- SEARCH_BOOKINGS đơn giả lập (2 vé / đơn ≈ 1 triệu vé) + một đơn thật của khách có SĐT / tên / email riêng
+- Không đăng nhập → 401/403 (dữ liệu khách hàng chỉ dành cho nhân viên quầy)
+- Tìm theo đuôi SĐT, SĐT dạng +84 có dấu cách, một phần email, một phần tên (không phân biệt hoa thường),
+  một phần mã đặt vé; ký tự %/_ không thành wildcard; truy vấn < 3 ký tự → 422
+- Độ trễ trung vị ROUNDS lần mỗi kiểu truy vấn; khi có index trigram (pg_trgm) truy vấn chọn lọc phải < TARGET_MS
+  (tên phổ biến khớp hàng chục nghìn đơn chỉ để tham khảo)
+Seed hàng trăm nghìn dòng: chạy trên DB kiểm thử riêng (DATABASE_URL=postgresql://.../cinema_test), không chạy trên DB thật.
+Đơn giả lập mang tiền tố riêng của lần chạy và luôn được xóa khi kết thúc (kể cả khi assert lỗi).
+
+# DATABASE_URL=postgresql://.../cinema_test python -m app.tests.booking_search_test
+"""
+
+import asyncio
+import os
+import statistics
+import time
+import uuid
+
+import httpx
+from sqlalchemy import text
+
+from app.core.database import SessionLocal
+from app.core.security import get_current_staff_user
+from app.main import app
+from app.models.users import Users
+from app.services.tickets_service import search_bookings
+from app.tests.my_tickets_test import buy
+from app.tests.payment_fixtures import showtime_fixture
+
+SEARCH_BOOKINGS = int(os.getenv("SEARCH_BOOKINGS", "500000"))
+ROUNDS = 50
+TARGET_MS = 20
+SEED_PREFIX = f"SRCH{uuid.uuid4().hex[:4].upper()}"  # Riêng cho lần chạy này
+
+
+def seed(showtime_id: int) -> None:
+    """Đơn giả lập trong read model, xóa bằng unseed()"""
+    db = SessionLocal()
+    try:
+        db.execute(text("""
+            INSERT INTO bookings (booking_code, showtime_id, customer_name, customer_email, customer_phone,
+                                  tickets, seats, ticket_count, total_amount, status, booked_at, show_datetime)
+            SELECT :prefix || lpad(n::text, 8, '0'), :showtime_id,
+                   (ARRAY['Nguyen','Tran','Le','Pham','Hoang','Vu','Dang','Bui'])[1 + n % 8] || ' Van ' || md5(n::text)::varchar(6),
+                   'khach' || n || '@mail.test', '09' || lpad((n::bigint * 7919 % 100000000)::text, 8, '0'),
+                   '[]', 'A1, A2', 2, 180000, 'confirmed', now() - (n % 365) * interval '1 day',
+                   now() + (n % 30 - 15) * interval '1 day'
+            FROM generate_series(:start, :stop) AS n
+        """), {"prefix": SEED_PREFIX, "showtime_id": showtime_id, "start": 1, "stop": SEARCH_BOOKINGS})
+        db.commit()
+        db.execute(text("ANALYZE bookings"))
+        db.commit()
+    finally:
+        db.close()
+
+
+def unseed() -> None:
+    db = SessionLocal()
+    try:
+        deleted = db.execute(
+            text("DELETE FROM bookings WHERE booking_code LIKE :prefix"), {"prefix": SEED_PREFIX + "%"}
+        ).rowcount
+        db.commit()
+        db.execute(text("ANALYZE bookings"))
+        db.commit()
+        print(f"🧹 Đã xóa {deleted} đơn giả lập {SEED_PREFIX}*")
+    finally:
+        db.close()
+
+
+def has_trigram_indexes() -> bool:
+    db = SessionLocal()
+    try:
+        return db.execute(text(
+            "SELECT count(*) FROM pg_indexes WHERE tablename = 'bookings' AND indexname LIKE '%\\_trgm'"
+        )).scalar() == 4
+    finally:
+        db.close()
+
+
+def timed_search(query: str) -> float:
+    db = SessionLocal()
+    try:
+        samples = []
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            search_bookings(db, query)
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
+    finally:
+        db.close()
+
+
+async def run():
+    with showtime_fixture(seat_count=4) as fixture:
+        suffix = uuid.uuid4().int % 10 ** 7
+        phone = f"08{suffix:08d}"
+        name = f"Trịnh Thị Quầy {uuid.uuid4().hex[:5]}"
+        db = SessionLocal()
+        try:
+            user = db.get(Users, fixture["user_id"])
+            user.phone, user.full_name = phone, name
+            db.commit()
+        finally:
+            db.close()
+        booking_code = await asyncio.to_thread(buy, fixture, fixture["seat_ids"][:2])
+        await asyncio.to_thread(seed, fixture["showtime_id"])
+        try:
+            await check_search(fixture, booking_code, phone, name)
+        finally:
+            await asyncio.to_thread(unseed)
+
+
+async def check_search(fixture, booking_code: str, phone: str, name: str):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        anonymous = await client.get("/api/v1/bookings/search", params={"q": phone})
+        assert anonymous.status_code in (401, 403), anonymous.status_code
+
+        async def search(q: str):
+            response = await client.get("/api/v1/bookings/search", params={"q": q})
+            assert response.status_code == 200, response.text
+            return response.json()["data"]["items"]
+
+        cases = {
+            "đuôi SĐT": phone[-6:],
+            "SĐT +84": f"+84 {phone[1:4]} {phone[4:7]} {phone[7:]}",
+            "một phần email": fixture["user_email"].split("@")[0][-8:],
+            "một phần tên": name.split()[-1].upper(),
+            "một phần mã": booking_code[2:8].lower(),
+        }
+        app.dependency_overrides[get_current_staff_user] = lambda: None
+        try:
+            for label, q in cases.items():
+                # Khớp một phần có thể trùng đơn giả lập (cùng hạng, suất chiếu muộn hơn xếp trước): chỉ cần có trong kết quả
+                items = {item["code"]: item for item in await search(q)}
+                assert booking_code in items, (label, q, list(items))
+                assert items[booking_code]["seats"] and len(items[booking_code]["tickets"]) == 2
+            exact = await search(phone)
+            assert exact[0]["code"] == booking_code and exact[0]["phone"] == phone
+            print(f"✅ Đơn {booking_code} tìm được theo: {', '.join(cases)}; 401/403 khi không đăng nhập")
+
+            assert not await search("%%%"), "ký tự % phải được escape"
+            assert not await search("a_c@"), "ký tự _ phải được escape"
+            short = await client.get("/api/v1/bookings/search", params={"q": "09"})
+            assert short.status_code == 422, short.status_code
+        finally:
+            app.dependency_overrides.pop(get_current_staff_user, None)
+
+    indexed = has_trigram_indexes()
+    print(f"🔎 {SEARCH_BOOKINGS} đơn giả lập, index trigram: {'có' if indexed else 'không (thiếu pg_trgm)'}")
+    for label, q in {**cases, "tên phổ biến": "nguyen van", "SĐT đầy đủ": phone}.items():
+        median = await asyncio.to_thread(timed_search, q)
+        print(f"   {label:<16} {q!r:<28} {median:8.2f} ms")
+        if indexed and label in cases:
+            assert median < TARGET_MS, (label, median)
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
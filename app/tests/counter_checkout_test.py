@@ -0,0 +1,173 @@
+"""
+Kiểm thử bán vé tại quầy theo giỏ (POST /tickets/counter-checkout):
+- Gia đình FAMILY ghế + combo: một giao dịch, FAMILY vé cùng booking_code, read model bookings,
+  seat_reservations confirmed (sơ đồ ghế thấy ghế đã bán), transaction_combos, tổng tiền đúng, một broadcast,
+  khuyến mãi của giỏ ghi vào từng vé, nhân viên bán là người đăng nhập (không lấy từ body);
+  /tickets/direct không ghi khách thành nhân viên bán
+- So sánh thời gian: FAMILY lần /tickets/direct với một lần counter-checkout
+- Chỉ nhân viên gọi được (response chứa QR vé); giỏ có ghế đã bán → 409, không để lại dữ liệu dở dang; hai quầy tranh cùng ghế → đúng một quầy bán được
+App chạy in-process qua httpx.ASGITransport.
+
+# python -m app.tests.counter_checkout_test
+"""
+
+import asyncio
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, timedelta
+from types import SimpleNamespace
+from typing import Iterator, Tuple
+
+import httpx
+from sqlalchemy import delete
+
+from app.core.database import SessionLocal
+from app.core.security import get_current_staff_user
+from app.core.websocket_manager import websocket_manager
+from app.main import app
+from app.models.bookings import Bookings
+from app.models.combos import Combo
+from app.models.promotions import Promotions
+from app.models.seat_reservations import SeatReservations
+from app.models.tickets import Tickets
+from app.models.transactions import Transaction, TransactionCombo
+from app.services.pricing_service import price_cart
+from app.tests.payment_fixtures import showtime_fixture
+
+FAMILY = 5
+COMBO_PRICE = 85000
+
+
+@contextmanager
+def combo_and_promotion() -> Iterator[Tuple[int, int]]:
+    """Combo + khuyến mãi dùng cho giỏ, xóa khi kết thúc"""
+    db = SessionLocal()
+    try:
+        combo = Combo(combo_name=f"Family combo {uuid.uuid4().hex[:8]}", price=COMBO_PRICE)
+        promotion = Promotions(code=f"FAM{uuid.uuid4().hex[:8].upper()}", discount_percentage=0,
+                               start_date=date.today(), end_date=date.today() + timedelta(days=1))
+        db.add_all([combo, promotion])
+        db.commit()
+        combo_id, promotion_id = combo.combo_id, promotion.promotion_id
+    finally:
+        db.close()
+    try:
+        yield combo_id, promotion_id
+    finally:
+        db = SessionLocal()
+        try:
+            db.execute(delete(Combo).where(Combo.combo_id == combo_id))
+            db.execute(delete(Promotions).where(Promotions.promotion_id == promotion_id))
+            db.commit()
+        finally:
+            db.close()
+
+
+async def run():
+    # Thoát showtime_fixture trước (xóa giao dịch / transaction_combos) rồi mới xóa combo
+    with combo_and_promotion() as (combo_id, promotion_id), showtime_fixture(seat_count=4 * FAMILY) as fixture:
+        showtime_id, seat_ids = fixture["showtime_id"], fixture["seat_ids"]
+
+        broadcasts = []
+        send_seat_reserved = websocket_manager.send_seat_reserved
+
+        async def counting_send(**kwargs):
+            broadcasts.append(kwargs)
+            await send_seat_reserved(**kwargs)
+
+        websocket_manager.send_seat_reserved = counting_send
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            anonymous = await client.post("/api/v1/tickets/counter-checkout", json={"showtime_id": showtime_id, "seat_ids": seat_ids[:1]})
+            assert anonymous.status_code in (401, 403), anonymous.status_code
+            app.dependency_overrides[get_current_staff_user] = lambda: SimpleNamespace(user_id=fixture["user_id"], roles=[])
+
+            # Cách cũ: mỗi ghế một request /tickets/direct
+            start = time.perf_counter()
+            for seat_id in seat_ids[:FAMILY]:
+                response = await client.post("/api/v1/tickets/direct", json={
+                    "showtime_id": showtime_id, "seat_id": seat_id, "user_id": fixture["user_id"],
+                })
+                assert response.status_code == 201, response.text
+            single = (time.perf_counter() - start) * 1000
+            print(f"🐢 {FAMILY} lần /tickets/direct: {single:.0f}ms, {len(broadcasts)} broadcast")
+
+            broadcasts.clear()
+            family_seats = seat_ids[FAMILY:2 * FAMILY]
+            start = time.perf_counter()
+            response = await client.post("/api/v1/tickets/counter-checkout", json={
+                "showtime_id": showtime_id, "seat_ids": family_seats, "user_id": fixture["user_id"],
+                "promotion_id": promotion_id, "combos": [{"combo_id": combo_id, "quantity": 1}, {"combo_id": combo_id, "quantity": 1}],
+                "staff_user_id": -1,  # bị bỏ qua: nhân viên bán lấy từ phiên đăng nhập
+            })
+            cart = (time.perf_counter() - start) * 1000
+            assert response.status_code == 201, response.text
+            checkout = response.json()["data"]
+            print(f"⚡ Một giỏ {FAMILY} ghế + combo: {cart:.0f}ms, {len(broadcasts)} broadcast")
+            assert len(broadcasts) == 1 and broadcasts[0]["seat_ids"] == family_seats, broadcasts
+
+            db = SessionLocal()
+            try:
+                seats_amount = sum(price_cart(db, showtime_id, family_seats).values())
+                assert checkout["seats_amount"] == seats_amount
+                assert checkout["combos"] == [{
+                    "combo_id": combo_id, "combo_name": checkout["combos"][0]["combo_name"],
+                    "quantity": 2, "unit_price": COMBO_PRICE, "amount": 2 * COMBO_PRICE,
+                }], checkout["combos"]
+                assert checkout["total_amount"] == seats_amount + 2 * COMBO_PRICE
+
+                transaction = db.get(Transaction, checkout["transaction_id"])
+                assert float(transaction.total_amount) == checkout["total_amount"] and transaction.status.value == "success"
+                assert transaction.staff_user_id == fixture["user_id"], transaction.staff_user_id
+                tickets = db.query(Tickets).filter(Tickets.transaction_id == transaction.transaction_id).all()
+                assert sorted(ticket.seat_id for ticket in tickets) == sorted(family_seats)
+                assert {ticket.booking_code for ticket in tickets} == {checkout["booking_code"]}
+                assert {ticket.promotion_id for ticket in tickets} == {promotion_id} == {transaction.promotion_id}
+                direct = db.query(Transaction).join(Tickets, Tickets.transaction_id == Transaction.transaction_id).filter(
+                    Tickets.showtime_id == showtime_id, Tickets.seat_id.in_(seat_ids[:FAMILY])
+                ).all()
+                assert len(direct) == FAMILY and all(t.staff_user_id is None for t in direct), [t.staff_user_id for t in direct]
+                booking = db.query(Bookings).filter(Bookings.booking_code == checkout["booking_code"]).one()
+                assert booking.ticket_count == FAMILY, booking.ticket_count
+                assert db.query(SeatReservations).filter(
+                    SeatReservations.showtime_id == showtime_id, SeatReservations.seat_id.in_(family_seats),
+                    SeatReservations.status == "confirmed", SeatReservations.transaction_id == transaction.transaction_id,
+                ).count() == FAMILY
+                assert db.query(TransactionCombo).filter(TransactionCombo.transaction_id == transaction.transaction_id).one().quantity == 2
+            finally:
+                db.close()
+            print(f"✅ {checkout['booking_code']}: {FAMILY} vé, 2 combo, tổng {checkout['total_amount']:.0f}đ trong một giao dịch")
+
+            # Giỏ có một ghế đã bán → 409, không có giao dịch / vé / reservation dở dang
+            overlap = seat_ids[2 * FAMILY:3 * FAMILY - 1] + [family_seats[0]]
+            response = await client.post("/api/v1/tickets/counter-checkout", json={"showtime_id": showtime_id, "seat_ids": overlap})
+            assert response.status_code == 409, response.text
+            db = SessionLocal()
+            try:
+                assert db.query(SeatReservations).filter(
+                    SeatReservations.showtime_id == showtime_id, SeatReservations.seat_id.in_(overlap[:-1])
+                ).count() == 0
+            finally:
+                db.close()
+
+            # Hai quầy cùng bán một giỏ
+            contested = seat_ids[3 * FAMILY:4 * FAMILY]
+            responses = await asyncio.gather(*[
+                client.post("/api/v1/tickets/counter-checkout", json={"showtime_id": showtime_id, "seat_ids": contested})
+                for _ in range(2)
+            ])
+            assert sorted(response.status_code for response in responses) == [201, 409], [r.text for r in responses]
+            print("✅ Ghế đã bán → 409 không để lại dữ liệu; hai quầy tranh cùng giỏ → một quầy bán được")
+
+        websocket_manager.send_seat_reserved = send_seat_reserved
+        app.dependency_overrides.pop(get_current_staff_user, None)
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
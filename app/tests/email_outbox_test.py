@@ -0,0 +1,140 @@
+"""
+Kiểm thử email qua outbox với SMTP sink cục bộ (không cần Gmail):
+- SMTP không kết nối được: POST /register vẫn trả 200 ngay, event email được ghi lỗi,
+  attempts tăng và next_attempt_at lùi về sau (backoff), không gửi lại ngay
+- SMTP hoạt động lại: worker lane "email" (OutboxWorkerPool.worker thật) xả hết hàng đợi,
+  mỗi thư chứa đúng mã xác nhận trong email_verifications; đo thông lượng thư/giây
+
+# python -m app.tests.email_outbox_test
+"""
+
+import asyncio
+import socket
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List
+
+import httpx
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.outbox_worker import OutboxWorkerPool
+from app.core.smtp_pool import close_smtp_pools
+from app.models.email_verifications import EmailVerification
+from app.models.outbox import OutboxEvents, OutboxStatusEnum
+from app.services.outbox_handlers import VERIFICATION_EMAIL_EVENT
+from app.tests.payment_fixtures import drop_registered_users
+from app.tests.smtp_sink import SMTPSink
+
+USERS = 30
+WORKERS = 4
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def events_for(emails: List[str]) -> List[OutboxEvents]:
+    db = SessionLocal()
+    try:
+        return db.query(OutboxEvents).filter(
+            OutboxEvents.event_type == VERIFICATION_EMAIL_EVENT, OutboxEvents.aggregate_id.in_(emails)
+        ).all()
+    finally:
+        db.close()
+
+
+async def drain(emails: List[str], until, timeout: float = 30.0) -> float:
+    """Chạy worker lane email (chỉ event xác nhận của test) tới khi until(events) đúng"""
+    pool = OutboxWorkerPool()
+    pool.running = True
+    tasks = [asyncio.create_task(pool.worker("email", [VERIFICATION_EMAIL_EVENT], i)) for i in range(WORKERS)]
+    pool.tasks = tasks
+    start = time.perf_counter()
+    try:
+        while not until(await asyncio.to_thread(events_for, emails)):
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError("Worker outbox không xử lý kịp")
+            await asyncio.sleep(0.05)
+        return time.perf_counter() - start
+    finally:
+        await pool.stop()
+
+
+async def run(emails: List[str]):
+    from app.main import app
+
+    port = free_port()
+    settings.EMAIL_HOST, settings.EMAIL_PORT = "127.0.0.1", port
+    settings.EMAIL_USERNAME, settings.EMAIL_PASSWORD = "cineplus@example.com", "secret"
+    settings.OUTBOX_BATCH_SIZE = 5
+    settings.OUTBOX_POLL_INTERVAL = 0.05
+
+    # 1. SMTP chết: đăng ký vẫn thành công, không phụ thuộc SMTP
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        latencies = []
+        for email in emails:
+            start = time.perf_counter()
+            response = await client.post("/api/v1/register", json={"full_name": "Outbox", "email": email, "password": "secret123"})
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.text
+    latencies.sort()
+    print(f"✅ {USERS} POST /register khi SMTP không kết nối được: p50 {latencies[USERS // 2]:.0f}ms, "
+          f"max {latencies[-1]:.0f}ms, không lỗi 500")
+
+    await drain(emails, lambda events: len(events) == USERS and all(e.attempts >= 1 for e in events))
+    now = datetime.now(timezone.utc)
+    for event in events_for(emails):
+        assert event.status == OutboxStatusEnum.pending and event.attempts == 1, (event.status, event.attempts)
+        assert event.next_attempt_at > now and "thất bại" in (event.last_error or "")
+    print(f"✅ Gửi thất bại: {USERS} event pending, attempts=1, retry sau backoff")
+
+    # 2. SMTP sống lại (sink cục bộ trên đúng cổng), backoff đã hết hạn → worker xả hàng đợi
+    db = SessionLocal()
+    try:
+        db.query(OutboxEvents).filter(
+            OutboxEvents.event_type == VERIFICATION_EMAIL_EVENT, OutboxEvents.aggregate_id.in_(emails)
+        ).update({OutboxEvents.next_attempt_at: now}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    with SMTPSink(port=port) as sink:
+        elapsed = await drain(emails, lambda events: all(e.status == OutboxStatusEnum.done for e in events))
+        messages = sink.wait_for(USERS)
+        assert len(messages) == USERS and sink.connections <= WORKERS, (len(messages), sink.connections)
+    print(f"⚡ {USERS} email xác nhận gửi qua {WORKERS} worker / {sink.connections} kết nối SMTP "
+          f"trong {elapsed * 1000:.0f}ms ({USERS / elapsed:.0f} thư/giây)")
+
+    db = SessionLocal()
+    try:
+        codes = {
+            verification.email: verification.verification_code
+            for verification in db.query(EmailVerification).filter(EmailVerification.email.in_(emails))
+        }
+    finally:
+        db.close()
+    for message in messages:
+        (email,) = message.rcpt_to
+        parsed = message.parsed()
+        assert parsed["To"] == email and parsed["Subject"] == "Xác nhận đăng ký tài khoản của bạn"
+        assert codes[email] in parsed.get_body(("html",)).get_content(), email
+    assert sorted(m.rcpt_to[0] for m in messages) == sorted(emails)
+    print("✅ Mỗi thư đúng người nhận và đúng mã xác nhận")
+
+
+def main():
+    prefix = f"outbox-{uuid.uuid4().hex[:6]}"
+    emails = [f"{prefix}-{i}@example.com" for i in range(USERS)]
+    try:
+        asyncio.run(run(emails))
+    finally:
+        drop_registered_users(emails)
+        close_smtp_pools()
+
+
+if __name__ == "__main__":
+    main()
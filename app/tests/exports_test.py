@@ -0,0 +1,147 @@
+"""
+Kiểm thử export cho kế toán (GET /exports/tickets, /exports/transactions):
+- Export toàn bộ bảng tickets qua stream_export: số dòng khớp COUNT(*), bộ nhớ đỉnh (tracemalloc)
+  so với cách cũ nạp toàn bộ kết quả vào bộ nhớ
+- Event loop không bị chặn trong lúc export: đo độ trễ của một tác vụ tick mỗi TICK_MS
+- Qua HTTP: CSV có header + đúng số dòng theo bộ lọc rạp / ngày, NDJSON giao dịch lọc theo rạp, 403 khi không phải admin
+App chạy in-process qua httpx.ASGITransport.
+
+# python -m app.tests.exports_test
+"""
+
+import asyncio
+import csv
+import io
+import json
+import time
+import tracemalloc
+from datetime import date
+
+import httpx
+from sqlalchemy import func, select
+
+from app.core.database import SessionLocal
+from app.core.security import get_current_admin_user
+from app.main import app
+from app.models.showtimes import Showtimes
+from app.models.tickets import Tickets
+from app.services.exports_service import stream_export, tickets_export_query
+from app.tests.my_tickets_test import buy
+from app.tests.payment_fixtures import showtime_fixture
+
+TICK_MS = 10
+
+
+async def measure_export(export_format: str, trace_memory: bool = False):
+    """(số dòng, số byte, bộ nhớ đỉnh MB, độ trễ event loop lớn nhất ms); tracemalloc làm chậm nên chỉ bật khi đo bộ nhớ"""
+    done = asyncio.Event()
+    lags = []
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(TICK_MS / 1000)
+            lags.append((time.perf_counter() - start) * 1000 - TICK_MS)
+
+    tick_task = asyncio.create_task(ticker())
+    if trace_memory:
+        tracemalloc.start()
+    rows = size = 0
+    async for chunk in stream_export(tickets_export_query(), export_format):
+        rows += chunk.count("\n")
+        size += len(chunk)
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024 if trace_memory else None
+    tracemalloc.stop()
+    done.set()
+    await tick_task
+    return rows, size, peak, max(lags)
+
+
+def legacy_export_peak() -> float:
+    """Cách cũ: nạp toàn bộ kết quả rồi mới trả"""
+    db = SessionLocal()
+    tracemalloc.start()
+    try:
+        rows = [dict(row._mapping) for row in db.execute(tickets_export_query())]
+        payload = json.dumps(rows, default=str)
+        assert payload
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+        db.close()
+
+
+async def run():
+    db = SessionLocal()
+    try:
+        total = db.scalar(select(func.count()).select_from(Tickets))
+    finally:
+        db.close()
+
+    start = time.perf_counter()
+    rows, size, _, lag = await measure_export("ndjson")
+    elapsed = time.perf_counter() - start
+    assert rows == total, (rows, total)
+    print(f"📤 NDJSON {rows} vé, {size / 1024 / 1024:.1f}MB trong {elapsed:.1f}s ({rows / elapsed:.0f} dòng/s),"
+          f" event loop trễ tối đa {lag:.0f}ms")
+    rows, size, peak, _ = await measure_export("csv", trace_memory=True)
+    assert rows == total + 1, (rows, total)
+    legacy_peak = await asyncio.to_thread(legacy_export_peak)
+    print(f"🐢 Bộ nhớ đỉnh: stream CSV {peak:.1f}MB, cách cũ (nạp toàn bộ) {legacy_peak:.1f}MB")
+    assert peak < legacy_peak / 10, (peak, legacy_peak)
+
+    # Dữ liệu của một rạp riêng để kiểm bộ lọc
+    with showtime_fixture(seat_count=6) as fixture:
+        await asyncio.to_thread(buy, fixture, fixture["seat_ids"][:3])
+        await asyncio.to_thread(buy, fixture, fixture["seat_ids"][3:])
+        db = SessionLocal()
+        try:
+            theater_id = db.get(Showtimes, fixture["showtime_id"]).theater_id
+            expected_transactions = db.scalar(
+                select(func.count(func.distinct(Tickets.transaction_id)))
+                .join(Showtimes, Showtimes.showtime_id == Tickets.showtime_id)
+                .where(Showtimes.theater_id == theater_id, Tickets.transaction_id.isnot(None))
+            )
+            expected_tickets = db.scalar(
+                select(func.count()).select_from(Tickets)
+                .join(Showtimes, Showtimes.showtime_id == Tickets.showtime_id)
+                .where(Showtimes.theater_id == theater_id, func.date(Tickets.booking_time) == date.today())
+            )
+        finally:
+            db.close()
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/api/v1/exports/tickets")
+            assert response.status_code in (401, 403), response.status_code
+
+            app.dependency_overrides[get_current_admin_user] = lambda: None
+            try:
+                today = date.today().isoformat()
+                response = await client.get("/api/v1/exports/tickets", params={
+                    "format": "csv", "theater_id": theater_id, "date_from": today, "date_to": today,
+                })
+                assert response.status_code == 200 and response.headers["content-type"].startswith("text/csv")
+                assert f'tickets_{today}_{today}.csv' in response.headers["content-disposition"]
+                table = list(csv.reader(io.StringIO(response.text)))
+                assert table[0][:3] == ["ticket_id", "booking_code", "transaction_id"], table[0]
+                assert len(table) - 1 == expected_tickets >= 6, (len(table), expected_tickets)
+
+                response = await client.get("/api/v1/exports/transactions", params={"theater_id": theater_id})
+                lines = [json.loads(line) for line in response.text.splitlines()]
+                assert len(lines) == expected_transactions >= 2, (len(lines), expected_transactions)
+                assert all(line["status"] == "success" for line in lines), lines
+
+                bad = await client.get("/api/v1/exports/tickets", params={"date_from": "2025-02-01", "date_to": "2025-01-01"})
+                assert bad.status_code == 400, bad.status_code
+            finally:
+                app.dependency_overrides.pop(get_current_admin_user, None)
+        print(f"✅ CSV {len(table) - 1} vé / NDJSON {len(lines)} giao dịch của rạp {theater_id}, 401/403 khi không phải admin")
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
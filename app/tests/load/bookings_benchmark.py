@@ -0,0 +1,104 @@
+"""
+Benchmark danh sách booking (/bookings, /tickets): cách cũ (tải toàn bộ tickets, lazy-load quan hệ từng vé,
+gom và sắp xếp trong Python) so với get_all_bookings (read model bookings + keyset) ở trang 1 và trang sâu,
+tra cứu một booking tại quầy và lịch sử của một khách.
+Tạo BOOKINGS booking x SEATS_PER_BOOKING vé bằng generate_series rồi dựng read model bằng backfill_bookings.
+
+# python -m app.tests.load.bookings_benchmark
+"""
+
+import os
+import time
+
+from sqlalchemy import text
+
+from app.core.database import SessionLocal
+from app.models.tickets import Tickets
+from app.services.bookings_service import backfill_bookings
+from app.services.tickets_service import encode_booking_cursor, get_all_bookings, get_booking_by_code, get_user_bookings_page
+from app.tests.payment_fixtures import showtime_fixture
+
+BOOKINGS = int(os.getenv("BOOKINGS", "20000"))
+SEATS_PER_BOOKING = 4
+PAGE_SIZE = 50
+DEEP_PAGE = 200
+ROUNDS = 20
+
+
+def seed(db, fixture) -> None:
+    seat_ids = fixture["seat_ids"]
+    db.execute(text("""
+        INSERT INTO tickets (booking_code, user_id, showtime_id, seat_id, price, status, booking_time)
+        SELECT 'BENCH' || :showtime_id || '-' || lpad(b::text, 7, '0'), :user_id, :showtime_id,
+               (:seat_ids)[1 + ((b * :per_booking + s) % cardinality(:seat_ids))], 90000, 'confirmed',
+               now() - (b || ' seconds')::interval
+        FROM generate_series(1, :bookings) AS b, generate_series(0, :per_booking - 1) AS s
+    """), {
+        "showtime_id": fixture["showtime_id"], "user_id": fixture["user_id"], "seat_ids": seat_ids,
+        "bookings": BOOKINGS, "per_booking": SEATS_PER_BOOKING,
+    })
+    db.commit()
+    start = time.perf_counter()
+    built = backfill_bookings(db)
+    print(f"   backfill read model: {built} booking trong {(time.perf_counter() - start):.1f}s")
+    db.execute(text("ANALYZE tickets"))
+    db.execute(text("ANALYZE bookings"))
+    db.commit()
+
+
+def legacy_list(db):
+    """Cách cũ: toàn bộ bảng tickets, mỗi vé lazy-load seat / user / showtime / movie / room"""
+    grouped = {}
+    for ticket in db.query(Tickets).all():
+        item = grouped.setdefault(ticket.booking_code, {"code": ticket.booking_code, "tickets": [], "ts": 0})
+        item["tickets"].append({"ticket_id": ticket.ticket_id, "seat": ticket.seat.seat_code})
+        if ticket.user:
+            item["customer"] = ticket.user.full_name
+        if ticket.showtime and ticket.showtime.movie:
+            item["movie"] = ticket.showtime.movie.title
+            item["room"] = getattr(ticket.showtime.room, "room_name", None)
+        item["ts"] = max(item["ts"], int(ticket.booking_time.timestamp()))
+    return sorted(grouped.values(), key=lambda it: it["ts"], reverse=True)
+
+
+def timed(label: str, fn, rounds: int = ROUNDS) -> None:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+        db_session.expunge_all()
+    print(f"   {label:<36} {(time.perf_counter() - start) * 1000 / rounds:10.2f} ms/page")
+
+
+def main():
+    global db_session
+    with showtime_fixture(seat_count=400) as fixture:
+        db_session = SessionLocal()
+        seed(db_session, fixture)
+        showtime_id = fixture["showtime_id"]
+
+        # Cursor của booking cuối trang DEEP_PAGE - 1 (lấy một lần, không tính giờ)
+        page = get_all_bookings(db_session, showtime_id=showtime_id, limit=PAGE_SIZE)
+        assert len(page["items"]) == PAGE_SIZE and all(len(item["tickets"]) == SEATS_PER_BOOKING for item in page["items"])
+        anchor = db_session.execute(text("""
+            SELECT booked_at, booking_code FROM bookings WHERE showtime_id = :showtime_id
+            ORDER BY booked_at DESC, booking_code DESC
+            OFFSET :offset LIMIT 1
+        """), {"showtime_id": showtime_id, "offset": (DEEP_PAGE - 1) * PAGE_SIZE - 1}).one()
+        deep_cursor = encode_booking_cursor(anchor.booked_at, anchor.booking_code)
+        deep = get_all_bookings(db_session, showtime_id=showtime_id, limit=PAGE_SIZE, cursor=deep_cursor)["items"]
+        assert deep[0]["code"] == f"BENCH{showtime_id}-{(DEEP_PAGE - 1) * PAGE_SIZE + 1:07d}", deep[0]["code"]
+
+        total_tickets = db_session.query(Tickets).count()
+        print(f"📚 {BOOKINGS} booking x {SEATS_PER_BOOKING} vé (bảng tickets: {total_tickets} dòng), trang {PAGE_SIZE} booking")
+        timed("cũ: toàn bảng + N+1 + sort Python", lambda: legacy_list(db_session), rounds=1)
+        timed("read model + keyset, trang 1", lambda: get_all_bookings(db_session, limit=PAGE_SIZE))
+        timed(f"read model + keyset, trang {DEEP_PAGE}", lambda: get_all_bookings(db_session, limit=PAGE_SIZE, cursor=deep_cursor))
+        timed("lọc theo suất chiếu, trang 1", lambda: get_all_bookings(db_session, showtime_id=showtime_id, limit=PAGE_SIZE))
+        timed("tra cứu một booking (quầy)", lambda: get_booking_by_code(db_session, deep[0]["code"]))
+        other_user = fixture["user_id"] + 1_000_000
+        timed("lịch sử khách (không có vé)", lambda: get_user_bookings_page(db_session, other_user, "upcoming"))
+        db_session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Load test: độ trễ WebSocket trong lúc có đợt checkout dồn dập.
+- LISTENERS client WebSocket cùng xem một suất chiếu, một client "probe" gửi ping liên tục
+- Pha 1 (idle): chỉ đo RTT ping/pong
+- Pha 2 (burst): CHECKOUT_WORKERS worker lặp giữ ghế → tạo thanh toán → hủy giữ ghế
+Báo cáo p50/p99/max của RTT ping và độ trễ fan-out (POST giữ ghế → listener nhận seats_reserved).
+Cần server đang chạy (LOAD_BASE_URL, mặc định http://localhost:8000) và DATABASE_URL
+trỏ cùng DB để tạo dữ liệu mẫu.
+
+# uvicorn app.main:app --port 8000
+# python -m app.tests.load.checkout_ws_load_test
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+import websockets
+from jose import jwt
+
+from app.core.config import settings
+from app.tests.payment_fixtures import showtime_fixture
+
+BASE_URL = os.getenv("LOAD_BASE_URL", "http://localhost:8000")
+LISTENERS = int(os.getenv("LOAD_LISTENERS", "50"))
+CHECKOUT_WORKERS = int(os.getenv("LOAD_CHECKOUT_WORKERS", "20"))
+SEATS_PER_CHECKOUT = 4
+IDLE_SECONDS = 3
+BURST_SECONDS = int(os.getenv("LOAD_BURST_SECONDS", "10"))
+PING_INTERVAL = 0.02
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def report(label, samples_ms):
+    print(f"   {label:<28} n={len(samples_ms):<6} p50={percentile(samples_ms, 50):7.1f}ms "
+          f"p99={percentile(samples_ms, 99):7.1f}ms max={max(samples_ms, default=float('nan')):7.1f}ms")
+
+
+class LoadTest:
+    def __init__(self, fixture):
+        self.fixture = fixture
+        self.ws_url = BASE_URL.replace("http", "ws", 1) + f"/api/v1/ws/seats/{fixture['showtime_id']}"
+        self.sent_at = {}          # session_id -> thời điểm gửi POST giữ ghế
+        self.fanout_ms = []
+        self.phase = "idle"
+        self.rtt_ms = {"idle": [], "burst": []}
+        self.stop = asyncio.Event()
+        self.checkouts = 0
+        self.errors = 0
+
+    async def listener(self, ready: asyncio.Event, counter: list):
+        async with websockets.connect(self.ws_url, max_queue=None) as ws:
+            counter[0] += 1
+            if counter[0] == LISTENERS:
+                ready.set()
+            last_heartbeat = time.monotonic()
+            while not self.stop.is_set():
+                # Server đóng kết nối nếu 10s không nhận tin → gửi heartbeat định kỳ
+                if time.monotonic() - last_heartbeat > 5:
+                    await ws.send(json.dumps({"type": "heartbeat", "timestamp": time.time()}))
+                    last_heartbeat = time.monotonic()
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=1)
+                except asyncio.TimeoutError:
+                    continue
+                message = json.loads(raw)
+                if message.get("type") == "seats_reserved":
+                    sent = self.sent_at.get(message["data"].get("user_session"))
+                    if sent is not None:
+                        self.fanout_ms.append((time.perf_counter() - sent) * 1000)
+
+    async def probe(self):
+        async with websockets.connect(self.ws_url, max_queue=None) as ws:
+            while not self.stop.is_set():
+                start = time.perf_counter()
+                await ws.send(json.dumps({"type": "ping"}))
+                while json.loads(await ws.recv()).get("type") != "pong":
+                    pass
+                self.rtt_ms[self.phase].append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(PING_INTERVAL)
+
+    async def checkout_worker(self, client: httpx.AsyncClient, worker_no: int, token: str):
+        seat_ids = self.fixture["seat_ids"][worker_no * SEATS_PER_CHECKOUT:(worker_no + 1) * SEATS_PER_CHECKOUT]
+        headers = {"Authorization": f"Bearer {token}"}
+        while not self.stop.is_set():
+            session_id = uuid.uuid4().hex
+            body = [
+                {"seat_id": seat_id, "showtime_id": self.fixture["showtime_id"],
+                 "user_id": self.fixture["user_id"], "session_id": session_id}
+                for seat_id in seat_ids
+            ]
+            try:
+                self.sent_at[session_id] = time.perf_counter()
+                response = await client.post("/api/v1/reservations/multiple", json=body)
+                response.raise_for_status()
+                response = await client.post(
+                    "/api/v1/payments/create", headers=headers,
+                    json={"session_id": session_id, "order_desc": "Load test", "payment_method": "VNPAY"},
+                )
+                response.raise_for_status()
+                response = await client.post(
+                    "/api/v1/reservations/cancel",
+                    json={"showtime_id": self.fixture["showtime_id"], "seat_ids": seat_ids, "session_id": session_id},
+                )
+                response.raise_for_status()
+                self.checkouts += 1
+            except httpx.HTTPError as e:
+                self.errors += 1
+                if self.errors <= 3:
+                    print(f"⚠️  Checkout lỗi: {e} {getattr(getattr(e, 'response', None), 'text', '')[:200]}")
+
+    async def run(self):
+        token = jwt.encode(
+            {"sub": self.fixture["user_email"], "type": "access", "exp": datetime.utcnow() + timedelta(hours=1)},
+            settings.SECRET_KEY, algorithm=settings.ALGORITHM,
+        )
+        ready, counter = asyncio.Event(), [0]
+        listeners = [asyncio.create_task(self.listener(ready, counter)) for _ in range(LISTENERS)]
+        await asyncio.wait_for(ready.wait(), timeout=30)
+        probe = asyncio.create_task(self.probe())
+
+        await asyncio.sleep(IDLE_SECONDS)
+        self.phase = "burst"
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=30) as client:
+            workers = [
+                asyncio.create_task(self.checkout_worker(client, worker_no, token))
+                for worker_no in range(CHECKOUT_WORKERS)
+            ]
+            await asyncio.sleep(BURST_SECONDS)
+            self.stop.set()
+            await asyncio.gather(*workers, probe, *listeners, return_exceptions=True)
+
+        print(f"📊 {LISTENERS} listener, {CHECKOUT_WORKERS} checkout worker, {BURST_SECONDS}s burst")
+        print(f"   checkout hoàn tất: {self.checkouts} ({self.checkouts / BURST_SECONDS:.1f}/s), lỗi: {self.errors}")
+        report("ping RTT (idle)", self.rtt_ms["idle"])
+        report("ping RTT (burst)", self.rtt_ms["burst"])
+        report("fan-out seats_reserved", self.fanout_ms)
+
+
+def main():
+    with showtime_fixture(seat_count=CHECKOUT_WORKERS * SEATS_PER_CHECKOUT) as fixture:
+        asyncio.run(LoadTest(fixture).run())
+
+
+if __name__ == "__main__":
+    main()
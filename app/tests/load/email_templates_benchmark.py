@@ -0,0 +1,101 @@
+"""
+Benchmark chuẩn bị email (send-prep):
+cách cũ (f-string → premailer.transform() mỗi lần gửi) so với template đã inline CSS sẵn
+(app.services.email_templates: chỉ escape + ghép chuỗi).
+Đo riêng bước HTML và cả bước dựng MIME của EmailService (không gửi: _deliver được thay bằng hàm ghi lại thư).
+Không cần DB / SMTP. HTML giống cách cũ / escape: app/tests/unit/test_email_templates.py.
+
+# python -m app.tests.load.email_templates_benchmark
+"""
+
+import string
+import time
+from datetime import datetime
+
+from premailer import transform
+
+from app.services.email_service import EmailService
+from app.services.email_templates import (
+    BOOKING_CONFIRMATION_TEMPLATE,
+    TEMPLATE_SOURCES,
+    TICKET_TEMPLATE,
+    VERIFICATION_TEMPLATE,
+    compile_template,
+    render_template,
+)
+
+ROUNDS = 300
+
+
+class CapturingEmailService(EmailService):
+    """Dựng thư như thật nhưng không mở kết nối SMTP"""
+
+    def __init__(self):
+        super().__init__("127.0.0.1", 25, "cineplus@example.com", "", "CinePlus")
+        self.messages = []
+
+    def _deliver(self, msg, to_email):
+        self.messages.append(msg)
+
+
+def values(name: str, i: int) -> dict:
+    common = {"sender_name": "CinePlus", "year": datetime.now().year}
+    if name == VERIFICATION_TEMPLATE:
+        return {**common, "verification_code": f"{i:06d}"}
+    if name == BOOKING_CONFIRMATION_TEMPLATE:
+        return {
+            **common,
+            "booking_id": f"BK{i:08d}",
+            "customer_name": "Nguyễn Văn A",
+            "departure_date": "2026-10-20",
+            "origin": "Dune: Part Three",
+            "destination": "CinePlus Landmark",
+            "time": "19:30",
+            "ticket_count": 3,
+        }
+    return {
+        "booking_id": f"BK{i:08d}",
+        "customer_name": "Nguyễn Văn A",
+        "movie_name": "Dune: Part Three",
+        "showtime": "2026-10-20 19:30",
+        "seats": "F5, F6, F7",
+    }
+
+
+def legacy_html(name: str, i: int) -> str:
+    """Cách cũ: ghép giá trị vào template nguồn rồi premailer.transform() mỗi email"""
+    return transform(string.Template(TEMPLATE_SOURCES[name]).substitute(values(name, i)))
+
+
+def timed(label: str, fn) -> float:
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    print(f"   {label:<38} {elapsed * 1e6 / ROUNDS:10.1f} µs/email")
+    return elapsed
+
+
+def main():
+    start = time.perf_counter()
+    for name in TEMPLATE_SOURCES:
+        compile_template(name)
+    print(f"🛠️  Inline CSS {len(TEMPLATE_SOURCES)} template (một lần lúc khởi động): {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    for name in (VERIFICATION_TEMPLATE, BOOKING_CONFIRMATION_TEMPLATE, TICKET_TEMPLATE):
+        print(f"📧 HTML template {name} ({ROUNDS} email)")
+        legacy = timed("legacy (premailer.transform mỗi lần)", lambda i: legacy_html(name, i))
+        new = timed("render_template", lambda i: render_template(name, **values(name, i)))
+        print(f"   → nhanh hơn {legacy / new:.0f}x")
+
+    # Cả bước dựng thư của EmailService (MIME + base64), phần còn lại sau khi bỏ premailer
+    service = CapturingEmailService()
+    print(f"✉️  EmailService dựng thư ({ROUNDS} email)")
+    timed("send_verification_email", lambda i: service.send_verification_email(f"u{i}@example.com", f"{i:06d}"))
+    booking = values(BOOKING_CONFIRMATION_TEMPLATE, 1)
+    timed("send_booking_confirmation_email", lambda i: service.send_booking_confirmation_email(f"u{i}@example.com", booking))
+    assert len(service.messages) == 2 * ROUNDS
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Kiểm thử tải soát vé tại cửa (gate_validator): SEATS khách quét QR qua GATES cửa song song.
+- Cách cũ: mỗi lượt quét decode JWT + truy vấn vé + UPDATE + commit
+- gate_validator: tra tập vé nạp sẵn trong bộ nhớ, validated_at ghi theo lô khi dừng / mỗi GATE_FLUSH_INTERVAL_SECONDS
+- Quét lại → duplicate kèm giờ soát đầu; vé bị hủy sau khi nạp → từ chối; DB có đủ validated_at, bookings được đánh dấu
+
+# python -m app.tests.load.gate_scan_load_test
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from fastapi import HTTPException
+from jose import jwt
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.gate_validator import gate_validator
+from app.models.bookings import Bookings
+from app.models.tickets import Tickets, TicketStatusEnum
+from app.schemas.tickets import TicketVerifyRequest
+from app.services.tickets_service import verify_ticket_qr
+from app.tests.payment_fixtures import showtime_fixture, sold_out_showtime
+
+SEATS = 300
+SEATS_PER_BOOKING = 3
+GATES = 4
+
+
+def legacy_verify(token: str) -> None:
+    """Cách cũ: mỗi lượt quét một session, truy vấn vé, ghi validated_at và commit"""
+    decoded = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    db = SessionLocal()
+    try:
+        ticket = db.query(Tickets).filter(Tickets.ticket_id == int(decoded["ticket_id"])).first()
+        if ticket.status == TicketStatusEnum.confirmed and not ticket.validated_at:
+            ticket.validated_at = datetime.now()
+            db.commit()
+    finally:
+        db.close()
+
+
+def scan_all(fn, tokens):
+    """GATES cửa quét song song, trả về (kết quả, thời gian ms)"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=GATES) as pool:
+        results = list(pool.map(fn, tokens))
+    return results, (time.perf_counter() - start) * 1000
+
+
+def gate_verify(token: str):
+    return verify_ticket_qr(None, TicketVerifyRequest(qr_token=token))
+
+
+async def run():
+    with showtime_fixture(seat_count=SEATS) as legacy, showtime_fixture(seat_count=SEATS) as fixture:
+        _, legacy_tokens = sold_out_showtime(legacy, SEATS_PER_BOOKING)
+        _, elapsed = await asyncio.to_thread(scan_all, legacy_verify, list(legacy_tokens.values()))
+        print(f"🐢 Cách cũ: {SEATS} lượt quét / {GATES} cửa trong {elapsed:.0f}ms ({elapsed / SEATS:.2f} ms/lượt)")
+
+        showtime_id, tokens = sold_out_showtime(fixture, SEATS_PER_BOOKING)
+        gate_validator.start()
+        try:
+            loaded = await asyncio.to_thread(gate_validator.preload)
+            print(f"🎫 Nạp tập vé cho {loaded} suất chiếu")
+            responses, elapsed = await asyncio.to_thread(scan_all, gate_verify, list(tokens.values()))
+            assert all(response.validated and not response.duplicate for response in responses)
+            print(f"⚡ gate_validator: {SEATS} lượt quét / {GATES} cửa trong {elapsed:.0f}ms ({elapsed / SEATS:.3f} ms/lượt)")
+
+            again, _ = await asyncio.to_thread(scan_all, gate_verify, list(tokens.values()))
+            first_scan = {response.ticket_id: response.validated_at for response in responses}
+            assert all(response.duplicate and response.validated_at == first_scan[response.ticket_id] for response in again)
+            print(f"✅ Quét lại {len(again)} vé → duplicate, giữ giờ soát đầu")
+        finally:
+            await gate_validator.stop()
+
+        db = SessionLocal()
+        try:
+            validated = db.query(Tickets).filter(Tickets.showtime_id == showtime_id, Tickets.validated_at.isnot(None)).count()
+            assert validated == SEATS, validated
+            assert db.query(Bookings).filter(Bookings.showtime_id == showtime_id, Bookings.validated_at.is_(None)).count() == 0
+
+            # Vé bị hủy sau khi nạp tập vé
+            cancelled = db.query(Tickets).filter(Tickets.showtime_id == showtime_id).first()
+            cancelled.status = TicketStatusEnum.cancelled
+            db.commit()
+            gate_validator.invalidate([showtime_id])
+            try:
+                gate_verify(tokens[cancelled.ticket_id])
+                raise AssertionError("vé đã hủy vẫn được soát")
+            except HTTPException as e:
+                assert e.status_code == 400, e.detail
+        finally:
+            db.close()
+        print(f"✅ {validated} validated_at đã ghi theo lô, bookings được đánh dấu, vé đã hủy bị từ chối")
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
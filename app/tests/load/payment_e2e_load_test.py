@@ -0,0 +1,188 @@
+"""
+Load test end-to-end luồng mua vé qua cổng VNPay giả lập (app/payments/simulator.py):
+giữ ghế → tạo thanh toán → "khách thanh toán" trên simulator → return + IPN → vé.
+Báo cáo throughput và p50/p95/p99 của từng bước và của toàn bộ luồng,
+sau đó kiểm tra trong DB: mỗi đơn thành công có đúng số vé, không vé trùng.
+
+Simulator chạy ngay trong process này (cổng LOAD_SIM_PORT, mặc định 9000).
+Backend phải được chạy với cổng thanh toán trỏ tới simulator, ví dụ:
+# VNPAY_PAYMENT_URL=http://localhost:9000/paymentv2/vpcpay.html \
+#   VNPAY_RETURN_URL=http://localhost:8000/api/v1/payments/vnpay/return \
+#   uvicorn app.main:app --port 8000
+# python -m app.tests.load.payment_e2e_load_test
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+import uvicorn
+from jose import jwt
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.tickets import Tickets
+from app.payments.simulator import SimulatorConfig, create_simulator_app
+from app.tests.payment_fixtures import showtime_fixture
+
+BASE_URL = os.getenv("LOAD_BASE_URL", "http://localhost:8000")
+SIM_PORT = int(os.getenv("LOAD_SIM_PORT", "9000"))
+ORDERS = int(os.getenv("LOAD_ORDERS", "200"))
+CONCURRENCY = int(os.getenv("LOAD_CONCURRENCY", "20"))
+SEATS_PER_ORDER = int(os.getenv("LOAD_SEATS_PER_ORDER", "2"))
+POLL_TIMEOUT_SECONDS = 30
+
+SIMULATOR_CONFIG = SimulatorConfig(
+    ipn_url=f"{BASE_URL}/api/v1/payments/vnpay/ipn",
+    latency_ms=float(os.getenv("LOAD_SIM_LATENCY_MS", "50")),
+    latency_jitter_ms=float(os.getenv("LOAD_SIM_LATENCY_JITTER_MS", "50")),
+    failure_rate=float(os.getenv("LOAD_SIM_FAILURE_RATE", "0.05")),
+    duplicate_ipn_rate=float(os.getenv("LOAD_SIM_DUPLICATE_IPN_RATE", "0.2")),
+    deliver_return=True,
+)
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class Scenario:
+    def __init__(self, fixture, token):
+        self.fixture = fixture
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.timings = defaultdict(list)
+        self.outcomes = Counter()
+        self.booking_codes = {}
+        self.queue = asyncio.Queue()
+        for order_no in range(ORDERS):
+            self.queue.put_nowait(order_no)
+
+    async def poll_status(self, client: httpx.AsyncClient, order_id: str) -> str:
+        deadline = time.monotonic() + POLL_TIMEOUT_SECONDS
+        while time.monotonic() < deadline:
+            response = await client.get(f"/api/v1/payments/payment-status/{order_id}")
+            status = response.json().get("status")
+            if status in ("SUCCESS", "FAILED"):
+                return status
+            await asyncio.sleep(0.05)
+        return "TIMEOUT"
+
+    async def purchase(self, backend: httpx.AsyncClient, gateway: httpx.AsyncClient, order_no: int):
+        seat_ids = self.fixture["seat_ids"][order_no * SEATS_PER_ORDER:(order_no + 1) * SEATS_PER_ORDER]
+        session_id = uuid.uuid4().hex
+        start = time.perf_counter()
+
+        response = await backend.post("/api/v1/reservations/multiple", json=[
+            {"seat_id": seat_id, "showtime_id": self.fixture["showtime_id"],
+             "user_id": self.fixture["user_id"], "session_id": session_id}
+            for seat_id in seat_ids
+        ])
+        response.raise_for_status()
+        held = time.perf_counter()
+
+        response = await backend.post("/api/v1/payments/create", headers=self.headers, json={
+            "session_id": session_id, "order_desc": f"Load test {order_no}", "payment_method": "VNPAY",
+        })
+        response.raise_for_status()
+        payment = response.json()["data"]
+        created = time.perf_counter()
+
+        # Simulator: chữ ký URL → kết quả giao dịch → IPN (nền) + return URL (trả body về đây)
+        response = await gateway.get(payment["payment_url"])
+        response.raise_for_status()
+        returned = response.json()
+        paid = time.perf_counter()
+
+        data = returned["return_body"].get("data") if isinstance(returned["return_body"], dict) else None
+        status = (data or {}).get("status")
+        if status == "success":
+            outcome = "SUCCESS"
+            self.booking_codes[payment["order_id"]] = data.get("booking_code")
+        elif status == "failed":
+            outcome = "FAILED"
+        else:
+            # IPN đang giữ khóa đơn (processing) hoặc return bị từ chối → chờ trạng thái cuối
+            outcome = await self.poll_status(backend, payment["order_id"])
+        done = time.perf_counter()
+
+        self.outcomes[outcome] += 1
+        self.timings["hold"].append(held - start)
+        self.timings["create payment"].append(created - held)
+        self.timings["gateway + return"].append(paid - created)
+        self.timings["full purchase"].append(done - start)
+
+    async def worker(self, backend: httpx.AsyncClient, gateway: httpx.AsyncClient):
+        while True:
+            try:
+                order_no = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                await self.purchase(backend, gateway, order_no)
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                self.outcomes["ERROR"] += 1
+                if self.outcomes["ERROR"] <= 3:
+                    print(f"⚠️  Đơn {order_no} lỗi: {e!r}")
+
+
+async def run():
+    with showtime_fixture(seat_count=ORDERS * SEATS_PER_ORDER) as fixture:
+        token = jwt.encode(
+            {"sub": fixture["user_email"], "type": "access", "exp": datetime.utcnow() + timedelta(hours=1)},
+            settings.SECRET_KEY, algorithm=settings.ALGORITHM,
+        )
+
+        simulator_app = create_simulator_app(SIMULATOR_CONFIG)
+        server = uvicorn.Server(uvicorn.Config(simulator_app, port=SIM_PORT, log_level="warning"))
+        server_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+
+        scenario = Scenario(fixture, token)
+        limits = httpx.Limits(max_connections=CONCURRENCY * 2)
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=60, limits=limits) as backend, \
+                httpx.AsyncClient(timeout=60, limits=limits) as gateway:
+            start = time.perf_counter()
+            await asyncio.gather(*[scenario.worker(backend, gateway) for _ in range(CONCURRENCY)])
+            elapsed = time.perf_counter() - start
+
+        # Chờ các IPN còn lại (kể cả IPN trùng) rồi mới kiểm tra DB
+        await simulator_app.state.simulator.drain()
+        server.should_exit = True
+        await server_task
+
+        print(f"📊 {ORDERS} đơn x {SEATS_PER_ORDER} ghế, concurrency {CONCURRENCY}: "
+              f"{elapsed:.1f}s → {ORDERS / elapsed:.1f} đơn/s")
+        print(f"   kết quả: {dict(scenario.outcomes)}")
+        for step, values in scenario.timings.items():
+            print(f"   {step:<18} p50={percentile(values, 50) * 1000:7.1f}ms p95={percentile(values, 95) * 1000:7.1f}ms "
+                  f"p99={percentile(values, 99) * 1000:7.1f}ms")
+        print(f"   simulator: {dict(simulator_app.state.simulator.stats)}")
+
+        db = SessionLocal()
+        try:
+            tickets = db.query(Tickets.booking_code, Tickets.seat_id).filter(
+                Tickets.showtime_id == fixture["showtime_id"]
+            ).all()
+        finally:
+            db.close()
+        seats_per_booking = Counter(code for code, _ in tickets)
+        assert len({seat_id for _, seat_id in tickets}) == len(tickets), "Một ghế có nhiều vé"
+        assert all(count == SEATS_PER_ORDER for count in seats_per_booking.values()), seats_per_booking
+        assert len(seats_per_booking) == scenario.outcomes["SUCCESS"], (len(seats_per_booking), scenario.outcomes)
+        print(f"✅ {len(tickets)} vé / {len(seats_per_booking)} booking: không vé trùng")
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark lịch sử thanh toán VNPay: OFFSET + COUNT(*) (cách cũ) so với keyset cursor
+(PaymentService.get_vnpay_history) ở trang 1 và trang sâu.
+Tạo HISTORY_ROWS payment cho một user mẫu bằng generate_series.
+
+# python -m app.tests.load.payment_history_benchmark
+"""
+
+import os
+import time
+
+from sqlalchemy import text
+
+from app.core.database import SessionLocal
+from app.models.payments import VNPayPayment
+from app.services.payments_service import PaymentService, encode_history_cursor
+from app.tests.payment_fixtures import showtime_fixture
+
+HISTORY_ROWS = int(os.getenv("HISTORY_ROWS", "100000"))
+PAGE_SIZE = 50
+DEEP_PAGE = 500
+ROUNDS = 20
+
+
+def seed(db, user_id: int) -> None:
+    db.execute(text("""
+        WITH new_payments AS (
+            INSERT INTO payments (order_id, amount, payment_method, payment_status, user_id,
+                                  callback_state, created_at)
+            SELECT 'HIST' || :user_id || '-' || g, 90000, 'VNPAY', 'SUCCESS', :user_id,
+                   'completed', now() - (g || ' seconds')::interval
+            FROM generate_series(1, :rows) AS g
+            RETURNING payment_id, order_id, created_at
+        )
+        INSERT INTO vnpay_payments (payment_id, vnp_txn_ref, vnp_pay_date, vnp_response_code)
+        SELECT payment_id, order_id, to_char(created_at, 'YYYYMMDDHH24MISS'), '00' FROM new_payments
+    """), {"user_id": user_id, "rows": HISTORY_ROWS})
+    db.commit()
+    db.execute(text("ANALYZE payments"))
+    db.execute(text("ANALYZE vnpay_payments"))
+    db.commit()
+
+
+def legacy_page(db, user_id: int, page: int):
+    """Cách cũ: COUNT(*) rồi OFFSET"""
+    query = db.query(VNPayPayment).filter(VNPayPayment.user_id == user_id)
+    total = query.count()
+    items = query.order_by(VNPayPayment.created_at.desc()).offset((page - 1) * PAGE_SIZE).limit(PAGE_SIZE).all()
+    return total, items
+
+
+def timed(label: str, fn) -> None:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+        db_session.expunge_all()
+    print(f"   {label:<36} {(time.perf_counter() - start) * 1000 / ROUNDS:8.2f} ms/page")
+
+
+def main():
+    global db_session
+    with showtime_fixture(seat_count=1) as fixture:
+        user_id = fixture["user_id"]
+        db_session = SessionLocal()
+        seed(db_session, user_id)
+        service = PaymentService()
+
+        # Cursor của bản ghi cuối trang DEEP_PAGE - 1 (lấy một lần, không tính giờ)
+        anchor = (
+            db_session.query(VNPayPayment.created_at, VNPayPayment.payment_id)
+            .filter(VNPayPayment.user_id == user_id)
+            .order_by(VNPayPayment.created_at.desc(), VNPayPayment.payment_id.desc())
+            .offset((DEEP_PAGE - 1) * PAGE_SIZE - 1).limit(1).one()
+        )
+        deep_cursor = encode_history_cursor(anchor.created_at, anchor.payment_id)
+
+        # Trang sâu của hai cách phải giống nhau
+        keyset_items = service.get_vnpay_history(db_session, user_id=user_id, limit=PAGE_SIZE, cursor=deep_cursor)["items"]
+        _, legacy_items = legacy_page(db_session, user_id, DEEP_PAGE)
+        assert [item["payment_id"] for item in keyset_items] == [item.payment_id for item in legacy_items]
+        # Tổng ước lượng với bộ lọc chứa ký tự đặc biệt (nháy, dấu :, %) và Enum: tham số bind, không ghép vào SQL
+        estimated = service.get_vnpay_history(
+            db_session, user_id=user_id, order_id="x':y%_", status="SUCCESS", start_date="2025-01-01", include_total=True
+        )
+        assert estimated["items"] == [] and estimated["total"] >= 0, estimated
+
+        print(f"📚 {HISTORY_ROWS} payment, trang {PAGE_SIZE} dòng")
+        timed("OFFSET + COUNT, trang 1", lambda: legacy_page(db_session, user_id, 1))
+        timed(f"OFFSET + COUNT, trang {DEEP_PAGE}", lambda: legacy_page(db_session, user_id, DEEP_PAGE))
+        timed("keyset, trang 1", lambda: service.get_vnpay_history(db_session, user_id=user_id, limit=PAGE_SIZE))
+        timed(f"keyset, trang {DEEP_PAGE}", lambda: service.get_vnpay_history(
+            db_session, user_id=user_id, limit=PAGE_SIZE, cursor=deep_cursor))
+        timed(f"keyset + tổng ước lượng, trang {DEEP_PAGE}", lambda: service.get_vnpay_history(
+            db_session, user_id=user_id, limit=PAGE_SIZE, cursor=deep_cursor, include_total=True))
+        timed("tiền tố order_id", lambda: service.get_vnpay_history(
+            db_session, order_id=f"HIST{user_id}-4242", limit=PAGE_SIZE))
+        db_session.close()
+
+
+if __name__ == "__main__":
+    main()
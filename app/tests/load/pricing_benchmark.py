@@ -0,0 +1,121 @@
+"""
+Benchmark tính giá vé: đường cũ (2 truy vấn / ghế, gọi 2 lần / ghế khi checkout)
+so với bảng giá theo suất chiếu (pricing_service).
+Mặc định chạy trên SQLite in-memory, có thể trỏ sang Postgres bằng BENCH_DATABASE_URL.
+
+# python -m app.tests.load.pricing_benchmark
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models.movies import Movies
+from app.models.rooms import Rooms
+from app.models.seat_layouts import SeatLayouts
+from app.models.seat_templates import SeatTypeEnum
+from app.models.seats import Seats
+from app.models.showtimes import Showtimes
+from app.models.theaters import Theaters
+from app.services import pricing_service
+
+SEATS_PER_ROOM = 200
+CART_SIZES = [1, 4, 10]
+ROUNDS = 200
+
+
+def legacy_calculate_ticket_price(db, seat_id: int, showtime_id: int) -> int:
+    """Bản sao của PaymentService.calculate_ticket_price trước khi có bảng giá"""
+    seat = db.query(Seats).filter(Seats.seat_id == seat_id).first()
+    showtime = db.query(Showtimes).filter(Showtimes.showtime_id == showtime_id).first()
+    price = float(showtime.ticket_price)
+    if seat.seat_type == SeatTypeEnum.vip:
+        price *= 1.5
+    elif seat.seat_type == SeatTypeEnum.couple:
+        price *= 2.0
+    return int(price)
+
+
+def seed(db):
+    theater = Theaters(name="Bench", address="Bench", city="HCM")
+    layout = SeatLayouts(layout_name="bench", total_rows=10, total_columns=20)
+    db.add_all([theater, layout])
+    db.flush()
+    room = Rooms(theater_id=theater.theater_id, layout_id=layout.layout_id, room_name="R1")
+    movie = Movies(title="Bench", duration=120)
+    db.add_all([room, movie])
+    db.flush()
+    seat_types = [SeatTypeEnum.regular, SeatTypeEnum.vip, SeatTypeEnum.couple]
+    seats = [
+        Seats(room_id=room.room_id, seat_type=seat_types[i % 3], seat_code=f"S{i}", row_number=i // 20, column_number=i % 20)
+        for i in range(SEATS_PER_ROOM)
+    ]
+    db.add_all(seats)
+    showtime = Showtimes(
+        movie_id=movie.movie_id, theater_id=theater.theater_id, room_id=room.room_id,
+        show_datetime=datetime.now() + timedelta(days=1), ticket_price=85000,
+    )
+    db.add(showtime)
+    db.commit()
+    return showtime.showtime_id, [seat.seat_id for seat in seats]
+
+
+def main():
+    url = os.getenv("BENCH_DATABASE_URL", "sqlite://")
+    engine = create_engine(url)
+    tables = [Theaters.__table__, SeatLayouts.__table__, Rooms.__table__, Movies.__table__, Seats.__table__, Showtimes.__table__]
+    Base.metadata.create_all(engine, tables=tables)
+    db = sessionmaker(bind=engine)()
+    showtime_id, seat_ids = seed(db)
+
+    queries = {"count": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_queries(*args, **kwargs):
+        queries["count"] += 1
+
+    for cart_size in CART_SIZES:
+        cart = seat_ids[:cart_size]
+
+        # Đường cũ: tính tổng khi tạo payment + tính lại từng vé khi xuất vé
+        queries["count"] = 0
+        started = time.perf_counter()
+        for _ in range(ROUNDS):
+            legacy = {seat_id: legacy_calculate_ticket_price(db, seat_id, showtime_id) for seat_id in cart}
+            legacy = {seat_id: legacy_calculate_ticket_price(db, seat_id, showtime_id) for seat_id in cart}
+        legacy_ms = (time.perf_counter() - started) * 1000 / ROUNDS
+        legacy_queries = queries["count"] / ROUNDS
+
+        # Bảng giá: lần đầu dựng bảng (cold), các lần sau lấy từ cache (warm)
+        pricing_service.invalidate_price_table()
+        queries["count"] = 0
+        started = time.perf_counter()
+        cold = pricing_service.price_cart(db, showtime_id, cart)
+        cold_ms = (time.perf_counter() - started) * 1000
+        cold_queries = queries["count"]
+
+        queries["count"] = 0
+        started = time.perf_counter()
+        for _ in range(ROUNDS):
+            warm = pricing_service.price_cart(db, showtime_id, cart)
+            warm = pricing_service.price_cart(db, showtime_id, cart)
+        warm_ms = (time.perf_counter() - started) * 1000 / ROUNDS
+        warm_queries = queries["count"] / ROUNDS
+
+        assert legacy == cold == warm, "Giá tính theo bảng giá khác đường cũ"
+        print(
+            f"cart={cart_size:>3} | legacy {legacy_ms:8.3f} ms ({legacy_queries:.0f} queries) | "
+            f"table cold {cold_ms:8.3f} ms ({cold_queries} queries) | "
+            f"table warm {warm_ms:8.4f} ms ({warm_queries:.0f} queries) | "
+            f"speedup x{legacy_ms / warm_ms:,.0f}"
+        )
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
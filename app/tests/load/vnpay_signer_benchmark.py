@@ -0,0 +1,87 @@
+"""
+Benchmark ký URL / xác thực callback VNPay:
+cách cũ (instance VNPay dùng chung, nối chuỗi trong vòng lặp, hmac.new mỗi lần)
+so với hàm thuần (canonical_query một lượt + HMAC đã nạp key sẵn).
+Không cần DB.
+
+# python -m app.tests.load.vnpay_signer_benchmark
+"""
+
+import hashlib
+import hmac
+import time
+import urllib.parse
+from datetime import datetime
+
+from app.payments.vnpay import build_payment_url, canonical_query, sign, verify_callback
+
+SECRET_KEY = "BENCHSECRETKEY0123456789ABCDEFGH"
+PAYMENT_URL = "https://sandbox.vnpayment.vn/paymentv2/vpcpay.html"
+ROUNDS = 20000
+
+
+def legacy_payment_url(request_data: dict) -> str:
+    """Thuật toán cũ của VNPay.get_payment_url (class wrapper đã bỏ)"""
+    input_data = sorted(request_data.items())
+    query_string = ''
+    seq = 0
+    for key, val in input_data:
+        if seq == 1:
+            query_string = query_string + "&" + key + '=' + urllib.parse.quote_plus(str(val))
+        else:
+            seq = 1
+            query_string = key + '=' + urllib.parse.quote_plus(str(val))
+    hash_value = hmac.new(SECRET_KEY.encode('utf-8'), query_string.encode('utf-8'), hashlib.sha512).hexdigest()
+    return PAYMENT_URL + "?" + query_string + '&vnp_SecureHash=' + hash_value
+
+
+def request_params(i: int) -> dict:
+    return {
+        "vnp_Version": "2.1.0",
+        "vnp_Command": "pay",
+        "vnp_TmnCode": "BENCH001",
+        "vnp_Amount": 18000000 + i,
+        "vnp_CurrCode": "VND",
+        "vnp_TxnRef": f"ORDER{i:08d}",
+        "vnp_OrderInfo": f"Thanh toan ve xem phim {i}",
+        "vnp_OrderType": "other",
+        "vnp_Locale": "vn",
+        "vnp_CreateDate": datetime.now().strftime('%Y%m%d%H%M%S'),
+        "vnp_IpAddr": "127.0.0.1",
+        "vnp_ReturnUrl": "http://localhost:8000/api/v1/payments/vnpay/return",
+    }
+
+
+def timed(label: str, fn) -> float:
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    print(f"   {label:<38} {elapsed * 1e6 / ROUNDS:8.2f} µs/op")
+    return elapsed
+
+
+def main():
+    params = [request_params(i) for i in range(ROUNDS)]
+
+    # Kết quả phải giống hệt nhau trước khi so tốc độ
+    assert legacy_payment_url(params[0]) == build_payment_url(PAYMENT_URL, params[0], SECRET_KEY)
+
+    callbacks = []
+    for p in params:
+        callback = {key: str(val) for key, val in p.items()}
+        callback["vnp_SecureHash"] = sign(SECRET_KEY, canonical_query(callback))
+        callback["vnp_SecureHashType"] = "HmacSHA512"
+        callbacks.append(callback)
+
+    print(f"🔐 Ký URL thanh toán ({ROUNDS} lần)")
+    legacy = timed("legacy (string concat + hmac.new)", lambda i: legacy_payment_url(params[i]))
+    new = timed("build_payment_url", lambda i: build_payment_url(PAYMENT_URL, params[i], SECRET_KEY))
+    print(f"   → nhanh hơn {legacy / new:.2f}x")
+
+    print(f"🔎 Xác thực callback ({ROUNDS} lần)")
+    timed("verify_callback", lambda i: verify_callback(callbacks[i], SECRET_KEY))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Kiểm thử "Vé của tôi" (/tickets/my) trên một khách có BOOKINGS_PER_SECTION đơn sắp chiếu + BOOKINGS_PER_SECTION đơn đã chiếu:
+- upcoming / past tách đúng, duyệt hết các trang bằng cursor không trùng / không sót, đúng thứ tự
+- So sánh thời gian: cách cũ (tải toàn bộ vé, lazy-load suất chiếu / phim / phòng / rạp / ghế từng vé)
+  với trang đầu khi cache trống và khi cache đã có
+- Mua vé mới (callback VNPay) → cache bị vô hiệu hóa, đơn mới xuất hiện ngay ở upcoming
+
+# python -m app.tests.my_tickets_test
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+from urllib.parse import parse_qsl, urlsplit
+
+from sqlalchemy import text
+from sqlalchemy.orm import undefer
+
+from app.core.database import SessionLocal
+from app.models.showtimes import Showtimes
+from app.models.tickets import Tickets
+from app.payments.simulator import SimulatorConfig, VNPaySimulator
+from app.schemas.payments import PaymentMethod, PaymentRequest
+from app.services.bookings_service import refresh_bookings
+from app.services.payments_service import PaymentService
+from app.services.tickets_service import get_my_bookings, get_user_bookings_page
+from app.tests.payment_fixtures import showtime_fixture, hold_seats
+
+BOOKINGS_PER_SECTION = int(os.getenv("BOOKINGS_PER_SECTION", "1000"))
+SEATS_PER_BOOKING = 2
+PAGE_SIZE = 10
+ROUNDS = 50
+
+
+def seed(db, fixture) -> int:
+    """Suất đã chiếu (hôm kia) cùng phòng + vé cho cả hai suất, dựng read model. Trả về showtime_id suất đã chiếu"""
+    upcoming = db.get(Showtimes, fixture["showtime_id"])
+    past = Showtimes(
+        movie_id=upcoming.movie_id, theater_id=upcoming.theater_id, room_id=upcoming.room_id,
+        show_datetime=datetime.now() - timedelta(days=2), ticket_price=upcoming.ticket_price,
+    )
+    db.add(past)
+    db.flush()
+    for prefix, showtime_id in (("UP", upcoming.showtime_id), ("PAST", past.showtime_id)):
+        db.execute(text("""
+            INSERT INTO tickets (booking_code, user_id, showtime_id, seat_id, price, status, booking_time)
+            SELECT :prefix || :showtime_id || '-' || lpad(b::text, 6, '0'), :user_id, :showtime_id,
+                   (:seat_ids)[1 + ((b * :per_booking + s) % cardinality(:seat_ids))], 90000, 'confirmed', now()
+            FROM generate_series(1, :bookings) AS b, generate_series(0, :per_booking - 1) AS s
+        """), {
+            "prefix": prefix, "showtime_id": showtime_id, "user_id": fixture["user_id"],
+            "seat_ids": fixture["seat_ids"], "bookings": BOOKINGS_PER_SECTION, "per_booking": SEATS_PER_BOOKING,
+        })
+    codes = [code for (code,) in db.query(Tickets.booking_code).filter(Tickets.user_id == fixture["user_id"]).distinct()]
+    for start in range(0, len(codes), 1000):
+        refresh_bookings(db, codes[start:start + 1000])
+    db.commit()
+    db.execute(text("ANALYZE bookings"))
+    db.commit()
+    return past.showtime_id
+
+
+def legacy_my_tickets(db, user_id: int):
+    """Cách cũ: toàn bộ vé của khách, mỗi vé lazy-load showtime / movie / room / theater / seat"""
+    bookings = {}
+    for t in db.query(Tickets).options(undefer(Tickets.qr_code)).filter(Tickets.user_id == user_id).all():
+        if t.booking_code not in bookings:
+            showtime = t.showtime
+            bookings[t.booking_code] = {
+                "booking_code": t.booking_code, "movie_title": showtime.movie.title,
+                "room": showtime.room.room_name, "theater_name": showtime.theater.name,
+                "seats": [], "qr_code": t.qr_code, "_sort": showtime.show_datetime,
+            }
+        bookings[t.booking_code]["seats"].append(t.seat.seat_code)
+    return sorted(bookings.values(), key=lambda item: item["_sort"], reverse=True)
+
+
+def walk(db, user_id: int, section: str):
+    codes, cursor = [], None
+    while True:
+        page = get_user_bookings_page(db, user_id, section, limit=100, cursor=cursor)
+        codes.extend(item["booking_code"] for item in page["items"])
+        if not page["has_more"]:
+            return codes
+        cursor = page["next_cursor"]
+
+
+def timed(label: str, fn, rounds: int = ROUNDS) -> None:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+        db_session.expunge_all()
+    print(f"   {label:<40} {(time.perf_counter() - start) * 1000 / rounds:10.2f} ms")
+
+
+def buy(fixture, seat_ids) -> str:
+    """Mua vé qua VNPay (callback ký bởi cổng giả lập), trả về booking_code"""
+    service = PaymentService()
+    simulator = VNPaySimulator(SimulatorConfig(send_ipn=False))
+    db = SessionLocal()
+    try:
+        session_id = hold_seats(fixture["showtime_id"], fixture["user_id"], seat_ids)
+        payment = service.create_payment(
+            db, PaymentRequest(session_id=session_id, order_desc="My tickets test", payment_method=PaymentMethod.VNPAY),
+            "127.0.0.1", user_id=fixture["user_id"],
+        )
+        callback = simulator.signed_callback(dict(parse_qsl(urlsplit(payment.payment_url).query)))
+        payment_result = service.handle_vnpay_callback(db, callback)
+        return service.update_payment_status(db, payment_result.order_id, payment_result)["booking_code"]
+    finally:
+        db.close()
+
+
+def main():
+    global db_session
+    with showtime_fixture(seat_count=400) as fixture:
+        user_id = fixture["user_id"]
+        db_session = SessionLocal()
+        seed(db_session, fixture)
+
+        upcoming, past = walk(db_session, user_id, "upcoming"), walk(db_session, user_id, "past")
+        assert len(upcoming) == len(set(upcoming)) == BOOKINGS_PER_SECTION, len(upcoming)
+        assert len(past) == len(set(past)) == BOOKINGS_PER_SECTION, len(past)
+        assert all(code.startswith("UP") for code in upcoming) and all(code.startswith("PAST") for code in past)
+        assert upcoming == sorted(upcoming) and past == sorted(past, reverse=True)
+        print(f"✅ {len(upcoming)} upcoming + {len(past)} past, phân trang đủ và đúng thứ tự")
+
+        print(f"🎟️  Khách có {2 * BOOKINGS_PER_SECTION} đơn ({2 * BOOKINGS_PER_SECTION * SEATS_PER_BOOKING} vé), trang {PAGE_SIZE}")
+        timed("cũ: toàn bộ vé + lazy-load từng vé", lambda: legacy_my_tickets(db_session, user_id), rounds=1)
+        timed("read model, cache trống", lambda: get_user_bookings_page(db_session, user_id, "upcoming", limit=PAGE_SIZE))
+        get_my_bookings(db_session, user_id, limit=PAGE_SIZE)
+        timed("cache (upcoming + past)", lambda: get_my_bookings(db_session, user_id, limit=PAGE_SIZE))
+
+        # Mua vé mới: trang upcoming đã cache phải bị vô hiệu hóa
+        before = get_my_bookings(db_session, user_id, "upcoming", limit=PAGE_SIZE)
+        booking_code = buy(fixture, fixture["seat_ids"][:SEATS_PER_BOOKING])
+        after = get_my_bookings(db_session, user_id, "upcoming", limit=PAGE_SIZE)
+        assert booking_code not in [item["booking_code"] for item in before["items"]]
+        assert booking_code in [item["booking_code"] for item in after["items"]], booking_code
+        print(f"✅ Mua vé {booking_code} → cache vô hiệu hóa, đơn mới có ngay trong upcoming")
+        db_session.close()
+
+
+if __name__ == "__main__":
+    main()
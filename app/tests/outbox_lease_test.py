@@ -0,0 +1,123 @@
+"""
+Kiểm thử lease của outbox khi một lô được xử lý tuần tự lâu hơn lease:
+- Worker thật (OutboxWorkerPool.worker) gia hạn phần còn lại của lô trước từng event → worker khác quét
+  liên tục không nhận lại event nào, mỗi handler chạy đúng một lần dù cả lô dài gấp vài lần lease
+- Lease đã hết và worker khác đã nhận lại event → renew_leases không gia hạn cho worker cũ (không chạy trùng)
+
+# python -m app.tests.outbox_lease_test
+"""
+
+import asyncio
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.outbox_worker import OutboxWorkerPool
+from app.models.outbox import OutboxEvents, OutboxStatusEnum
+from app.services.outbox_service import claim_events, enqueue_event, register_handler, renew_leases
+
+LEASE_EVENT = "test.outbox_lease"
+EVENTS = 6
+HANDLER_SECONDS = 0.4
+LEASE_SECONDS = 1
+
+handled = Counter()
+
+
+@register_handler(LEASE_EVENT, lane="test")
+def slow_handler(payload):
+    time.sleep(HANDLER_SECONDS)
+    handled[payload["n"]] += 1
+
+
+def claim(lease_seconds: int, batch_size: int = EVENTS):
+    db = SessionLocal()
+    try:
+        return claim_events(db, [LEASE_EVENT], batch_size=batch_size, lease_seconds=lease_seconds)
+    finally:
+        db.close()
+
+
+def enqueue(aggregate_id: str, numbers) -> None:
+    db = SessionLocal()
+    try:
+        for n in numbers:
+            enqueue_event(db, LEASE_EVENT, {"n": n}, aggregate_id=aggregate_id)
+        db.commit()
+    finally:
+        db.close()
+
+
+def done_count(aggregate_id: str) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(OutboxEvents).filter(
+            OutboxEvents.aggregate_id == aggregate_id, OutboxEvents.status == OutboxStatusEnum.done
+        ).count()
+    finally:
+        db.close()
+
+
+async def run(aggregate_id: str):
+    settings.OUTBOX_BATCH_SIZE = EVENTS
+    settings.OUTBOX_LEASE_SECONDS = LEASE_SECONDS
+    settings.OUTBOX_POLL_INTERVAL = 0.05
+
+    # 1. Một lô 6 event x 0.4s (2.4s) với lease 1s, worker khác quét mỗi 50ms
+    enqueue(aggregate_id, range(EVENTS))
+    pool = OutboxWorkerPool()
+    pool.running = True
+    pool.tasks = [asyncio.create_task(pool.worker("test", [LEASE_EVENT], 0))]
+    stolen = []
+    start = time.perf_counter()
+    try:
+        while await asyncio.to_thread(done_count, aggregate_id) < EVENTS:
+            if time.perf_counter() - start > 30:
+                raise TimeoutError("Worker outbox không xử lý kịp")
+            stolen.extend(await asyncio.to_thread(claim, LEASE_SECONDS))
+            await asyncio.sleep(0.05)
+    finally:
+        await pool.stop()
+    elapsed = time.perf_counter() - start
+    assert not stolen, [event["event_id"] for event in stolen]
+    assert handled == Counter(range(EVENTS)), handled
+    assert elapsed > LEASE_SECONDS * 2, elapsed
+    print(f"✅ Lô {EVENTS} event xử lý trong {elapsed:.1f}s với lease {LEASE_SECONDS}s: "
+          f"worker khác không nhận lại event nào, mỗi handler chạy một lần")
+
+    # 2. Lease đã hết, worker khác nhận lại → worker cũ không được gia hạn
+    enqueue(aggregate_id, [EVENTS])
+    (first,) = claim(60, batch_size=1)
+    db = SessionLocal()
+    try:
+        db.query(OutboxEvents).filter(OutboxEvents.event_id == first["event_id"]).update(
+            {OutboxEvents.locked_until: datetime.now(timezone.utc) - timedelta(seconds=1)}, synchronize_session=False
+        )
+        db.commit()
+        (second,) = claim(60, batch_size=1)
+        assert second["event_id"] == first["event_id"] and second["attempts"] == 1, second
+        assert renew_leases(db, [first], 60) == []
+        assert renew_leases(db, [second], 60) == [second]
+    finally:
+        db.close()
+    print("✅ Lease hết hạn, worker khác đã nhận lại: worker cũ không gia hạn được, bỏ qua event")
+
+
+def main():
+    aggregate_id = f"lease-{uuid.uuid4().hex[:8]}"
+    try:
+        asyncio.run(run(aggregate_id))
+    finally:
+        db = SessionLocal()
+        try:
+            db.query(OutboxEvents).filter(OutboxEvents.aggregate_id == aggregate_id).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Dữ liệu mẫu cho các script kiểm thử luồng thanh toán (chạy trên DATABASE_URL hiện tại)
+Mỗi lần gọi tạo rạp/phòng/suất chiếu/người dùng riêng nên có thể chạy nhiều lần;
+drop_showtime_fixture / showtime_fixture() xóa lại toàn bộ dữ liệu của fixture (vé, đơn, thanh toán, outbox...).
+drop_registered_users xóa người dùng do script tạo qua POST /register.
+"""
+
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Tuple
+
+from sqlalchemy import delete, or_, select, text
+
+from app.core.database import SessionLocal
+from app.models.bookings import Bookings
+from app.models.email_verifications import EmailVerification
+from app.models.movies import Movies
+from app.models.outbox import OutboxEvents
+from app.models.payments import Payment, VNPayPayment
+from app.models.role import UserRole
+from app.models.rooms import Rooms
+from app.models.seat_layouts import SeatLayouts
+from app.models.seat_reservations import SeatReservations
+from app.models.seat_templates import SeatTypeEnum
+from app.models.seats import Seats
+from app.models.showtimes import Showtimes
+from app.models.theaters import Theaters
+from app.models.tickets import Tickets
+from app.models.transactions import Transaction, TransactionCombo
+from app.models.users import Users
+from app.services.bookings_service import refresh_bookings
+from app.services.ticket_qr_service import ticket_qr_expiry, ticket_qr_token
+
+
+def create_showtime_fixture(seat_count: int = 100, ticket_price: int = 90000) -> Dict:
+    """Tạo một suất chiếu với seat_count ghế và một người dùng mua vé"""
+    suffix = uuid.uuid4().hex[:8]
+    db = SessionLocal()
+    try:
+        theater = Theaters(name=f"Test {suffix}", address="Test", city="HCM")
+        layout = SeatLayouts(layout_name=f"test-{suffix}", total_rows=(seat_count + 19) // 20, total_columns=20)
+        db.add_all([theater, layout])
+        db.flush()
+        room = Rooms(theater_id=theater.theater_id, layout_id=layout.layout_id, room_name=f"R-{suffix}")
+        movie = Movies(title=f"Test movie {suffix}", duration=120)
+        db.add_all([room, movie])
+        db.flush()
+        seat_types = [SeatTypeEnum.regular, SeatTypeEnum.vip, SeatTypeEnum.couple]
+        seats = [
+            Seats(room_id=room.room_id, seat_type=seat_types[i % 3], seat_code=f"{chr(65 + i // 20)}{i % 20 + 1}",
+                  row_number=i // 20, column_number=i % 20)
+            for i in range(seat_count)
+        ]
+        db.add_all(seats)
+        showtime = Showtimes(
+            movie_id=movie.movie_id, theater_id=theater.theater_id, room_id=room.room_id,
+            show_datetime=datetime.now() + timedelta(days=1), ticket_price=ticket_price,
+        )
+        user = Users(full_name=f"Test user {suffix}", email=f"test-{suffix}@example.com", password_hash="x")
+        db.add_all([showtime, user])
+        db.commit()
+        return {
+            "showtime_id": showtime.showtime_id,
+            "room_id": room.room_id,
+            "theater_id": theater.theater_id,
+            "layout_id": layout.layout_id,
+            "movie_id": movie.movie_id,
+            "user_id": user.user_id,
+            "user_email": user.email,
+            "seat_ids": [seat.seat_id for seat in seats],
+        }
+    finally:
+        db.close()
+
+
+def hold_seats(showtime_id: int, user_id: int, seat_ids: List[int], session_id: str = None) -> str:
+    """Giữ ghế (pending reservation) như bước chọn ghế của khách, trả về session_id"""
+    session_id = session_id or uuid.uuid4().hex
+    db = SessionLocal()
+    try:
+        expires_at = datetime.now(timezone.utc) + timedelta(minutes=10)
+        db.add_all([
+            SeatReservations(seat_id=seat_id, showtime_id=showtime_id, user_id=user_id,
+                             session_id=session_id, expires_at=expires_at, status="pending")
+            for seat_id in seat_ids
+        ])
+        db.commit()
+        return session_id
+    finally:
+        db.close()
+
+
+def sold_out_showtime(fixture: Dict, seats_per_booking: int = 3) -> Tuple[int, Dict[int, str]]:
+    """Suất chiếu của fixture bắt đầu sau 20 phút, bán hết ghế; trả về (showtime_id, token QR theo ticket_id)"""
+    showtime_id = fixture["showtime_id"]
+    db = SessionLocal()
+    try:
+        show_datetime = datetime.now() + timedelta(minutes=20)
+        db.get(Showtimes, showtime_id).show_datetime = show_datetime
+        ticket_ids = db.scalars(text("""
+            INSERT INTO tickets (booking_code, user_id, showtime_id, seat_id, price, status)
+            SELECT 'GATE' || :showtime_id || '-' || ((n - 1) / :per_booking), :user_id, :showtime_id,
+                   (:seat_ids)[n], 90000, 'confirmed'
+            FROM generate_series(1, cardinality(:seat_ids)) AS n
+            RETURNING ticket_id
+        """), {
+            "showtime_id": showtime_id, "user_id": fixture["user_id"],
+            "seat_ids": fixture["seat_ids"], "per_booking": seats_per_booking,
+        }).all()
+        bookings = -(-len(fixture["seat_ids"]) // seats_per_booking)
+        refresh_bookings(db, {f"GATE{showtime_id}-{n}" for n in range(bookings)})
+        db.commit()
+    finally:
+        db.close()
+    expires_at = ticket_qr_expiry(show_datetime)
+    return showtime_id, {ticket_id: ticket_qr_token(ticket_id, showtime_id, expires_at) for ticket_id in ticket_ids}
+
+
+def drop_showtime_fixture(fixture: Dict) -> None:
+    """
+    Xóa mọi dữ liệu của fixture: các suất chiếu trong phòng (kể cả suất script tự thêm), vé, read model,
+    giao dịch, thanh toán, reservation, event outbox của đơn / payment, người dùng, ghế, phòng, phim, rạp.
+    """
+    db = SessionLocal()
+    try:
+        user_id = fixture["user_id"]
+        showtime_ids = db.scalars(select(Showtimes.showtime_id).where(Showtimes.room_id == fixture["room_id"])).all()
+        transaction_ids = set(db.scalars(select(Tickets.transaction_id).where(
+            Tickets.showtime_id.in_(showtime_ids), Tickets.transaction_id.isnot(None)
+        )).all())
+        transaction_ids |= set(db.scalars(select(Transaction.transaction_id).where(Transaction.user_id == user_id)).all())
+        payment_ids = set(db.scalars(select(Payment.payment_id).where(Payment.user_id == user_id)).all())
+        payment_ids |= set(db.scalars(select(Transaction.payment_id).where(
+            Transaction.transaction_id.in_(transaction_ids), Transaction.payment_id.isnot(None)
+        )).all())
+        aggregate_ids = set(db.scalars(select(Tickets.booking_code).where(
+            or_(Tickets.showtime_id.in_(showtime_ids), Tickets.user_id == user_id), Tickets.booking_code.isnot(None)
+        )).all())
+        aggregate_ids |= set(db.scalars(select(Payment.order_id).where(Payment.payment_id.in_(payment_ids))).all())
+        aggregate_ids.add(fixture["user_email"])
+
+        db.execute(delete(OutboxEvents).where(OutboxEvents.aggregate_id.in_(aggregate_ids)))
+        db.execute(delete(Bookings).where(or_(
+            Bookings.showtime_id.in_(showtime_ids), Bookings.user_id == user_id, Bookings.transaction_id.in_(transaction_ids)
+        )))
+        db.execute(delete(Tickets).where(or_(
+            Tickets.showtime_id.in_(showtime_ids), Tickets.user_id == user_id, Tickets.transaction_id.in_(transaction_ids)
+        )))
+        db.execute(delete(SeatReservations).where(or_(
+            SeatReservations.showtime_id.in_(showtime_ids), SeatReservations.payment_id.in_(payment_ids)
+        )))
+        db.execute(delete(TransactionCombo).where(TransactionCombo.transaction_id.in_(transaction_ids)))
+        db.execute(delete(Transaction).where(Transaction.transaction_id.in_(transaction_ids)))
+        db.execute(delete(VNPayPayment.__table__).where(VNPayPayment.__table__.c.payment_id.in_(payment_ids)))
+        db.execute(delete(Payment.__table__).where(Payment.__table__.c.payment_id.in_(payment_ids)))
+        db.execute(delete(UserRole).where(UserRole.user_id == user_id))
+        db.execute(delete(Users).where(Users.user_id == user_id))
+        db.execute(delete(Showtimes).where(Showtimes.showtime_id.in_(showtime_ids)))
+        db.execute(delete(Seats).where(Seats.room_id == fixture["room_id"]))
+        db.execute(delete(Rooms).where(Rooms.room_id == fixture["room_id"]))
+        db.execute(delete(Movies).where(Movies.movie_id == fixture["movie_id"]))
+        db.execute(delete(SeatLayouts).where(SeatLayouts.layout_id == fixture["layout_id"]))
+        db.execute(delete(Theaters).where(Theaters.theater_id == fixture["theater_id"]))
+        db.commit()
+    finally:
+        db.close()
+
+
+@contextmanager
+def showtime_fixture(seat_count: int = 100, ticket_price: int = 90000) -> Iterator[Dict]:
+    """create_showtime_fixture + dọn dữ liệu khi kết thúc (kể cả khi assert lỗi)"""
+    fixture = create_showtime_fixture(seat_count=seat_count, ticket_price=ticket_price)
+    try:
+        yield fixture
+    finally:
+        drop_showtime_fixture(fixture)
+
+
+def drop_registered_users(emails: List[str]) -> None:
+    """Xóa người dùng tạo qua POST /register: user, role, mã xác nhận, event email outbox"""
+    db = SessionLocal()
+    try:
+        user_ids = select(Users.user_id).where(Users.email.in_(emails))
+        db.execute(delete(OutboxEvents).where(OutboxEvents.aggregate_id.in_(emails)))
+        db.execute(delete(EmailVerification).where(EmailVerification.email.in_(emails)))
+        db.execute(delete(UserRole).where(UserRole.user_id.in_(user_ids)))
+        db.execute(delete(Users).where(Users.email.in_(emails)))
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,118 @@
+"""
+Kiểm thử đối soát thanh toán (payment_reconciliation_service) với cổng VNPay giả lập chạy in-process.
+Kịch bản: IPN bị mất hoàn toàn (send_ipn=False), khách không quay lại return URL.
+- Đơn đã thanh toán thành công → SUCCESS, vé được xuất đúng số ghế
+- Đơn thanh toán thất bại trên cổng → FAILED
+- Đơn chưa từng tới cổng, đã quá hạn → FAILED; còn mới → vẫn PENDING
+- Chạy đối soát lần hai không xuất thêm vé
+
+# python -m app.tests.payment_reconciliation_test
+"""
+
+import asyncio
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+import httpx
+from sqlalchemy import update
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.payments import Payment, PaymentStatusEnum
+from app.models.tickets import Tickets
+from app.payments.simulator import PAYMENT_PATH, QUERYDR_PATH, SimulatorConfig, create_simulator_app
+from app.schemas.payments import PaymentMethod, PaymentRequest
+from app.services.payment_reconciliation_service import reconcile_pending_payments
+from app.services.payments_service import PaymentService
+from app.tests.payment_fixtures import showtime_fixture, hold_seats
+
+GATEWAY_URL = "http://vnpay.local"
+SEATS_PER_ORDER = 2
+
+
+def create_order(fixture, order_no: int):
+    seat_ids = fixture["seat_ids"][order_no * SEATS_PER_ORDER:(order_no + 1) * SEATS_PER_ORDER]
+    session_id = hold_seats(fixture["showtime_id"], fixture["user_id"], seat_ids)
+    db = SessionLocal()
+    try:
+        return PaymentService().create_payment(
+            db, PaymentRequest(session_id=session_id, order_desc="Reconcile test", payment_method=PaymentMethod.VNPAY),
+            "127.0.0.1", user_id=fixture["user_id"],
+        )
+    finally:
+        db.close()
+
+
+def payment_state(order_id: str):
+    db = SessionLocal()
+    try:
+        payment = db.query(Payment).filter(Payment.order_id == order_id).one()
+        return payment.payment_status, payment.callback_result
+    finally:
+        db.close()
+
+
+def backdate(order_id: str, seconds: int):
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(Payment)
+            .where(Payment.order_id == order_id)
+            .values(created_at=Payment.created_at - timedelta(seconds=seconds))
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run():
+    settings.VNPAY_API_URL = f"{GATEWAY_URL}{QUERYDR_PATH}"
+    config = SimulatorConfig(send_ipn=False)
+    simulator_app = create_simulator_app(config)
+    with showtime_fixture(seat_count=4 * SEATS_PER_ORDER) as fixture:
+
+        paid = create_order(fixture, 0)
+        declined = create_order(fixture, 1)
+        abandoned = create_order(fixture, 2)
+        recent = create_order(fixture, 3)
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=simulator_app), base_url=GATEWAY_URL) as gateway:
+            # Khách thanh toán trên cổng nhưng IPN/return (redirect 302) không bao giờ tới backend
+            response = await gateway.get(f"{PAYMENT_PATH}?{urlsplit(paid.payment_url).query}")
+            assert response.status_code == 302, response.text
+            config.failure_rate = 1.0
+            response = await gateway.get(f"{PAYMENT_PATH}?{urlsplit(declined.payment_url).query}")
+            assert response.status_code == 302, response.text
+            backdate(abandoned.order_id, 3600)
+
+            stats = await reconcile_pending_payments(client=gateway, stale_seconds=0, abandon_seconds=600)
+            print(f"🔁 Lượt 1: {dict(stats)}")
+
+            status, result = payment_state(paid.order_id)
+            assert status == PaymentStatusEnum.SUCCESS, (status, result)
+            db = SessionLocal()
+            tickets = db.query(Tickets).filter(Tickets.booking_code == result["booking_code"]).count()
+            db.close()
+            assert tickets == SEATS_PER_ORDER, tickets
+            assert payment_state(declined.order_id)[0] == PaymentStatusEnum.FAILED
+            assert payment_state(abandoned.order_id)[0] == PaymentStatusEnum.FAILED
+            assert payment_state(recent.order_id)[0] == PaymentStatusEnum.PENDING
+
+            # Lượt 2: các đơn đã có kết quả không còn PENDING → không được xử lý lại
+            stats = await reconcile_pending_payments(client=gateway, stale_seconds=0, abandon_seconds=600)
+            print(f"🔁 Lượt 2: {dict(stats)}")
+            db = SessionLocal()
+            tickets_after = db.query(Tickets).filter(Tickets.booking_code == result["booking_code"]).count()
+            db.close()
+            assert tickets_after == SEATS_PER_ORDER
+
+        print(f"✅ Đối soát: {paid.order_id} SUCCESS ({tickets} vé), {declined.order_id} FAILED, "
+              f"{abandoned.order_id} FAILED (bỏ dở), {recent.order_id} vẫn PENDING")
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Kiểm thử đẩy trạng thái thanh toán (payment_notifier) thay cho polling:
+- WebSocket /ws/payments/{order_id}: nhận PENDING ngay khi kết nối, nhận SUCCESS ngay sau khi IPN được xử lý
+- Long-poll /payment-status/{order_id}?wait=: request được giữ lại và trả về ngay khi có kết quả
+- Đơn đã có kết quả: long-poll trả về ngay, không chờ
+Backend chạy in-process (uvicorn) trên BACKEND_PORT.
+
+# python -m app.tests.payment_status_push_test
+"""
+
+import asyncio
+import json
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+import uvicorn
+import websockets
+
+from app.core.database import SessionLocal
+from app.main import app
+from app.payments.simulator import SimulatorConfig, VNPaySimulator
+from app.schemas.payments import PaymentMethod, PaymentRequest
+from app.services.payments_service import PaymentService
+from app.tests.payment_fixtures import showtime_fixture, hold_seats
+
+BACKEND_PORT = 8765
+BASE_URL = f"http://127.0.0.1:{BACKEND_PORT}/api/v1"
+WS_URL = f"ws://127.0.0.1:{BACKEND_PORT}/api/v1"
+CALLBACK_DELAY = 0.5
+SEATS_PER_ORDER = 2
+
+
+def create_order(fixture, order_no: int):
+    seat_ids = fixture["seat_ids"][order_no * SEATS_PER_ORDER:(order_no + 1) * SEATS_PER_ORDER]
+    session_id = hold_seats(fixture["showtime_id"], fixture["user_id"], seat_ids)
+    db = SessionLocal()
+    try:
+        return PaymentService().create_payment(
+            db, PaymentRequest(session_id=session_id, order_desc="Push test", payment_method=PaymentMethod.VNPAY),
+            "127.0.0.1", user_id=fixture["user_id"],
+        )
+    finally:
+        db.close()
+
+
+async def deliver_ipn(client: httpx.AsyncClient, simulator: VNPaySimulator, payment_url: str):
+    """Khách trả tiền sau CALLBACK_DELAY giây, VNPay gửi IPN về backend"""
+    await asyncio.sleep(CALLBACK_DELAY)
+    params = simulator.signed_callback(dict(parse_qsl(urlsplit(payment_url).query)))
+    response = await client.get(f"{BASE_URL}/payments/vnpay/ipn", params=params)
+    assert response.json().get("RspCode") == "00", response.text
+    return time.perf_counter()
+
+
+async def watch_websocket(order_id: str):
+    """Trả về (danh sách trạng thái nhận được, thời điểm nhận kết quả cuối)"""
+    statuses = []
+    async with websockets.connect(f"{WS_URL}/ws/payments/{order_id}") as ws:
+        async for raw in ws:
+            message = json.loads(raw)
+            assert message["type"] == "payment_status", message
+            statuses.append(message["data"]["status"])
+    return statuses, time.perf_counter()
+
+
+async def long_poll(client: httpx.AsyncClient, order_id: str, wait: float):
+    response = await client.get(f"{BASE_URL}/payments/payment-status/{order_id}", params={"wait": wait})
+    response.raise_for_status()
+    return response.json(), time.perf_counter()
+
+
+async def run():
+    with showtime_fixture(seat_count=2 * SEATS_PER_ORDER) as fixture:
+        ws_order = create_order(fixture, 0)
+        poll_order = create_order(fixture, 1)
+        simulator = VNPaySimulator(SimulatorConfig())
+
+        server = uvicorn.Server(uvicorn.Config(app, port=BACKEND_PORT, log_level="warning"))
+        server_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+
+        try:
+            async with httpx.AsyncClient(timeout=60) as client:
+                # WebSocket: kết nối trước khi khách thanh toán
+                watcher = asyncio.create_task(watch_websocket(ws_order.order_id))
+                ipn_at, (statuses, pushed_at) = await asyncio.gather(
+                    deliver_ipn(client, simulator, ws_order.payment_url), watcher
+                )
+                assert statuses == ["PENDING", "SUCCESS"], statuses
+                print(f"✅ WebSocket: {statuses}, nhận kết quả {(pushed_at - ipn_at) * 1000:.1f}ms sau IPN")
+
+                # Long-poll: request được giữ cho tới khi IPN xử lý xong
+                start = time.perf_counter()
+                ipn_at, (body, answered_at) = await asyncio.gather(
+                    deliver_ipn(client, simulator, poll_order.payment_url), long_poll(client, poll_order.order_id, 10)
+                )
+                assert body["status"] == "SUCCESS", body
+                assert body["result"]["booking_code"], body
+                assert answered_at - start < 5, answered_at - start
+                print(f"✅ Long-poll: {body['status']} ({body['result']['booking_code']}), "
+                      f"trả về {(answered_at - ipn_at) * 1000:.1f}ms sau IPN")
+
+                # Đơn đã có kết quả → trả về ngay dù wait lớn
+                start = time.perf_counter()
+                body, answered_at = await long_poll(client, poll_order.order_id, 10)
+                assert body["status"] == "SUCCESS" and answered_at - start < 1, (body, answered_at - start)
+                print(f"✅ Đơn đã xong: long-poll trả về sau {(answered_at - start) * 1000:.1f}ms")
+        finally:
+            server.should_exit = True
+            await server_task
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
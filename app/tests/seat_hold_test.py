@@ -0,0 +1,78 @@
+"""
+Kiểm thử giữ ghế (create_multiple_reserved_seats) khi nhiều khách cùng chọn:
+- Hai khách giữ cùng giỏ đồng thời → đúng một người giữ được, người kia 409, giỏ không bị chia đôi
+- Giữ ghế đang được người khác giữ (chưa hết hạn) → 409 và KHÔNG xóa hold của người đang thanh toán
+- Bản ghi pending đã hết hạn nhưng chưa được dọn → bị ghi đè, người mới giữ được
+
+# python -m app.tests.seat_hold_test
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from sqlalchemy import select, update
+
+from app.core.database import AsyncSessionLocal, async_engine
+from app.models.seat_reservations import SeatReservations
+from app.schemas.reservations import SeatReservationsCreate
+from app.services.reservations_service import create_multiple_reserved_seats
+from app.tests.payment_fixtures import showtime_fixture
+
+
+async def hold(fixture, seat_ids, session_id: str):
+    async with AsyncSessionLocal() as db:
+        try:
+            return await create_multiple_reserved_seats([
+                SeatReservationsCreate(showtime_id=fixture["showtime_id"], seat_id=seat_id,
+                                       user_id=fixture["user_id"], session_id=session_id)
+                for seat_id in seat_ids
+            ], db)
+        except HTTPException as e:
+            return e.status_code
+
+
+async def holders(fixture, seat_ids):
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(select(SeatReservations.seat_id, SeatReservations.session_id).where(
+            SeatReservations.showtime_id == fixture["showtime_id"], SeatReservations.seat_id.in_(seat_ids)
+        ))
+        return dict(rows.all())
+
+
+async def run():
+    with showtime_fixture(seat_count=8) as fixture:
+        seat_ids = fixture["seat_ids"]
+
+        results = await asyncio.gather(*[hold(fixture, seat_ids[:3], f"race-{i}") for i in range(2)])
+        assert sorted(r if isinstance(r, int) else 201 for r in results) == [201, 409], results
+        owners = await holders(fixture, seat_ids[:3])
+        assert len(set(owners.values())) == 1, owners
+        print(f"✅ Hai khách tranh giỏ 3 ghế: một người giữ được ({next(iter(owners.values()))}), người kia 409")
+
+        winner = next(iter(owners.values()))
+        assert await hold(fixture, seat_ids[2:5], "late") == 409
+        assert await holders(fixture, seat_ids[:3]) == owners, "hold chưa hết hạn không được bị xóa"
+        assert not await holders(fixture, seat_ids[3:5]), "giỏ bị từ chối không được giữ dở dang"
+        print(f"✅ Ghế {seat_ids[2]} đang được {winner} giữ: 409, hold cũ còn nguyên")
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(SeatReservations).where(
+                SeatReservations.showtime_id == fixture["showtime_id"], SeatReservations.seat_id.in_(seat_ids[:3])
+            ).values(expires_at=datetime.now(timezone.utc) - timedelta(minutes=1)))
+            await db.commit()
+        session_id = uuid.uuid4().hex
+        created = await hold(fixture, seat_ids[:3], session_id)
+        assert not isinstance(created, int) and len(created) == 3, created
+        assert set((await holders(fixture, seat_ids[:3])).values()) == {session_id}
+        print("✅ Hold đã hết hạn chưa dọn → ghi đè, khách mới giữ được")
+        await async_engine.dispose()
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
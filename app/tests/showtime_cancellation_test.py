@@ -0,0 +1,223 @@
+"""
+Kiểm thử hủy suất chiếu hàng loạt (showtime_cancellation_service) trên một phòng ORDERS x SEATS_PER_ORDER ghế đã bán hết.
+- Mọi vé → cancelled, giao dịch → refunded, reservation bị xóa, suất chiếu → cancelled, ghế đang giữ được giải phóng
+- Mỗi đơn đúng một event hoàn tiền + một email trong outbox; chạy hoàn tiền qua cổng VNPay giả lập
+- Read model bookings: một dòng / đơn khi xuất vé, chuyển cancelled khi hủy
+- Điểm tích lũy được thu hồi; gọi hủy lần hai không sinh thêm event / hoàn tiền
+- Khách đang ở trang VNPay lúc hủy: IPN thành công đến sau → payment FAILED, không xuất vé, tiền đã trừ được hoàn
+
+# python -m app.tests.showtime_cancellation_test
+"""
+
+import asyncio
+import time
+from fastapi import HTTPException
+from urllib.parse import parse_qsl, urlsplit
+
+import uvicorn
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.outbox_worker import OutboxWorkerPool
+from app.models.bookings import Bookings, BookingStatusEnum
+from app.models.outbox import OutboxEvents
+from app.models.payments import Payment, PaymentStatusEnum
+from app.models.seat_reservations import SeatReservations
+from app.models.showtimes import Showtimes, StatusShowtimeEnum
+from app.models.tickets import Tickets, TicketStatusEnum
+from app.models.transactions import Transaction, TransactionStatus
+from app.models.users import Users
+from app.payments.simulator import QUERYDR_PATH, SimulatorConfig, create_simulator_app
+from app.schemas.payments import PaymentMethod, PaymentRequest
+from app.services.outbox_handlers import SHOWTIME_CANCELLED_EMAIL_EVENT, SHOWTIME_REFUND_EVENT
+from app.services.outbox_service import claim_events
+from app.services.payments_service import PaymentService
+from app.services.showtime_cancellation_service import start_showtime_cancellation, stream_showtime_cancellation
+from app.tests.payment_fixtures import showtime_fixture, hold_seats
+
+ORDERS = 100
+SEATS_PER_ORDER = 4
+PENDING_HOLDS = 10
+SIM_PORT = 9011
+
+
+def sell_out(fixture, simulator) -> None:
+    """Bán hết ghế: mỗi đơn thanh toán VNPay (callback ký bởi cổng giả lập) và được xuất vé"""
+    service = PaymentService()
+    db = SessionLocal()
+    try:
+        for order_no in range(ORDERS):
+            seat_ids = fixture["seat_ids"][order_no * SEATS_PER_ORDER:(order_no + 1) * SEATS_PER_ORDER]
+            session_id = hold_seats(fixture["showtime_id"], fixture["user_id"], seat_ids)
+            payment = service.create_payment(
+                db, PaymentRequest(session_id=session_id, order_desc="Cancel test", payment_method=PaymentMethod.VNPAY),
+                "127.0.0.1", user_id=fixture["user_id"],
+            )
+            callback = simulator.signed_callback(dict(parse_qsl(urlsplit(payment.payment_url).query)))
+            payment_result = service.handle_vnpay_callback(db, callback)
+            service.update_payment_status(db, payment_result.order_id, payment_result)
+    finally:
+        db.close()
+
+
+def start_checkout(fixture, simulator, seat_ids):
+    """Khách giữ ghế và được chuyển sang VNPay; trả về (order_id, callback) để gửi sau"""
+    service = PaymentService()
+    db = SessionLocal()
+    try:
+        session_id = hold_seats(fixture["showtime_id"], fixture["user_id"], seat_ids)
+        payment = service.create_payment(
+            db, PaymentRequest(session_id=session_id, order_desc="In-flight", payment_method=PaymentMethod.VNPAY),
+            "127.0.0.1", user_id=fixture["user_id"],
+        )
+        return payment.order_id, simulator.signed_callback(dict(parse_qsl(urlsplit(payment.payment_url).query)))
+    finally:
+        db.close()
+
+
+def finish_checkout(callback) -> int:
+    """IPN thành công đến sau khi suất chiếu đã hủy; trả về mã lỗi"""
+    service = PaymentService()
+    db = SessionLocal()
+    try:
+        payment_result = service.handle_vnpay_callback(db, callback)
+        service.update_payment_status(db, payment_result.order_id, payment_result)
+    except HTTPException as e:
+        return e.status_code
+    finally:
+        db.close()
+    return 200
+
+
+def drain_refunds() -> int:
+    """Chạy các event hoàn tiền như worker lane cancellation (không gửi email - không có SMTP)"""
+    processed = 0
+    while True:
+        db = SessionLocal()
+        try:
+            events = claim_events(db, [SHOWTIME_REFUND_EVENT], batch_size=50, lease_seconds=60)
+        finally:
+            db.close()
+        if not events:
+            return processed
+        for event in events:
+            OutboxWorkerPool._process_event(event)
+            processed += 1
+
+
+def count_events(showtime_booking_codes, event_type: str) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(OutboxEvents).filter(
+            OutboxEvents.event_type == event_type,
+            OutboxEvents.aggregate_id.in_(showtime_booking_codes),
+        ).count()
+    finally:
+        db.close()
+
+
+async def cancel(showtime_id: int):
+    showtime = await start_showtime_cancellation(showtime_id)
+    events = []
+    async for event in stream_showtime_cancellation(showtime, "Máy chiếu hỏng", "admin@test"):
+        events.append(event)
+    return events
+
+
+async def run():
+    with showtime_fixture(seat_count=ORDERS * SEATS_PER_ORDER + PENDING_HOLDS) as fixture:
+        showtime_id = fixture["showtime_id"]
+        settings.VNPAY_API_URL = f"http://127.0.0.1:{SIM_PORT}{QUERYDR_PATH}"
+        simulator_app = create_simulator_app(SimulatorConfig(send_ipn=False))
+        simulator = simulator_app.state.simulator
+        server = uvicorn.Server(uvicorn.Config(simulator_app, port=SIM_PORT, log_level="warning"))
+        server_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+
+        try:
+            start = time.perf_counter()
+            await asyncio.to_thread(sell_out, fixture, simulator)
+            print(f"🎟️  Bán {ORDERS * SEATS_PER_ORDER} vé ({ORDERS} đơn) trong {time.perf_counter() - start:.1f}s")
+            in_flight_order, in_flight_callback = await asyncio.to_thread(
+                start_checkout, fixture, simulator, fixture["seat_ids"][-PENDING_HOLDS:]
+            )
+
+            db = SessionLocal()
+            points_before = db.get(Users, fixture["user_id"]).loyalty_points
+            booking_codes = [code for (code,) in db.query(Tickets.booking_code).filter(Tickets.showtime_id == showtime_id).distinct()]
+            bookings = db.query(Bookings).filter(Bookings.showtime_id == showtime_id).all()
+            assert len(bookings) == ORDERS and {booking.status for booking in bookings} == {BookingStatusEnum.confirmed}
+            assert all(booking.ticket_count == SEATS_PER_ORDER and len(booking.seats.split(", ")) == SEATS_PER_ORDER for booking in bookings)
+            db.close()
+
+            start = time.perf_counter()
+            events = await cancel(showtime_id)
+            elapsed = time.perf_counter() - start
+            started, done = events[0], events[-1]
+            assert started["type"] == "started" and started["total_tickets"] == ORDERS * SEATS_PER_ORDER, started
+            assert started["released_pending_seats"] == PENDING_HOLDS, started
+            assert done["type"] == "done" and done["tickets"] == ORDERS * SEATS_PER_ORDER, done
+            assert done["bookings"] == ORDERS and done["refunds"] == ORDERS and done["emails"] == ORDERS, done
+            print(f"🛑 Hủy {done['tickets']} vé / {done['bookings']} đơn trong {elapsed * 1000:.0f}ms "
+                  f"({len(events) - 2} lô), giải phóng {done['released_seats'] + PENDING_HOLDS} ghế")
+
+            db = SessionLocal()
+            try:
+                assert db.get(Showtimes, showtime_id).status == StatusShowtimeEnum.cancelled
+                assert db.query(Tickets).filter(
+                    Tickets.showtime_id == showtime_id, Tickets.status != TicketStatusEnum.cancelled
+                ).count() == 0
+                assert db.query(SeatReservations).filter(SeatReservations.showtime_id == showtime_id).count() == 0
+                assert {(status, cancelled) for status, cancelled in db.query(Bookings.status, Bookings.cancelled_count).filter(
+                    Bookings.showtime_id == showtime_id
+                ).distinct()} == {(BookingStatusEnum.cancelled, SEATS_PER_ORDER)}
+                statuses = {status for (status,) in db.query(Transaction.status).join(
+                    Tickets, Tickets.transaction_id == Transaction.transaction_id
+                ).filter(Tickets.showtime_id == showtime_id).distinct()}
+                assert statuses == {TransactionStatus.refunded}, statuses
+                points_after = db.get(Users, fixture["user_id"]).loyalty_points
+                assert points_after < points_before, (points_before, points_after)
+            finally:
+                db.close()
+            assert count_events(booking_codes, SHOWTIME_REFUND_EVENT) == ORDERS
+            assert count_events(booking_codes, SHOWTIME_CANCELLED_EMAIL_EVENT) == ORDERS
+
+            # Khách thanh toán xong trên VNPay sau khi ghế đã bị giải phóng
+            assert await asyncio.to_thread(finish_checkout, in_flight_callback) == 400
+            db = SessionLocal()
+            try:
+                payment = db.query(Payment).filter(Payment.order_id == in_flight_order).one()
+                assert payment.payment_status == PaymentStatusEnum.FAILED
+                assert payment.vnp_transaction_no, "cần mã giao dịch VNPay để hoàn tiền"
+                assert db.query(Transaction).filter(
+                    Transaction.payment_id == payment.payment_id, Transaction.status == TransactionStatus.success
+                ).count() == 0
+            finally:
+                db.close()
+            assert count_events([in_flight_order], SHOWTIME_REFUND_EVENT) == 1
+            assert await asyncio.to_thread(finish_checkout, in_flight_callback) == 400
+            assert count_events([in_flight_order], SHOWTIME_REFUND_EVENT) == 1, "IPN gửi lại không được hoàn trùng"
+
+            start = time.perf_counter()
+            refunded = await asyncio.to_thread(drain_refunds)
+            assert refunded == ORDERS + 1 and simulator.stats["refunded"] == ORDERS + 1, (refunded, dict(simulator.stats))
+            print(f"💸 {refunded} giao dịch hoàn tiền qua VNPay giả lập trong {time.perf_counter() - start:.1f}s "
+                  f"(gồm đơn {in_flight_order} thanh toán xong sau khi hủy)")
+
+            # Gọi lại: không còn vé để hủy, không sinh thêm event
+            again = await cancel(showtime_id)
+            assert again[0]["already_cancelled"] and again[-1]["tickets"] == 0, again
+            assert count_events(booking_codes, SHOWTIME_REFUND_EVENT) == ORDERS
+            print(f"✅ Gọi lại idempotent, điểm tích lũy {points_before} → {points_after}")
+        finally:
+            server.should_exit = True
+            await server_task
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
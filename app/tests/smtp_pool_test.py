@@ -0,0 +1,121 @@
+"""
+Kiểm thử pool kết nối SMTP (app.core.smtp_pool) với SMTP sink cục bộ (app.tests.smtp_sink):
+- Cách cũ: mỗi email một kết nối + đăng nhập; pool: vài kết nối đăng nhập một lần cho cả loạt email
+- Nhiều thread gửi cùng lúc (như worker outbox) không mở quá SMTP_POOL_SIZE kết nối
+- POST /register chỉ ghi event outbox; handler lane "email" gửi đúng mã xác nhận qua sink
+Mở lại kết nối / giới hạn thư mỗi kết nối / từ chối người nhận: app/tests/unit/test_smtp_pool.py.
+
+# python -m app.tests.smtp_pool_test
+"""
+
+import asyncio
+import smtplib
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+
+import httpx
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.smtp_pool import SMTPConnectionPool, close_smtp_pools
+from app.models.outbox import OutboxEvents
+from app.services.outbox_handlers import VERIFICATION_EMAIL_EVENT
+from app.services.outbox_service import get_handler
+from app.tests.payment_fixtures import drop_registered_users
+from app.tests.smtp_sink import SMTPSink
+
+MESSAGES = 40
+WORKERS = 4
+HANDSHAKE_DELAY = 0.05  # Giả lập TCP + STARTTLS + AUTH
+USERNAME, PASSWORD = "cineplus@example.com", "secret"
+
+
+def send_per_message(sink: SMTPSink) -> float:
+    """Cách cũ của EmailService: mở kết nối, đăng nhập, gửi, đóng cho từng email"""
+    start = time.perf_counter()
+    for i in range(MESSAGES):
+        msg = message(i)
+        with smtplib.SMTP("127.0.0.1", sink.port) as server:
+            server.login(USERNAME, PASSWORD)
+            server.sendmail(USERNAME, f"user{i}@example.com", msg.as_string())
+    return time.perf_counter() - start
+
+
+def message(i: int) -> MIMEText:
+    msg = MIMEText(f"Mã xác nhận {i:06d}", "plain", "utf-8")
+    msg["From"], msg["To"], msg["Subject"] = USERNAME, f"user{i}@example.com", "test"
+    return msg
+
+
+def send_pooled(pool: SMTPConnectionPool) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(WORKERS) as executor:
+        list(executor.map(lambda i: pool.send(message(i), USERNAME, [f"user{i}@example.com"]), range(MESSAGES)))
+    return time.perf_counter() - start
+
+
+def check_pool_throughput():
+    with SMTPSink(handshake_delay=HANDSHAKE_DELAY) as sink:
+        old = send_per_message(sink)
+        assert sink.connections == MESSAGES and len(sink.messages) == MESSAGES
+    print(f"🐢 Mỗi email một kết nối: {MESSAGES} email / {MESSAGES} kết nối trong {old * 1000:.0f}ms")
+
+    with SMTPSink(handshake_delay=HANDSHAKE_DELAY) as sink:
+        pool = SMTPConnectionPool("127.0.0.1", sink.port, USERNAME, PASSWORD, size=WORKERS)
+        pooled = send_pooled(pool)
+        pool.close()
+        assert len(sink.messages) == MESSAGES, len(sink.messages)
+        assert sink.connections <= WORKERS and sink.logins == sink.connections, (sink.connections, sink.logins)
+        received = sorted(m.rcpt_to[0] for m in sink.messages)
+        assert received == sorted(f"user{i}@example.com" for i in range(MESSAGES))
+    print(f"⚡ Pool {WORKERS} kết nối, {WORKERS} thread: {MESSAGES} email / {sink.connections} kết nối "
+          f"trong {pooled * 1000:.0f}ms ({old / pooled:.1f}x)")
+
+
+async def check_register_enqueues(sink: SMTPSink, email: str):
+    from app.main import app
+
+    settings.EMAIL_HOST, settings.EMAIL_PORT = "127.0.0.1", sink.port
+    settings.EMAIL_USERNAME, settings.EMAIL_PASSWORD = USERNAME, PASSWORD
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        start = time.perf_counter()
+        response = await client.post("/api/v1/register", json={"full_name": "SMTP Pool", "email": email, "password": "secret123"})
+        elapsed = (time.perf_counter() - start) * 1000
+    assert response.status_code == 200, response.text
+    assert not sink.messages, "register không được gửi email trong request"
+    print(f"✅ POST /register {elapsed:.0f}ms, không chạm SMTP")
+
+    db = SessionLocal()
+    try:
+        event = db.query(OutboxEvents).filter(
+            OutboxEvents.event_type == VERIFICATION_EMAIL_EVENT, OutboxEvents.aggregate_id == email
+        ).one()
+        payload = dict(event.payload)
+        db.delete(event)
+        db.commit()
+    finally:
+        db.close()
+
+    await asyncio.to_thread(get_handler(VERIFICATION_EMAIL_EVENT), payload)
+    assert len(sink.messages) == 1 and sink.messages[0].rcpt_to == [email]
+    html = sink.messages[0].parsed().get_body(("html",)).get_content()
+    assert payload["verification_code"] in html
+    print(f"✅ Handler outbox gửi mã {payload['verification_code']} tới {email}")
+
+
+def main():
+    check_pool_throughput()
+    email = f"smtp-pool-{uuid.uuid4().hex[:8]}@example.com"
+    try:
+        with SMTPSink() as sink:
+            asyncio.run(check_register_enqueues(sink, email))
+    finally:
+        drop_registered_users([email])
+        close_smtp_pools()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+SMTP sink cho kiểm thử / benchmark email – server SMTP tối giản chạy trong thread, không gửi thư đi đâu
+(thay Gmail khi chạy local: EMAIL_HOST=127.0.0.1 EMAIL_PORT=1025):
+- Hỗ trợ EHLO/HELO, AUTH PLAIN, MAIL, RCPT, DATA, RSET, NOOP, QUIT (đủ cho smtplib)
+- Đếm số kết nối / số lần đăng nhập, lưu lại từng thư để kiểm tra nội dung
+- handshake_delay: giả lập chi phí TCP + STARTTLS + AUTH của server thật (Gmail ~0.3–1s)
+- drop_after: server đóng kết nối sau N thư (giống server cắt kết nối nghỉ / giới hạn thư mỗi kết nối)
+- reject_recipients: địa chỉ bị từ chối ở RCPT TO (550, như hộp thư không tồn tại)
+
+    with SMTPSink(handshake_delay=0.2) as sink:
+        pool = SMTPConnectionPool("127.0.0.1", sink.port, "user", "pass")
+
+# python -m app.tests.smtp_sink --port 1025
+"""
+
+import argparse
+import base64
+import socketserver
+import threading
+import time
+from dataclasses import dataclass, field
+from email import message_from_bytes, policy
+from email.message import EmailMessage
+from typing import Iterable, List, Optional, Set
+
+
+@dataclass
+class SunkMessage:
+    mail_from: str
+    rcpt_to: List[str]
+    data: bytes
+    connection: int
+
+    def parsed(self) -> EmailMessage:
+        return message_from_bytes(self.data, policy=policy.default)
+
+
+@dataclass
+class _SinkState:
+    handshake_delay: float = 0.0
+    drop_after: Optional[int] = None
+    reject_recipients: Set[str] = field(default_factory=set)
+    messages: List[SunkMessage] = field(default_factory=list)
+    verbose: bool = False
+    connections: int = 0
+    logins: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self) -> None:
+        state: _SinkState = self.server.state
+        with state.lock:
+            state.connections += 1
+            connection = state.connections
+        time.sleep(state.handshake_delay)
+        self.reply("220 sink ESMTP")
+        mail_from, rcpt_to, sent = None, [], 0
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            command, _, argument = raw.decode(errors="replace").strip().partition(" ")
+            command = command.upper()
+            if command == "EHLO":
+                self.reply("250-sink")
+                self.reply("250-8BITMIME")
+                self.reply("250 AUTH PLAIN")
+            elif command == "HELO":
+                self.reply("250 sink")
+            elif command == "AUTH":
+                credentials = argument.partition(" ")[2]
+                parts = base64.b64decode(credentials).split(b"\0") if credentials else []
+                if len(parts) != 3 or not parts[1]:
+                    self.reply("535 Authentication failed")
+                    continue
+                with state.lock:
+                    state.logins += 1
+                self.reply("235 Authentication successful")
+            elif command == "MAIL":
+                mail_from, rcpt_to = argument.partition(":")[2].strip().strip("<>").split(" ")[0], []
+                self.reply("250 OK")
+            elif command == "RCPT":
+                recipient = argument.partition(":")[2].strip().strip("<>")
+                if recipient.lower() in state.reject_recipients:
+                    self.reply("550 5.1.1 User unknown")
+                    continue
+                rcpt_to.append(recipient)
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                message = SunkMessage(mail_from, rcpt_to, b"".join(lines), connection)
+                with state.lock:
+                    state.messages.append(message)
+                if state.verbose:
+                    print(f"📨 #{len(state.messages)} {mail_from} → {', '.join(rcpt_to)}: {message.parsed()['Subject']}")
+                sent += 1
+                self.reply("250 OK queued")
+                if state.drop_after and sent >= state.drop_after:
+                    return  # Đóng kết nối không báo trước
+            elif command == "RSET":
+                mail_from, rcpt_to = None, []
+                self.reply("250 OK")
+            elif command == "NOOP":
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    def __init__(
+        self,
+        handshake_delay: float = 0.0,
+        drop_after: Optional[int] = None,
+        reject_recipients: Iterable[str] = (),
+        host: str = "127.0.0.1",
+        port: int = 0,
+        verbose: bool = False,
+    ):
+        self.state = _SinkState(
+            handshake_delay=handshake_delay,
+            drop_after=drop_after,
+            reject_recipients={address.lower() for address in reject_recipients},
+            verbose=verbose,
+        )
+        self._server = _ThreadingServer((host, port), _SMTPHandler)
+        self._server.state = self.state
+        self.host, self.port = self._server.server_address[:2]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def messages(self) -> List[SunkMessage]:
+        return self.state.messages
+
+    @property
+    def connections(self) -> int:
+        return self.state.connections
+
+    @property
+    def logins(self) -> int:
+        return self.state.logins
+
+    def wait_for(self, count: int, timeout: float = 10.0) -> List[SunkMessage]:
+        """Chờ tới khi sink nhận đủ count thư (worker gửi bất đồng bộ)"""
+        deadline = time.monotonic() + timeout
+        while len(self.state.messages) < count:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Sink mới nhận {len(self.state.messages)}/{count} thư sau {timeout}s")
+            time.sleep(0.02)
+        return self.messages
+
+    def start(self) -> "SMTPSink":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "SMTPSink":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SMTP sink cục bộ: nhận và in thư, không gửi đi")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+    sink = SMTPSink(host=args.host, port=args.port, verbose=True).start()
+    print(f"📮 SMTP sink lắng nghe {sink.host}:{sink.port} (Ctrl+C để dừng)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.stop()
+
+
+if __name__ == "__main__":
+    main()
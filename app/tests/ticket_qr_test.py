@@ -0,0 +1,128 @@
+"""
+Kiểm thử ảnh QR sinh theo yêu cầu (ticket_qr_service) thay cho PNG base64 lưu trên tickets:
+- Xuất vé không còn sinh event ticket.qr, tickets.qr_code để trống
+- /bookings/{code} (nhân viên) và /tickets/{id} (chủ vé / nhân viên) chỉ trả URL; URL trỏ tới ảnh PNG
+  với Cache-Control private immutable (max-age tới exp của token) + ETag
+- Không đăng nhập / không phải chủ vé: không lấy được qr_url; danh sách /tickets không chứa qr_url
+- If-None-Match → 304; token sửa đổi → 400; token của vé khác → 404
+- Token trong ảnh QR của vé là token soát vé (ticket_id, showtime_id, type=qr), POST /tickets/{id}/qr trả cùng token
+  (chỉ chủ vé / nhân viên, người khác → 404)
+App chạy in-process qua httpx.ASGITransport.
+
+# python -m app.tests.ticket_qr_test
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+from app.core.database import SessionLocal
+from app.core.security import get_current_active_user, get_current_staff_user
+from app.main import app
+from app.models.outbox import OutboxEvents
+from app.models.tickets import Tickets
+from app.services.outbox_handlers import TICKET_QR_EVENT
+from app.services.ticket_qr_service import TICKET_QR_TYPE, decode_qr_token
+from app.tests.my_tickets_test import buy
+from app.tests.payment_fixtures import showtime_fixture
+
+SEATS = 4
+
+
+def url_token(url: str) -> str:
+    return parse_qs(urlsplit(url).query)["token"][0]
+
+
+async def run():
+    with showtime_fixture(seat_count=SEATS) as fixture:
+        booking_code = await asyncio.to_thread(buy, fixture, fixture["seat_ids"])
+
+        db = SessionLocal()
+        try:
+            assert db.query(OutboxEvents).filter(
+                OutboxEvents.event_type == TICKET_QR_EVENT, OutboxEvents.aggregate_id == booking_code
+            ).count() == 0
+            assert db.query(Tickets).filter(Tickets.booking_code == booking_code, Tickets.qr_code.isnot(None)).count() == 0
+        finally:
+            db.close()
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            anonymous = await client.get(f"/api/v1/bookings/{booking_code}")
+            assert anonymous.status_code in (401, 403), anonymous.status_code
+            listing = await client.get("/api/v1/tickets", params={"showtime_id": fixture["showtime_id"]})
+            assert all("qr_url" not in item for item in listing.json()["data"]["items"])
+            print("✅ Không đăng nhập: /bookings/{code} bị từ chối, danh sách /tickets không chứa qr_url")
+
+            app.dependency_overrides[get_current_staff_user] = lambda: None
+            try:
+                response = await client.get(f"/api/v1/bookings/{booking_code}")
+            finally:
+                app.dependency_overrides.pop(get_current_staff_user, None)
+            booking = response.json()["data"]
+            assert "qr" not in booking and "qr_code" not in booking, booking
+            assert len(booking["tickets"]) == SEATS and all(ticket["qr_url"] for ticket in booking["tickets"])
+            print(f"✅ /bookings/{booking_code}: {len(response.content)} bytes, chỉ chứa URL ảnh QR")
+
+            ticket = booking["tickets"][0]
+            detail_url = f"/api/v1/tickets/{ticket['ticket_id']}"
+            assert (await client.get(detail_url)).status_code in (401, 403)
+            assert (await client.post(f"{detail_url}/qr")).status_code in (401, 403)
+            assert (await client.post(f"{detail_url}/qr", params={"format": "png"})).status_code in (401, 403)
+            try:
+                app.dependency_overrides[get_current_active_user] = lambda: SimpleNamespace(user_id=-1, roles=[])
+                assert (await client.get(detail_url)).status_code == 404
+                assert (await client.post(f"{detail_url}/qr")).status_code == 404
+                assert (await client.post(f"{detail_url}/qr", params={"format": "png"})).status_code == 404
+                app.dependency_overrides[get_current_active_user] = lambda: SimpleNamespace(user_id=fixture["user_id"], roles=[])
+                detail = (await client.get(detail_url)).json()["data"]
+
+                # POST /tickets/{id}/qr trả đúng token của qr_url → ảnh cache theo (vé, định dạng, kích thước)
+                issued = [(await client.post(f"{detail_url}/qr")).json()["data"]["qr_token"] for _ in range(2)]
+                png = await client.post(f"{detail_url}/qr", params={"format": "png", "box_size": 4})
+            finally:
+                app.dependency_overrides.pop(get_current_active_user, None)
+            assert detail["qr_url"] == ticket["qr_url"]
+            assert issued == [url_token(ticket["qr_url"])] * 2, issued
+            assert png.status_code == 200 and png.content.startswith(b"\x89PNG")
+            print("✅ /tickets/{id} và POST /tickets/{id}/qr: chủ vé nhận token / ảnh, người khác → 404, ẩn danh → 401")
+
+            start = time.perf_counter()
+            image = await client.get(ticket["qr_url"])
+            elapsed = (time.perf_counter() - start) * 1000
+            assert image.status_code == 200 and image.content.startswith(b"\x89PNG"), image.status_code
+            claims = decode_qr_token(url_token(ticket["qr_url"]), TICKET_QR_TYPE)
+            assert claims["ticket_id"] == ticket["ticket_id"] and claims["showtime_id"] == fixture["showtime_id"], claims
+            # Cache không vượt quá exp (hết cửa sổ vào muộn của suất chiếu)
+            assert claims["exp"] > time.time(), claims
+            assert image.headers["cache-control"].startswith("private, max-age="), image.headers["cache-control"]
+            max_age = int(image.headers["cache-control"].split("max-age=")[1].split(",")[0])
+            assert 0 < max_age <= claims["exp"] - time.time() + 1, (max_age, claims["exp"])
+            assert image.headers["etag"]
+            print(f"✅ QR vé {ticket['ticket_id']}: {len(image.content)} bytes PNG trong {elapsed:.1f}ms, {image.headers['cache-control']}")
+
+            again = await client.get(ticket["qr_url"])
+            assert again.content == image.content, "token / ảnh phải xác định"
+            not_modified = await client.get(ticket["qr_url"], headers={"If-None-Match": image.headers["etag"]})
+            assert not_modified.status_code == 304 and not not_modified.content
+
+            booking_image = await client.get(booking["qr_url"])
+            assert booking_image.status_code == 200 and booking_image.content.startswith(b"\x89PNG")
+
+            other = booking["tickets"][1]
+            swapped = await client.get(f"/api/v1/tickets/{other['ticket_id']}/qr.png", params={"token": url_token(ticket["qr_url"])})
+            assert swapped.status_code == 404, swapped.status_code
+            tampered = await client.get(ticket["qr_url"][:-2] + "xx")
+            assert tampered.status_code == 400, tampered.status_code
+            print("✅ 304 với If-None-Match, token của vé khác → 404, token sửa đổi → 400")
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
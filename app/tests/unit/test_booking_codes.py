@@ -0,0 +1,53 @@
+from collections import Counter
+
+from app.core.booking_codes import (
+    CROCKFORD_ALPHABET,
+    encode_booking_code,
+    is_valid_booking_code,
+    normalize_booking_code,
+)
+
+CODES = [encode_booking_code(n * 7919) for n in range(2000)]
+
+
+def test_encoded_codes_are_valid_and_unique():
+    assert len(set(CODES)) == len(CODES)
+    assert all(code.startswith("BK") and is_valid_booking_code(code) for code in CODES)
+
+
+def test_every_single_character_substitution_is_detected():
+    for code in CODES[:500]:
+        body = code[2:]
+        for position in range(len(body)):
+            for char in CROCKFORD_ALPHABET:
+                if char != body[position]:
+                    typo = "BK" + body[:position] + char + body[position + 1:]
+                    assert not is_valid_booking_code(typo), (code, typo)
+
+
+def test_adjacent_transpositions_missed_only_for_0_z_pair():
+    # Luhn mod 32 không phát hiện đảo hai ký tự liền kề có giá trị 0 và 31 ('0' ↔ 'Z')
+    transpositions, missed = 0, Counter()
+    for code in CODES:
+        body = code[2:]
+        for position in range(len(body) - 1):
+            if body[position] != body[position + 1]:
+                transpositions += 1
+                swapped = "BK" + body[:position] + body[position + 1] + body[position] + body[position + 2:]
+                if is_valid_booking_code(swapped):
+                    missed[frozenset(body[position:position + 2])] += 1
+    assert set(missed) <= {frozenset("0Z")}, missed
+    assert sum(missed.values()) / transpositions < 0.01
+
+
+def test_normalize_spoken_and_typed_codes():
+    code = encode_booking_code(123456)
+    spoken = code.lower().replace("0", "o").replace("1", "l")
+    assert normalize_booking_code(f" {spoken[:5]}-{spoken[5:]} ") == code
+    assert normalize_booking_code("bk20250101ab12") == "BK20250101AB12"
+
+
+def test_0_z_swap_is_a_known_blind_spot():
+    code = next(code for code in CODES if "0Z" in code[2:])
+    swapped = code.replace("0Z", "Z0", 1)
+    assert swapped != code and is_valid_booking_code(swapped)
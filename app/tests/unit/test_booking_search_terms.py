@@ -0,0 +1,24 @@
+import pytest
+
+from app.services.tickets_service import _like_contains, _phone_term
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("0901234567", "0901234567"),
+    ("090 123 4567", "0901234567"),
+    ("090.123.4567", "0901234567"),
+    ("(090) 123-4567", "0901234567"),
+    ("+84 901 234 567", "0901234567"),
+    ("84901234567", "0901234567"),
+    ("4567", "4567"),
+    ("nguyen", None),
+    ("a@example.com", None),
+    ("BK0000", None),
+])
+def test_phone_term(query, expected):
+    assert _phone_term(query) == expected
+
+
+def test_like_contains_escapes_wildcards():
+    assert _like_contains("abc") == "%abc%"
+    assert _like_contains("50%_off\\") == "%50\\%\\_off\\\\%"
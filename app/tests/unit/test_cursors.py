@@ -0,0 +1,30 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.payments_service import decode_history_cursor, encode_history_cursor
+from app.services.tickets_service import decode_booking_cursor, encode_booking_cursor
+
+CREATED_AT = datetime(2026, 10, 19, 19, 30, 15, 123456)
+
+
+def test_booking_cursor_round_trip():
+    cursor = encode_booking_cursor(CREATED_AT, "BK00000001AB")
+    assert "=" not in cursor
+    assert decode_booking_cursor(cursor) == (CREATED_AT, "BK00000001AB")
+
+
+def test_history_cursor_round_trip():
+    cursor = encode_history_cursor(CREATED_AT, 42)
+    assert "=" not in cursor
+    assert decode_history_cursor(cursor) == (CREATED_AT, 42)
+
+
+@pytest.mark.parametrize("decode", [decode_booking_cursor, decode_history_cursor])
+@pytest.mark.parametrize("cursor", ["", "not-base64!", "bnVsbA", "WzEsMiwzXQ", "WyJ4IiwgMV0"])
+def test_invalid_cursor_is_400(decode, cursor):
+    # "bnVsbA" = null, "WzEsMiwzXQ" = [1,2,3], "WyJ4IiwgMV0" = ["x", 1]
+    with pytest.raises(HTTPException) as excinfo:
+        decode(cursor)
+    assert excinfo.value.status_code == 400
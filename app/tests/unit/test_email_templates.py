@@ -0,0 +1,54 @@
+import string
+
+import pytest
+from premailer import transform
+
+from app.services.email_templates import (
+    BOOKING_CONFIRMATION_TEMPLATE,
+    TEMPLATE_SOURCES,
+    TICKET_TEMPLATE,
+    VERIFICATION_TEMPLATE,
+    get_template,
+    render_template,
+)
+
+VALUES = {
+    VERIFICATION_TEMPLATE: {"sender_name": "CinePlus", "year": 2026, "verification_code": "012345"},
+    BOOKING_CONFIRMATION_TEMPLATE: {
+        "sender_name": "CinePlus",
+        "year": 2026,
+        "booking_id": "BK00000007",
+        "customer_name": "Nguyễn Văn A",
+        "departure_date": "2026-10-20",
+        "origin": "Dune: Part Three",
+        "destination": "CinePlus Landmark",
+        "time": "19:30",
+        "ticket_count": 3,
+    },
+    TICKET_TEMPLATE: {
+        "booking_id": "BK00000007",
+        "customer_name": "Nguyễn Văn A",
+        "movie_name": "Dune: Part Three",
+        "showtime": "2026-10-20 19:30",
+        "seats": "F5, F6, F7",
+    },
+}
+
+
+@pytest.mark.parametrize("name", sorted(VALUES))
+def test_render_matches_premailer_per_message(name):
+    # Cách cũ: ghép giá trị vào template nguồn rồi premailer.transform() mỗi email
+    legacy = transform(string.Template(TEMPLATE_SOURCES[name]).substitute(VALUES[name]))
+    assert render_template(name, **VALUES[name]) == legacy
+
+
+def test_user_values_are_escaped():
+    unsafe = {**VALUES[TICKET_TEMPLATE], "customer_name": '<img src=x onerror="alert(1)">'}
+    rendered = render_template(TICKET_TEMPLATE, **unsafe)
+    assert "<img src=x" not in rendered
+    assert "&lt;img src=x onerror=&quot;alert(1)&quot;&gt;" in rendered
+
+
+def test_missing_value_raises_key_error():
+    with pytest.raises(KeyError):
+        get_template(TICKET_TEMPLATE).render(booking_id="BK1")
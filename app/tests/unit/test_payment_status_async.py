@@ -0,0 +1,97 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.schemas.payments import PaymentMethod, PaymentResult, PaymentStatus
+from app.services import payments_service
+from app.services.payments_service import PaymentService
+
+
+class FakeAsyncSession:
+    """run_sync chạy hàm trên chính event loop như AsyncSession"""
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return fn(None, *args, **kwargs)
+
+
+def payment_result(success=True):
+    return PaymentResult(
+        success=success,
+        order_id="order-1",
+        transaction_id="123",
+        amount=100000,
+        payment_method=PaymentMethod.VNPAY,
+        payment_status=PaymentStatus.SUCCESS if success else PaymentStatus.FAILED,
+        response_code="00" if success else "24",
+    )
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Ghi lại thread của mọi lời gọi Redis / sequence"""
+    calls = []
+
+    def recorder(name, value=None):
+        return lambda *args: calls.append((name, threading.get_ident())) or value
+
+    monkeypatch.setattr(payments_service, "get_cached_callback_result", recorder("cache_get"))
+    monkeypatch.setattr(payments_service, "next_booking_code", recorder("booking_code", "BKTEST"))
+    monkeypatch.setattr(payments_service, "cache_callback_result", recorder("cache_set"))
+    monkeypatch.setattr(payments_service, "invalidate_user_bookings", recorder("invalidate"))
+    monkeypatch.setattr(payments_service.payment_notifier, "publish", recorder("publish"))
+    return calls
+
+
+def run(service, result):
+    async def main():
+        loop_thread = threading.get_ident()
+        return loop_thread, await service.update_payment_status_async(FakeAsyncSession(), "order-1", result)
+    return asyncio.run(main())
+
+
+def test_redis_calls_run_off_the_event_loop(monkeypatch, calls):
+    service = PaymentService()
+    seen = {}
+
+    def apply(db, order_id, result, after_commit, booking_code=None):
+        seen["booking_code"] = booking_code
+        outcome = {"status": "success", "order_id": order_id}
+        after_commit.append(lambda: service._publish_result(order_id, outcome))
+        after_commit.append(lambda: payments_service.invalidate_user_bookings([1]))
+        return outcome
+
+    monkeypatch.setattr(service, "_apply_payment_result", apply)
+    loop_thread, outcome = run(service, payment_result())
+    assert outcome["status"] == "success" and seen["booking_code"] == "BKTEST"
+    assert [name for name, _ in calls] == ["cache_get", "booking_code", "cache_set", "publish", "invalidate"]
+    assert all(thread != loop_thread for _, thread in calls)
+
+
+def test_after_commit_runs_when_rejected(monkeypatch, calls):
+    service = PaymentService()
+
+    def apply(db, order_id, result, after_commit, booking_code=None):
+        after_commit.append(lambda: service._publish_result(order_id, {"status": "rejected"}))
+        raise HTTPException(status_code=400, detail="expired")
+
+    monkeypatch.setattr(service, "_apply_payment_result", apply)
+    with pytest.raises(HTTPException):
+        run(service, payment_result())
+    assert [name for name, _ in calls][-2:] == ["cache_set", "publish"]
+
+
+def test_failed_payment_skips_booking_code(monkeypatch, calls):
+    service = PaymentService()
+    monkeypatch.setattr(service, "_apply_payment_result", lambda db, order_id, result, after_commit, booking_code=None: {"status": "failed"})
+    run(service, payment_result(success=False))
+    assert "booking_code" not in [name for name, _ in calls]
+
+
+def test_cached_result_replayed_without_db(monkeypatch):
+    service = PaymentService()
+    monkeypatch.setattr(payments_service, "get_cached_callback_result", lambda order_id: {"status": "success"})
+    monkeypatch.setattr(service, "_apply_payment_result", lambda *args: pytest.fail("không được chạm DB"))
+    _, outcome = run(service, payment_result())
+    assert outcome == {"status": "success", "duplicate": True}
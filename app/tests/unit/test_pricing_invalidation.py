@@ -0,0 +1,48 @@
+import json
+import time
+
+import pytest
+
+from app.models.seat_templates import SeatTypeEnum
+from app.services import pricing_service
+from app.services.pricing_service import PRICE_INVALIDATION_CHANNEL, ShowtimePriceTable, invalidate_price_table
+
+
+class RecordingRedis:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.published = []
+
+    def publish(self, channel, message):
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.published.append((channel, json.loads(message)))
+
+
+@pytest.fixture
+def cached_tables(monkeypatch):
+    monkeypatch.setattr(pricing_service, "_cache", {})
+    expires_at = time.monotonic() + 60
+    for showtime_id in (1, 2):
+        table = ShowtimePriceTable(showtime_id, 90000, 0, {10: SeatTypeEnum.regular})
+        pricing_service._cache[showtime_id] = (table, expires_at)
+    return pricing_service._cache
+
+
+def test_invalidate_one_showtime_publishes_to_other_workers(monkeypatch, cached_tables):
+    redis = RecordingRedis()
+    monkeypatch.setattr(pricing_service, "redis_client", redis)
+    invalidate_price_table(1)
+    assert list(cached_tables) == [2]
+    invalidate_price_table()
+    assert not cached_tables
+    assert redis.published == [
+        (PRICE_INVALIDATION_CHANNEL, {"showtime_id": 1}),
+        (PRICE_INVALIDATION_CHANNEL, {"showtime_id": None}),
+    ]
+
+
+def test_redis_failure_still_drops_local_table(monkeypatch, cached_tables):
+    monkeypatch.setattr(pricing_service, "redis_client", RecordingRedis(fail=True))
+    invalidate_price_table(2)
+    assert list(cached_tables) == [1]
@@ -0,0 +1,32 @@
+import pytest
+
+from app.core.config import settings
+from app.services import qr_service
+from app.services.qr_service import qr_cache_key, render_qr
+
+
+@pytest.fixture(autouse=True)
+def inline_render(monkeypatch):
+    monkeypatch.setattr(settings, "QR_PROCESS_WORKERS", 0)
+    monkeypatch.setattr(qr_service, "_cache", type(qr_service._cache)())
+    renders = []
+    original = qr_service._render
+    monkeypatch.setattr(qr_service, "_render", lambda *args: renders.append(args) or original(*args))
+    return renders
+
+
+def test_payload_key_without_subject():
+    assert qr_cache_key("a") != qr_cache_key("b")
+    assert qr_cache_key("a", "png") != qr_cache_key("a", "svg")
+    assert qr_cache_key("a", box_size=5) != qr_cache_key("a", box_size=6)
+
+
+def test_subject_key_by_ticket_format_and_size(inline_render):
+    first = render_qr("token-1", "png", 5, subject="ticket:42")
+    assert render_qr("token-1", "png", 5, subject="ticket:42") == first
+    assert len(inline_render) == 1
+    render_qr("token-1", "svg", 5, subject="ticket:42")
+    render_qr("token-1", "png", 6, subject="ticket:42")
+    render_qr("token-1", "png", 5, subject="ticket:43")
+    assert len(inline_render) == 4
+    assert qr_cache_key("token-1", "png", 5, subject="ticket:42") == qr_cache_key("token-2", "png", 5, subject="ticket:42")
@@ -0,0 +1,59 @@
+import smtplib
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+
+import pytest
+
+from app.core.smtp_pool import SMTPConnectionPool
+from app.tests.smtp_sink import SMTPSink
+
+USERNAME, PASSWORD = "cineplus@example.com", "secret"
+WORKERS = 4
+
+
+def message(to_addr: str) -> MIMEText:
+    msg = MIMEText("Mã xác nhận 123456", "plain", "utf-8")
+    msg["From"], msg["To"], msg["Subject"] = USERNAME, to_addr, "test"
+    return msg
+
+
+def test_rejected_recipient_raises_and_keeps_connection():
+    with SMTPSink(reject_recipients=["missing@example.com"]) as sink:
+        pool = SMTPConnectionPool("127.0.0.1", sink.port, USERNAME, PASSWORD, size=1)
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            pool.send(message("missing@example.com"), USERNAME, ["missing@example.com"])
+        # Không gửi lại thư bị từ chối, kết nối vẫn được dùng cho thư sau
+        pool.send(message("ok@example.com"), USERNAME, ["ok@example.com"])
+        pool.close()
+        assert [m.rcpt_to for m in sink.messages] == [["ok@example.com"]]
+        assert sink.connections == 1 and pool.connections_opened == 1
+
+
+def test_reconnects_when_server_drops_connection():
+    # Server cắt kết nối sau mỗi 3 thư; idle_seconds=0 → NOOP trước mỗi lần dùng lại
+    with SMTPSink(drop_after=3) as sink:
+        pool = SMTPConnectionPool("127.0.0.1", sink.port, USERNAME, PASSWORD, size=1, idle_seconds=0)
+        for i in range(10):
+            pool.send(message(f"user{i}@example.com"), USERNAME, [f"user{i}@example.com"])
+        pool.close()
+        assert [m.rcpt_to[0] for m in sink.messages] == [f"user{i}@example.com" for i in range(10)]
+        assert sink.connections == 4
+
+
+def test_max_messages_per_connection():
+    with SMTPSink() as sink:
+        pool = SMTPConnectionPool("127.0.0.1", sink.port, USERNAME, PASSWORD, size=1, max_messages=4)
+        for i in range(10):
+            pool.send(message(f"user{i}@example.com"), USERNAME, [f"user{i}@example.com"])
+        pool.close()
+        assert len(sink.messages) == 10 and sink.connections == 3
+
+
+def test_concurrent_senders_stay_within_pool_size():
+    with SMTPSink(handshake_delay=0.02) as sink:
+        pool = SMTPConnectionPool("127.0.0.1", sink.port, USERNAME, PASSWORD, size=WORKERS)
+        with ThreadPoolExecutor(WORKERS * 2) as executor:
+            list(executor.map(lambda i: pool.send(message(f"user{i}@example.com"), USERNAME, [f"user{i}@example.com"]), range(40)))
+        pool.close()
+        assert sorted(m.rcpt_to[0] for m in sink.messages) == sorted(f"user{i}@example.com" for i in range(40))
+        assert sink.connections <= WORKERS and sink.logins == sink.connections
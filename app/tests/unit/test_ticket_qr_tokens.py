@@ -0,0 +1,56 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from app.core.config import settings
+from app.services.ticket_qr_service import (
+    QR_IMAGE_MAX_AGE,
+    TICKET_QR_TYPE,
+    decode_qr_token,
+    qr_image_cache_control,
+    ticket_qr_expiry,
+    ticket_qr_subject,
+    ticket_qr_token,
+)
+
+
+def test_expiry_is_end_of_late_entry_window():
+    show_datetime = datetime(2030, 1, 1, 19, 30)
+    expected = show_datetime + timedelta(minutes=settings.GATE_LATE_ENTRY_MINUTES)
+    assert ticket_qr_expiry(show_datetime) == int(expected.timestamp())
+
+
+def test_token_is_deterministic_and_carries_exp():
+    expires_at = ticket_qr_expiry(datetime.now() + timedelta(hours=1))
+    token = ticket_qr_token(42, 7, expires_at)
+    assert ticket_qr_token(42, 7, expires_at) == token
+    claims = decode_qr_token(token, TICKET_QR_TYPE)
+    assert (claims["ticket_id"], claims["showtime_id"], claims["exp"]) == (42, 7, expires_at)
+
+
+def test_expired_token_rejected():
+    expires_at = ticket_qr_expiry(datetime.now() - timedelta(minutes=settings.GATE_LATE_ENTRY_MINUTES + 1))
+    with pytest.raises(HTTPException) as exc:
+        decode_qr_token(ticket_qr_token(42, 7, expires_at), TICKET_QR_TYPE)
+    assert exc.value.status_code == 400
+
+
+def test_ticket_token_without_exp_rejected():
+    token = jwt.encode({"ticket_id": 42, "showtime_id": 7, "type": TICKET_QR_TYPE}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    with pytest.raises(HTTPException) as exc:
+        decode_qr_token(token, TICKET_QR_TYPE)
+    assert exc.value.status_code == 400
+
+
+def test_cache_subject_changes_with_exp():
+    assert ticket_qr_subject(42, 1000) != ticket_qr_subject(42, 2000)
+
+
+def test_cache_control_bounded_by_exp():
+    assert qr_image_cache_control() == f"private, max-age={QR_IMAGE_MAX_AGE}, immutable"
+    max_age = int(qr_image_cache_control(int(time.time()) + 600).split("max-age=")[1].split(",")[0])
+    assert 595 <= max_age <= 600
+    assert qr_image_cache_control(int(time.time()) - 10) == "private, max-age=0, immutable"
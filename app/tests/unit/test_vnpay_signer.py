@@ -0,0 +1,59 @@
+"""
+Nhiều thread cùng tạo URL thanh toán qua MỘT PaymentService dùng chung
+(giống singleton trong app/api/v1/payments.py). Mỗi URL phải chỉ chứa tham số của chính
+request đó và chữ ký phải hợp lệ - không rò rỉ tham số giữa các request.
+"""
+
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.payments.vnpay import verify_callback
+from app.schemas.payments import PaymentMethod, PaymentRequest
+from app.services.payments_service import PaymentService
+
+THREADS = 16
+REQUESTS = 1000
+
+
+def create_urls():
+    payment_service = PaymentService()
+    barrier = threading.Barrier(THREADS)
+
+    def create_url(i: int):
+        if i < THREADS:
+            barrier.wait()
+        request = PaymentRequest(
+            order_desc=f"Don hang {i}",
+            payment_method=PaymentMethod.VNPAY,
+            language="en" if i % 2 else "vn",
+        )
+        return i, payment_service.create_vnpay_url(request, f"10.0.{i // 256 % 256}.{i % 256}", 1000 + i, f"ORDER{i:06d}")
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        return list(pool.map(create_url, range(REQUESTS)))
+
+
+def query_params(url: str):
+    return urllib.parse.parse_qsl(urllib.parse.urlsplit(url).query, keep_blank_values=True)
+
+
+def test_concurrent_urls_do_not_leak_params():
+    for i, url in create_urls():
+        pairs = query_params(url)
+        keys = [key for key, _ in pairs]
+        assert len(keys) == len(set(keys)), f"Request {i}: tham số bị lặp {keys}"
+        params = dict(pairs)
+        assert params["vnp_TxnRef"] == f"ORDER{i:06d}"
+        assert params["vnp_Amount"] == str((1000 + i) * 100)
+        assert params["vnp_OrderInfo"] == f"Don hang {i}"
+        assert params["vnp_Locale"] == ("en" if i % 2 else "vn")
+        assert verify_callback(params, settings.VNPAY_HASH_SECRET_KEY), f"Request {i}: chữ ký không hợp lệ"
+
+
+def test_tampered_callback_is_rejected():
+    _, url = create_urls()[0]
+    tampered = dict(query_params(url))
+    tampered["vnp_Amount"] = "1"
+    assert not verify_callback(tampered, settings.VNPAY_HASH_SECRET_KEY)
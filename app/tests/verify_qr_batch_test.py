@@ -0,0 +1,97 @@
+"""
+Kiểm thử soát vé theo lô (POST /tickets/verify-qr/batch) – cổng phát lại bộ đệm offline:
+- Lô SEATS token + token hỏng + token quét trùng trong lô + vé đã hủy → kết quả đúng theo từng vị trí
+- scanned_at của cổng được giữ làm validated_at (không vượt quá giờ nhận)
+- So sánh thời gian: gửi từng token một (/tickets/verify-qr) với một request lô
+- DB có đủ validated_at sau khi gate_validator ghi lô
+App chạy in-process qua httpx.ASGITransport.
+
+# python -m app.tests.verify_qr_batch_test
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+from app.core.database import SessionLocal
+from app.core.gate_validator import gate_validator
+from app.main import app
+from app.models.tickets import Tickets, TicketStatusEnum
+from app.tests.payment_fixtures import showtime_fixture, sold_out_showtime
+
+SEATS = 300
+
+
+async def run():
+    with showtime_fixture(seat_count=SEATS) as legacy, showtime_fixture(seat_count=SEATS) as fixture:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            # Cách cũ: mỗi token một request
+            _, tokens = await asyncio.to_thread(sold_out_showtime, legacy)
+            start = time.perf_counter()
+            for token in tokens.values():
+                response = await client.post("/api/v1/tickets/verify-qr", json={"qr_token": token})
+                assert response.status_code == 200, response.text
+            single = (time.perf_counter() - start) * 1000
+            print(f"🐢 Từng request: {SEATS} lượt quét trong {single:.0f}ms")
+
+            showtime_id, tokens = await asyncio.to_thread(sold_out_showtime, fixture)
+            ticket_ids = list(tokens)
+            cancelled_id = ticket_ids[-1]
+            db = SessionLocal()
+            try:
+                db.get(Tickets, cancelled_id).status = TicketStatusEnum.cancelled
+                db.commit()
+            finally:
+                db.close()
+            gate_validator.invalidate([showtime_id])
+
+            offline_at = (datetime.now() - timedelta(minutes=3)).replace(microsecond=0)
+            items = [{"qr_token": tokens[ticket_id], "scanned_at": offline_at.isoformat()} for ticket_id in ticket_ids]
+            items.append({"qr_token": "not-a-token"})
+            items.append({"qr_token": tokens[ticket_ids[0]]})
+            items.append({"qr_token": tokens[ticket_ids[1]], "scanned_at": (datetime.now() + timedelta(days=1)).isoformat()})
+
+            start = time.perf_counter()
+            response = await client.post("/api/v1/tickets/verify-qr/batch", json={"items": items})
+            batch = (time.perf_counter() - start) * 1000
+            assert response.status_code == 200, response.text
+            data = response.json()["data"]
+            print(f"⚡ Một request lô: {len(items)} token trong {batch:.0f}ms ({single / batch:.1f}x)")
+
+            results = data["results"]
+            assert [result["index"] for result in results] == list(range(len(items)))
+            for ticket_id, result in zip(ticket_ids[:-1], results):
+                assert result["result"] == "valid" and result["ticket_id"] == ticket_id, result
+                assert datetime.fromisoformat(result["validated_at"]) == offline_at, result
+            assert results[SEATS - 1]["result"] == "invalid", results[SEATS - 1]
+            assert results[SEATS]["result"] == "bad_token" and results[SEATS]["ticket_id"] is None
+            assert results[SEATS + 1]["result"] == "duplicate"
+            assert datetime.fromisoformat(results[SEATS + 1]["validated_at"]) == offline_at
+            assert results[SEATS + 2]["result"] == "duplicate"
+            assert data["summary"] == {"valid": SEATS - 1, "invalid": 1, "bad_token": 1, "duplicate": 2}, data["summary"]
+            print(f"✅ Kết quả theo từng token: {data['summary']}")
+
+            empty = await client.post("/api/v1/tickets/verify-qr/batch", json={"items": []})
+            assert empty.status_code == 422, empty.status_code
+
+        # gate_validator không chạy nền → scan_many đã ghi ngay trong request
+        db = SessionLocal()
+        try:
+            validated = db.query(Tickets).filter(
+                Tickets.showtime_id == showtime_id, Tickets.validated_at == offline_at
+            ).count()
+            assert validated == SEATS - 1, validated
+        finally:
+            db.close()
+        print(f"✅ {validated} validated_at = giờ quét offline đã ghi vào DB")
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
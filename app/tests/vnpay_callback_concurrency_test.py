@@ -0,0 +1,112 @@
+"""
+Kiểm thử đồng thời: /vnpay/return và /vnpay/ipn cho CÙNG một order_id chạy song song.
+Kỳ vọng: mỗi đơn chỉ được xuất vé đúng một lần, callback còn lại nhận 'processing'
+hoặc kết quả đã lưu (duplicate), callback gửi lại sau đó trả kết quả đã lưu.
+
+# python -m app.tests.vnpay_callback_concurrency_test
+"""
+
+import threading
+from datetime import datetime
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.tickets import Tickets
+from app.payments.vnpay import canonical_query, sign
+from app.schemas.payments import PaymentRequest
+from app.services.payments_service import PaymentService
+from app.tests.payment_fixtures import showtime_fixture, hold_seats
+
+ROUNDS = 20
+SEATS_PER_ORDER = 4
+
+
+def signed_callback(order_id: str, amount: float, transaction_no: str) -> dict:
+    """Tạo query callback hợp lệ giống VNPay gửi về"""
+    params = {
+        "vnp_Amount": str(int(amount * 100)),
+        "vnp_BankCode": "NCB",
+        "vnp_CardType": "ATM",
+        "vnp_OrderInfo": "Thanh toan ve",
+        "vnp_PayDate": datetime.now().strftime('%Y%m%d%H%M%S'),
+        "vnp_ResponseCode": "00",
+        "vnp_TmnCode": settings.VNPAY_TMN_CODE,
+        "vnp_TransactionNo": transaction_no,
+        "vnp_TransactionStatus": "00",
+        "vnp_TxnRef": order_id,
+    }
+    params["vnp_SecureHash"] = sign(settings.VNPAY_HASH_SECRET_KEY, canonical_query(params))
+    return params
+
+
+def run_callback(service: PaymentService, params: dict, results: list, barrier: threading.Barrier):
+    db = SessionLocal()
+    try:
+        barrier.wait()
+        payment_result = service.handle_vnpay_callback(db, params)
+        results.append(service.update_payment_status(db, payment_result.order_id, payment_result))
+    except HTTPException as e:
+        results.append({"status": "error", "code": e.status_code, "message": e.detail})
+    finally:
+        db.close()
+
+
+def main():
+    with showtime_fixture(seat_count=ROUNDS * SEATS_PER_ORDER) as fixture:
+        outcomes = {}
+        for round_no in range(ROUNDS):
+            seat_ids = fixture["seat_ids"][round_no * SEATS_PER_ORDER:(round_no + 1) * SEATS_PER_ORDER]
+            session_id = hold_seats(fixture["showtime_id"], fixture["user_id"], seat_ids)
+
+            # Mỗi callback dùng một PaymentService riêng, giống hai worker khác nhau
+            db = SessionLocal()
+            payment = PaymentService().create_payment(
+                db, PaymentRequest(session_id=session_id, order_desc="Concurrency test", payment_method="VNPAY"),
+                "127.0.0.1", user_id=fixture["user_id"],
+            )
+            db.close()
+            params = signed_callback(payment.order_id, payment.amount, f"TXN{round_no}")
+
+            results = []
+            barrier = threading.Barrier(2)
+            threads = [
+                threading.Thread(target=run_callback, args=(PaymentService(), params, results, barrier))
+                for _ in ("return", "ipn")
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            # Callback gửi lại sau khi đã xong → kết quả đã lưu
+            retry = []
+            run_callback(PaymentService(), params, retry, threading.Barrier(1))
+
+            db = SessionLocal()
+            booking_codes = {
+                code for (code,) in db.query(Tickets.booking_code)
+                .filter(Tickets.seat_id.in_(seat_ids), Tickets.showtime_id == fixture["showtime_id"])
+                .all()
+            }
+            ticket_count = db.query(Tickets).filter(
+                Tickets.seat_id.in_(seat_ids), Tickets.showtime_id == fixture["showtime_id"]
+            ).count()
+            db.close()
+
+            statuses = sorted(r["status"] + ("(dup)" if r.get("duplicate") else "") for r in results)
+            outcomes[tuple(statuses)] = outcomes.get(tuple(statuses), 0) + 1
+
+            assert ticket_count == SEATS_PER_ORDER, f"Round {round_no}: {ticket_count} tickets issued for {SEATS_PER_ORDER} seats"
+            assert len(booking_codes) == 1, f"Round {round_no}: booking codes {booking_codes}"
+            assert sum(1 for r in results if r["status"] == "success" and not r.get("duplicate")) == 1, results
+            assert retry[0].get("duplicate") and retry[0]["booking_code"] in booking_codes, retry
+
+        print(f"✅ {ROUNDS} đơn, mỗi đơn 2 callback song song: không xuất vé trùng")
+        for statuses, count in outcomes.items():
+            print(f"   {count:>3} x {statuses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+"""
+Unit test (app/tests/unit) chạy bằng pytest, không cần Postgres / Redis / SMTP thật:
+biến môi trường bắt buộc của Settings được gán giá trị giả trước khi import app (app/__init__ nạp models → Settings).
+
+# pytest
+"""
+
+import os
+
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "15")
+os.environ.setdefault("REFRESH_TOKEN_EXPIRE_DAYS", "7")
+os.environ.setdefault("SECRET_KEY", "unit-test-secret")
+os.environ.setdefault("REDIS_ENABLED", "false")
+os.environ.setdefault("VNPAY_TMN_CODE", "UNITTEST")
+os.environ.setdefault("VNPAY_HASH_SECRET_KEY", "unit-test-vnpay-secret")
+os.environ.setdefault("VNPAY_PAYMENT_URL", "https://sandbox.vnpayment.vn/paymentv2/vpcpay.html")